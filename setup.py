@@ -26,6 +26,9 @@ setup(
         "torch >= 2.0.1",
         "transformers >= 4.29.2"
     ],
+    extras_require={
+        "parquet": ["pyarrow >= 12.0.0"]
+    },
     python_requires=">=3.11.2",
     entry_points={
         'console_scripts': [
@@ -0,0 +1,2 @@
+from .benchmark import format_report, run_benchmark
+from .fixture_site import FixtureSite
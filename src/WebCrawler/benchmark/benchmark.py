@@ -0,0 +1,143 @@
+"""
+benchmark.py
+====================================
+This module contains the offline end-to-end benchmark which scraps a local fixture site.
+"""
+
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from WebCrawler.benchmark.fixture_site import FixtureSite
+from WebCrawler.custom_logger import get_logger
+from WebCrawler.managers import ScraperManager
+from WebCrawler.network import override_site_urls, reset_site_urls
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, peak memory is not reported there
+    resource = None
+
+# the fixture site is local, so requests are paced only by the browsers
+BENCHMARK_RATE_LIMITS = {'*': (1000.0, 64)}
+PERCENTILES = [50, 90, 99]
+# results whose numbers of rows are reported
+BENCHMARK_RESULTS = {
+    'regon': 'regon_entity_df',
+    'regon_local': 'regon_local_entity_df',
+    'krs': 'krs_general_info_df',
+    'aleo': 'aleo_account_numbers_df',
+    'infostrefa': 'infostrefa_news_df',
+    'bankier': 'bankier_news_df'
+}
+
+
+def _latency_stats(latencies: List[float]) -> dict:
+    """Returns the number of items and percentiles of latencies in milliseconds.
+    """
+    if not latencies:
+        return {'items': 0}
+    values = np.array(latencies) * 1000
+    stats = {'items': len(latencies)}
+    stats.update({f'p{q}_ms': round(float(np.percentile(values, q)), 1) for q in PERCENTILES})
+    stats['max_ms'] = round(float(values.max()), 1)
+    return stats
+
+
+def _peak_rss_mb() -> Tuple[Optional[float], Optional[float]]:
+    """Returns peak resident memory in megabytes of this process and of its finished child processes.
+    """
+    if resource is None:
+        return None, None
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return tuple(round(resource.getrusage(who).ru_maxrss / unit, 1)
+                 for who in [resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN])
+
+
+def run_benchmark(entities: int = 20, workers: int = 1, news_per_entity: int = 3, latency: float = 0,
+                  queue_size: int = 16, analyze_sentiment: bool = False,
+                  rate_limits: Dict[str, Tuple[float, int]] = None, regon_backend: str = 'selenium') -> dict:
+    """Scraps a local fixture site with generated entities end to end and measures the throughput.
+
+    :param entities: Number of generated entities, defaults to 20
+    :type entities: int, optional
+    :param workers: Number of processes the entities are sharded across, defaults to 1
+    :type workers: int, optional
+    :param news_per_entity: Number of news of every kind on every news site, defaults to 3
+    :type news_per_entity: int, optional
+    :param latency: Delay in seconds added by the fixture site to every response, defaults to 0
+    :type latency: float, optional
+    :param queue_size: Maximum number of entities waiting between two stages of the pipeline, defaults to 16
+    :type queue_size: int, optional
+    :param analyze_sentiment: Specifies whether scraped news are scored by the sentiment model, which has to be
+        available offline, defaults to False
+    :type analyze_sentiment: bool, optional
+    :param rate_limits: Requests per second and requests in flight of every host, defaults to
+        BENCHMARK_RATE_LIMITS
+    :type rate_limits: dict, optional
+    :param regon_backend: Backend of REGON, one of ScraperManager.REGON_BACKENDS, defaults to 'selenium'
+    :type regon_backend: str, optional
+    :return: Report with entities per minute, latency percentiles of every pipeline stage, numbers of scraped rows,
+        requests served by every site, run metrics of every source and peak memory
+    :rtype: dict
+    """
+    logger = get_logger()
+    with FixtureSite(entities, news_per_entity=news_per_entity, latency=latency) as site:
+        override_site_urls(site.urls())
+        try:
+            scraper_manager = ScraperManager(data=site.input_rows(), workers=workers, queue_size=queue_size,
+                                             rate_limits=rate_limits or BENCHMARK_RATE_LIMITS,
+                                             analyze_sentiment=analyze_sentiment, regon_backend=regon_backend)
+            logger.info(f'Benchmark of {entities} entities started on {site.urls()["regon"]}')
+            start = time.perf_counter()
+            scraper_manager.scrap()
+            elapsed = time.perf_counter() - start
+        finally:
+            reset_site_urls()
+
+    peak_rss, peak_rss_children = _peak_rss_mb()
+    return {
+        'entities': entities,
+        'workers': workers,
+        'seconds': round(elapsed, 2),
+        'entities_per_minute': round(entities / elapsed * 60, 2) if elapsed else None,
+        'stages': {name: _latency_stats(latencies) for name, latencies in scraper_manager.stage_latencies.items()},
+        'rows': {name: len(scraper_manager.results.handle(result)) for name, result in BENCHMARK_RESULTS.items()},
+        'requests': dict(site.requests),
+        'sources': {source: {name: value for name, value in stats.items() if name != 'histograms'}
+                    for source, stats in scraper_manager.metrics.snapshot()['sources'].items()},
+        'peak_rss_mb': peak_rss,
+        'peak_rss_children_mb': peak_rss_children
+    }
+
+
+def format_report(report: dict) -> str:
+    """Formats the benchmark report as a plain text table.
+
+    :param report: Report returned by run_benchmark
+    :type report: dict
+    :return: Human readable report
+    :rtype: str
+    """
+    lines = [f"{'Entities: ':<24}{report['entities']}",
+             f"{'Workers: ':<24}{report['workers']}",
+             f"{'Time [s]: ':<24}{report['seconds']}",
+             f"{'Entities per minute: ':<24}{report['entities_per_minute']}",
+             f"{'Peak RSS [MB]: ':<24}{report['peak_rss_mb']}",
+             f"{'Peak RSS children [MB]: ':<24}{report['peak_rss_children_mb']}",
+             '',
+             f"{'Stage':<12}{'items':>8}" + ''.join(f"{f'p{q} [ms]':>12}" for q in PERCENTILES) + f"{'max [ms]':>12}"]
+    for name, stats in report['stages'].items():
+        lines.append(f"{name:<12}{stats['items']:>8}" +
+                     ''.join(f"{stats.get(f'p{q}_ms', '-'):>12}" for q in PERCENTILES) +
+                     f"{stats.get('max_ms', '-'):>12}")
+    lines.append('')
+    lines.append('Rows: ' + ', '.join(f'{name} {count}' for name, count in report['rows'].items()))
+    lines.append('Requests: ' + ', '.join(f'{name} {count}' for name, count in report['requests'].items()))
+    lines.append('Page waits [s]: ' + ', '.join(f"{source} {stats['page_wait_seconds']}"
+                                                for source, stats in report['sources'].items()))
+    return '\n'.join(lines)
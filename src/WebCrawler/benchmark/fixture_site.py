@@ -0,0 +1,659 @@
+"""
+fixture_site.py
+====================================
+This module contains a local stand-in of all the scraped sites serving synthetic pages for generated entities.
+"""
+
+import json
+import re
+import time
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from uuid import uuid4
+from xml.sax.saxutils import escape as escape_xml
+
+from WebCrawler.network import SITES
+
+NEWS_DATE = '2023-02-01 10:{minute:02d}'
+INFOSTREFA_DATE = '10:{minute:02d} 01/02/2023'
+# code and name of the basic legal form, the special legal form and the form of ownership of every entity
+REGON_FORMS = [('1', 'OSOBA PRAWNA'), ('16', 'SPÓŁKI AKCYJNE'), ('215', 'WŁASNOŚĆ KRAJOWYCH OSÓB FIZYCZNYCH')]
+
+
+def _nip(number: int) -> str:
+    """Returns a NIP with a correct checksum made of the number and its check digit.
+    """
+    while True:
+        digits = f'{number:09d}'[-9:]
+        checksum = sum(w * int(d) for w, d in zip([6, 5, 7, 2, 3, 4, 5, 6, 7], digits)) % 11
+        if checksum != 10:
+            return digits + str(checksum)
+        number += 1
+
+
+def _regon(number: int) -> str:
+    """Returns a 9 digit REGON with a correct checksum.
+    """
+    digits = f'{number:08d}'[-8:]
+    checksum = sum(w * int(d) for w, d in zip([8, 9, 2, 3, 4, 5, 6, 7], digits)) % 11
+    return digits + str(0 if checksum == 10 else checksum)
+
+
+def _local_regon(regon: str, number: int) -> str:
+    """Returns a 14 digit REGON of a local unit of the entity with a correct checksum.
+    """
+    digits = regon + f'{number:04d}'
+    checksum = sum(w * int(d) for w, d in zip([2, 4, 8, 5, 0, 9, 7, 3, 6, 1, 2, 4, 8], digits)) % 11
+    return digits + str(0 if checksum == 10 else checksum)
+
+
+def _page(body: str, script: str = '') -> str:
+    """Wraps the body in an HTML document.
+    """
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>fixture</title></head>'
+            f'<body>{body}<script>{script}</script></body></html>')
+
+
+class FixtureSite:
+    """Synthetic stand-in of REGON BIR, KRS search, Aleo, GPW, NewConnect, Infostrefa and Bankier served by a local
+    HTTP server. Pages mimic the structure the scrapers expect for a number of generated entities: every entity has
+    a REGON and KRS record with PKD codes and representatives, every fifth has a local unit, two thirds are listed
+    on GPW or NewConnect and have news on Infostrefa and Bankier.
+
+    Every site is served under its own path prefix, base URLs for network.override_site_urls are returned by urls.
+
+    :param entities: Number of generated entities, defaults to 20
+    :type entities: int, optional
+    :param news_per_entity: Number of news of every kind on every news site, defaults to 3
+    :type news_per_entity: int, optional
+    :param latency: Delay in seconds added to every response to mimic the network, defaults to 0
+    :type latency: float, optional
+    :param port: Port of the server, defaults to 0 which picks a free port
+    :type port: int, optional
+    """
+
+    def __init__(self, entities: int = 20, news_per_entity: int = 3, latency: float = 0, port: int = 0):
+        """Constructor method.
+        """
+        self.news_per_entity = news_per_entity
+        self.latency = latency
+        self.port = port
+        self.requests: Dict[str, int] = {site: 0 for site in SITES}
+        self.entities = [self._entity(i) for i in range(entities)]
+        self._by_nip = {entity['nip']: entity for entity in self.entities}
+        self._by_stock = {entity['stock']: entity for entity in self.entities if entity['market']}
+        self._bir_sessions = set()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[Thread] = None
+        self._lock = Lock()
+
+    def start(self) -> 'FixtureSite':
+        """Starts the server in a background thread.
+
+        :return: The started site
+        :rtype: FixtureSite
+        """
+        site = self
+
+        class Handler(_FixtureHandler):
+            fixture = site
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = Thread(target=self._server.serve_forever, name='FixtureSite', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stops the server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+    def __enter__(self) -> 'FixtureSite':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
+
+    def urls(self) -> Dict[str, str]:
+        """Returns base URLs of all the sites served by the fixture.
+
+        :return: Base URLs keyed by the name of the site
+        :rtype: Dict[str, str]
+        """
+        return {site: f'http://127.0.0.1:{self.port}/{site}' for site in SITES}
+
+    def input_rows(self) -> List[Tuple[str, str]]:
+        """Returns input rows identifying the generated entities, alternately by NIP, REGON and KRS.
+
+        :return: (identifier, type) of every entity
+        :rtype: List[Tuple[str, str]]
+        """
+        kinds = [('nip', 'NIP'), ('regon', 'REGON'), ('krs', 'KRS')]
+        return [(entity[field], kind) for entity, (field, kind) in
+                zip(self.entities, kinds * (len(self.entities) // len(kinds) + 1))]
+
+    def handle(self, path: str, body: bytes = None, headers: Dict[str, str] = None) -> Tuple[int, str]:
+        """Renders the page of a request.
+
+        :param path: Path of the request including the query
+        :type path: str
+        :param body: Body of a POST request, defaults to None which means a GET request
+        :type body: bytes, optional
+        :param headers: Headers of the request, defaults to None
+        :type headers: Dict[str, str], optional
+        :return: HTTP status and the page
+        :rtype: Tuple[int, str]
+        """
+        url = urlsplit(path)
+        parts = unquote(url.path).split('/', 2)
+        site = parts[1] if len(parts) > 1 else ''
+        if site not in SITES:
+            return 404, _page('Not found')
+
+        with self._lock:
+            self.requests[site] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        site_path = '/' + (parts[2] if len(parts) > 2 else '')
+        query = {name: values[0] for name, values in parse_qs(url.query).items()}
+        if body is not None:
+            # POST requests are only answered by the services of the sites
+            for pattern, renderer in self._post_routes(site):
+                if re.fullmatch(pattern, site_path):
+                    return 200, renderer(body.decode('utf-8'), headers or {})
+            return 404, _page('Not found')
+        for pattern, renderer in self._routes(site):
+            match = re.fullmatch(pattern, site_path)
+            if match:
+                page = renderer(query, *match.groups())
+                return (200, page) if page is not None else (404, _page('Not found'))
+        return 404, _page('Not found')
+
+    def _entity(self, i: int) -> dict:
+        """Generates the entity number i.
+        """
+        regon = _regon(10000000 + i)
+        listed = i % 3 != 2
+        return {
+            'i': i,
+            'nip': _nip(500000000 + i * 7),
+            'regon': regon,
+            'krs': f'{i + 1:010d}',
+            'name': f'FIRMA TESTOWA {i} SPÓŁKA AKCYJNA',
+            'market': ('newconnect' if i % 2 else 'gpw') if listed else '',
+            'isin': f'PLTEST{i:06d}',
+            'stock': f'TST{i}',
+            'local_units': [_local_regon(regon, 1)] if i % 5 == 0 else [],
+            'pkd': [[f'{10 + i % 80}.{i % 9}{i % 7}.Z', f'Działalność testowa {i}'],
+                    ['62.01.Z', 'Działalność związana z oprogramowaniem']],
+            'representatives': [[f'Kowalski{i}', '', f'Jan{i}', '', 'PREZES ZARZĄDU'],
+                                [f'Nowak{i}', '', f'Anna{i}', '', 'CZŁONEK ZARZĄDU']]
+        }
+
+    def _routes(self, site: str) -> list:
+        """Returns (path pattern, renderer) pairs of the site.
+        """
+        return {
+            'regon': [(r'/appBIR/index\.aspx', self._regon_page)],
+            'krs': [(r'/?', self._krs_page)],
+            'aleo': [(r'/int/companies', self._aleo_search), (r'/int/firma/(\d+)', self._aleo_company)],
+            'gpw': [(r'/spolki', lambda query: self._stock_search('gpw'))],
+            'newconnect': [(r'/spolki', lambda query: self._stock_search('newconnect'))],
+            'infostrefa': [(r'/infostrefa/pl/index/?', self._infostrefa_index),
+                           (r'/infostrefa/pl/spolki', self._infostrefa_companies),
+                           (r'/infostrefa/pl/wiadomosci/szukaj/(\d+)', self._infostrefa_search),
+                           (r'/infostrefa/pl/wiadomosci/(\d+),(\d+)', self._infostrefa_news)],
+            'bankier': [(r'/inwestowanie/profile/quote\.html', self._bankier_quote),
+                        (r'/forum/forum_o_(\w+),1\.html', self._bankier_forum),
+                        (r'/forum/temat_(\w+)_(\d+)\.html', self._bankier_thread),
+                        (r'/gielda/wiadomosci/komunikaty-spolki', self._bankier_messages),
+                        (r'/wiadomosci/espi-(\w+)-(\d+)\.html', self._bankier_message),
+                        (r'/gielda/wiadomosci/wiadomosci-spolki', self._bankier_news),
+                        (r'/wiadomosci/art-(\w+)-(\d+)\.html', self._bankier_article)]
+        }[site]
+
+    def _post_routes(self, site: str) -> list:
+        """Returns (path pattern, renderer) pairs of POST requests to the site, renderers get the body and headers.
+        """
+        return {
+            'regon': [(r'/wsBIR/UslugaBIRzewnPubl\.svc', self._bir_service)]
+        }.get(site, [])
+
+    def _prefix(self, site: str) -> str:
+        """Returns the path prefix the site is served under.
+        """
+        return f'/{site}'
+
+    def _regon_units(self) -> Tuple[dict, dict]:
+        """Returns REGON reports of all the units and the index of units by searched identifiers.
+        """
+        reports, index = {}, {'txtNip': {}, 'txtRegon': {}, 'txtKrs': {}}
+        for entity in self.entities:
+            unit = len(reports)
+            reports[unit] = self._regon_report(entity)
+            index['txtNip'].setdefault(entity['nip'], []).append(unit)
+            index['txtRegon'].setdefault(entity['regon'], []).append(unit)
+            index['txtKrs'].setdefault(entity['krs'], []).append(unit)
+            for local_regon in entity['local_units']:
+                unit = len(reports)
+                reports[unit] = self._regon_report(entity, local_regon)
+                index['txtRegon'].setdefault(local_regon, []).append(unit)
+        return reports, index
+
+    @staticmethod
+    def _regon_address(entity: dict) -> dict:
+        """Returns the address of the entity keyed by the ids of the search page.
+        """
+        return {
+            'adSiedzNazwaKraju': 'POLSKA',
+            'adSiedzNazwaWojewodztwa': 'MAZOWIECKIE',
+            'adSiedzNazwaPowiatu': 'Warszawa',
+            'adSiedzNazwaGminy': 'Śródmieście',
+            'adSiedzNazwaMiejscowosci': 'Warszawa',
+            'adSiedzNazwaUlicy': 'ul. Testowa',
+            'adSiedzNumerNieruchomosci': str(entity['i'] + 1),
+            'adSiedzKodPocztowy': '00-001'
+        }
+
+    @staticmethod
+    def _regon_report(entity: dict, local_regon: str = None) -> dict:
+        """Returns the REGON report of the entity or of its local unit.
+        """
+        address = FixtureSite._regon_address(entity)
+        forms = dict(zip(['nazwaPodstawowejFormyPrawnej', 'nazwaSzczegolnejFormyPrawnej', 'nazwaFormyWlasnosci'],
+                         [f'{symbol} - {name}' for symbol, name in REGON_FORMS]))
+        if local_regon is None:
+            kind = 'praw'
+            fields = {
+                'regon9': entity['regon'],
+                'nip': entity['nip'],
+                'nazwa': entity['name'],
+                **forms,
+                **address
+            }
+        else:
+            kind = 'lokpraw'
+            fields = {
+                'regon14': local_regon,
+                'praw_regon': entity['regon'],
+                'praw_nip': entity['nip'],
+                'nazwa': f"{entity['name']} ODDZIAŁ",
+                **{f'praw_{name}': value for name, value in forms.items()},
+                **address
+            }
+        return {
+            'regon': local_regon or entity['regon'],
+            'kind': kind,
+            'fields': {f'{kind}_{name}': value for name, value in fields.items()},
+            'pkd': entity['pkd'],
+            'local_units': entity['local_units'] if local_regon is None else []
+        }
+
+    def _regon_page(self, query: dict) -> str:
+        """Search page of REGON BIR, results and reports are rendered by the script like on the real site.
+        """
+        reports, index = self._regon_units()
+        body = ('<input id="txtNip"><input id="txtRegon"><input id="txtKrs">'
+                '<button id="btnSzukaj" onclick="search()">Szukaj</button>'
+                '<div id="divInfoKomunikat" style="display: none">Nie znaleziono podmiotów.</div>'
+                '<div id="wyniki"></div><div id="raport"></div>')
+        script = f'''
+            var REPORTS = {json.dumps(reports, ensure_ascii=False)};
+            var INDEX = {json.dumps(index, ensure_ascii=False)};
+            var KINDS = {{tblRaportJFizyczna: 'fiz', tblRaportJPrawna: 'praw',
+                         tblRaportJLokalnaPrawnej: 'lokpraw', tblRaportJLokalnaFizycznej: 'lokfiz'}};
+            function search() {{
+                var units = [];
+                ['txtNip', 'txtRegon', 'txtKrs'].forEach(function (id) {{
+                    var value = document.getElementById(id).value.trim();
+                    if (value) units = units.concat(INDEX[id][value] || []);
+                }});
+                var rows = units.map(function (unit) {{
+                    return '<tr><td><a href="#" onclick="report(' + unit + '); return false;">' +
+                        REPORTS[unit].regon + '</a></td></tr>';
+                }}).join('');
+                document.getElementById('divInfoKomunikat').style.display = units.length ? 'none' : 'block';
+                document.getElementById('wyniki').innerHTML = units.length ?
+                    '<table class="tabelaZbiorczaListaJednostek"><tbody>' + rows + '</tbody></table>' : '';
+            }}
+            function show(id) {{
+                document.getElementById(id).style.display = 'table';
+            }}
+            function report(unit) {{
+                var data = REPORTS[unit], kind = data.kind, html = '';
+                Object.keys(KINDS).forEach(function (table) {{
+                    var display = KINDS[table] === kind ? 'block' : 'none';
+                    html += '<div id="' + table + '" style="display: ' + display + '"></div>';
+                }});
+                Object.keys(data.fields).forEach(function (id) {{
+                    html += '<div><span id="' + id + '">' + data.fields[id] + '</span></div>';
+                }});
+                var pkd = data.pkd.map(function (row) {{
+                    return '<tr><td>' + row[0] + '</td><td>' + row[1] + '</td></tr>';
+                }}).join('');
+                html += '<a id="' + kind + '_butLinkDzial" href="#" onclick="show(\\'' + kind +
+                    '_dzial\\'); return false;">PKD</a><table><tr><td id="' + kind +
+                    '_dzial" style="display: none"><table><tbody>' + pkd + '</tbody></table></td></tr></table>';
+                if (kind === 'praw' || kind === 'fiz') {{
+                    var local = data.local_units.map(function (regon) {{
+                        return '<tr><td><a href="#">' + regon + '</a></td></tr>';
+                    }}).join('');
+                    var display = local ? 'table' : 'none';
+                    html += '<table id="' + kind + '_lokTable" style="display: ' + display + '"><tr><td>' +
+                        '<a id="' + kind + '_butLinkLok" href="#" onclick="show(\\'' + kind +
+                        '_lok\\'); return false;">Jednostki lokalne</a></td></tr></table><table><tr><td id="' +
+                        kind + '_lok" style="display: none"><table><tbody>' + local + '</tbody></table></td></tr>' +
+                        '</table>';
+                }}
+                document.getElementById('wyniki').innerHTML = '';
+                document.getElementById('raport').innerHTML = html;
+            }}
+        '''
+        return _page(body, script)
+
+    def _bir_service(self, body: str, headers: Dict[str, str]) -> str:
+        """SOAP service BIR1.1 of REGON used by RegonClient, answers logins, searches and full reports of the units.
+        """
+        operation = re.search(r'<ns:(\w+)>', body.split('Body>', 1)[-1]).group(1)
+        parameters = dict(re.findall(r'<(?:ns|dat):(\w+)>([^<]*)</', body))
+        session_id = headers.get('sid')
+        if operation == 'Zaloguj':
+            result = uuid4().hex
+            with self._lock:
+                self._bir_sessions.add(result)
+        elif operation == 'GetValue':
+            result = '1' if session_id in self._bir_sessions else '0'
+        elif session_id not in self._bir_sessions:
+            # like the real service, requests of an unknown session get an empty result
+            result = ''
+        elif operation == 'DaneSzukajPodmioty':
+            result = self._bir_records(self._bir_search(parameters))
+        else:
+            result = self._bir_records(self._bir_report(parameters.get('pRegon', ''),
+                                                        parameters.get('pNazwaRaportu', '')))
+        return (f'<s:Envelope xmlns:s="http://www.w3.org/2003/05/soap-envelope"><s:Body>'
+                f'<{operation}Response xmlns="http://CIS/BIR/PUBL/2014/07"><{operation}Result>'
+                f'{escape_xml(result)}</{operation}Result></{operation}Response></s:Body></s:Envelope>')
+
+    @staticmethod
+    def _bir_records(records: List[dict]) -> str:
+        """Returns records of BIR as the XML document embedded in the result, no records are a not found error.
+        """
+        records = records or [{'ErrorCode': '4', 'ErrorMessagePl': 'Nie znaleziono podmiotów.'}]
+        return '<root>' + ''.join('<dane>' + ''.join(f'<{name}>{escape_xml(value)}</{name}>'
+                                                     for name, value in record.items()) + '</dane>'
+                                  for record in records) + '</root>'
+
+    def _bir_search(self, parameters: dict) -> List[dict]:
+        """Returns units of BIR matching the searched NIP, REGON or KRS.
+        """
+        units = []
+        for field in ['Nip', 'Regon', 'Krs']:
+            value = parameters.get(field, '').strip()
+            for entity in self.entities:
+                if entity[field.lower()] == value:
+                    units.append({'Regon': entity['regon'], 'Nip': entity['nip'], 'Nazwa': entity['name'],
+                                  'Typ': 'P', 'SilosID': '6'})
+                elif field == 'Regon' and value in entity['local_units']:
+                    units.append({'Regon': value, 'Nip': '', 'Nazwa': f"{entity['name']} ODDZIAŁ", 'Typ': 'LP',
+                                  'SilosID': '6'})
+        return units
+
+    def _bir_report(self, regon: str, name: str) -> List[dict]:
+        """Returns records of a full report of BIR of the entity or of its local unit.
+        """
+        entity = next((entity for entity in self.entities if regon[:9] == entity['regon']), None)
+        if entity is None or (len(regon) == 14 and regon not in entity['local_units']):
+            return []
+        prefix = 'praw' if len(regon) == 9 else 'lokpraw'
+        address = dict(zip(['Kraj_Nazwa', 'Wojewodztwo_Nazwa', 'Powiat_Nazwa', 'Gmina_Nazwa', 'Miejscowosc_Nazwa',
+                            'Ulica_Nazwa', 'NumerNieruchomosci', 'KodPocztowy'],
+                           self._regon_address(entity).values()))
+        address['KodPocztowy'] = address['KodPocztowy'].replace('-', '')
+        address = {f'{prefix}_adSiedz{field}': value for field, value in address.items()}
+        if name == 'BIR11OsPrawna' and prefix == 'praw':
+            forms = {}
+            for field, (symbol, form) in zip(['podstawowaFormaPrawna', 'szczegolnaFormaPrawna', 'formaWlasnosci'],
+                                             REGON_FORMS):
+                forms.update({f'praw_{field}_Symbol': symbol, f'praw_{field}_Nazwa': form})
+            return [{'praw_regon9': regon, 'praw_nip': entity['nip'], 'praw_nazwa': entity['name'], **forms,
+                     **address}]
+        if name == 'BIR11JednLokalnaOsPrawnej' and prefix == 'lokpraw':
+            return [{'lokpraw_regon14': regon, 'lokpraw_nazwa': f"{entity['name']} ODDZIAŁ", **address}]
+        if name in ('BIR11OsPrawnaPkd', 'BIR11JednLokalnaOsPrawnejPkd'):
+            return [{f'{prefix}_pkdKod': code.replace('.', ''), f'{prefix}_pkdNazwa': description}
+                    for code, description in entity['pkd']]
+        if name == 'BIR11OsPrawnaListaJednLokalnych' and prefix == 'praw':
+            return [{'lokpraw_regon14': local_regon} for local_regon in entity['local_units']]
+        return []
+
+    def _krs_page(self, query: dict) -> str:
+        """Search page of KRS, the search and the details of an entity are rendered by the script.
+        """
+        entities = {entity[field]: self._krs_details(entity)
+                    for entity in self.entities for field in ['nip', 'regon', 'krs']}
+        body = ('<ds-input label="Numer KRS"><div><input id="krs"></div></ds-input>'
+                '<ds-input label="NIP"><div><input id="nip"></div></ds-input>'
+                '<ds-input label="REGON"><div><input id="regon"></div></ds-input>'
+                '<ds-checkbox formcontrolname="rejestrP"><div><div>'
+                '<div class="p-checkbox-box" style="display: inline-block; width: 20px; height: 20px; '
+                'border: 1px solid black"></div></div></div></ds-checkbox>'
+                '<div id="p-panel-6-content"><div><div><div><ds-button><button>Wyczyść</button></ds-button>'
+                '<ds-button><button onclick="search()">Szukaj</button></ds-button></div></div></div></div>'
+                '<div id="p-panel-5-content"><div><div><ds-table><div><p-table><div><div><table>'
+                '<tbody id="wyniki"></tbody></table></div></div></p-table></div></ds-table></div></div></div>')
+        script = f'''
+            var ENTITIES = {json.dumps(entities, ensure_ascii=False)};
+            function search() {{
+                var value = ['krs', 'nip', 'regon'].map(function (id) {{
+                    return document.getElementById(id).value.trim();
+                }}).filter(function (value) {{ return value; }})[0];
+                if (!ENTITIES[value]) return;
+                document.getElementById('wyniki').innerHTML =
+                    '<tr><td><a class="link" href="#" onclick="details(\\'' + value + '\\'); return false;">' +
+                    value + '</a></td></tr>';
+            }}
+            function details(value) {{
+                document.body.innerHTML = ENTITIES[value];
+            }}
+        '''
+        return _page(body, script)
+
+    @staticmethod
+    def _krs_details(entity: dict) -> str:
+        """Returns the HTML of the details of the entity in KRS.
+        """
+        def panel(number: int, values: List[str]) -> str:
+            divs = ''.join(f'<div>{escape(value)}</div>' for value in values)
+            return f'<div id="p-panel-{number}-content"><div><div><div>{divs}</div></div></div></div>'
+
+        rows = ''.join('<tr>' + ''.join(f'<td><span class="ds-column-value">{escape(value)}</span></td>'
+                                        for value in representative) + '</tr>'
+                       for representative in entity['representatives'])
+        return (panel(16, ['Nazwa', entity['name'], 'Poprzednia nazwa', '', 'Numer KRS', entity['krs'], 'NIP',
+                           entity['nip'], 'REGON', entity['regon'], 'Forma prawna', 'SPÓŁKA AKCYJNA']) +
+                panel(17, ['Data wpisu', '01.01.2010', 'Data wykreślenia', '']) +
+                panel(21, ['Adres www', f"www.firma{entity['i']}.pl", 'E-mail', f"biuro@firma{entity['i']}.pl"]) +
+                panel(24, ['Nazwa organu', 'ZARZĄD', 'Sposób reprezentacji', 'DWÓCH CZŁONKÓW ZARZĄDU ŁĄCZNIE']) +
+                f'<ds-panel id="sekcja10"><table><tbody>{rows}</tbody></table></ds-panel>')
+
+    def _aleo_search(self, query: dict) -> str:
+        """Search results of Aleo.
+        """
+        entity = self._by_nip.get(query.get('phrase', '').strip("'"))
+        if entity is None:
+            return _page('')
+        return _page(f'<div class="catalog-row-first-line"><a class="catalog-row-first-line__company-name" '
+                     f'href="firma/{entity["i"]}">{escape(entity["name"])}</a></div>')
+
+    def _aleo_company(self, query: dict, number: str) -> Optional[str]:
+        """Company page of Aleo with bank accounts and shareholders.
+        """
+        i = int(number)
+        if i >= len(self.entities):
+            return None
+        entity = self.entities[i]
+        return _page(f'<div class="bank-account__number">PL{i:026d}</div>'
+                     f'<div class="flex flex-wrap w-full ng-star-inserted">shareholders'
+                     f'<div class="authority-name ng-star-inserted"><span class="ng-star-inserted">'
+                     f'Udziałowiec {entity["i"]}</span></div></div>')
+
+    def _stock_search(self, market: str) -> str:
+        """Company search of GPW or NewConnect, results are shown by the script while the name is typed.
+        """
+        companies = {entity['name']: entity['isin'] for entity in self.entities if entity['market'] == market}
+        body = ('<input name="searchText" oninput="search(this.value)" style="width: 400px">'
+                '<div id="preview-area" style="display: none">Wyszukiwanie...</div>'
+                '<table><tbody id="search-result"></tbody></table>')
+        script = f'''
+            var COMPANIES = {json.dumps(companies, ensure_ascii=False)};
+            function search(text) {{
+                text = text.toLowerCase();
+                document.getElementById('search-result').innerHTML = Object.keys(COMPANIES).filter(function (name) {{
+                    return text && name.toLowerCase() === text;
+                }}).map(function (name) {{
+                    return '<tr><td><a href="spolka?isin=' + COMPANIES[name] + '">' + name + '</a></td></tr>';
+                }}).join('');
+            }}
+        '''
+        return _page(body, script)
+
+    def _infostrefa_index(self, query: dict) -> str:
+        """Home page of Infostrefa with the consent popup.
+        """
+        return _page('<div id="rodo"><button id="rodoButtonAccept" '
+                     'onclick="document.getElementById(\'rodo\').style.display = \'none\'">Akceptuję</button></div>')
+
+    def _infostrefa_companies(self, query: dict) -> str:
+        """List of companies on Infostrefa with their stock names and ISINs.
+        """
+        prefix = self._prefix('infostrefa')
+        rows = ''.join(f'<tr><td><a href="{prefix}/infostrefa/pl/spolka/{entity["i"]},{entity["stock"]}">'
+                       f'{entity["stock"]}</a></td><td><a href="{prefix}/infostrefa/pl/spolka/{entity["i"]},'
+                       f'{entity["stock"]}">{entity["isin"]}</a></td></tr>'
+                       for entity in self.entities if entity['market'])
+        return _page(f'<table>{rows}</table>')
+
+    def _infostrefa_search(self, query: dict, page: str) -> Optional[str]:
+        """News search of a company on Infostrefa, news are split into pages of five.
+        """
+        company = query.get('company', '')
+        if not company.isdigit() or int(company) >= len(self.entities):
+            return None
+        page, per_page = int(page), 5
+        pages = max(1, -(-self.news_per_entity // per_page))
+        news = range((page - 1) * per_page, min(page * per_page, self.news_per_entity))
+        rows = ''.join(f'<tr><td class="text"><a href="/infostrefa/pl/wiadomosci/{company},{k}">Wiadomość {k}</a>'
+                       f'</td></tr>' for k in news)
+        pagination = ''.join(f'<li>{number}</li>' for number in range(1, pages + 1))
+        next_page = (f'{self._prefix("infostrefa")}/infostrefa/pl/wiadomosci/szukaj/{min(page + 1, pages)}'
+                     f'?company={company}&category=wszystko')
+        return _page(f'<div class="search-results"><table class="table table-condensed table-data">{rows}</table>'
+                     f'</div><ul class="pagination">{pagination}</ul><a class="nav-next" href="{next_page}">Dalej</a>')
+
+    def _infostrefa_news(self, query: dict, company: str, number: str) -> str:
+        """Single news of Infostrefa.
+        """
+        minute = int(number) % 60
+        return _page(f'<div class="text-date">{INFOSTREFA_DATE.format(minute=minute)}</div>'
+                     f'<div class="news-full-content"><p>Spółka {company} opublikowała raport numer {number}. '
+                     f'Wyniki finansowe są lepsze od oczekiwań analityków.</p></div>')
+
+    def _bankier_quote(self, query: dict) -> Optional[str]:
+        """Quote page of a company on Bankier with links to its forum, messages and news.
+        """
+        stock = query.get('symbol', '')
+        if stock not in self._by_stock:
+            return None
+        prefix = self._prefix('bankier')
+        return _page(f'<div id="boxForum"><div class="boxFooter"><a href="{prefix}/forum/forum_o_{stock},1.html">'
+                     f'Forum</a></div></div>'
+                     f'<a href="{prefix}/gielda/wiadomosci/komunikaty-spolki?symbol={stock}">Więcej komunikatów</a>'
+                     f'<a href="{prefix}/gielda/wiadomosci/wiadomosci-spolki?symbol={stock}">Więcej wiadomości</a>')
+
+    def _bankier_forum(self, query: dict, stock: str) -> str:
+        """List of forum threads of a company on Bankier.
+        """
+        rows = ''.join(f'<tr><td><a href="temat_{stock}_{k}.html">Temat {k}</a></td></tr>'
+                       for k in range(self.news_per_entity))
+        return _page(f'<table class="threadsList">{rows}</table><div class="pagination"></div>')
+
+    def _bankier_thread(self, query: dict, stock: str, number: str) -> str:
+        """Single forum thread on Bankier.
+        """
+        minute = int(number) % 60
+        return _page(f'<div class="entry-meta"><time class="entry-date">{NEWS_DATE.format(minute=minute)}</time>'
+                     f'</div><div id="boxThread"><div class="p">Co sądzicie o {stock}? Kurs rośnie od tygodnia.</div>'
+                     f'</div>')
+
+    def _bankier_messages(self, query: dict) -> str:
+        """List of ESPI messages of a company on Bankier.
+        """
+        stock = query.get('symbol', '')
+        articles = ''.join(f'<div class="article"><a href="/wiadomosci/espi-{stock}-{k}.html">Komunikat {k}</a>'
+                           f'</div>' for k in range(self.news_per_entity))
+        return _page(f'<section id="articleEspiList">{articles}</section>')
+
+    def _bankier_message(self, query: dict, stock: str, number: str) -> str:
+        """Single ESPI message on Bankier.
+        """
+        minute = int(number) % 60
+        return _page(f'<div class="m-article-attributes"><div>{NEWS_DATE.format(minute=minute)}</div></div>'
+                     f'<table><tr><td colspan="2">Treść raportu:</td></tr><tr><td colspan="2">Zarząd {stock} '
+                     f'informuje o zawarciu znaczącej umowy numer {number}.</td></tr></table>')
+
+    def _bankier_news(self, query: dict) -> str:
+        """List of news about a company on Bankier.
+        """
+        stock = query.get('symbol', '')
+        links = ''.join(f'<a class="more-link" href="/wiadomosci/art-{stock}-{k}.html">Więcej</a>'
+                        for k in range(self.news_per_entity))
+        return _page(f'<section id="articleList">{links}</section>')
+
+    def _bankier_article(self, query: dict, stock: str, number: str) -> str:
+        """Single news article on Bankier.
+        """
+        minute = int(number) % 60
+        return _page(f'<div class="m-article-attributes"><div>publikacja: <span>{NEWS_DATE.format(minute=minute)}'
+                     f'</span></div></div><section class="o-article-content"><p>Akcje {stock} zdrożały po '
+                     f'publikacji wyników.</p><p>Analitycy podnieśli rekomendacje.</p></section>')
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    """Request handler passing every GET and POST request to the fixture site.
+    """
+
+    fixture: FixtureSite = None
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        status, page = self.fixture.handle(self.path, body, dict(self.headers))
+        content = page.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/soap+xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self) -> None:
+        status, page = self.fixture.handle(self.path)
+        content = page.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format: str, *args) -> None:
+        """Silences logging of every request.
+        """
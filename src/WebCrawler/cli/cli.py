@@ -1,54 +1,225 @@
 import sys
 import click
+import json
 from PyQt5.QtWidgets import QApplication
 import os
 import pathlib
 
+from WebCrawler.benchmark import format_report, run_benchmark
 from WebCrawler.client.client_app import MainWindow
+from WebCrawler.custom_logger import configure_logging
+from WebCrawler.distributed import Coordinator, Worker
+from WebCrawler.input_validator import InputValidator
 from WebCrawler.managers import DataBaseManager
 from WebCrawler.managers import ScraperManager
+from WebCrawler.scrapers.regon_client import KEY_VARIABLE
 
 
 @click.group()
-def cli():
-    pass
+@click.option('--log-json', is_flag=True, help='Write logs as JSON lines with source and entity fields.')
+@click.option('--log-rate', type=float, default=50.0, show_default=True,
+              help='Info and debug logs per second of every source, 0 disables the limit.')
+def cli(log_json, log_rate):
+    configure_logging(json_lines=log_json, rate=log_rate)
 
 
 @click.command()
 @click.argument('file', type=click.Path(exists=True))
 @click.option('-db', '--database', is_flag=True, help='Specifies whether results should be saved to a database.')
 @click.option('-c', '--clear', is_flag=True, help='Specifies whether to clean a database before saving results there.')
-def scrap(file, database, clear):
+@click.option('-w', '--workers', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of processes the entities are sharded across.')
+@click.option('-r', '--resume', is_flag=True, help='Resumes the previous scrape, entities already saved in its '
+                                                   'journal are not scraped again.')
+@click.option('-i', '--incremental', is_flag=True, help='Reuses results of sources whose time to live has not '
+                                                        'expired since they were last scraped.')
+@click.option('--ttl', 'ttls', multiple=True, type=(str, float), metavar='SOURCE HOURS',
+              help='Overrides the time to live of a source in incremental mode, e.g. --ttl bankier 0.5')
+@click.option('--rate-limit', 'rate_limits', multiple=True, type=(str, float, click.IntRange(min=1)),
+              metavar='HOST REQUESTS_PER_SECOND IN_FLIGHT',
+              help='Overrides the limit of requests sent to a host, e.g. --rate-limit bankier.pl 4 2')
+@click.option('--record', is_flag=True, help='Captures every loaded page to the page store.')
+@click.option('--replay', is_flag=True, help='Serves pages from the page store instead of the network.')
+@click.option('--capture', 'capture_path', type=click.Path(), default=None,
+              help='Path to the page store, defaults to output/capture/pages.db')
+@click.option('-f', '--format', 'output_format', type=click.Choice(['csv', 'parquet']), default='csv',
+              show_default=True, help='Format of the output, parquet is partitioned by source and scrape date.')
+@click.option('--entity-timeout', 'entity_timeouts', multiple=True, type=(str, click.FloatRange(min=0)),
+              metavar='SOURCE SECONDS', help='Overrides the time budget of scraping a single entity from a source, '
+                                             '0 disables it, e.g. --entity-timeout regon 300')
+@click.option('--run-timeout', type=click.FloatRange(min=0), default=None,
+              help='Time budget in seconds of the whole scrape, entities left when it is exceeded are skipped.')
+@click.option('--regon-backend', type=click.Choice(['selenium', 'http']), default='selenium', show_default=True,
+              help='Searches REGON with a browser or queries the BIR service directly, which needs a user key.')
+@click.option('--regon-key', envvar=KEY_VARIABLE, default=None,
+              help=f'User key of the BIR service used by --regon-backend http, defaults to {KEY_VARIABLE}.')
+@click.option('--local-unit-workers', type=click.IntRange(min=1), default=2, show_default=True,
+              help='Number of local units of a REGON entity scraped at once, each with its own browser or session.')
+def scrap(file, database, clear, workers, resume, incremental, ttls, rate_limits, record, replay, capture_path,
+          output_format, entity_timeouts, run_timeout, regon_backend, regon_key, local_unit_workers):
     """Runs the whole process of scraping and doing sentiment analysis.
 
     FILE is the path to the file with entities to scrap.
     """
-    scraper_manager = ScraperManager(os.path.abspath(file), log_scrap_info=True)
-    scraper_manager.scrap()
+    if record and replay:
+        raise click.UsageError('--record and --replay cannot be used together.')
+    if regon_key:
+        # shards started by the manager read the key from the environment
+        os.environ[KEY_VARIABLE] = regon_key
 
     output_dir = os.path.join(pathlib.Path(__file__).parent.resolve(), '..', '..', '..', 'output')
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    csv_dir = os.path.join(output_dir, 'csv')
-    if not os.path.exists(csv_dir):
-        os.makedirs(csv_dir)
+    journal_path = os.path.join(output_dir, 'journal', 'scrap_journal.jsonl')
+    freshness_path = os.path.join(output_dir, 'freshness', 'freshness.db') if incremental else None
+    capture_mode = 'record' if record else 'replay' if replay else None
+    capture_path = capture_path or os.path.join(output_dir, 'capture', 'pages.db')
+    identity_path = os.path.join(output_dir, 'identity', 'identity.db')
+    pkd_path = os.path.join(output_dir, 'pkd', 'pkd.db')
 
-    scraper_manager.save_to_csv(path=csv_dir)
+    scraper_manager = ScraperManager(os.path.abspath(file), log_scrap_info=True, workers=workers,
+                                     journal_path=journal_path, resume=resume, freshness_path=freshness_path,
+                                     ttls={source: hours * 60 * 60 for source, hours in ttls},
+                                     rate_limits={host: (rate, in_flight) for host, rate, in_flight in rate_limits},
+                                     capture_mode=capture_mode, capture_path=capture_path,
+                                     results_path=os.path.join(output_dir, 'results'),
+                                     database_path=_database_path(output_dir) if database else None,
+                                     clear_database=clear, entity_timeouts=dict(entity_timeouts),
+                                     run_timeout=run_timeout, identity_path=identity_path,
+                                     regon_backend=regon_backend, local_unit_workers=local_unit_workers,
+                                     pkd_path=pkd_path)
+    # results are inserted into the database while they are scraped
+    scraper_manager.scrap()
 
-    if not database:
-        return
+    metrics_dir = os.path.join(output_dir, 'metrics')
+    if not os.path.exists(metrics_dir):
+        os.makedirs(metrics_dir)
+    scraper_manager.save_metrics(path=metrics_dir)
+
+    _save_results(scraper_manager, output_dir, False, clear, output_format)
 
+
+def _database_path(output_dir):
+    """Returns the path to the database in the output directory.
+    """
     db_dir = os.path.join(output_dir, 'db')
     if not os.path.exists(db_dir):
         os.makedirs(db_dir)
 
-    db_path = os.path.join(db_dir, 'KNF_sentiment.db')
+    return os.path.join(db_dir, 'KNF_sentiment.db')
+
+
+def _save_results(scraper_manager, output_dir, database, clear, output_format='csv'):
+    """Saves results of the scraper manager to csv or Parquet files and optionally to the database.
+    """
+    results_dir = os.path.join(output_dir, output_format)
+    if not os.path.exists(results_dir):
+        os.makedirs(results_dir)
+
+    if output_format == 'parquet':
+        scraper_manager.save_to_parquet(path=results_dir)
+    else:
+        scraper_manager.save_to_csv(path=results_dir)
+
+    if not database:
+        return
 
-    db_manager = DataBaseManager(db_path=db_path, clear_database=clear)
+    db_manager = DataBaseManager(db_path=_database_path(output_dir), clear_database=clear, input_format=output_format,
+                                 output_dir=results_dir)
     db_manager.insert_all()
 
 
+@click.command()
+@click.argument('file', type=click.Path(exists=True))
+@click.option('-q', '--queue', 'queue_path', type=click.Path(), default=None,
+              help='Path to the task queue shared with the workers, defaults to output/queue/queue.db')
+@click.option('-db', '--database', is_flag=True, help='Specifies whether results should be saved to a database.')
+@click.option('-c', '--clear', is_flag=True, help='Specifies whether to clean a database before saving results there.')
+@click.option('-r', '--resume', is_flag=True, help='Keeps tasks of the previous run in the queue.')
+@click.option('--visibility-timeout', type=click.FloatRange(min=1), default=600, show_default=True,
+              help='Seconds after which a task leased by a crashed worker is handed out again, used by all workers.')
+@click.option('--max-attempts', type=click.IntRange(min=1), default=3, show_default=True,
+              help='Number of failed attempts after which a task is abandoned, used by all workers.')
+@click.option('-f', '--format', 'output_format', type=click.Choice(['csv', 'parquet']), default='csv',
+              show_default=True, help='Format of the output, parquet is partitioned by source and scrape date.')
+def coordinator(file, queue_path, database, clear, resume, visibility_timeout, max_attempts, output_format):
+    """Queues entities for workers of a distributed scrape, waits for them and saves the merged results.
+
+    FILE is the path to the file with entities to scrap.
+    """
+    output_dir = os.path.join(pathlib.Path(__file__).parent.resolve(), '..', '..', '..', 'output')
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    data, _ = InputValidator(os.path.abspath(file)).validate_input()
+    queue_path = queue_path or os.path.join(output_dir, 'queue', 'queue.db')
+    journal_path = os.path.join(output_dir, 'queue', 'results_journal.jsonl')
+
+    scrap_coordinator = Coordinator(queue_path, data, resume=resume, visibility_timeout=visibility_timeout,
+                                    max_attempts=max_attempts,
+                                    identity_path=os.path.join(output_dir, 'identity', 'identity.db'))
+    scraper_manager = scrap_coordinator.run(journal_path, log_scrap_info=True)
+    _save_results(scraper_manager, output_dir, database, clear, output_format)
+
+
+@click.command()
+@click.option('-q', '--queue', 'queue_path', type=click.Path(), default=None,
+              help='Path to the task queue shared with the coordinator, defaults to output/queue/queue.db')
+@click.option('--worker-id', default=None, help='Identifier of the worker, defaults to host name and process id.')
+@click.option('--rate-limit', 'rate_limits', multiple=True, type=(str, float, click.IntRange(min=1)),
+              metavar='HOST REQUESTS_PER_SECOND IN_FLIGHT',
+              help='Overrides the limit of requests this worker sends to a host, e.g. --rate-limit bankier.pl 4 2')
+@click.option('--visibility-timeout', type=click.FloatRange(min=1), default=None,
+              help='Seconds a leased task stays hidden from other workers, the lease is extended while scraping, '
+                   'defaults to the timeout set by the coordinator.')
+@click.option('--regon-backend', type=click.Choice(['selenium', 'http']), default='selenium', show_default=True,
+              help='Searches REGON with a browser or queries the BIR service directly, which needs a user key.')
+@click.option('--regon-key', envvar=KEY_VARIABLE, default=None,
+              help=f'User key of the BIR service used by --regon-backend http, defaults to {KEY_VARIABLE}.')
+@click.option('--local-unit-workers', type=click.IntRange(min=1), default=2, show_default=True,
+              help='Number of local units of a REGON entity scraped at once, each with its own browser or session.')
+def worker(queue_path, worker_id, rate_limits, visibility_timeout, regon_backend, regon_key, local_unit_workers):
+    """Scraps tasks of a distributed scrape until the queue is finished.
+    """
+    output_dir = os.path.join(pathlib.Path(__file__).parent.resolve(), '..', '..', '..', 'output')
+    queue_path = queue_path or os.path.join(output_dir, 'queue', 'queue.db')
+    if regon_key:
+        os.environ[KEY_VARIABLE] = regon_key
+
+    scrap_worker = Worker(queue_path, worker_id=worker_id, log_scrap_info=True,
+                          rate_limits={host: (rate, in_flight) for host, rate, in_flight in rate_limits},
+                          visibility_timeout=visibility_timeout, regon_backend=regon_backend,
+                          local_unit_workers=local_unit_workers)
+    completed = scrap_worker.run()
+    click.echo(f"Completed {completed} tasks")
+
+
+@click.command()
+@click.option('-n', '--entities', type=click.IntRange(min=1), default=20, show_default=True,
+              help='Number of entities generated on the fixture site.')
+@click.option('-w', '--workers', type=click.IntRange(min=1), default=1, show_default=True,
+              help='Number of processes the entities are sharded across.')
+@click.option('--news', type=click.IntRange(min=0), default=3, show_default=True,
+              help='Number of news of every kind on every news site per entity.')
+@click.option('--latency', type=click.FloatRange(min=0), default=0, show_default=True,
+              help='Seconds the fixture site waits before every response.')
+@click.option('-s', '--sentiment', is_flag=True, help='Scores the news with the sentiment model, which has to be '
+                                                      'available offline.')
+@click.option('-o', '--output', type=click.Path(), default=None, help='Path to a JSON file the report is saved to.')
+@click.option('--regon-backend', type=click.Choice(['selenium', 'http']), default='selenium', show_default=True,
+              help='Searches REGON with a browser or queries the BIR service of the fixture site directly.')
+def benchmark(entities, workers, news, latency, sentiment, output, regon_backend):
+    """Scraps a local fixture site end to end without network access and reports the throughput.
+    """
+    report = run_benchmark(entities=entities, workers=workers, news_per_entity=news, latency=latency,
+                           analyze_sentiment=sentiment, regon_backend=regon_backend)
+    click.echo(format_report(report))
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
 @click.command()
 def gui():
     """Runs the app with a GUI.
@@ -61,7 +232,9 @@ def gui():
 
 @click.command()
 @click.option('-c', '--clear', is_flag=True, help='Specifies whether to clean a database before saving results there.')
-def insert_to_db(clear):
+@click.option('-f', '--format', 'output_format', type=click.Choice(['csv', 'parquet']), default='csv',
+              show_default=True, help='Format of the saved results.')
+def insert_to_db(clear, output_format):
     """Saves results of scraping to the database.
     """
     output_dir = os.path.join(pathlib.Path(__file__).parent.resolve(), '..', '..', '..', 'output')
@@ -74,7 +247,7 @@ def insert_to_db(clear):
 
     db_path = os.path.join(db_dir, 'KNF_sentiment.db')
 
-    db_manager = DataBaseManager(db_path=db_path, clear_database=clear)
+    db_manager = DataBaseManager(db_path=db_path, clear_database=clear, input_format=output_format)
     db_manager.insert_all()
     click.echo("Data inserted")
 
@@ -94,7 +267,10 @@ def check_info(entity_id, id_type):
     try:
         from WebCrawler.scrapers import KrsScraper, RegonScraper
         regon_scraper = RegonScraper()
-        _, local_entities_df, pkd_df = regon_scraper.get_entity_info(entity_id, id_type)
+        try:
+            _, local_entities_df, pkd_df = regon_scraper.get_entity_info(entity_id, id_type)
+        finally:
+            regon_scraper.close()
 
         krs_scrapper = KrsScraper(entity_id, id_type)
         general_info, representants = krs_scrapper.scrap()
@@ -118,7 +294,7 @@ def check_info(entity_id, id_type):
             click.echo(local_entities_df.to_string())
         if not pkd_df.empty:
             click.echo("\nPKD: ")
-            pkd_df.drop(columns=['regon'], inplace=True)
+            pkd_df = regon_scraper.pkd_dictionary.decode(pkd_df.drop(columns=['regon']))
             click.echo(pkd_df.to_string())
     except:
         click.echo("Couldn't scrap this entity.")
@@ -128,6 +304,9 @@ cli.add_command(scrap)
 cli.add_command(gui)
 cli.add_command(insert_to_db)
 cli.add_command(check_info)
+cli.add_command(coordinator)
+cli.add_command(worker)
+cli.add_command(benchmark)
 
 if __name__ == "__main__":
     cli()
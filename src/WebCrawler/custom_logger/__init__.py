@@ -1 +1,2 @@
-from .custom_logger import get_logger
\ No newline at end of file
+from .custom_logger import (CustomFormatter, JsonFormatter, SamplingFilter, configure_logging, flush_logging,
+                            get_logger, log_fields)
@@ -1,4 +1,23 @@
+import atexit
+import json
 import logging
+import os
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+from threading import Lock
+from typing import Dict, Optional, TextIO, Tuple
+
+LOGGER_NAME = "web_crawler"
+# output format inherited by worker processes, 'text' or 'json'
+FORMAT_VARIABLE = 'WCRAWLER_LOG_FORMAT'
+# records per second and burst of records below WARNING logged for every source
+DEFAULT_RATE = 50.0
+DEFAULT_BURST = 200
+# rate and burst inherited by worker processes
+RATE_VARIABLE = 'WCRAWLER_LOG_RATE'
+BURST_VARIABLE = 'WCRAWLER_LOG_BURST'
 
 
 class CustomFormatter(logging.Formatter):
@@ -12,6 +31,9 @@ class CustomFormatter(logging.Formatter):
         logging.ERROR: format,
     }
 
+    _formatters = {level: logging.Formatter(level_format) for level, level_format in FORMATS.items()}
+    _default_formatter = logging.Formatter()
+
     def format(self, record: logging.LogRecord) -> str:
         """Formats the record as a text.
 
@@ -20,24 +42,199 @@ class CustomFormatter(logging.Formatter):
         :return: Formatted str object made of logging.LogRecord object
         :rtype: str
         """
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
+        formatter = self._formatters.get(record.levelno, self._default_formatter)
         return formatter.format(record)
 
 
+class JsonFormatter(logging.Formatter):
+    """Formatter converting a logging.LogRecord instance to a single JSON line. Fields passed with log_fields,
+    e.g. source and entity, are included.
+    """
+
+    FIELDS = ['source', 'entity']
+
+    def format(self, record: logging.LogRecord) -> str:
+        """Formats the record as a JSON line.
+
+        :param record: An instance of logging.LogRecord to be formatted
+        :type record: logging.LogRecord
+        :return: JSON object with time, level, message, thread and the extra fields
+        :rtype: str
+        """
+        line = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        for field in self.FIELDS:
+            if getattr(record, field, None) is not None:
+                line[field] = getattr(record, field)
+        if record.exc_info:
+            line['exception'] = self.formatException(record.exc_info)
+        return json.dumps(line, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Filter limiting high-volume records of every source to rate records per second with bursts of burst records.
+    Records of WARNING level and above always pass. The number of records dropped for a source is appended to its
+    next logged record.
+
+    :param rate: Records per second logged for every source, defaults to DEFAULT_RATE
+    :type rate: float, optional
+    :param burst: Maximum number of records logged at once for every source, defaults to DEFAULT_BURST
+    :type burst: int, optional
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST):
+        """Constructor method.
+        """
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._dropped: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        """Decides whether the record is logged.
+
+        :param record: Logged record
+        :type record: logging.LogRecord
+        :return: True if the record should be logged
+        :rtype: bool
+        """
+        if record.levelno >= logging.WARNING:
+            return True
+
+        source = getattr(record, 'source', None) or record.name
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(source, (float(self.burst), now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[source] = (tokens, now)
+                self._dropped[source] = self._dropped.get(source, 0) + 1
+                return False
+            self._buckets[source] = (tokens - 1, now)
+            dropped = self._dropped.pop(source, 0)
+
+        if dropped:
+            record.msg = f"{record.getMessage()} ({dropped} similar messages suppressed)"
+            record.args = None
+        return True
+
+
+def log_fields(source: str = None, entity: str = None) -> dict:
+    """Returns fields of a record describing the scraped source and entity, to be passed as extra to the logger.
+
+    :param source: Name of the scraped source, defaults to None
+    :type source: str, optional
+    :param entity: Identifier of the entity, defaults to None
+    :type entity: str, optional
+    :return: Dictionary for the extra argument of logging calls
+    :rtype: dict
+    """
+    return {'source': source, 'entity': entity}
+
+
+_options = {'json_lines': None, 'stream': None, 'rate': None, 'burst': None}
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+_setup_lock = Lock()
+
+
+def _setup(logger: logging.Logger) -> None:
+    """Attaches a queue handler to the logger, records are written by a listener thread, so logging threads never
+    wait for a slow terminal or pipe.
+    """
+    global _listener, _queue_handler
+    json_lines = _options['json_lines']
+    if json_lines is None:
+        json_lines = os.environ.get(FORMAT_VARIABLE) == 'json'
+    rate = _options['rate']
+    if rate is None:
+        rate = float(os.environ.get(RATE_VARIABLE, DEFAULT_RATE))
+    burst = _options['burst']
+    if burst is None:
+        burst = int(os.environ.get(BURST_VARIABLE, DEFAULT_BURST))
+
+    ch = logging.StreamHandler(_options['stream'] or sys.stderr)
+    ch.setLevel(logging.DEBUG)
+    ch.setFormatter(JsonFormatter() if json_lines else CustomFormatter())
+
+    _queue_handler = QueueHandler(SimpleQueue())
+    _queue_handler.setLevel(logging.DEBUG)
+    if rate:
+        _queue_handler.addFilter(SamplingFilter(rate, burst))
+    _listener = QueueListener(_queue_handler.queue, ch, respect_handler_level=True)
+    _listener.start()
+    logger.addHandler(_queue_handler)
+
+
 def get_logger() -> logging.Logger:
     """Creates common logging.Logger instance for the whole application.
 
     :return: Instance of logging.Logger
     :rtype: logging.Logger
     """
-    logger = logging.getLogger("web_crawler")
+    logger = logging.getLogger(LOGGER_NAME)
     logger.setLevel(logging.DEBUG)
 
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.DEBUG)
-    ch.setFormatter(CustomFormatter())
-    if not logger.hasHandlers():
-        logger.addHandler(ch)
+    if _queue_handler is None:
+        with _setup_lock:
+            if _queue_handler is None and not logger.hasHandlers():
+                _setup(logger)
 
     return logger
+
+
+def configure_logging(json_lines: bool = None, stream: TextIO = None, rate: float = DEFAULT_RATE,
+                      burst: int = DEFAULT_BURST) -> logging.Logger:
+    """Replaces the handler of the application logger.
+
+    :param json_lines: Specifies whether records are written as JSON lines, processes started later use the same
+        format, defaults to None which keeps the format of the environment
+    :type json_lines: bool, optional
+    :param stream: Stream the records are written to, defaults to None which means sys.stderr
+    :type stream: TextIO, optional
+    :param rate: Records per second below WARNING logged for every source, 0 disables the limit, processes started
+        later use the same limit, defaults to DEFAULT_RATE
+    :type rate: float, optional
+    :param burst: Maximum number of records below WARNING logged at once for every source, processes started later
+        use the same burst, defaults to DEFAULT_BURST
+    :type burst: int, optional
+    :return: Instance of logging.Logger
+    :rtype: logging.Logger
+    """
+    global _listener, _queue_handler
+    logger = logging.getLogger(LOGGER_NAME)
+    with _setup_lock:
+        if _queue_handler is not None:
+            _listener.stop()
+            logger.removeHandler(_queue_handler)
+            _listener, _queue_handler = None, None
+        if json_lines is not None:
+            os.environ[FORMAT_VARIABLE] = 'json' if json_lines else 'text'
+        os.environ[RATE_VARIABLE], os.environ[BURST_VARIABLE] = str(rate), str(burst)
+        _options.update({'json_lines': json_lines, 'stream': stream, 'rate': rate, 'burst': burst})
+        _setup(logger)
+    logger.setLevel(logging.DEBUG)
+    return logger
+
+
+def flush_logging() -> None:
+    """Blocks until all the queued records are written, e.g. before a worker process exits.
+    """
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener.start()
+
+
+@atexit.register
+def _stop_listener() -> None:
+    """Writes queued records at exit.
+    """
+    if _listener is not None:
+        _listener.stop()
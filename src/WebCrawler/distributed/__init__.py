@@ -0,0 +1,3 @@
+from .coordinator import Coordinator
+from .task_queue import Task, TaskQueue
+from .worker import Worker
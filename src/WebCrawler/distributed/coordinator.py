@@ -0,0 +1,114 @@
+"""
+coordinator.py
+====================================
+This module contains the coordinator of a distributed scrape, it fills the task queue and merges results of
+the workers.
+"""
+
+import time
+from typing import List
+
+from WebCrawler.custom_logger import get_logger
+from WebCrawler.distributed.task_queue import DEAD, DONE, LEASED, PENDING, TaskQueue
+from WebCrawler.distributed.worker import task_key
+from WebCrawler.managers import ScraperManager
+from WebCrawler.storage import IdentityIndex, ScrapJournal
+
+
+class Coordinator:
+    """Loads validated input rows into the task queue as regon and krs tasks, tasks of the next stages are added
+    by the workers. Once every task is done or abandoned, results of the workers are written to a scrap journal
+    and a ScraperManager resuming from it builds the result DataFrames and analyzes sentiment of the news.
+
+    :param queue_path: Path to the database of the task queue
+    :type queue_path: str
+    :param data: Validated identifiers of the entities
+    :type data: List[tuple]
+    :param resume: Specifies whether tasks of the previous run are kept, otherwise the queue is cleared,
+        defaults to False
+    :type resume: bool, optional
+    :param visibility_timeout: Time in seconds a leased task stays hidden from other workers, saved in the queue for
+        the workers, defaults to 600
+    :type visibility_timeout: float, optional
+    :param max_attempts: Number of leases after which a failing task is abandoned, saved in the queue for
+        the workers, defaults to 3
+    :type max_attempts: int, optional
+    :param poll_interval: Time in seconds between progress checks, defaults to 10
+    :type poll_interval: float, optional
+    :param identity_path: Path to the identity index, rows naming an entity named by an earlier row are not
+        queued, defaults to None which means only rows with the same identifier are
+    :type identity_path: str, optional
+    """
+
+    def __init__(self, queue_path: str, data: List[tuple], resume: bool = False, visibility_timeout: float = 600,
+                 max_attempts: int = 3, poll_interval: float = 10, identity_path: str = None):
+        """Constructor method.
+        """
+        self.queue = TaskQueue(queue_path)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.identity_path = identity_path
+        identities = IdentityIndex(identity_path)
+        self.data, self.duplicates = identities.dedupe(data)
+        identities.close()
+        self.resume = resume
+        self.poll_interval = poll_interval
+        self.logger = get_logger()
+
+    def enqueue(self) -> None:
+        """Saves the settings of the queue and adds a regon and a krs task for every input row.
+        """
+        if not self.resume:
+            self.queue.clear()
+        self.queue.configure(self.visibility_timeout, self.max_attempts)
+        self.queue.put((source, task_key(source, row), row) for row in self.data for source in ['regon', 'krs'])
+        self.logger.info(f'Coordinator queued {len(self.data)} entities, {len(self.duplicates)} duplicates skipped')
+
+    def wait(self) -> None:
+        """Blocks until every task is done or abandoned, logs the progress.
+        """
+        while True:
+            counts = self.queue.counts()
+            self.logger.info(f'Tasks pending: {counts[PENDING]}, leased: {counts[LEASED]}, done: {counts[DONE]}, '
+                             f'abandoned: {counts[DEAD]}')
+            if counts[PENDING] == 0 and counts[LEASED] == 0:
+                break
+            time.sleep(self.poll_interval)
+
+    def merge(self, journal_path: str, log_scrap_info: bool = False) -> ScraperManager:
+        """Writes results of the workers to a scrap journal and builds the result DataFrames from it. Tasks
+        abandoned by the workers are scraped once more by the returned manager.
+
+        :param journal_path: Path to the journal the results are written to
+        :type journal_path: str
+        :param log_scrap_info: Specifies whether there to print info about scraping proccess, defaults to False
+        :type log_scrap_info: bool, optional
+        :return: Manager holding the merged results
+        :rtype: ScraperManager
+        """
+        journal = ScrapJournal(journal_path)
+        for source, key, entry in self.queue.results():
+            journal.record(source, key, entry['frames'], entry['value'])
+        self.logger.info(f'Coordinator merged {len(journal)} results')
+
+        scraper_manager = ScraperManager(data=self.data, log_scrap_info=log_scrap_info, journal_path=journal_path,
+                                         resume=True, identity_path=self.identity_path)
+        scraper_manager.scrap()
+        return scraper_manager
+
+    def run(self, journal_path: str, log_scrap_info: bool = False) -> ScraperManager:
+        """Queues the input, waits for the workers and merges their results.
+
+        :param journal_path: Path to the journal the results are written to
+        :type journal_path: str
+        :param log_scrap_info: Specifies whether there to print info about scraping proccess, defaults to False
+        :type log_scrap_info: bool, optional
+        :return: Manager holding the merged results
+        :rtype: ScraperManager
+        """
+        try:
+            self.enqueue()
+            self.wait()
+            return self.merge(journal_path, log_scrap_info)
+        finally:
+            self.queue.close()
@@ -0,0 +1,284 @@
+"""
+task_queue.py
+====================================
+This module contains a durable queue of (source, entity) scraping tasks shared by the coordinator and workers of
+a distributed scrape.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from WebCrawler.storage.serialization import dump_entry, load_entry
+
+PENDING = 'oczekuje'
+LEASED = 'w_toku'
+DONE = 'gotowe'
+DEAD = 'porzucone'
+# settings of the queue used by workers which do not override them
+DEFAULT_VISIBILITY_TIMEOUT = 600.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class Task:
+    """Single (source, entity) task leased by a worker.
+
+    :param task_id: Identifier of the task in the queue
+    :type task_id: int
+    :param source: Name of the scraped source, e.g. "regon"
+    :type source: str
+    :param key: Identifier of the entity within the source
+    :type key: str
+    :param item: Item passed to the scraper of the source, e.g. an input row or (nip, nazwa)
+    :type item: tuple
+    :param attempts: Number of times the task was leased, including this lease
+    :type attempts: int
+    """
+
+    def __init__(self, task_id: int, source: str, key: str, item: tuple, attempts: int):
+        """Constructor method.
+        """
+        self.task_id = task_id
+        self.source = source
+        self.key = key
+        self.item = item
+        self.attempts = attempts
+
+
+class TaskQueue:
+    """SQLite queue of scraping tasks. Workers lease a task for a visibility timeout, a task whose worker crashed
+    without completing it becomes visible again once its lease expires. Tasks failing max_attempts times are
+    abandoned. Results of completed tasks are kept in the queue as entries of the scrap journal format.
+
+    The visibility timeout and max_attempts are saved in the queue by configure, e.g. by the coordinator, and read
+    by every worker which does not override them, so all the workers abandon tasks after the same number of leases.
+
+    The database file can be shared by machines through a network file system, every operation is a single
+    transaction.
+
+    :param db_path: Path to the database file
+    :type db_path: str
+    :param visibility_timeout: Time in seconds a task leased by this instance stays hidden from other workers,
+        defaults to None which means the timeout saved in the queue
+    :type visibility_timeout: float, optional
+    :param max_attempts: Number of leases after which a failing task is abandoned by this instance, defaults to None
+        which means the number saved in the queue
+    :type max_attempts: int, optional
+    """
+
+    def __init__(self, db_path: str, visibility_timeout: Optional[float] = None, max_attempts: Optional[int] = None):
+        """Constructor method.
+        """
+        self.db_path = db_path
+        self._visibility_timeout = visibility_timeout
+        self._max_attempts = max_attempts
+        self._lock = Lock()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # transactions are started explicitly, so leasing takes the write lock before reading
+        self._conn = sqlite3.connect(db_path, timeout=60, isolation_level=None, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS zadania(
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                zrodlo TEXT,
+                klucz TEXT,
+                dane TEXT,
+                stan TEXT,
+                pracownik TEXT,
+                termin REAL,
+                proby INTEGER DEFAULT 0,
+                UNIQUE(zrodlo, klucz)
+            );
+            CREATE TABLE IF NOT EXISTS wyniki(
+                zrodlo TEXT,
+                klucz TEXT,
+                wynik TEXT,
+                PRIMARY KEY(zrodlo, klucz)
+            );
+            CREATE TABLE IF NOT EXISTS ustawienia(
+                nazwa TEXT PRIMARY KEY,
+                wartosc REAL
+            );
+        """)
+
+    @property
+    def visibility_timeout(self) -> float:
+        """Time in seconds a task leased by this instance stays hidden from other workers.
+        """
+        with self._lock:
+            return self._settings(self._conn)[0]
+
+    @property
+    def max_attempts(self) -> int:
+        """Number of leases after which a failing task is abandoned.
+        """
+        with self._lock:
+            return self._settings(self._conn)[1]
+
+    def configure(self, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+                  max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> None:
+        """Saves settings of the queue used by all the workers which do not override them, workers started before
+        see them from their next lease.
+
+        :param visibility_timeout: Time in seconds a leased task stays hidden from other workers,
+            defaults to DEFAULT_VISIBILITY_TIMEOUT
+        :type visibility_timeout: float, optional
+        :param max_attempts: Number of leases after which a failing task is abandoned, defaults to DEFAULT_MAX_ATTEMPTS
+        :type max_attempts: int, optional
+        """
+        with self._transaction() as cursor:
+            cursor.executemany("INSERT OR REPLACE INTO ustawienia VALUES (?, ?)",
+                               [('widocznosc', visibility_timeout), ('proby', max_attempts)])
+
+    def clear(self) -> None:
+        """Removes all the tasks and results.
+        """
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM zadania")
+            cursor.execute("DELETE FROM wyniki")
+
+    def put(self, tasks: Iterable[Tuple[str, str, tuple]]) -> None:
+        """Adds tasks which are not in the queue yet.
+
+        :param tasks: (source, key, item) of every task
+        :type tasks: Iterable[Tuple[str, str, tuple]]
+        """
+        with self._transaction() as cursor:
+            self._insert(cursor, tasks)
+
+    def lease(self, worker_id: str) -> Optional[Task]:
+        """Leases a pending task or a task whose lease has expired.
+
+        :param worker_id: Identifier of the leasing worker
+        :type worker_id: str
+        :return: Leased task, None if there is no task to lease
+        :rtype: Task, optional
+        """
+        now = time.time()
+        with self._transaction() as cursor:
+            visibility_timeout, max_attempts = self._settings(cursor)
+            cursor.execute("UPDATE zadania SET stan=? WHERE stan=? AND termin<? AND proby>=?",
+                           (DEAD, LEASED, now, max_attempts))
+            row = cursor.execute("SELECT id, zrodlo, klucz, dane, proby FROM zadania "
+                                 "WHERE stan=? OR (stan=? AND termin<?) ORDER BY id LIMIT 1",
+                                 (PENDING, LEASED, now)).fetchone()
+            if row is None:
+                return None
+            cursor.execute("UPDATE zadania SET stan=?, pracownik=?, termin=?, proby=proby+1 WHERE id=?",
+                           (LEASED, worker_id, now + visibility_timeout, row[0]))
+        return Task(row[0], row[1], row[2], tuple(json.loads(row[3])), row[4] + 1)
+
+    def extend(self, task: Task, worker_id: str) -> None:
+        """Extends the lease of a task which is still being scraped.
+
+        :param task: Leased task
+        :type task: Task
+        :param worker_id: Identifier of the worker holding the lease
+        :type worker_id: str
+        """
+        with self._transaction() as cursor:
+            cursor.execute("UPDATE zadania SET termin=? WHERE id=? AND stan=? AND pracownik=?",
+                           (time.time() + self._settings(cursor)[0], task.task_id, LEASED, worker_id))
+
+    def complete(self, task: Task, entries: List[tuple], follow_ups: List[Tuple[str, str, tuple]]) -> None:
+        """Saves results of a task, adds tasks which depend on it and marks it as done.
+
+        :param task: Leased task
+        :type task: Task
+        :param entries: (source, key, frames, value) of every result of the task
+        :type entries: List[tuple]
+        :param follow_ups: (source, key, item) of tasks which depend on the results
+        :type follow_ups: List[Tuple[str, str, tuple]]
+        """
+        with self._transaction() as cursor:
+            cursor.executemany("INSERT OR REPLACE INTO wyniki VALUES (?, ?, ?)",
+                               [(source, key, dump_entry(frames, value)) for source, key, frames, value in entries])
+            self._insert(cursor, follow_ups)
+            cursor.execute("UPDATE zadania SET stan=? WHERE id=?", (DONE, task.task_id))
+
+    def fail(self, task: Task) -> None:
+        """Gives a failed task back to the queue, abandons it after max_attempts leases.
+
+        :param task: Leased task
+        :type task: Task
+        """
+        with self._transaction() as cursor:
+            state = DEAD if task.attempts >= self._settings(cursor)[1] else PENDING
+            cursor.execute("UPDATE zadania SET stan=?, pracownik=NULL WHERE id=?", (state, task.task_id))
+
+    def counts(self) -> Dict[str, int]:
+        """Returns the number of tasks in every state.
+
+        :return: Number of tasks keyed by the state
+        :rtype: Dict[str, int]
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT stan, COUNT(*) FROM zadania GROUP BY stan").fetchall()
+        return {PENDING: 0, LEASED: 0, DONE: 0, DEAD: 0, **dict(rows)}
+
+    def is_finished(self) -> bool:
+        """Checks whether every task is done or abandoned.
+
+        :return: True if no task is pending or leased
+        :rtype: bool
+        """
+        counts = self.counts()
+        return counts[PENDING] == 0 and counts[LEASED] == 0
+
+    def results(self) -> Iterator[Tuple[str, str, dict]]:
+        """Iterates over results of all the completed tasks.
+
+        :return: (source, key, entry) of every result, entry has 'frames' and 'value' like entries of the journal
+        :rtype: Iterator[Tuple[str, str, dict]]
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT zrodlo, klucz, wynik FROM wyniki").fetchall()
+        for source, key, result in rows:
+            yield source, key, load_entry(result)
+
+    def close(self) -> None:
+        """Closes the connection to the database.
+        """
+        with self._lock:
+            self._conn.close()
+
+    def _settings(self, cursor: Union[sqlite3.Cursor, sqlite3.Connection]) -> Tuple[float, int]:
+        """Returns the visibility timeout and max_attempts, overridden by this instance or saved in the queue.
+        """
+        saved = dict(cursor.execute("SELECT nazwa, wartosc FROM ustawienia").fetchall())
+        visibility_timeout = self._visibility_timeout
+        if visibility_timeout is None:
+            visibility_timeout = saved.get('widocznosc', DEFAULT_VISIBILITY_TIMEOUT)
+        max_attempts = self._max_attempts
+        if max_attempts is None:
+            max_attempts = saved.get('proby', DEFAULT_MAX_ATTEMPTS)
+        return float(visibility_timeout), int(max_attempts)
+
+    @staticmethod
+    def _insert(cursor: sqlite3.Cursor, tasks: Iterable[Tuple[str, str, tuple]]) -> None:
+        """Inserts tasks in the current transaction, tasks already in the queue are skipped.
+        """
+        cursor.executemany("INSERT OR IGNORE INTO zadania(zrodlo, klucz, dane, stan) VALUES (?, ?, ?, ?)",
+                           [(source, key, json.dumps(list(item), ensure_ascii=False), PENDING)
+                            for source, key, item in tasks])
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        """Runs the body in a transaction holding the write lock of the database.
+        """
+        with self._lock:
+            cursor = self._conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                yield cursor
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
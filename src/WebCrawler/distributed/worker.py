@@ -0,0 +1,151 @@
+"""
+worker.py
+====================================
+This module contains a worker of a distributed scrape, it leases tasks from the queue and scraps them.
+"""
+
+import os
+import socket
+import time
+from threading import Event, Thread
+from typing import Dict, List, Optional, Tuple
+
+from WebCrawler.custom_logger import get_logger
+from WebCrawler.distributed.task_queue import Task, TaskQueue
+from WebCrawler.drivers import get_driver_pool
+from WebCrawler.managers import ScraperManager
+from WebCrawler.network import get_rate_limiter
+
+# stages fed by the items a stage emits, the same as in the pipeline of ScraperManager
+DOWNSTREAM = {
+    'regon': ['stock_name', 'aleo'],
+    'stock_name': ['bankier', 'infostrefa']
+}
+
+
+def task_key(source: str, item: tuple) -> str:
+    """Returns the key the results of a task are saved under, the same as used by ScraperManager.
+
+    :param source: Name of the scraped source
+    :type source: str
+    :param item: Item passed to the scraper of the source
+    :type item: tuple
+    :return: Identifier of the entity within the source
+    :rtype: str
+    """
+    return item[0] if source == 'aleo' else ','.join(item)
+
+
+class _TaskJournal:
+    """Collects results a ScraperManager saves while scraping a single task.
+    """
+
+    def __init__(self):
+        self.entries: List[tuple] = []
+
+    def get(self, source: str, key: str) -> Optional[dict]:
+        return None
+
+    def record(self, source: str, key: str, frames: dict = None, value=None) -> None:
+        self.entries.append((source, key, frames or {}, value))
+
+
+class Worker:
+    """Leases (source, entity) tasks from the queue and scraps them with a ScraperManager. Results and tasks of
+    the next stages are pushed back to the queue. The lease of a task is extended while it is being scraped,
+    so only tasks of crashed workers become visible again.
+
+    :param queue_path: Path to the database of the task queue
+    :type queue_path: str
+    :param worker_id: Identifier of the worker, defaults to host name and process id
+    :type worker_id: str, optional
+    :param log_scrap_info: Specifies whether there to print info about scraping proccess, defaults to False
+    :type log_scrap_info: bool, optional
+    :param rate_limits: Requests per second and requests in flight of every host used by this worker,
+        defaults to None
+    :type rate_limits: dict, optional
+    :param poll_interval: Time in seconds between attempts to lease a task while there is none, defaults to 5
+    :type poll_interval: float, optional
+    :param visibility_timeout: Time in seconds a leased task stays hidden from other workers, defaults to None which
+        means the timeout saved in the queue by the coordinator
+    :type visibility_timeout: float, optional
+    :param regon_backend: Backend of REGON tasks, one of ScraperManager.REGON_BACKENDS, defaults to 'selenium'
+    :type regon_backend: str, optional
+    :param local_unit_workers: Number of local units of a REGON entity scraped at once, defaults to 2
+    :type local_unit_workers: int, optional
+    """
+
+    def __init__(self, queue_path: str, worker_id: str = None, log_scrap_info: bool = False,
+                 rate_limits: Dict[str, Tuple[float, int]] = None, poll_interval: float = 5,
+                 visibility_timeout: float = None, regon_backend: str = 'selenium', local_unit_workers: int = 2):
+        """Constructor method.
+        """
+        self.queue = TaskQueue(queue_path, visibility_timeout=visibility_timeout)
+        self.worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+        self.poll_interval = poll_interval
+        self.logger = get_logger()
+        # sentiment is analyzed by the coordinator once all the news are scraped
+        self.manager = ScraperManager(data=[], log_scrap_info=log_scrap_info, analyze_sentiment=False,
+                                      regon_backend=regon_backend, local_unit_workers=local_unit_workers)
+        get_rate_limiter().configure(rate_limits)
+
+    def run(self) -> int:
+        """Scraps tasks until the queue is finished.
+
+        :return: Number of completed tasks
+        :rtype: int
+        """
+        completed = 0
+        self.logger.info(f'Worker {self.worker_id} started')
+        try:
+            while True:
+                task = self.queue.lease(self.worker_id)
+                if task is None:
+                    if self.queue.is_finished():
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+
+                completed += self._scrap(task)
+        finally:
+            self.manager.close_scrapers()
+            get_driver_pool().close()
+            self.queue.close()
+        self.logger.info(f'Worker {self.worker_id} finished after {completed} tasks')
+        return completed
+
+    def _scrap(self, task: Task) -> bool:
+        """Scraps a single task and pushes its results to the queue.
+        """
+        journal = _TaskJournal()
+        self.manager.journal = journal
+        stop_heartbeat = Event()
+        heartbeat = Thread(target=self._heartbeat, args=(task, stop_heartbeat), daemon=True)
+        heartbeat.start()
+        try:
+            emitted = self.manager.scrap_task(task.source, task.item)
+        except Exception as e:
+            self.logger.error(f'Worker {self.worker_id} could not scrap {task.source} {task.key} - {e}')
+            emitted = []
+        finally:
+            stop_heartbeat.set()
+            heartbeat.join()
+
+        # scrapers handle their own errors, a task is completed only if it saved its result
+        if not any(source == task.source and key == task.key for source, key, _, _ in journal.entries):
+            self.queue.fail(task)
+            return False
+
+        follow_ups = [(source, task_key(source, item), item)
+                      for item in emitted for source in DOWNSTREAM.get(task.source, [])]
+        self.queue.complete(task, journal.entries, follow_ups)
+        return True
+
+    def _heartbeat(self, task: Task, stop: Event) -> None:
+        """Extends the lease of the task until stop is set.
+        """
+        while not stop.wait(self.queue.visibility_timeout / 3):
+            try:
+                self.queue.extend(task, self.worker_id)
+            except Exception as e:
+                self.logger.error(f'Worker {self.worker_id} could not extend lease of {task.key} - {e}')
@@ -0,0 +1 @@
+from .driver_pool import DriverPool, get_driver_pool
\ No newline at end of file
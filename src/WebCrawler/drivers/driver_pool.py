@@ -0,0 +1,282 @@
+"""
+driver_pool.py
+====================================
+This module contains a pool of WebDriver sessions shared by all Selenium scrapers.
+"""
+
+import atexit
+import os
+from contextlib import contextmanager
+from threading import Condition, Lock
+from typing import Dict, Iterator, List, Literal, Optional
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options as ChromeOptions
+from selenium.webdriver.firefox.options import Options as FirefoxOptions
+from selenium.webdriver.firefox.service import Service as FirefoxService
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from WebCrawler.custom_logger import get_logger
+from WebCrawler.network import RecordingDriver, check_deadline, get_page_capture, get_rate_limiter, wait_timeout
+
+Browser = Literal['chrome', 'firefox']
+
+
+class DriverPool:
+    """Bounded pool of browser sessions. Scrapers lease a driver, use it and return it, so browsers are started once
+    and reused instead of being launched for every scraper or entity. Returned drivers are health checked and
+    cookies of every site are kept, so a session leased later for the same site keeps e.g. accepted consent popups.
+    In record mode of the page capture browsers are wrapped in recording proxies, in replay mode no browser is
+    started and drivers serving the captured pages are leased instead.
+
+    :param max_size: Maximum number of browsers alive at the same time, defaults to 5
+    :type max_size: int, optional
+    :param headless: Specifies whether browsers should not pop up while scrapping, defaults to True
+    :type headless: bool, optional
+    """
+
+    def __init__(self, max_size: int = 5, headless: bool = True):
+        """Constructor method.
+        """
+        self.max_size = max_size
+        self.headless = headless
+        self._idle: Dict[str, List[WebDriver]] = {'chrome': [], 'firefox': []}
+        self._browsers: Dict[WebDriver, str] = {}
+        self._sites: Dict[WebDriver, Optional[str]] = {}
+        self._site_cookies: Dict[str, List[dict]] = {}
+        self._site_state: Dict[str, dict] = {}
+        self._live = 0
+        self._condition = Condition(Lock())
+        self.logger = get_logger()
+
+    def acquire(self, browser: Browser = 'chrome', site: Optional[str] = None, implicit_wait: float = 0) -> WebDriver:
+        """Leases a driver, blocks while all the browsers are in use, but no longer than the deadline of the current
+        thread. A driver which was last used for the same site is preferred, otherwise cookies saved for the site
+        are restored.
+
+        :param browser: Browser the driver should control, defaults to 'chrome'
+        :type browser: Browser, optional
+        :param site: Base URL of the site the driver will be used for, defaults to None
+        :type site: str, optional
+        :param implicit_wait: Implicit wait in seconds set on the leased driver, defaults to 0
+        :type implicit_wait: float, optional
+        :raises DeadlineExceeded: If the deadline of the current thread expires or is cancelled while waiting for
+            a driver
+        :return: Leased driver, it has to be given back with release
+        :rtype: WebDriver
+        """
+        with self._condition:
+            while True:
+                driver = self._take_idle(browser, site)
+                if driver is not None:
+                    break
+                if self._live < self.max_size:
+                    self._live += 1
+                    break
+                if not self._evict_idle():
+                    check_deadline()
+                    self._condition.wait(wait_timeout())
+
+        if driver is not None and (not get_page_capture().accepts(driver) or not self._is_healthy(driver)):
+            self._quit(driver, count=False)
+            driver = None
+
+        if driver is None:
+            try:
+                driver = self._create(browser)
+            except Exception:
+                with self._condition:
+                    self._live -= 1
+                    self._condition.notify()
+                raise
+
+        if site is not None and self._sites.get(driver) != site:
+            self._restore_cookies(driver, site)
+        driver.implicitly_wait(implicit_wait)
+        return driver
+
+    def release(self, driver: WebDriver, site: Optional[str] = None) -> None:
+        """Gives a leased driver back to the pool. Unhealthy drivers are closed.
+
+        :param driver: Driver obtained from acquire
+        :type driver: WebDriver
+        :param site: Site the driver was used for, its cookies are saved, defaults to None
+        :type site: str, optional
+        """
+        if isinstance(driver, RecordingDriver):
+            try:
+                driver.flush()
+            except Exception as e:
+                self.logger.error(f"DriverPool could not capture the last page of {site} - {e}")
+        healthy = self._is_healthy(driver)
+        if healthy and site is not None:
+            try:
+                self._site_cookies[site] = driver.get_cookies()
+            except Exception:
+                healthy = False
+
+        if not healthy:
+            self._quit(driver)
+            return
+
+        with self._condition:
+            self._sites[driver] = site
+            self._idle[self._browsers[driver]].append(driver)
+            self._condition.notify()
+
+    @contextmanager
+    def lease(self, browser: Browser = 'chrome', site: Optional[str] = None,
+              implicit_wait: float = 0) -> Iterator[WebDriver]:
+        """Context manager version of acquire and release.
+
+        :param browser: Browser the driver should control, defaults to 'chrome'
+        :type browser: Browser, optional
+        :param site: Base URL of the site the driver will be used for, defaults to None
+        :type site: str, optional
+        :param implicit_wait: Implicit wait in seconds set on the leased driver, defaults to 0
+        :type implicit_wait: float, optional
+        """
+        driver = self.acquire(browser, site, implicit_wait)
+        try:
+            yield driver
+        finally:
+            self.release(driver, site)
+
+    def ensure_size(self, size: int) -> None:
+        """Raises the maximum number of browsers to at least size, e.g. to the number of scrapers holding a browser
+        at the same time, which would otherwise wait for each other's browsers forever.
+
+        :param size: Number of browsers needed at the same time
+        :type size: int
+        """
+        with self._condition:
+            if size > self.max_size:
+                self.max_size = size
+                self._condition.notify_all()
+
+    def site_state(self, site: str) -> dict:
+        """Returns a dictionary shared by all the sessions of the site, e.g. to remember an accepted consent popup.
+
+        :param site: Base URL of the site
+        :type site: str
+        :return: Mutable state of the site
+        :rtype: dict
+        """
+        with self._condition:
+            return self._site_state.setdefault(site, {})
+
+    def close(self) -> None:
+        """Quits all idle browsers. The pool stays usable, new browsers are started when needed.
+        """
+        with self._condition:
+            drivers = [driver for idle in self._idle.values() for driver in idle]
+            for idle in self._idle.values():
+                idle.clear()
+        for driver in drivers:
+            self._quit(driver)
+
+    def _take_idle(self, browser: str, site: Optional[str]) -> Optional[WebDriver]:
+        """Takes an idle driver of the browser, preferably one already used for the site.
+        """
+        idle = self._idle[browser]
+        for driver in idle:
+            if self._sites.get(driver) == site:
+                idle.remove(driver)
+                return driver
+        return idle.pop() if idle else None
+
+    def _evict_idle(self) -> bool:
+        """Quits an idle driver of any browser to make room for a new one, called with the lock held.
+        """
+        for idle in self._idle.values():
+            if idle:
+                driver = idle.pop(0)
+                self._live -= 1
+                self._sites.pop(driver, None)
+                self._browsers.pop(driver, None)
+                try:
+                    driver.quit()
+                except Exception:
+                    pass
+                return True
+        return False
+
+    def _create(self, browser: str) -> WebDriver:
+        """Starts a new browser.
+        """
+        page_capture = get_page_capture()
+        if page_capture.replaying:
+            driver = page_capture.replay_driver()
+        elif browser == 'firefox':
+            firefox_options = FirefoxOptions()
+            if self.headless:
+                firefox_options.add_argument("--headless")
+            driver = webdriver.Firefox(options=firefox_options, service=FirefoxService(log_path=os.devnull))
+        else:
+            chrome_options = ChromeOptions()
+            if self.headless:
+                chrome_options.add_argument("--headless")
+            chrome_options.add_argument("--window-size=1920,1080")
+            chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
+            driver = webdriver.Chrome(options=chrome_options)
+        driver = page_capture.wrap(driver)
+
+        with self._condition:
+            self._browsers[driver] = browser
+        return driver
+
+    def _restore_cookies(self, driver: WebDriver, site: str) -> None:
+        """Opens the site and restores its saved cookies in the driver.
+        """
+        cookies = self._site_cookies.get(site)
+        if not cookies:
+            return
+        try:
+            get_rate_limiter().load(driver, site)
+            driver.delete_all_cookies()
+            for cookie in cookies:
+                driver.add_cookie(cookie)
+            self._sites[driver] = site
+        except Exception as e:
+            self.logger.error(f"DriverPool could not restore cookies of {site} - {e}")
+
+    @staticmethod
+    def _is_healthy(driver: WebDriver) -> bool:
+        """Checks whether the browser still responds.
+        """
+        try:
+            return bool(driver.window_handles)
+        except Exception:
+            return False
+
+    def _quit(self, driver: WebDriver, count: bool = True) -> None:
+        """Quits the browser, frees its place in the pool if count is True.
+        """
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self._condition:
+            self._sites.pop(driver, None)
+            self._browsers.pop(driver, None)
+            if count:
+                self._live -= 1
+                self._condition.notify()
+
+
+_driver_pool: Optional[DriverPool] = None
+_driver_pool_lock = Lock()
+
+
+def get_driver_pool() -> DriverPool:
+    """Returns common DriverPool instance for the whole process, its browsers are quit at exit.
+
+    :return: Instance of DriverPool
+    :rtype: DriverPool
+    """
+    global _driver_pool
+    with _driver_pool_lock:
+        if _driver_pool is None:
+            _driver_pool = DriverPool()
+            atexit.register(_driver_pool.close)
+        return _driver_pool
@@ -1,2 +1,3 @@
 from .database_manager import DataBaseManager
+from .database_writer import DataBaseWriter
 from .scraper_manager import ScraperManager
@@ -10,6 +10,7 @@ import pandas as pd
 import pathlib
 from typing import List
 from WebCrawler.custom_logger import get_logger
+from WebCrawler.storage import read_parquet
 
 
 class DataBaseManager:
@@ -20,17 +21,35 @@ class DataBaseManager:
         Attributes:
             db_path (str): Contains the path to the database file (.db).
             clear_database (bool): Optional parameter that specifies whether the database tables are deleted at runtime.
+            input_format (str): Optional format of the scraped data, 'csv' or 'parquet' (the latest scrape
+                is read from the partitioned output).
+            output_dir (str): Optional directory of the scraped data, defaults to output/csv or output/parquet.
     """
 
-    def __init__(self, db_path, clear_database=False):
+    def __init__(self, db_path, clear_database=False, input_format='csv', output_dir=None):
         """
             Initializes the RegonScraper class.
         """
         self.db_path = db_path
         self.clear_database = clear_database
-        self.output_dir = os.path.join(pathlib.Path(__file__).parent.resolve(), '..', '..', '..', 'output', 'csv')
+        self.input_format = input_format
+        self.output_dir = output_dir or os.path.join(pathlib.Path(__file__).parent.resolve(), '..', '..', '..',
+                                                     'output', input_format)
         self.logger = get_logger()
 
+    def _read_result(self, name: str, dtype: dict = None) -> pd.DataFrame:
+        """
+            Reads a scraped result from a csv file or from the Parquet output, which keeps the types of columns
+            and does not need dtype.
+
+            :param name: The name of the result, e.g. regon_entity_df.
+            :param dtype: Types of columns of the csv file.
+            :return: DataFrame with the result.
+        """
+        if self.input_format == 'parquet':
+            return read_parquet(self.output_dir, name)
+        return pd.read_csv(f'{self.output_dir}/{name}', dtype=dtype)
+
     @staticmethod
     def _find_entities(conn: sqlite3.Connection, df: pd.DataFrame, table: str, column: str, compare: str) -> List[int]:
         """
@@ -82,6 +101,15 @@ class DataBaseManager:
 
         return times_ids
 
+    def create_tables(self) -> None:
+        """
+            Public method used to create tables in database, they are dropped first if clear_database is set.
+
+            :param: None.
+            :return: None.
+        """
+        self._create_db_create_tables()
+
     def _create_db_create_tables(self) -> None:
         """
             Public method used to create tables in database.
@@ -102,6 +130,7 @@ class DataBaseManager:
                 cur.execute("DROP TABLE IF EXISTS konto")
                 cur.execute("DROP TABLE IF EXISTS akcjonariusz")
                 cur.execute("DROP TABLE IF EXISTS pkd")
+                cur.execute("DROP TABLE IF EXISTS pkd_slownik")
                 cur.execute("DROP TABLE IF EXISTS czas")
                 cur.execute("DROP TABLE IF EXISTS ocena")
 
@@ -201,13 +230,22 @@ class DataBaseManager:
                 )
             """)
 
+            # pkd dimension, entities are linked to the codes
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS pkd_slownik(
+                    kod TEXT PRIMARY KEY,
+                    nazwa TEXT,
+                    wersja INTEGER
+                )
+            """)
+
             cur.execute("""
                 CREATE TABLE IF NOT EXISTS pkd(
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     id_podmiotu INTEGER,
                     kod TEXT,
-                    nazwa TEXT,
-                    FOREIGN KEY(id_podmiotu) REFERENCES podmiot(id)
+                    FOREIGN KEY(id_podmiotu) REFERENCES podmiot(id),
+                    FOREIGN KEY(kod) REFERENCES pkd_slownik(kod)
                 )
             """)
 
@@ -248,7 +286,7 @@ class DataBaseManager:
         try:
             conn = sqlite3.connect(self.db_path)
 
-            regon_entities_df = pd.read_csv(f'{self.output_dir}/regon_entity_df', dtype={'regon': str, 'nip': str})
+            regon_entities_df = self._read_result('regon_entity_df', dtype={'regon': str, 'nip': str})
             regon_entities_df.drop(columns=['nazwa_gieldowa'], inplace=True)
             regon_entities_df.to_sql('podmiot', conn, if_exists='append', index=False)
 
@@ -268,8 +306,7 @@ class DataBaseManager:
         try:
             conn = sqlite3.connect(self.db_path)
 
-            local_regon_entities_df = pd.read_csv(f'{self.output_dir}/regon_local_entity_df',
-                                                  dtype={'regon': str, 'nip': str})
+            local_regon_entities_df = self._read_result('regon_local_entity_df', dtype={'regon': str, 'nip': str})
 
             entities_ids = self._find_entities(conn, local_regon_entities_df, 'podmiot', 'nip j.nadrzędnej', 'nip')
 
@@ -294,8 +331,7 @@ class DataBaseManager:
             conn = sqlite3.connect(self.db_path)
             cur = conn.cursor()
 
-            krs_general_df = pd.read_csv(f'{self.output_dir}/krs_general_info_df',
-                                         dtype={'regon': str, 'nip': str, 'krs': str})
+            krs_general_df = self._read_result('krs_general_info_df', dtype={'regon': str, 'nip': str, 'krs': str})
             for index, row in krs_general_df.iterrows():
                 nip = row['nip']
                 query = "SELECT id FROM podmiot WHERE nip='{}'".format(nip)
@@ -324,7 +360,7 @@ class DataBaseManager:
         try:
             conn = sqlite3.connect(self.db_path)
 
-            representatives_df = pd.read_csv(f'{self.output_dir}/krs_representatives_df', dtype={'nip': str})
+            representatives_df = self._read_result('krs_representatives_df', dtype={'nip': str})
 
             entities_ids = self._find_entities(conn, representatives_df, 'podmiot', 'nip', 'nip')
 
@@ -349,7 +385,7 @@ class DataBaseManager:
         try:
             conn = sqlite3.connect(self.db_path)
 
-            info_df = pd.read_csv(f'{self.output_dir}/infostrefa_news_df', dtype={'nip': str})
+            info_df = self._read_result('infostrefa_news_df', dtype={'nip': str})
 
             entities_ids = self._find_entities(conn, info_df, 'podmiot', 'nip', 'nip')
 
@@ -374,7 +410,7 @@ class DataBaseManager:
         try:
             conn = sqlite3.connect(self.db_path)
 
-            bank_df = pd.read_csv(f'{self.output_dir}/bankier_news_df', dtype={'nip': str})
+            bank_df = self._read_result('bankier_news_df', dtype={'nip': str})
 
             entities_ids = self._find_entities(conn, bank_df, 'podmiot', 'nip', 'nip')
 
@@ -398,7 +434,7 @@ class DataBaseManager:
         try:
             conn = sqlite3.connect(self.db_path)
 
-            shareholders_df = pd.read_csv(f'{self.output_dir}/aleo_shareholders_df', dtype={'nip': str})
+            shareholders_df = self._read_result('aleo_shareholders_df', dtype={'nip': str})
 
             entities_ids = self._find_entities(conn, shareholders_df, 'podmiot', 'nip', 'nip')
 
@@ -423,7 +459,7 @@ class DataBaseManager:
         try:
             conn = sqlite3.connect(self.db_path)
 
-            accounts_df = pd.read_csv(f'{self.output_dir}/aleo_account_numbers_df', dtype={'nip': str})
+            accounts_df = self._read_result('aleo_account_numbers_df', dtype={'nip': str})
 
             entities_ids = self._find_entities(conn, accounts_df, 'podmiot', 'nip', 'nip')
 
@@ -438,6 +474,28 @@ class DataBaseManager:
         except sqlite3.Error as error:
             self.logger.error(f"Failed to insert bank accounts data into table konto - {error}")
 
+    def _insert_pkd_dictionary(self) -> None:
+        """
+            Public method used to complete the 'pkd_slownik' table with the names of the scraped pkd codes, names
+            already in the table are replaced by the newer ones.
+
+            :param: None.
+            :return: None.
+        """
+        try:
+            conn = sqlite3.connect(self.db_path)
+
+            dictionary_df = self._read_result('regon_pkd_dictionary_df', dtype={'kod': str})
+            # shards of a sharded scrape save entries of the codes they found themselves
+            dictionary_df = dictionary_df.sort_values('wersja').drop_duplicates('kod', keep='last')
+            conn.executemany("INSERT OR REPLACE INTO pkd_slownik (kod, nazwa, wersja) VALUES (?, ?, ?)",
+                             dictionary_df[['kod', 'nazwa', 'wersja']].astype(object).values.tolist())
+
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as error:
+            self.logger.error(f"Failed to insert pkd data into table pkd_slownik - {error}")
+
     def _insert_pkd_info(self) -> None:
         """
             Public method used to complete the 'pkd' table with the data (from regon) of the scraped entities.
@@ -448,7 +506,7 @@ class DataBaseManager:
         try:
             conn = sqlite3.connect(self.db_path)
 
-            pkd_df = pd.read_csv(f'{self.output_dir}/regon_pkd_df', dtype={'regon': str})
+            pkd_df = self._read_result('regon_pkd_df', dtype={'regon': str})
 
             entities_ids = []
             for index, row in pkd_df.iterrows():
@@ -463,7 +521,8 @@ class DataBaseManager:
                 else:
                     entities_ids.append(None)
 
-            pkd_df.drop(columns=['regon'], inplace=True)
+            # results of older runs have names of the codes in their rows
+            pkd_df.drop(columns=['regon', 'nazwa'], inplace=True, errors='ignore')
 
             pkd = pkd_df.assign(id_podmiotu=entities_ids)
             pkd.to_sql('pkd', conn, if_exists='append', index=False)
@@ -483,7 +542,7 @@ class DataBaseManager:
         try:
             conn = sqlite3.connect(self.db_path)
 
-            times_df = pd.read_csv(f'{self.output_dir}/time_df')
+            times_df = self._read_result('time_df')
             times_df.drop_duplicates(inplace=True)
             times_df.to_sql('czas', conn, if_exists='append', index=False)
 
@@ -504,7 +563,7 @@ class DataBaseManager:
             conn = sqlite3.connect(self.db_path)
 
             # Infostrefa
-            sentiment_info_df = pd.read_csv(f'{self.output_dir}/sentiment_info_df', dtype={'nip': str})
+            sentiment_info_df = self._read_result('sentiment_info_df', dtype={'nip': str})
 
             entities_ids = self._find_entities(conn, sentiment_info_df, 'podmiot', 'nip', 'nip')
             times_ids = self._find_times(conn, sentiment_info_df)
@@ -518,7 +577,7 @@ class DataBaseManager:
             conn.commit()
 
             # Bankier
-            bankier_info_df = pd.read_csv(f'{self.output_dir}/sentiment_bankier_df', dtype={'nip': str})
+            bankier_info_df = self._read_result('sentiment_bankier_df', dtype={'nip': str})
 
             entities_ids = self._find_entities(conn, bankier_info_df, 'podmiot', 'nip', 'nip')
             times_ids = self._find_times(conn, bankier_info_df)
@@ -554,6 +613,7 @@ class DataBaseManager:
         try:
             self._insert_entity_data()
             self._insert_local_entity_data()
+            self._insert_pkd_dictionary()
             self._insert_pkd_info()
         except Exception as e:
             self.logger.error(f"Couldn't insert regon data - {e}")
@@ -0,0 +1,263 @@
+"""
+database_writer.py
+====================================
+This module contains the background writer inserting scraping results to the database while they are scraped.
+"""
+
+import sqlite3
+import time
+from queue import Empty, Queue
+from threading import Thread
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from WebCrawler.custom_logger import get_logger
+from WebCrawler.managers.database_manager import DataBaseManager
+
+_SENTINEL = object()
+
+# tables of news and of Aleo results, keyed by the name of the result, with renamed columns
+CHILD_TABLES = {
+    'krs_representatives_df': ('reprezentant', {}),
+    'infostrefa_news_df': ('infostrefa', {}),
+    'bankier_news_df': ('bankier', {}),
+    'aleo_shareholders_df': ('akcjonariusz', {'shareholder': 'nazwa'}),
+    'aleo_account_numbers_df': ('konto', {'account_number': 'numer'})
+}
+# results with entities other rows refer to
+PARENT_RESULTS = ['regon_entity_df', 'regon_local_entity_df']
+
+
+def _insert(conn: sqlite3.Connection, table: str, df: pd.DataFrame) -> None:
+    """Inserts rows of the DataFrame into the table with a single statement, NaN values are inserted as NULL.
+    """
+    if df.empty:
+        return
+    columns = ', '.join(f'"{column}"' for column in df.columns)
+    placeholders = ', '.join('?' * len(df.columns))
+    rows = df.astype(object).where(pd.notna(df), None).values.tolist()
+    conn.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows)
+
+
+class DataBaseWriter:
+    """Inserts results into the database in a background thread while entities are scraped, in a transaction per
+    batch of rows, so the database can be used before the scrape finishes. Rows referring to an entity which is not
+    in the database yet, e.g. KRS scraped before REGON, wait until it is inserted. Whatever still waits when the
+    writer is closed is inserted like DataBaseManager.insert_all does. If the transaction of a batch fails, every
+    result of the batch is inserted in a transaction of its own, rows of results which still fail are counted in
+    dropped.
+
+    :param db_path: Path to the database file, tables are created if they do not exist
+    :type db_path: str
+    :param batch_rows: Number of rows inserted in a single transaction, defaults to 500
+    :type batch_rows: int, optional
+    :param flush_interval: Maximum number of seconds rows wait for the transaction, defaults to 1.0
+    :type flush_interval: float, optional
+    :param maxsize: Maximum number of results waiting for the writer, defaults to 256
+    :type maxsize: int, optional
+    """
+
+    def __init__(self, db_path: str, batch_rows: int = 500, flush_interval: float = 1.0, maxsize: int = 256):
+        """Constructor method.
+        """
+        self.db_path = db_path
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.queue = Queue(maxsize=maxsize)
+        self.logger = get_logger()
+        self.inserted: Dict[str, int] = {}
+        self.dropped: Dict[str, int] = {}
+        self._deferred: Dict[str, List[pd.DataFrame]] = {}
+        self._thread = Thread(target=self._run, name='DataBaseWriter', daemon=True)
+
+    def start(self) -> None:
+        """Starts the writer thread.
+        """
+        self._thread.start()
+
+    def submit(self, name: str, df: pd.DataFrame) -> None:
+        """Queues rows of a result for inserting, blocks while the queue is full.
+
+        :param name: Name of the result, e.g. regon_entity_df
+        :type name: str
+        :param df: Rows of the result
+        :type df: pd.DataFrame
+        """
+        if not df.empty:
+            self.queue.put((name, df))
+
+    def close(self) -> None:
+        """Marks that no more results will be submitted.
+        """
+        self.queue.put(_SENTINEL)
+
+    def join(self) -> None:
+        """Waits until all the submitted results are inserted.
+        """
+        self._thread.join()
+
+    def _run(self) -> None:
+        """Writer loop, collects results until batch_rows rows or flush_interval seconds and inserts them in
+        a single transaction.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=60)
+        # readers do not block the writer and see committed batches while scraping goes on
+        conn.execute('PRAGMA journal_mode=WAL')
+        finished = False
+        while not finished:
+            items = [self.queue.get()]
+            rows = 0 if items[0] is _SENTINEL else len(items[0][1])
+            deadline = time.monotonic() + self.flush_interval
+            while rows < self.batch_rows and items[-1] is not _SENTINEL:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except Empty:
+                    break
+                items.append(item)
+                rows += 0 if item is _SENTINEL else len(item[1])
+
+            if items[-1] is _SENTINEL:
+                finished = True
+                items.pop()
+            self._write(conn, items)
+
+        self._write(conn, [], final=True)
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, items: list, final: bool = False) -> None:
+        """Inserts the batch and rows waiting for their entities in a single transaction, or every result in
+        a transaction of its own if the batch fails.
+        """
+        # deferred rows can only be inserted once their entities are
+        flush = final or any(name in PARENT_RESULTS for name, _ in items)
+        state = self._state()
+        try:
+            with conn:
+                for name, df in items:
+                    self._write_result(conn, name, df, final=False)
+                if flush:
+                    self._write_deferred(conn, final)
+            return
+        except Exception as e:
+            self.logger.warning(f"DataBaseWriter could not insert a batch of {len(items)} results, inserting them "
+                                f"one by one - {e}")
+        # the transaction was rolled back, so were the counts and the rows it deferred
+        self.inserted, self._deferred = state
+        for name, df in items:
+            self._write_one(conn, name, df, final=False)
+        if flush:
+            deferred, self._deferred = self._deferred, {}
+            for name, frames in deferred.items():
+                self._write_one(conn, name, pd.concat(frames, ignore_index=True), final)
+
+    def _write_deferred(self, conn: sqlite3.Connection, final: bool) -> None:
+        deferred, self._deferred = self._deferred, {}
+        for name, frames in deferred.items():
+            self._write_result(conn, name, pd.concat(frames, ignore_index=True), final)
+
+    def _write_one(self, conn: sqlite3.Connection, name: str, df: pd.DataFrame, final: bool) -> None:
+        """Inserts rows of a single result in a transaction of its own, rows which cannot be inserted are dropped.
+        """
+        state = self._state()
+        try:
+            with conn:
+                self._write_result(conn, name, df, final)
+        except Exception as e:
+            self.inserted, self._deferred = state
+            self.dropped[name] = self.dropped.get(name, 0) + len(df)
+            self.logger.error(f"DataBaseWriter dropped {len(df)} rows of {name} - {e}")
+
+    def _state(self) -> tuple:
+        """Returns copies of the counts of inserted rows and of the deferred rows, restored if a transaction fails.
+        """
+        return dict(self.inserted), {name: list(frames) for name, frames in self._deferred.items()}
+
+    def _defer(self, name: str, df: pd.DataFrame) -> None:
+        if not df.empty:
+            self._deferred.setdefault(name, []).append(df)
+
+    def _split(self, name: str, df: pd.DataFrame, ids: List[Optional[int]], final: bool) -> pd.DataFrame:
+        """Returns rows whose entity was found, or all the rows at the end, the other rows are deferred.
+        """
+        df = df.assign(_id=pd.Series(ids, index=df.index, dtype=object))
+        if not final:
+            self._defer(name, df[df['_id'].isna()].drop(columns=['_id']))
+            df = df[df['_id'].notna()]
+        return df
+
+    def _count(self, table: str, rows: int) -> None:
+        self.inserted[table] = self.inserted.get(table, 0) + rows
+
+    def _write_result(self, conn: sqlite3.Connection, name: str, df: pd.DataFrame, final: bool) -> None:
+        """Inserts rows of a single result with identifiers of the entities they refer to.
+        """
+        if name == 'regon_entity_df':
+            df = df.drop(columns=['nazwa_gieldowa'], errors='ignore')
+            _insert(conn, 'podmiot', df)
+            self._count('podmiot', len(df))
+
+        elif name == 'regon_local_entity_df':
+            ids = DataBaseManager._find_entities(conn, df, 'podmiot', 'nip j.nadrzędnej', 'nip')
+            df = self._split(name, df, ids, final)
+            df = df.drop(columns=['regon j.nadrzędnej', 'nip j.nadrzędnej']).rename(
+                columns={'_id': 'id_jed_nadrzednej'})
+            _insert(conn, 'jednostka_lokalna', df)
+            self._count('jednostka_lokalna', len(df))
+
+        elif name == 'regon_pkd_df':
+            ids = []
+            for regon in df['regon']:
+                table = 'jednostka_lokalna' if len(str(regon)) == 14 else 'podmiot'
+                result = conn.execute(f"SELECT id FROM {table} WHERE regon=?", (str(regon),)).fetchone()
+                ids.append(result[0] if result else None)
+            df = self._split(name, df, ids, final)
+            df = df.drop(columns=['regon']).rename(columns={'_id': 'id_podmiotu'})
+            _insert(conn, 'pkd', df)
+            self._count('pkd', len(df))
+
+        elif name == 'regon_pkd_dictionary_df':
+            # shards find the same codes, the newer name of a code replaces the older one
+            conn.executemany("INSERT OR REPLACE INTO pkd_slownik (kod, nazwa, wersja) VALUES (?, ?, ?)",
+                             df[['kod', 'nazwa', 'wersja']].astype(object).values.tolist())
+            self._count('pkd_slownik', len(df))
+
+        elif name == 'krs_general_info_df':
+            ids = DataBaseManager._find_entities(conn, df, 'podmiot', 'nip', 'nip')
+            df = self._split(name, df, ids, final)
+            # entities which are not in REGON are not updated, like in DataBaseManager
+            values = df.loc[df['_id'].notna(), ['data_wpisu_do_rej_przeds', 'data_wykr_z_rej_przeds', 'adr_www', '_id']]
+            conn.executemany("UPDATE podmiot SET data_wpisu=?, data_wykreslenia=?, adres_www=? WHERE id=?",
+                             values.astype(object).where(values.notna(), None).values.tolist())
+
+        elif name in CHILD_TABLES:
+            table, columns = CHILD_TABLES[name]
+            ids = DataBaseManager._find_entities(conn, df, 'podmiot', 'nip', 'nip')
+            df = self._split(name, df, ids, final)
+            df = df.drop(columns=['nip']).rename(columns={**columns, '_id': 'id_podmiotu'})
+            _insert(conn, table, df)
+            self._count(table, len(df))
+
+        elif name == 'time_df':
+            self._insert_times(conn, df)
+
+        elif name in ['sentiment_info_df', 'sentiment_bankier_df']:
+            timestamps = pd.to_datetime(df['timestamp'], format='%Y-%m-%d %H:%M:%S')
+            # sentiment can be written before the time rows scraped with it
+            self._insert_times(conn, pd.DataFrame({'godzina': timestamps.dt.hour, 'dzien': timestamps.dt.day,
+                                                   'miesiac': timestamps.dt.month, 'rok': timestamps.dt.year}))
+            ids = DataBaseManager._find_entities(conn, df, 'podmiot', 'nip', 'nip')
+            df = self._split(name, df, ids, final)
+            times_ids = DataBaseManager._find_times(conn, df)
+            df = df.drop(columns=['nip', 'timestamp']).rename(columns={'_id': 'id_podmiotu'})
+            _insert(conn, 'ocena', df.assign(id_czasu=times_ids))
+            self._count('ocena', len(df))
+
+    def _insert_times(self, conn: sqlite3.Connection, df: pd.DataFrame) -> None:
+        """Inserts times which are not in the database yet.
+        """
+        for row in df.drop_duplicates().astype(int).values.tolist():
+            if conn.execute("SELECT id FROM czas WHERE godzina=? AND dzien=? AND miesiac=? AND rok=?",
+                            row).fetchone() is None:
+                conn.execute("INSERT INTO czas (godzina, dzien, miesiac, rok) VALUES (?, ?, ?, ?)", row)
+                self._count('czas', 1)
@@ -0,0 +1,115 @@
+"""
+pipeline.py
+====================================
+This module contains building blocks of the streaming scraping pipeline.
+"""
+
+import time
+from queue import Queue
+from threading import Lock, Thread
+from typing import Any, Callable, Iterable, List, Optional
+
+from WebCrawler.custom_logger import get_logger
+
+_SENTINEL = object()
+
+
+class PipelineStage:
+    """Single stage of the scraping pipeline. Every stage owns one worker thread which takes items from a bounded
+    queue, passes them to the handler and forwards whatever the handler returns to all downstream stages.
+
+    A stage finishes once every upstream producer has closed it and all queued items were handled. Time spent by
+    the handler on every item is kept in latencies.
+
+    :param name: Name of the stage used in logs
+    :type name: str
+    :param handler: Function called for every item, returns an iterable of items for downstream stages or None
+    :type handler: Callable[[Any], Optional[Iterable]]
+    :param maxsize: Maximum number of items waiting in the stage queue, defaults to 16
+    :type maxsize: int, optional
+    :param on_stop: Function called in the worker thread after the last item was handled, defaults to None
+    :type on_stop: Callable[[], None], optional
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Optional[Iterable]], maxsize: int = 16,
+                 on_stop: Optional[Callable[[], None]] = None):
+        """Constructor method.
+        """
+        self.name = name
+        self.handler = handler
+        self.on_stop = on_stop
+        self.queue = Queue(maxsize=maxsize)
+        self.downstream: List['PipelineStage'] = []
+        self.producers = 0
+        self.latencies: List[float] = []
+        self._closed_by = 0
+        self._close_lock = Lock()
+        self._thread = Thread(target=self._run, name=f'{name}Stage', daemon=True)
+        self.logger = get_logger()
+
+    def connect(self, stage: 'PipelineStage') -> 'PipelineStage':
+        """Registers a stage which receives the output of this stage.
+
+        :param stage: Downstream stage
+        :type stage: PipelineStage
+        :return: The downstream stage, which allows chaining
+        :rtype: PipelineStage
+        """
+        self.downstream.append(stage)
+        stage.producers += 1
+        return stage
+
+    def put(self, item: Any) -> None:
+        """Puts an item into the stage queue, blocks while the queue is full.
+
+        :param item: Item to be handled by the stage
+        :type item: Any
+        """
+        self.queue.put(item)
+
+    def close(self) -> None:
+        """Signals that one of the producers will not put any more items. Stage without registered producers
+        (fed directly by the caller) is closed by a single call.
+        """
+        with self._close_lock:
+            self._closed_by += 1
+            last_producer = self._closed_by == max(self.producers, 1)
+        if last_producer:
+            self.queue.put(_SENTINEL)
+
+    def start(self) -> None:
+        """Starts the worker thread.
+        """
+        self._thread.start()
+
+    def join(self) -> None:
+        """Waits until the stage handles all of its items.
+        """
+        self._thread.join()
+
+    def _run(self) -> None:
+        """Worker loop, closes downstream stages even if the handler or the stop hook fails.
+        """
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _SENTINEL:
+                    break
+                start = time.perf_counter()
+                try:
+                    outputs = self.handler(item)
+                except Exception as e:
+                    self.logger.error(f"{self.name} stage failed on {item}: {e}")
+                    continue
+                finally:
+                    self.latencies.append(time.perf_counter() - start)
+                for output in outputs or ():
+                    for stage in self.downstream:
+                        stage.put(output)
+            if self.on_stop:
+                self.on_stop()
+        except Exception as e:
+            self.logger.error(f"{self.name} stage stopped unexpectedly: {e}")
+        finally:
+            for stage in self.downstream:
+                stage.close()
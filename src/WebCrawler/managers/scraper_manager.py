@@ -1,13 +1,108 @@
 from WebCrawler.input_validator import InputValidator
 from WebCrawler.scrapers import *
-from WebCrawler.sentiment import SentimentAnalyzer
-from WebCrawler.custom_logger import get_logger
-
-from threading import Thread
+from WebCrawler.sentiment import SentimentWorker
+from WebCrawler.custom_logger import flush_logging, get_logger, log_fields
+from WebCrawler.drivers import get_driver_pool
+from WebCrawler.metrics import get_metrics
+from WebCrawler.network import (Deadline, DeadlineExceeded, RateLimiter, RetryPolicy, check_deadline, deadline_scope,
+                                get_page_capture, get_rate_limiter)
+from WebCrawler.storage import (DICTIONARY_COLUMNS, FreshnessStore, IdentityIndex, ResultHandle, ResultStore,
+                                ScrapJournal, content_hash, get_pkd_dictionary, write_parquet)
+
+from WebCrawler.managers.database_manager import DataBaseManager
+from WebCrawler.managers.database_writer import DataBaseWriter
+from WebCrawler.managers.pipeline import PipelineStage
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 import pandas as pd
+import datetime
 import os
 import pathlib
 
+NEWS_COLUMNS = ['nip', 'data', 'wiadomosc']
+SENTIMENT_COLUMNS = ['nip', 'typ_oceny', 'timestamp']
+TIME_COLUMNS = ['godzina', 'dzien', 'miesiac', 'rok']
+NEWS_SCRAPER_NAMES = {'bankier': 'BankierScraper', 'infostrefa': 'InfostrefaScraper'}
+SENTIMENT_RESULTS = {'bankier': 'sentiment_bankier_df', 'infostrefa': 'sentiment_info_df'}
+# stages of the pipeline, a distributed scrape has a task for every (source, entity) pair
+SOURCES = ['regon', 'krs', 'stock_name', 'aleo', 'bankier', 'infostrefa']
+# browsers held at the same time by the REGON, KRS, stock name, Bankier and Infostrefa stages
+PIPELINE_BROWSERS = 5
+KRS_GENERAL_INFO_COLUMNS = ["nazwa", "krs", "nip", "regon", "forma_prawna", "data_wpisu_do_rej_przeds",
+                            "data_wykr_z_rej_przeds", "nazwa_org_repr", "sposob_repr", "adr_www", "email"]
+
+
+# names of attributes loading every result DataFrame, keyed by the name of the result and of the output file
+RESULT_ATTRIBUTES = {
+    'regon_entity_df': 'regon_entity_df',
+    'regon_local_entity_df': 'regon_local_entity_df',
+    'regon_pkd_df': 'regon_pkd_df',
+    'regon_pkd_dictionary_df': 'regon_pkd_dictionary_df',
+    'krs_representatives_df': 'krs_representants_df',
+    'krs_general_info_df': 'krs_general_info_df',
+    'aleo_account_numbers_df': 'aleo_account_numbers_df',
+    'aleo_shareholders_df': 'aleo_shareholders_df',
+    'infostrefa_news_df': 'infostrefa_news_df',
+    'bankier_news_df': 'bankier_news_df',
+    'sentiment_info_df': 'info_sentiment',
+    'sentiment_bankier_df': 'bankier_sentiment',
+    'time_df': 'time_df'
+}
+# columns of results which are saved even if nothing was scraped
+RESULT_COLUMNS = {
+    'regon_pkd_dictionary_df': DICTIONARY_COLUMNS,
+    'krs_general_info_df': KRS_GENERAL_INFO_COLUMNS,
+    'aleo_account_numbers_df': ['nip', 'account_number'],
+    'aleo_shareholders_df': ['nip', 'shareholder'],
+    'infostrefa_news_df': NEWS_COLUMNS,
+    'bankier_news_df': NEWS_COLUMNS,
+    'sentiment_info_df': SENTIMENT_COLUMNS,
+    'sentiment_bankier_df': SENTIMENT_COLUMNS,
+    'time_df': TIME_COLUMNS
+}
+
+
+def _scrap_shard(shard: List[tuple], shard_number: int, options: dict) -> Tuple[dict, dict, dict]:
+    """Scraps a single shard of the input, runs in a worker process started by ScraperManager. Returns handles of
+    results saved in the directory of the shard, latencies of the pipeline stages and run metrics.
+    """
+    manager = ScraperManager(data=shard, shard=shard_number, **options)
+    try:
+        manager.scrap()
+        results = manager._get_results()
+    finally:
+        # worker processes exit without running atexit handlers
+        manager.results.close()
+        get_driver_pool().close()
+        flush_logging()
+    return results, manager.stage_latencies, manager.metrics.snapshot()
+
+
+def _split_rate_limits(rate_limits: Optional[dict], workers: int) -> dict:
+    """Splits rates of every host between worker processes, each of them has its own rate limiter. Requests in flight
+    are not split, worker processes share semaphores of them created by _shared_in_flight.
+    """
+    limits = {**RateLimiter.DEFAULT_LIMITS, **(rate_limits or {})}
+    return {host: (rate / workers, max_in_flight) for host, (rate, max_in_flight) in limits.items()}
+
+
+def _shared_in_flight(rate_limits: Optional[dict], context: Any) -> dict:
+    """Creates semaphores limiting requests in flight of every host across all worker processes, a host allowing
+    fewer requests in flight than there are workers would be exceeded by limits split between the processes.
+    """
+    limits = {**RateLimiter.DEFAULT_LIMITS, **(rate_limits or {})}
+    return {host: context.BoundedSemaphore(max(1, max_in_flight)) for host, (_, max_in_flight) in limits.items()}
+
+
+def _init_shard_process(in_flight: dict) -> None:
+    """Initializes a worker process, its rate limiter keeps requests in flight within the semaphores of all workers.
+    """
+    get_rate_limiter().share_in_flight(in_flight)
+
 
 class ScraperManager:
     """Class which manages running all the scrappers and saving results to csv files.
@@ -16,218 +111,851 @@ class ScraperManager:
     :type input_path: str
     :param log_scrap_info: Specifies whether there to print info about scraping proccess, defaults to False
     :type log_scrap_info: bool, optional
+    :param queue_size: Maximum number of entities waiting between two stages of the pipeline, defaults to 16
+    :type queue_size: int, optional
+    :param workers: Number of processes the input is sharded across, each with its own browsers, defaults to 1
+    :type workers: int, optional
+    :param data: Already validated identifiers used instead of reading input_path, defaults to None
+    :type data: List[tuple], optional
+    :param journal_path: Path to the journal where results are saved as soon as each entity is scraped,
+        defaults to None which disables journaling
+    :type journal_path: str, optional
+    :param resume: Specifies whether (entity, source) pairs completed in the journal are restored instead of being
+        scraped again, defaults to False
+    :type resume: bool, optional
+    :param shard: Number of the shard scraped by this manager in a sharded scrape, defaults to None
+    :type shard: int, optional
+    :param freshness_path: Path to the freshness store, results of sources whose time to live has not expired are
+        reused instead of being scraped, defaults to None which disables incremental scraping
+    :type freshness_path: str, optional
+    :param ttls: Time to live in seconds of every source, overrides FreshnessStore.DEFAULT_TTLS, defaults to None
+    :type ttls: dict, optional
+    :param rate_limits: Requests per second and requests in flight of every host, overrides
+        RateLimiter.DEFAULT_LIMITS, defaults to None
+    :type rate_limits: dict, optional
+    :param analyze_sentiment: Specifies whether scraped news are scored by the sentiment model, defaults to True
+    :type analyze_sentiment: bool, optional
+    :param capture_mode: 'record' to capture every loaded page to the page store, 'replay' to serve pages from it
+        without network access, defaults to None which disables the capture
+    :type capture_mode: str, optional
+    :param capture_path: Path to the page store used in record and replay mode, defaults to None
+    :type capture_path: str, optional
+    :param results_path: Directory where results are written in partitions as soon as entities are scraped,
+        partitions of the previous run are removed when a scrape starts, other files are kept, defaults to None
+        which means a temporary directory removed together with the manager
+    :type results_path: str, optional
+    :param database_path: Path to the database results are inserted to by a background writer while they are
+        scraped, defaults to None which means they are not inserted
+    :type database_path: str, optional
+    :param clear_database: Specifies whether tables of the database are dropped before the scrape,
+        defaults to False
+    :type clear_database: bool, optional
+    :param entity_timeouts: Time budget in seconds of scraping a single entity from every source, None or 0
+        disables the budget of a source, overrides DEFAULT_ENTITY_TIMEOUTS, defaults to None
+    :type entity_timeouts: dict, optional
+    :param run_timeout: Time budget in seconds of the whole scrape, entities left when it is exceeded are not
+        scraped, defaults to None which means no limit
+    :type run_timeout: float, optional
+    :param entity_attempts: Maximum number of attempts of scraping a single entity from REGON, KRS, stock names and
+        ALEO which failed with a transient error, e.g. a browser crash, defaults to 2
+    :type entity_attempts: int, optional
+    :param identity_path: Path to the identity index linking NIP, REGON and KRS numbers of the same company found
+        in REGON and KRS results, reused by the next runs, defaults to None which means links are only kept
+        during the run
+    :type identity_path: str, optional
+    :param regon_backend: 'selenium' to search REGON with a browser, 'http' to query the BIR service directly with
+        RegonClient, defaults to 'selenium'
+    :type regon_backend: str, optional
+    :param local_unit_workers: Number of local units of a REGON entity scraped at once by LocalUnitCrawler, each
+        with its own browser or HTTP session, defaults to 2
+    :type local_unit_workers: int, optional
+    :param pkd_path: Path to the PKD dictionary with names of the PKD codes scraped from REGON, reused by the next
+        runs, defaults to None which means names are only kept during the run
+    :type pkd_path: str, optional
     """
 
-    def __init__(self, input_path: str, log_scrap_info: bool = False):
+    # scrapers check their budget before every page load, HTTP request and wait for a page
+    DEFAULT_ENTITY_TIMEOUTS = {
+        'regon': 600,
+        'krs': 120,
+        'stock_name': 120,
+        'aleo': 120,
+        'bankier': 600,
+        'infostrefa': 600,
+        # all the local units of an entity, each of them has its own budget in LocalUnitCrawler
+        'regon_local': 0
+    }
+
+    # classes getting entities from REGON, all of them return the same DataFrames from get_entity_info
+    REGON_BACKENDS = {
+        'selenium': RegonScraper,
+        'http': RegonClient
+    }
+
+    def __init__(self, input_path: str = None, log_scrap_info: bool = False, queue_size: int = 16, workers: int = 1,
+                 data: List[tuple] = None, journal_path: str = None, resume: bool = False, shard: int = None,
+                 freshness_path: str = None, ttls: dict = None, rate_limits: dict = None,
+                 analyze_sentiment: bool = True, capture_mode: str = None, capture_path: str = None,
+                 results_path: str = None, database_path: str = None, clear_database: bool = False,
+                 entity_timeouts: dict = None, run_timeout: float = None, entity_attempts: int = 2,
+                 identity_path: str = None, regon_backend: str = 'selenium', local_unit_workers: int = 2,
+                 pkd_path: str = None):
         """Constructor method.
         """
-        data, errors = InputValidator(input_path).validate_input()
+        if data is None:
+            data, errors = InputValidator(input_path).validate_input()
+        else:
+            errors = []
         self.log_scrap_info = log_scrap_info
+        self.queue_size = queue_size
+        self.workers = workers
+        self.journal_path = journal_path
+        self.resume = resume
+        self.shard = shard
+        self.journal = None
+        self.freshness_path = freshness_path
+        self.ttls = ttls
+        self.rate_limits = rate_limits
+        self.analyze_sentiment = analyze_sentiment
+        self.capture_mode = capture_mode
+        self.capture_path = capture_path
+        self.results = ResultStore(results_path)
+        self.database_path = database_path
+        self.clear_database = clear_database
+        self.entity_timeouts = {**self.DEFAULT_ENTITY_TIMEOUTS, **(entity_timeouts or {})}
+        self.run_timeout = run_timeout
+        self._run_deadline = Deadline(run_timeout, name='run budget')
+        self.entity_attempts = entity_attempts
+        # single pages are already retried by the rate limiter, these retries repeat the whole entity
+        self.retry_policy = RetryPolicy(attempts=entity_attempts, base_delay=2.0)
+        self.identity_path = identity_path
+        self.identities = IdentityIndex(identity_path)
+        self.duplicates = []
+        if regon_backend not in self.REGON_BACKENDS:
+            raise ValueError(f"Unknown REGON backend: {regon_backend}")
+        self.regon_backend = regon_backend
+        self.local_unit_workers = local_unit_workers
+        self.pkd_path = pkd_path
+        self.pkd_dictionary = get_pkd_dictionary()
+        self.pkd_dictionary.configure(pkd_path)
+        self.stage_latencies = {}
+        self.metrics = get_metrics()
+        self.freshness_store = None
         self.data = data
         self.errors = errors
 
         self.logger = get_logger()
+        self._reset_results()
 
     def scrap(self) -> None:
-        """Runs all the scrapers, some scrapers might be running parallelly.
+        """Runs all the scrapers. With more than one worker the input is split into shards scraped by separate
+        processes, otherwise the pipeline runs in the current process. Run metrics are collected in metrics.
         """
-        # run regon and krs scrapers parallelly
-        regon_thread = Thread(target=self._run_regon_scraper)
-        krs_thread = Thread(target=self._run_krs_scraper)
-
-        self.logger.info('Starting scraping regon and krs')
-        regon_thread.start()
-        krs_thread.start()
-
-        regon_thread.join()
-        krs_thread.join()
-        self.logger.info('Stopped scraping regon and krs')
-
-        self.logger.info('Starting scraping stock names')
-        self._run_stock_name_scraper()
-        self.logger.info('Stopped scraping stock names')
-
-        # run aleo, infostrefa and bankier parallelly
-        aleo_thread = Thread(target=self._run_aleo_scraper)
-        infostrefa_thread = Thread(target=self._run_infostrefa_scraper)
-        bankier_thread = Thread(target=self._run_bankier_scraper)
-
-        self.logger.info('Starting scraping aleo infostrefa and bankier')
-        aleo_thread.start()
-        infostrefa_thread.start()
-        bankier_thread.start()
+        self._run_deadline = Deadline(self.run_timeout, name='run budget')
+        self.metrics.reset()
+        self.identities.clear_claims()
+        self._dedupe_input()
+        if self.database_path and self.shard is None:
+            # shards insert into tables created once by the parent
+            DataBaseManager(self.database_path, self.clear_database).create_tables()
+        if self.workers > 1 and len(self.data) > 1:
+            self._scrap_sharded()
+        else:
+            self._scrap_pipeline()
+        self.metrics.finish()
+
+    def cancel(self) -> None:
+        """Stops the scrape running in this process, e.g. from another thread. Scrapers stop at their next page load,
+        request or wait, the entities left are recorded as timed out and whatever was scraped so far is saved.
+        """
+        self._run_deadline.cancel()
 
-        aleo_thread.join()
-        infostrefa_thread.join()
-        bankier_thread.join()
-        self.logger.info('Stopped scraping aleo infostrefa and bankier')
+    def _scrap_sharded(self) -> None:
+        """Scraps shards of the input in worker processes and merges their results.
+        """
+        workers = min(self.workers, len(self.data))
+        # round robin keeps shards balanced when the input is sorted by identifier type
+        shards = [self.data[i::workers] for i in range(workers)]
+        self._reset_results()
+        self.stage_latencies = {}
+        if self.journal_path:
+            # shards always load the journal, so a fresh scrape removes entries of the previous run up front
+            ScrapJournal(self.journal_path, resume=self.resume)
+
+        self.logger.info(f'Scraping {len(self.data)} entities in {workers} processes')
+        # spawned processes do not inherit threads and browser sessions of the parent
+        context = get_context('spawn')
+        in_flight = _shared_in_flight(self.rate_limits, context)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_shard_process,
+                                 initargs=(in_flight,)) as executor:
+            options = {
+                'log_scrap_info': self.log_scrap_info,
+                'queue_size': self.queue_size,
+                'journal_path': self.journal_path,
+                'freshness_path': self.freshness_path,
+                'ttls': self.ttls,
+                'rate_limits': _split_rate_limits(self.rate_limits, workers),
+                'analyze_sentiment': self.analyze_sentiment,
+                'capture_mode': self.capture_mode,
+                'capture_path': self.capture_path,
+                'database_path': self.database_path,
+                'entity_timeouts': self.entity_timeouts,
+                'entity_attempts': self.entity_attempts,
+                'identity_path': self.identity_path,
+                'regon_backend': self.regon_backend,
+                'local_unit_workers': self.local_unit_workers,
+                'pkd_path': self.pkd_path,
+                # shards start now, so the run budget left is theirs
+                'run_timeout': None if self.run_timeout is None else self._run_deadline.remaining()
+            }
+            # shards write results to their own directories, only handles of them are sent back
+            futures = [executor.submit(_scrap_shard, shard, shard_number,
+                                       {**options, 'results_path': self.results.subdirectory(f'shard-{shard_number}')})
+                       for shard_number, shard in enumerate(shards)]
+            for count, future in enumerate(futures):
+                try:
+                    results, stage_latencies, metrics = future.result()
+                    for handle in results.values():
+                        self.results.adopt(handle)
+                    self.metrics.merge(metrics)
+                    for name, latencies in stage_latencies.items():
+                        self.stage_latencies.setdefault(name, []).extend(latencies)
+                    self.logger.info(f'{count + 1}/{workers} shard scraped')
+                except Exception as e:
+                    self.logger.error(f'{count + 1}/{workers} shard could not be scraped - {e}')
+
+    def _dedupe_input(self) -> None:
+        """Removes input rows naming a company named by an earlier row, with the same identifier or with another one
+        linked to it by the identity index. Removed rows are kept in duplicates together with the rows kept instead.
+        """
+        self.data, duplicates = self.identities.dedupe(self.data)
+        self.duplicates += duplicates
+        for row, kept in duplicates:
+            for source in ['regon', 'krs']:
+                self.metrics.record_duplicate(source)
+            if self.log_scrap_info:
+                self.logger.info(f"Input row {row} skipped, the same entity as {kept}",
+                                 extra=log_fields('regon', ','.join(row)))
+        if duplicates:
+            self.logger.info(f'{len(duplicates)} duplicate input rows skipped')
+
+    def _scrap_pipeline(self) -> None:
+        """Runs all the scrapers as a streaming pipeline. Every entity flows REGON -> stock name -> Aleo, Infostrefa
+        and Bankier as soon as its own inputs are ready, KRS runs alongside REGON. Stages are connected with bounded
+        queues. News are scored by the sentiment worker while they are scraped, so network-bound scraping overlaps
+        with sentiment analysis.
+        """
+        self._reset_results()
+        get_rate_limiter().configure(self.rate_limits)
+        get_page_capture().configure(self.capture_mode, self.capture_path)
+        self._size_driver_pool()
+        if self.journal_path:
+            self.journal = ScrapJournal(self.journal_path, resume=self.resume or self.shard is not None,
+                                        shard=self.shard)
+        if self.freshness_path:
+            self.freshness_store = FreshnessStore(self.freshness_path, self.ttls)
+
+        # input rows are already in memory, so the first stages are not bounded and KRS does not wait for REGON
+        regon_stage = PipelineStage('Regon', self._regon_handler, 0, on_stop=self._finish_regon)
+        # fed by the REGON handler, so local units of large entities do not hold back the next entities
+        self._local_unit_stage = PipelineStage('RegonLocal', self._local_unit_handler, self.queue_size,
+                                               on_stop=self._finish_local_units)
+        krs_stage = PipelineStage('Krs', self._krs_handler, 0)
+        stock_name_stage = PipelineStage('StockName', self._stock_name_handler, self.queue_size,
+                                         on_stop=self._stock_name_scraper_close)
+        aleo_stage = PipelineStage('Aleo', self._aleo_handler, self.queue_size)
+        bankier_stage = PipelineStage('Bankier', self._bankier_handler, self.queue_size,
+                                      on_stop=self._finish_bankier)
+        infostrefa_stage = PipelineStage('Infostrefa', self._infostrefa_handler, self.queue_size,
+                                         on_stop=self._finish_infostrefa)
+
+        regon_stage.connect(stock_name_stage)
+        regon_stage.connect(aleo_stage)
+        stock_name_stage.connect(bankier_stage)
+        stock_name_stage.connect(infostrefa_stage)
+
+        stages = [regon_stage, self._local_unit_stage, krs_stage, stock_name_stage, aleo_stage, bankier_stage,
+                  infostrefa_stage]
+        self.stage_latencies = {stage.name: stage.latencies for stage in stages}
+
+        database_writer = None
+        if self.database_path:
+            database_writer = DataBaseWriter(self.database_path)
+            database_writer.start()
+            self.results.on_append = database_writer.submit
+
+        self.logger.info('Scraping pipeline started')
+        if self.analyze_sentiment:
+            self._sentiment_worker.start()
+        for stage in stages:
+            stage.start()
+
+        for row in self.data:
+            regon_stage.put(row)
+            krs_stage.put(row)
+        regon_stage.close()
+        krs_stage.close()
+
+        for stage in stages:
+            stage.join()
+        self._local_unit_stage = None
+        if self.analyze_sentiment:
+            self._sentiment_worker.close()
+            self._sentiment_worker.join()
+        self._finish_sentiment()
+        if database_writer is not None:
+            self.results.on_append = None
+            database_writer.close()
+            database_writer.join()
+            self.logger.info(f'Rows inserted into the database: {database_writer.inserted}')
+            if database_writer.dropped:
+                self.logger.error(f'Rows dropped by the database: {database_writer.dropped}')
+        if self.freshness_store is not None:
+            self.freshness_store.close()
+        self._finish_results()
+        self.logger.info('Scraping pipeline finished')
+
+    def scrap_task(self, source: str, item: tuple) -> List[tuple]:
+        """Scraps a single (source, item) task outside of the pipeline, used by workers of a distributed scrape.
+        Results are saved in the journal like in the pipeline, scrapers are kept open for the next tasks.
+
+        :param source: Name of the pipeline stage, one of SOURCES
+        :type source: str
+        :param item: Item the stage handles, an input row for regon and krs, (nip, nazwa) for stock_name and aleo,
+            (nip, nazwa_gieldowa) for bankier and infostrefa
+        :type item: tuple
+        :return: Items emitted for the next stages
+        :rtype: List[tuple]
+        """
+        handlers = {
+            'regon': self._regon_handler,
+            'krs': self._krs_handler,
+            'stock_name': self._stock_name_handler,
+            'aleo': self._aleo_handler,
+            'bankier': self._bankier_handler,
+            'infostrefa': self._infostrefa_handler
+        }
+        self._size_driver_pool()
+        # the queue hands out every task once, a repeated task was not completed before
+        self._seen_entities.clear()
+        self._seen_nips.clear()
+        self._seen_stock_names.clear()
+        self.identities.clear_claims()
+        return handlers[source](tuple(item)) or []
+
+    def _size_driver_pool(self) -> None:
+        """Makes room in the driver pool for a browser of every stage and of every scraper of local units, they keep
+        their browsers until the pipeline ends, so with fewer browsers stages would wait for each other forever.
+        """
+        local_unit_browsers = self.local_unit_workers if self.regon_backend == 'selenium' else 0
+        get_driver_pool().ensure_size(PIPELINE_BROWSERS + local_unit_browsers)
 
-        sentiment_info_thread = Thread(target=self._run_info_sentiment)
-        sentiment_bankier_thread = Thread(target=self._run_bankier_sentiment())
-        sentiment_time_thread = Thread(target=self._run_time_scv())
+    def close_scrapers(self) -> None:
+        """Closes scrapers kept open by scrap_task.
+        """
+        for scraper in [self._regon_scraper, self._local_unit_crawler, self._stock_name_scraper,
+                        *self._news_scrapers.values()]:
+            if scraper is not None:
+                scraper.close()
+        self._regon_scraper = None
+        self._local_unit_crawler = None
+        self._stock_name_scraper = None
+        self._news_scrapers = {}
+
+    def _reset_results(self) -> None:
+        """Removes results of the previous run and prepares containers filled by the pipeline stages.
+        """
+        self.results.clear()
+        for name, columns in RESULT_COLUMNS.items():
+            self.results.declare(name, columns)
+        self._stock_names = {}
+
+        self._regon_scraper = None
+        self._local_unit_crawler = None
+        self._local_unit_stage = None
+        self._stock_name_scraper = None
+        self._news_scrapers = {}
+        self._news_keys = {}
+        self._sentiment_worker = SentimentWorker(on_entity=self._store_sentiment)
+
+        self._seen_entities = set()
+        self._seen_nips = set()
+        self._seen_stock_names = set()
+        self._counters = {}
+        # PKD codes whose dictionary entries are in the results of the run
+        self._pkd_codes = set()
+        self._pkd_lock = Lock()
+
+    def _count(self, stage: str) -> str:
+        """Increments a counter of items handled by the stage, only called from the stage's own thread.
+        """
+        self._counters[stage] = self._counters.get(stage, 0) + 1
+        return str(self._counters[stage])
 
-        self.logger.info('Sentiment analysis started')
-        sentiment_bankier_thread.start()
-        sentiment_info_thread.start()
-        sentiment_time_thread.start()
+    @contextmanager
+    def _scope(self, source: str, key: str) -> Iterator[dict]:
+        """Measures scraping of a single entity from the source within its time budget, which ends no later than
+        the budget of the run. An exceeded budget is recorded as a timeout of the entity.
+        """
+        with self.metrics.scope(source, key) as record:
+            try:
+                with deadline_scope(self.entity_timeouts.get(source) or None, self._run_deadline, 'entity budget'):
+                    check_deadline()
+                    yield record
+            except DeadlineExceeded as e:
+                record['timed_out'] = True
+                # once the run is over every entity left stops, those are sampled like other info logs
+                log = self.logger.info if self._run_deadline.expired else self.logger.warning
+                log(f"{source} scraping of {key} stopped - {e}", extra=log_fields(source, key))
+                raise
+
+    def _retried(self, source: str, key: str, function: Callable[[], Any]) -> Any:
+        """Scraps a single entity, repeating it after transient errors within the time budget of the entity. News
+        are not repeated, their rows are streamed to the results while they are scraped.
+        """
+        def on_retry(e: BaseException) -> None:
+            self.metrics.record_retry()
+            self.logger.warning(f"{source} scraping of {key} failed, retrying - {e}", extra=log_fields(source, key))
 
-        sentiment_info_thread.join()
-        sentiment_bankier_thread.join()
-        sentiment_time_thread.join()
-        self.logger.info('Sentiment analysis finished')
+        return self.retry_policy.call(function, on_retry)
 
-    def _run_aleo_scraper(self) -> None:
-        """Runs scraper responsible for scraping ALEO.
+    def _claimed(self, source: str, row: tuple, counter: str) -> bool:
+        """Claims the entity of an input row for the source, rows of an entity already scraped from the source
+        in this run, e.g. by another identifier linked to it meanwhile, are counted as duplicates and skipped.
         """
-        # scraping from regon NIPs
-        account_numbers_df = pd.DataFrame(columns=['nip', 'account_number'])
-        shareholders_df = pd.DataFrame(columns=['nip', 'shareholder'])
-
-        nips = self.regon_entity_df.nip.copy().drop_duplicates()
+        if self.identities.claim(source, row[0], row[1]):
+            return True
+        self.metrics.record_duplicate(source)
+        if self.log_scrap_info:
+            self.logger.info(f"{counter} {source} skipped, entity already scraped: {row}",
+                             extra=log_fields(source, ','.join(row)))
+        return False
+
+    def _stored(self, source: str, key: str, counter: str, content: str = None) -> Optional[dict]:
+        """Returns the result of a (source, entity) pair completed in the journal or still fresh in the freshness
+        store. Results derived from other content are only returned if they were made from the same content.
+        """
+        entry, origin = None, None
+        if self.journal is not None:
+            entry, origin = self.journal.get(source, key), 'journal'
+        if entry is None and self.freshness_store is not None:
+            entry, origin = self.freshness_store.get(source, key), 'freshness store'
+            if entry is not None and self.journal is not None:
+                self.journal.record(source, key, entry['frames'], entry['value'])
+
+        if entry is None or (content is not None and entry['value'] != content):
+            return None
+        self.metrics.record_restored(source)
+        if self.log_scrap_info:
+            self.logger.info(f"{counter} {source} restored from {origin}: {key}", extra=log_fields(source, key))
+        return entry
+
+    def _store(self, source: str, key: str, frames: dict = None, value=None) -> None:
+        """Saves the result of a completed (source, entity) pair in the journal and in the freshness store.
+        """
+        if self.journal is not None:
+            self.journal.record(source, key, frames, value)
+        if self.freshness_store is not None:
+            self.freshness_store.put(source, key, frames, value)
 
-        for count, nip in enumerate(nips):
-            counter = str(count + 1) + '/' + str(len(nips))
+    def _regon_handler(self, row: tuple) -> List[tuple]:
+        """Scraps REGON for a single input row and emits entities found there, every entity is emitted only once.
+        """
+        counter = f'{self._count("regon")}/{len(self.data)}'
+        key = ','.join(row)
+        if not self._claimed('regon', row, counter):
+            return []
+        entry = self._stored('regon', key, counter)
+        if entry is not None:
+            e_df, l_df, p_df = entry['frames']['entity'], entry['frames']['local_entity'], self._restored_pkd(entry)
+            # entries of older runs have all the local units in their frames
+            local_units = entry['value'] or []
+        else:
             try:
-                account_numbers, shareholders = get_href_links(nip)
-                for account_number in account_numbers:
-                    account_numbers_df.loc[len(account_numbers_df)] = [nip, account_number]
-
-                for shareholder in shareholders:
-                    shareholders_df.loc[len(shareholders_df)] = [nip, shareholder]
-
+                with self._scope('regon', key):
+                    # the browser is leased within the budget of the entity
+                    if self._regon_scraper is None:
+                        self._regon_scraper = self.REGON_BACKENDS[self.regon_backend]()
+                    e_df, l_df, p_df = self._retried(
+                        'regon', key, lambda: self._regon_scraper.get_entity_info(row[0], row[1], local_units=False))
+                local_units = self._regon_scraper.local_units
+                self._store('regon', key, {'entity': e_df, 'local_entity': l_df, 'pkd': p_df,
+                                           'pkd_dictionary': self.pkd_dictionary.to_dataframe(p_df['kod'])},
+                            local_units)
                 if self.log_scrap_info:
-                    self.logger.info(f"{counter} AleoScraper scraped: {nip}")
+                    self.logger.info(f"{counter} RegonScrapper scraped: {row}", extra=log_fields('regon', key))
             except:
                 if self.log_scrap_info:
-                    self.logger.error(f"{counter} AleoScraper could not scrap: {nip}")
-
-        self.aleo_account_numbers_df = account_numbers_df
-        self.aleo_shareholders_df = shareholders_df
-
-    def _run_info_sentiment(self) -> None:
-        """Runs sentiment analyzer for Infostrefa
+                    self.logger.error(f"{counter} RegonScrapper could not scrap: {row}", extra=log_fields('regon', key))
+                self.identities.release('regon', row[0], row[1])
+                return []
+
+        identifiers = list(e_df[['nip', 'regon']].itertuples(index=False, name=None))
+        # a search may find several entities, the identifier of the row only names the entity if it found one
+        for nip, regon in identifiers:
+            self.identities.link([(nip, 'NIP'), (regon, 'REGON')] + ([row] if len(identifiers) == 1 else []))
+
+        self.results.append('regon_entity_df', e_df)
+        self.results.append('regon_local_entity_df', l_df)
+        self._append_pkd(p_df)
+        if local_units:
+            found = set(l_df['regon']) if 'regon' in l_df else set()
+            local_units = [tuple(unit) for unit in local_units if unit[0] not in found]
+            if self._local_unit_stage is not None:
+                self._local_unit_stage.put((key, local_units))
+            else:
+                self._local_unit_handler((key, local_units))
+
+        entities = []
+        for entity in e_df[['nip', 'nazwa']].itertuples(index=False, name=None):
+            # an entity named differently in another row is still the same company
+            seen = self.identities.resolve(entity[0], 'NIP') if entity[0] else entity
+            if seen not in self._seen_entities:
+                self._seen_entities.add(seen)
+                entities.append(entity)
+        return entities
+
+    def _local_unit_handler(self, item: Tuple[str, List[tuple]]) -> None:
+        """Scraps local units of a REGON entity with LocalUnitCrawler and appends them to the results page by page.
+        Units completed in the journal or fresh in the freshness store are restored instead of being scraped, every
+        unit is saved there as soon as it is scraped, so an interrupted entity resumes where it stopped.
         """
-        sentiment_analyzer = SentimentAnalyzer()
-        self.info_sentiment = sentiment_analyzer.get_sentiment_analysis(self.infostrefa_news_df)
+        key, local_units = item
+        if self._local_unit_crawler is None:
+            self._local_unit_crawler = LocalUnitCrawler(self.REGON_BACKENDS[self.regon_backend],
+                                                        self.local_unit_workers, retry_policy=self.retry_policy)
+        crawler = self._local_unit_crawler
+
+        def restore(regon: str) -> Optional[Tuple[pd.DataFrame, pd.DataFrame]]:
+            entry = self._stored('regon_local', regon, key)
+            return None if entry is None else (entry['frames']['local_entity'], self._restored_pkd(entry))
+
+        scraped = 0
+        try:
+            with self._scope('regon_local', key) as record:
+                for page in crawler.crawl(local_units, restore):
+                    for unit in page:
+                        if not unit.restored:
+                            self._store('regon_local', unit.regon, {
+                                'local_entity': unit.local_entity, 'pkd': unit.pkd,
+                                'pkd_dictionary': self.pkd_dictionary.to_dataframe(unit.pkd['kod'])})
+                    if page:
+                        self.results.append('regon_local_entity_df', pd.concat([unit.local_entity for unit in page]))
+                        self._append_pkd(pd.concat([unit.pkd for unit in page]))
+                        scraped += len(page)
+                record['failed'] = bool(crawler.failed)
+        except:
+            self.logger.error(f"Local units of {key} could not be scraped, {scraped} of {len(local_units)} saved",
+                              extra=log_fields('regon_local', key))
+            return
+        if self.log_scrap_info or crawler.failed:
+            log = self.logger.warning if crawler.failed else self.logger.info
+            log(f"{scraped} of {len(local_units)} local units of {key} scraped, {len(crawler.failed)} failed",
+                extra=log_fields('regon_local', key))
+
+    def _restored_pkd(self, entry: dict) -> pd.DataFrame:
+        """Returns PKD codes of a restored entry, names saved with them are added to the PKD dictionary, so they
+        are known to processes and machines other than the one which scraped them.
+        """
+        self.pkd_dictionary.update(entry['frames'].get('pkd_dictionary'))
+        # entries of older runs have names of the codes in their rows
+        return self.pkd_dictionary.encode(entry['frames']['pkd'])
 
-    def _run_bankier_sentiment(self) -> None:
-        """Runs sentiment analyzer for Bankier
+    def _append_pkd(self, p_df: pd.DataFrame) -> None:
+        """Appends PKD codes to the results together with dictionary entries of the codes new in the run.
+        """
+        self.results.append('regon_pkd_df', p_df)
+        if p_df.empty:
+            return
+        with self._pkd_lock:
+            codes = set(p_df['kod']) - self._pkd_codes
+            self._pkd_codes |= codes
+        if codes:
+            self.results.append('regon_pkd_dictionary_df', self.pkd_dictionary.to_dataframe(codes))
+
+    def _krs_handler(self, row: tuple) -> None:
+        """Scraps KRS for a single input row.
+        """
+        counter = f'{self._count("krs")}/{len(self.data)}'
+        key = ','.join(row)
+        if not self._claimed('krs', row, counter):
+            return
+        entry = self._stored('krs', key, counter)
+        if entry is not None:
+            self.results.append('krs_representatives_df', entry['frames']['representatives'])
+            self.results.append_rows('krs_general_info_df', [entry['value']], KRS_GENERAL_INFO_COLUMNS)
+            self._link_krs(row, dict(zip(KRS_GENERAL_INFO_COLUMNS, entry['value'])))
+            return
+
+        try:
+            with self._scope('krs', key):
+                gen_info_dict, repr_df = self._retried('krs', key,
+                                                       lambda: KrsScraper(idx=row[0], id_type=row[1]).scrap())
+
+            self.results.append('krs_representatives_df', repr_df)
+            self.results.append_rows('krs_general_info_df', [list(gen_info_dict.values())], KRS_GENERAL_INFO_COLUMNS)
+            self._store('krs', key, {'representatives': repr_df}, list(gen_info_dict.values()))
+            self._link_krs(row, gen_info_dict)
+            if self.log_scrap_info:
+                self.logger.info(f"{counter} KrsScraper scraped: {row}", extra=log_fields('krs', key))
+        except:
+            if self.log_scrap_info:
+                self.logger.error(f"{counter} KrsScraper could not scrap: {row}", extra=log_fields('krs', key))
+            self.identities.release('krs', row[0], row[1])
+
+    def _link_krs(self, row: tuple, general_info: dict) -> None:
+        """Links the identifier of the input row with the KRS, NIP and REGON numbers of the entity found in KRS.
         """
-        sentiment_analyzer = SentimentAnalyzer()
-        self.bankier_sentiment = sentiment_analyzer.get_sentiment_analysis(self.bankier_news_df)
+        self.identities.link([row, (general_info.get('krs'), 'KRS'), (general_info.get('nip'), 'NIP'),
+                              (general_info.get('regon'), 'REGON')])
 
-    def _run_time_scv(self) -> None:
-        """Generates time tables for Infostrefa and Bankier news, and then combines them into a single table time_df
+    def _stock_name_handler(self, entity: tuple) -> List[tuple]:
+        """Scraps the stock name of a single entity and emits it for the news scrapers.
+        """
+        nip, name = entity
+        counter = self._count('stock_name')
+        key = f'{nip},{name}'
+        entry = self._stored('stock_name', key, counter)
+        if entry is not None:
+            stock_name = entry['value']
+        else:
+            try:
+                with self._scope('stock_name', key):
+                    if self._stock_name_scraper is None:
+                        self._stock_name_scraper = StockNameScraper(pd.DataFrame(columns=['nazwa', 'nip']),
+                                                                    print_info=self.log_scrap_info)
+                    stock_name = self._retried('stock_name', key,
+                                               lambda: self._stock_name_scraper.get_stock_name(name))
+                self._store('stock_name', key, value=stock_name)
+                if self.log_scrap_info:
+                    self.logger.info(f"{counter} StockNameScraper scraped: {nip}", extra=log_fields('stock_name', key))
+            except:
+                if self.log_scrap_info:
+                    self.logger.error(f"{counter} StockNameScraper could not scrap: {nip}",
+                                      extra=log_fields('stock_name', key))
+                stock_name = ''
+
+        self._stock_names[entity] = stock_name
+        # entities which are not listed have no news on bankier and infostrefa
+        if not stock_name or (nip, stock_name) in self._seen_stock_names:
+            return []
+        self._seen_stock_names.add((nip, stock_name))
+        return [(nip, stock_name)]
+
+    def _aleo_handler(self, entity: tuple) -> None:
+        """Scraps ALEO for a single entity.
+        """
+        nip = entity[0]
+        if nip in self._seen_nips:
+            return
+        self._seen_nips.add(nip)
+
+        counter = self._count('aleo')
+        entry = self._stored('aleo', nip, counter)
+        if entry is not None:
+            self.results.append('aleo_account_numbers_df', entry['frames']['account_numbers'])
+            self.results.append('aleo_shareholders_df', entry['frames']['shareholders'])
+            return
+
+        try:
+            with self._scope('aleo', nip):
+                account_numbers, shareholders = self._retried('aleo', nip, lambda: get_href_links(nip))
+            account_numbers_df = pd.DataFrame([[nip, account_number] for account_number in account_numbers],
+                                              columns=RESULT_COLUMNS['aleo_account_numbers_df'])
+            shareholders_df = pd.DataFrame([[nip, shareholder] for shareholder in shareholders],
+                                           columns=RESULT_COLUMNS['aleo_shareholders_df'])
+            self.results.append('aleo_account_numbers_df', account_numbers_df)
+            self.results.append('aleo_shareholders_df', shareholders_df)
+            self._store('aleo', nip, {'account_numbers': account_numbers_df, 'shareholders': shareholders_df})
+
+            if self.log_scrap_info:
+                self.logger.info(f"{counter} AleoScraper scraped: {nip}", extra=log_fields('aleo', nip))
+        except:
+            if self.log_scrap_info:
+                self.logger.error(f"{counter} AleoScraper could not scrap: {nip}", extra=log_fields('aleo', nip))
+
+    def _bankier_handler(self, entity: tuple) -> None:
+        """Scraps Bankier for a single entity, its news are scored by the sentiment worker while being scraped.
         """
-        sentiment_analyzer = SentimentAnalyzer()
+        self._scrap_news('bankier', entity)
 
-        info_time_df = sentiment_analyzer.generate_time_table(self.infostrefa_news_df)
-        bank_time_df = sentiment_analyzer.generate_time_table(self.bankier_news_df)
+    def _infostrefa_handler(self, entity: tuple) -> None:
+        """Scraps Infostrefa for a single entity, its news are scored by the sentiment worker while being scraped.
+        """
+        self._scrap_news('infostrefa', entity)
 
-        self.time_df = pd.concat([info_time_df, bank_time_df], ignore_index=True)
+    def _scrap_news(self, source: str, entity: tuple) -> None:
+        """Scraps news of a single entity from the source. Every news row is passed to the sentiment worker as soon
+        as the scraper finds it.
+        """
+        nip, stock_name = entity
+        counter = self._count(source)
+        scraper_name = NEWS_SCRAPER_NAMES[source]
+        key = f'{nip},{stock_name}'
+        entry = self._stored(source, key, counter)
+        if entry is not None:
+            news_df = entry['frames']['news']
+            self.results.append(f'{source}_news_df', news_df)
+            self._analyze_restored_news(source, key, news_df, counter)
+            return
+
+        self._news_keys[source] = key
+        scraper = None
+        complete = False
+        try:
+            with self._scope(source, key):
+                # the browser is leased within the budget of the entity
+                scraper = self._news_scraper(source)
+                found = scraper.scrap_entity(nip, stock_name)
+            complete = True
+            if found is not False and self.log_scrap_info:
+                self.logger.info(f"{counter} {scraper_name} scraped: {nip}", extra=log_fields(source, key))
+        except:
+            if self.log_scrap_info:
+                self.logger.error(f"{counter} {scraper_name} could not scrap: {nip}", extra=log_fields(source, key))
+
+        if scraper is None:
+            return
+        # rows scraped before a failure are kept and analyzed too, but only complete news are stored
+        news_df = scraper.news.to_dataframe()
+        scraper.news.clear()
+        self.results.append(f'{source}_news_df', news_df)
+        if complete:
+            self._store(source, key, {'news': news_df})
+        if self.analyze_sentiment and not news_df.empty:
+            self._sentiment_worker.finish_entity(source, key, complete, content_hash({'news': news_df}))
+
+    def _news_scraper(self, source: str) -> Any:
+        """Returns the news scraper of the source, created on first use.
+        """
+        scraper = self._news_scrapers.get(source)
+        if scraper is None:
+            scraper_class = BankierScraper if source == 'bankier' else InfoStrefaScraper
+            on_news = None
+            if self.analyze_sentiment:
+                on_news = lambda row: self._sentiment_worker.submit(source, self._news_keys[source], row)
+            scraper = scraper_class(pd.DataFrame(columns=['nip', 'nazwa_gieldowa']),
+                                    print_info=self.log_scrap_info, on_news=on_news)
+            self._news_scrapers[source] = scraper
+        return scraper
+
+    def _analyze_restored_news(self, source: str, key: str, news_df: pd.DataFrame, counter: str) -> None:
+        """Restores sentiment of restored news if it was made from the same news, otherwise sends them to
+        the sentiment worker.
+        """
+        if not self.analyze_sentiment or news_df.empty:
+            return
+
+        news_hash = content_hash({'news': news_df})
+        entry = self._stored(f'sentiment_{source}', key, counter, news_hash)
+        if entry is not None:
+            self.results.append(SENTIMENT_RESULTS[source], entry['frames']['sentiment'])
+            self.results.append('time_df', entry['frames']['time'])
+            return
+
+        for row in news_df.values.tolist():
+            self._sentiment_worker.submit(source, key, row)
+        self._sentiment_worker.finish_entity(source, key, True, news_hash)
+
+    def _store_sentiment(self, source: str, key: str, sentiment_df: pd.DataFrame, time_df: pd.DataFrame,
+                         news_hash: str) -> None:
+        """Stores sentiment of all the news of a completely scraped entity, called by the sentiment worker.
+        """
+        self._store(f'sentiment_{source}', key, {'sentiment': sentiment_df, 'time': time_df}, news_hash)
 
-    def _run_stock_name_scraper(self) -> None:
-        """Runs scraper responsible for scraping entities stock names.
+    def _finish_regon(self) -> None:
+        """Closes REGON scraper, no more local units are sent to their stage.
         """
-        entities_df = self.regon_entity_df[["nazwa", "nip"]].copy().drop_duplicates()
-        scraper = StockNameScraper(entities_df, print_info=self.log_scrap_info)
-        stock_names = scraper.get_data()
-        self.regon_entity_df['nazwa_gieldowa'] = stock_names
+        if self._regon_scraper is not None:
+            self._regon_scraper.close()
+        if self._local_unit_stage is not None:
+            self._local_unit_stage.close()
 
-    def _run_infostrefa_scraper(self) -> None:
-        """Runs scraper responsible for scraping Infostrefa.
+    def _finish_local_units(self) -> None:
+        """Closes scrapers of local units.
         """
-        # scraping from regon NIPs and names
-        entities_df = self.regon_entity_df[["nip", "nazwa_gieldowa"]].copy().drop_duplicates()
-        scraper = InfoStrefaScraper(entities_df, print_info=self.log_scrap_info)
-        self.infostrefa_news_df = scraper.get_data()
+        if self._local_unit_crawler is not None:
+            self._local_unit_crawler.close()
 
-    def _run_bankier_scraper(self) -> None:
-        """Runs scraper responsible for scraping Bankier.
+    def _stock_name_scraper_close(self) -> None:
+        """Closes stock name scraper.
         """
-        # scraping from regon NIPs and names
-        entities_df = self.regon_entity_df[["nip", "nazwa_gieldowa"]].copy().drop_duplicates()
-        scraper = BankierScraper(entities_df, print_info=self.log_scrap_info)
-        self.bankier_news_df = scraper.get_data()
+        if self._stock_name_scraper is not None:
+            self._stock_name_scraper.close()
 
-    def _run_krs_scraper(self) -> None:
-        """Runs scraper responsible for scraping KRS.
+    def _finish_bankier(self) -> None:
+        """Closes Bankier scraper.
         """
-        general_info_df = pd.DataFrame(columns=[
-            "nazwa", "krs", "nip", "regon", "forma_prawna", "data_wpisu_do_rej_przeds", "data_wykr_z_rej_przeds",
-            "nazwa_org_repr", "sposob_repr", "adr_www", "email"])
-        representants_df = pd.DataFrame()
+        if 'bankier' in self._news_scrapers:
+            self._news_scrapers['bankier'].close()
 
-        for count, row in enumerate(self.data):
-            counter = f'{str(count + 1)}/{len(self.data)}'
-            try:
-                scraper = KrsScraper(idx=row[0], id_type=row[1])
-                gen_info_dict, repr_df = scraper.scrap()
+    def _finish_infostrefa(self) -> None:
+        """Closes Infostrefa scraper.
+        """
+        if 'infostrefa' in self._news_scrapers:
+            self._news_scrapers['infostrefa'].close()
 
-                representants_df = pd.concat([representants_df, repr_df], axis=0).reset_index(drop=True)
-                general_info_df.loc[len(general_info_df)] = gen_info_dict.values()
-                if self.log_scrap_info:
-                    self.logger.info(f"{counter} KrsScraper scraped: {row}")
-            except:
-                if self.log_scrap_info:
-                    self.logger.error(f"{counter} KrsScraper could not scrap: {row}")
+    def _finish_sentiment(self) -> None:
+        """Saves results of the sentiment worker, restored sentiment is saved as soon as it is restored.
+        """
+        sentiment_dfs, time_dfs = self._sentiment_worker.get_results()
+        for source in ['infostrefa', 'bankier']:
+            if source in sentiment_dfs:
+                self.results.append(SENTIMENT_RESULTS[source], sentiment_dfs[source])
+                self.results.append('time_df', time_dfs[source])
+
+    def _finish_results(self) -> None:
+        """Adds stock names found by the stock name stage to REGON entities.
+        """
+        def add_stock_names(df: pd.DataFrame) -> pd.DataFrame:
+            entities = zip(df.get('nip', []), df.get('nazwa', []))
+            df['nazwa_gieldowa'] = [self._stock_names.get(entity, '') for entity in entities]
+            return df
 
-        self.krs_representants_df = representants_df
-        self.krs_general_info_df = general_info_df
+        self.results.transform('regon_entity_df', add_stock_names)
 
-    def _run_regon_scraper(self) -> None:
-        """Runs scraper responsible for scraping REGON.
+    def _get_results(self) -> Dict[str, ResultHandle]:
+        """Returns lazy handles of the results saved on disk, keyed by the name of the result.
         """
-        regon_entity_df = pd.DataFrame()
-        regon_local_entity_df = pd.DataFrame()
-        regon_pkd = pd.DataFrame()
+        return {name: self.results.handle(name) for name in RESULT_ATTRIBUTES}
 
-        regon_scraper = RegonScraper()
-
-        for count, row in enumerate(self.data):
-            counter = f'{str(count + 1)}/{len(self.data)}'
-            try:
-                e_df, l_df, p_df = regon_scraper.get_entity_info(row[0], row[1])
-                regon_entity_df = pd.concat([regon_entity_df, e_df], axis=0).reset_index(drop=True)
-                regon_local_entity_df = pd.concat([regon_local_entity_df, l_df], axis=0).reset_index(drop=True)
-                regon_pkd = pd.concat([regon_pkd, p_df], axis=0).reset_index(drop=True)
-                if self.log_scrap_info:
-                    self.logger.info(f"{counter} RegonScrapper scraped: {row}")
-            except:
-                if self.log_scrap_info:
-                    self.logger.error(f"{counter} RegonScrapper could not scrap: {row}")
-
-        self.regon_entity_df = regon_entity_df
-        self.regon_local_entity_df = regon_local_entity_df
-        self.regon_pkd_df = regon_pkd
-
-    def _get_results(self) -> dict:
-        """Constructs the result of scraping as a dictionary of DataFrames.
-        """
-        results = {
-            'regon_entity_df': self.regon_entity_df.copy(),
-            'regon_local_entity_df': self.regon_local_entity_df.copy(),
-            'regon_pkd_df': self.regon_pkd_df.copy(),
-            'krs_representatives_df': self.krs_representants_df.copy(),
-            'krs_general_info_df': self.krs_general_info_df.copy(),
-            'aleo_account_numbers_df': self.aleo_account_numbers_df.copy(),
-            'aleo_shareholders_df': self.aleo_shareholders_df.copy(),
-            'infostrefa_news_df': self.infostrefa_news_df.copy(),
-            'bankier_news_df': self.bankier_news_df.copy(),
-            'sentiment_info_df': self.info_sentiment.copy(),
-            'sentiment_bankier_df': self.bankier_sentiment.copy(),
-            'time_df': self.time_df.copy()
-        }
-        return results
+    def __getattr__(self, name: str):
+        """Loads a result DataFrame when its attribute, e.g. regon_entity_df, is accessed.
+        """
+        results = {attribute: result for result, attribute in RESULT_ATTRIBUTES.items()}
+        if name in results and 'results' in self.__dict__:
+            return self.results.handle(results[name]).to_dataframe()
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
 
     def save_to_csv(self, path: str = ''):
-        """Saves results to csv files.
+        """Saves results to csv files, chunk by chunk without loading them whole.
 
         :param path: Path which specifies where to save csv files, defaults to ''
         :type path: str, optional
         """
         for k, v in self._get_results().items():
-            v.to_csv(os.path.join(path, k), index=False)
+            v.to_csv(os.path.join(path, k))
+
+    def save_to_parquet(self, path: str = '', scrape_date: datetime.date = None):
+        """Saves results to zstd compressed Parquet files partitioned by source and scrape date, chunk by chunk
+        without loading them whole. Requires pyarrow.
+
+        :param path: Path of the partitioned output, defaults to ''
+        :type path: str, optional
+        :param scrape_date: Date of the scrape, defaults to None which means today
+        :type scrape_date: datetime.date, optional
+        """
+        for handle in self._get_results().values():
+            write_parquet(handle, path, scrape_date)
+
+    def save_metrics(self, path: str = ''):
+        """Saves metrics of the last run as a JSON report and in the Prometheus text format.
+
+        :param path: Path which specifies where to save run_metrics.json and run_metrics.prom, defaults to ''
+        :type path: str, optional
+        """
+        self.metrics.save_json(os.path.join(path, 'run_metrics.json'))
+        self.metrics.save_prometheus(os.path.join(path, 'run_metrics.prom'))
 
 
 if __name__ == '__main__':
@@ -0,0 +1 @@
+from .run_metrics import Histogram, RunMetrics, get_metrics
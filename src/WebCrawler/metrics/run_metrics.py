@@ -0,0 +1,432 @@
+"""
+run_metrics.py
+====================================
+This module contains metrics of a scraping run, exported as a JSON report and in the Prometheus text format.
+"""
+
+import json
+import time
+from contextlib import contextmanager
+from threading import Lock, local
+from typing import Dict, Iterator, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+# upper bounds in seconds of histogram buckets, the last bucket is unbounded
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+# source of requests sent outside of any entity scope, e.g. while a browser restores cookies
+OTHER_SOURCE = 'other'
+PREFIX = 'wcrawler'
+
+
+class Histogram:
+    """Histogram with fixed bucket bounds, keeps the number of observations in every bucket, their count and sum.
+
+    :param buckets: Upper bounds of the buckets, defaults to DEFAULT_BUCKETS
+    :type buckets: Sequence[float], optional
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        """Constructor method.
+        """
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Adds an observation.
+
+        :param value: Observed value
+        :type value: float
+        """
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def merge(self, data: dict) -> None:
+        """Adds observations of a histogram with the same buckets exported with to_dict.
+
+        :param data: Exported histogram
+        :type data: dict
+        """
+        self.counts = [count + other for count, other in zip(self.counts, data['counts'])]
+        self.count += data['count']
+        self.sum += data['sum']
+
+    def cumulative(self) -> List[int]:
+        """Returns the number of observations less or equal to every bound, the last one is the total count.
+
+        :return: Cumulative counts
+        :rtype: List[int]
+        """
+        totals, total = [], 0
+        for count in self.counts:
+            total += count
+            totals.append(total)
+        return totals
+
+    def to_dict(self) -> dict:
+        """Exports the histogram.
+
+        :return: Dictionary with 'buckets', 'counts', 'count' and 'sum'
+        :rtype: dict
+        """
+        return {'buckets': self.buckets, 'counts': list(self.counts), 'count': self.count, 'sum': round(self.sum, 6)}
+
+
+def _source_stats() -> dict:
+    return {
+        'entities': 0,
+        'failed': 0,
+        'timed_out': 0,
+        'restored': 0,
+        'duplicates': 0,
+        'seconds': 0.0,
+        'page_loads': 0,
+        'load_seconds': 0.0,
+        'wait_seconds': 0.0,
+        'bytes': 0,
+        'retries': 0,
+        'rejected': 0,
+        'page_waits': 0,
+        'page_wait_seconds': 0.0,
+        'page_wait_timeouts': 0,
+        'histograms': {
+            'entity_seconds': Histogram(),
+            'page_load_seconds': Histogram(),
+            'wait_seconds': Histogram(),
+            'page_wait_seconds': Histogram()
+        }
+    }
+
+
+def _host_stats() -> dict:
+    return {'page_loads': 0, 'load_seconds': 0.0, 'wait_seconds': 0.0, 'bytes': 0, 'retries': 0, 'rejected': 0,
+            'page_waits': 0, 'page_wait_seconds': 0.0, 'page_wait_timeouts': 0}
+
+
+class RunMetrics:
+    """Metrics of a scraping run. Handlers of the pipeline stages scrap every entity within a scope of its source,
+    page loads and HTTP requests of the rate limiter are attributed to the scope of the thread sending them. For
+    every source and every entity the metrics keep page loads, wall time, time spent waiting for the rate limiter,
+    time spent waiting for pages to change after interactions, transferred bytes, retries, requests rejected by open
+    circuits, failures and timeouts, with histograms of entity, page load and wait times.
+    """
+
+    def __init__(self):
+        """Constructor method.
+        """
+        self._lock = Lock()
+        self._local = local()
+        self.reset()
+
+    def reset(self) -> None:
+        """Removes all the metrics and starts a new run.
+        """
+        with self._lock:
+            self.started_at = time.time()
+            self.duration: Optional[float] = None
+            self._start = time.perf_counter()
+            self._sources: Dict[str, dict] = {}
+            self._hosts: Dict[str, dict] = {}
+            self._entities: List[dict] = []
+
+    def finish(self) -> None:
+        """Records the duration of the run.
+        """
+        self.duration = time.perf_counter() - self._start
+
+    @contextmanager
+    def scope(self, source: str, key: str) -> Iterator[dict]:
+        """Context manager measuring scraping of a single entity from the source. The entity is counted as failed
+        if an exception leaves the scope or the yielded record is marked as failed, and as timed out if the record
+        is marked as timed_out, e.g. when its time budget was exceeded.
+
+        :param source: Name of the scraped source
+        :type source: str
+        :param key: Identifier of the entity within the source
+        :type key: str
+        :return: Metrics of the entity
+        :rtype: dict
+        """
+        record = {'source': source, 'key': key, 'seconds': 0.0, 'page_loads': 0, 'wait_seconds': 0.0, 'bytes': 0,
+                  'retries': 0, 'page_wait_seconds': 0.0, 'failed': False, 'timed_out': False}
+        previous = getattr(self._local, 'record', None)
+        self._local.record = record
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record['failed'] = True
+            raise
+        finally:
+            self._local.record = previous
+            record['seconds'] = round(time.perf_counter() - start, 6)
+            with self._lock:
+                stats = self._sources.setdefault(source, _source_stats())
+                stats['entities'] += 1
+                stats['failed'] += record['failed']
+                stats['timed_out'] += record['timed_out']
+                stats['seconds'] += record['seconds']
+                stats['histograms']['entity_seconds'].observe(record['seconds'])
+                self._entities.append(record)
+
+    def current(self) -> Optional[dict]:
+        """Returns the metrics of the entity scraped by the current thread.
+
+        :return: Record yielded by the innermost scope, None outside of any scope
+        :rtype: dict, optional
+        """
+        return getattr(self._local, 'record', None)
+
+    @contextmanager
+    def attach(self, record: Optional[dict]) -> Iterator[None]:
+        """Context manager attributing requests of the current thread to the scope of another thread, e.g. of
+        a pool thread scraping a part of the entity measured by that scope.
+
+        :param record: Record returned by current in the thread of the scope
+        :type record: dict, optional
+        """
+        previous = getattr(self._local, 'record', None)
+        self._local.record = record
+        try:
+            yield
+        finally:
+            self._local.record = previous
+
+    def record_restored(self, source: str) -> None:
+        """Counts an entity whose result was restored instead of being scraped.
+
+        :param source: Name of the source
+        :type source: str
+        """
+        with self._lock:
+            self._sources.setdefault(source, _source_stats())['restored'] += 1
+
+    def record_duplicate(self, source: str) -> None:
+        """Counts an entity which was not scraped because another identifier of the same company was.
+
+        :param source: Name of the source
+        :type source: str
+        """
+        with self._lock:
+            self._sources.setdefault(source, _source_stats())['duplicates'] += 1
+
+    def record_request(self, url: str, seconds: float, wait_seconds: float = 0, size: int = 0) -> None:
+        """Records a page load or an HTTP request sent by the current thread.
+
+        :param url: URL of the request
+        :type url: str
+        :param seconds: Time in seconds spent loading the page
+        :type seconds: float
+        :param wait_seconds: Time in seconds spent waiting for the rate limiter, defaults to 0
+        :type wait_seconds: float, optional
+        :param size: Number of transferred bytes, defaults to 0
+        :type size: int, optional
+        """
+        record = getattr(self._local, 'record', None)
+        with self._lock:
+            if record is not None:
+                record['page_loads'] += 1
+                record['wait_seconds'] += wait_seconds
+                record['bytes'] += size
+            stats = self._sources.setdefault(record['source'] if record else OTHER_SOURCE, _source_stats())
+            stats['page_loads'] += 1
+            stats['load_seconds'] += seconds
+            stats['wait_seconds'] += wait_seconds
+            stats['bytes'] += size
+            stats['histograms']['page_load_seconds'].observe(seconds)
+            stats['histograms']['wait_seconds'].observe(wait_seconds)
+
+            host = self._hosts.setdefault(urlsplit(url).hostname or url, _host_stats())
+            host['page_loads'] += 1
+            host['load_seconds'] += seconds
+            host['wait_seconds'] += wait_seconds
+            host['bytes'] += size
+
+    def record_retry(self, url: Optional[str] = None) -> None:
+        """Records a repeated request or a repeated scrape of an entity of the current thread.
+
+        :param url: URL of the request, defaults to None which means the whole entity was scraped again
+        :type url: str, optional
+        """
+        record = getattr(self._local, 'record', None)
+        with self._lock:
+            if record is not None:
+                record['retries'] += 1
+            self._sources.setdefault(record['source'] if record else OTHER_SOURCE, _source_stats())['retries'] += 1
+            if url is not None:
+                self._hosts.setdefault(urlsplit(url).hostname or url, _host_stats())['retries'] += 1
+
+    def record_rejected(self, url: str) -> None:
+        """Records a request of the current thread which was not sent because the circuit of its host was open.
+
+        :param url: URL of the request
+        :type url: str
+        """
+        record = getattr(self._local, 'record', None)
+        with self._lock:
+            self._sources.setdefault(record['source'] if record else OTHER_SOURCE, _source_stats())['rejected'] += 1
+            self._hosts.setdefault(urlsplit(url).hostname or url, _host_stats())['rejected'] += 1
+
+    def record_wait(self, url: str, seconds: float, timed_out: bool = False) -> None:
+        """Records a wait of the current thread for a page to change, e.g. for an element to appear after a click.
+
+        :param url: URL of the site
+        :type url: str
+        :param seconds: Time in seconds spent waiting
+        :type seconds: float
+        :param timed_out: Specifies whether the page did not change in time, defaults to False
+        :type timed_out: bool, optional
+        """
+        record = getattr(self._local, 'record', None)
+        with self._lock:
+            if record is not None:
+                record['page_wait_seconds'] += seconds
+            for stats in [self._sources.setdefault(record['source'] if record else OTHER_SOURCE, _source_stats()),
+                          self._hosts.setdefault(urlsplit(url).hostname or url, _host_stats())]:
+                stats['page_waits'] += 1
+                stats['page_wait_seconds'] += seconds
+                stats['page_wait_timeouts'] += timed_out
+                if 'histograms' in stats:
+                    stats['histograms']['page_wait_seconds'].observe(seconds)
+
+    def snapshot(self) -> dict:
+        """Exports the metrics as a JSON serializable run report.
+
+        :return: Report with 'started_at', 'duration_seconds', 'sources', 'hosts' and 'entities'
+        :rtype: dict
+        """
+        with self._lock:
+            sources = {}
+            for source, stats in self._sources.items():
+                sources[source] = {name: round(value, 6) if isinstance(value, float) else value
+                                   for name, value in stats.items() if name != 'histograms'}
+                sources[source]['histograms'] = {name: histogram.to_dict()
+                                                 for name, histogram in stats['histograms'].items()}
+            return {
+                'started_at': self.started_at,
+                'duration_seconds': round(self.duration, 6) if self.duration is not None else None,
+                'sources': sources,
+                'hosts': {host: {name: round(value, 6) if isinstance(value, float) else value
+                                 for name, value in stats.items()} for host, stats in self._hosts.items()},
+                'entities': [dict(record) for record in self._entities]
+            }
+
+    def merge(self, report: dict) -> None:
+        """Adds metrics of another run exported with snapshot, e.g. of a shard scraped by a worker process.
+
+        :param report: Exported metrics
+        :type report: dict
+        """
+        with self._lock:
+            for source, other in report['sources'].items():
+                stats = self._sources.setdefault(source, _source_stats())
+                for name, value in other.items():
+                    if name == 'histograms':
+                        for histogram_name, histogram in value.items():
+                            stats['histograms'][histogram_name].merge(histogram)
+                    else:
+                        stats[name] += value
+            for host, other in report['hosts'].items():
+                stats = self._hosts.setdefault(host, _host_stats())
+                for name, value in other.items():
+                    stats[name] += value
+            self._entities.extend(report['entities'])
+
+    def save_json(self, path: str) -> None:
+        """Saves the run report as JSON.
+
+        :param path: Path to the file
+        :type path: str
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def save_prometheus(self, path: str) -> None:
+        """Saves the metrics in the Prometheus text format, e.g. for the textfile collector of node exporter.
+
+        :param path: Path to the file
+        :type path: str
+        """
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+
+    def to_prometheus(self) -> str:
+        """Formats the metrics in the Prometheus text format.
+
+        :return: Metrics, one sample per line
+        :rtype: str
+        """
+        report = self.snapshot()
+        lines = []
+
+        def metric(name: str, kind: str, description: str, samples: List[tuple]) -> None:
+            lines.append(f'# HELP {PREFIX}_{name} {description}')
+            lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+            for labels, value, suffix in samples:
+                label_text = ','.join(f'{label}="{label_value}"' for label, label_value in labels.items())
+                label_text = f'{{{label_text}}}' if label_text else ''
+                lines.append(f'{PREFIX}_{name}{suffix}{label_text} {value}')
+
+        def histogram(name: str, description: str, histogram_name: str) -> None:
+            samples = []
+            for source, stats in report['sources'].items():
+                data = stats['histograms'][histogram_name]
+                restored = Histogram(data['buckets'])
+                restored.merge(data)
+                bounds = [str(bound) for bound in restored.buckets] + ['+Inf']
+                samples += [({'source': source, 'le': bound}, count, '_bucket')
+                            for bound, count in zip(bounds, restored.cumulative())]
+                samples += [({'source': source}, data['sum'], '_sum'), ({'source': source}, data['count'], '_count')]
+            metric(name, 'histogram', description, samples)
+
+        sources = report['sources']
+        metric('entities_total', 'counter', 'Entities handled by every source.',
+               [({'source': source, 'status': status}, count, '') for source, stats in sources.items()
+                for status, count in [('scraped', stats['entities'] - stats['failed']),
+                                      ('failed', stats['failed'] - stats['timed_out']),
+                                      ('timed_out', stats['timed_out']), ('restored', stats['restored']),
+                                      ('duplicate', stats['duplicates'])]])
+        metric('page_loads_total', 'counter', 'Pages loaded and HTTP requests sent by every source.',
+               [({'source': source}, stats['page_loads'], '') for source, stats in sources.items()])
+        metric('transferred_bytes_total', 'counter', 'Bytes of the pages loaded by every source.',
+               [({'source': source}, stats['bytes'], '') for source, stats in sources.items()])
+        metric('retries_total', 'counter', 'Repeated requests of every source.',
+               [({'source': source}, stats['retries'], '') for source, stats in sources.items()])
+        metric('rejected_requests_total', 'counter', 'Requests of every source not sent because of an open circuit.',
+               [({'source': source}, stats['rejected'], '') for source, stats in sources.items()])
+        metric('page_wait_timeouts_total', 'counter', 'Waits of every source for a page which did not change in time.',
+               [({'source': source}, stats['page_wait_timeouts'], '') for source, stats in sources.items()])
+        metric('host_page_wait_seconds_total', 'counter', 'Time spent waiting for pages of every host to change.',
+               [({'host': host}, stats['page_wait_seconds'], '') for host, stats in report['hosts'].items()])
+        metric('host_page_loads_total', 'counter', 'Pages loaded from every host.',
+               [({'host': host}, stats['page_loads'], '') for host, stats in report['hosts'].items()])
+        metric('host_transferred_bytes_total', 'counter', 'Bytes of the pages loaded from every host.',
+               [({'host': host}, stats['bytes'], '') for host, stats in report['hosts'].items()])
+        histogram('entity_seconds', 'Time of scraping a single entity.', 'entity_seconds')
+        histogram('page_load_seconds', 'Time of loading a single page.', 'page_load_seconds')
+        histogram('rate_limit_wait_seconds', 'Time a request waited for the rate limiter.', 'wait_seconds')
+        histogram('page_wait_seconds', 'Time a scraper waited for a page to change after an interaction.',
+                  'page_wait_seconds')
+        if report['duration_seconds'] is not None:
+            metric('run_seconds', 'gauge', 'Duration of the run.', [({}, report['duration_seconds'], '')])
+        return '\n'.join(lines) + '\n'
+
+
+_run_metrics: Optional[RunMetrics] = None
+_run_metrics_lock = Lock()
+
+
+def get_metrics() -> RunMetrics:
+    """Returns common RunMetrics instance for the whole process.
+
+    :return: Instance of RunMetrics
+    :rtype: RunMetrics
+    """
+    global _run_metrics
+    with _run_metrics_lock:
+        if _run_metrics is None:
+            _run_metrics = RunMetrics()
+        return _run_metrics
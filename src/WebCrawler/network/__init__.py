@@ -0,0 +1,9 @@
+from .deadline import (Deadline, DeadlineExceeded, check_deadline, current_deadline, deadline_scope, remaining_time,
+                       wait_timeout)
+from .extraction import Locator, extract, extract_fields, extract_rows
+from .page_capture import (PageCapture, PageNotRecorded, RECORD, REPLAY, RecordingDriver, ReplayDriver,
+                           get_page_capture, live_driver)
+from .rate_limiter import RateLimiter, TokenBucket, get_rate_limiter
+from .retry import CircuitBreaker, CircuitOpen, RETRY_STATUSES, RetryPolicy, TransientError, is_retryable
+from .sites import SITES, override_site_urls, reset_site_urls, site_url
+from .waits import AdaptiveWaits, WaitTimeout, dom_settled, get_waits, network_idle
@@ -0,0 +1,154 @@
+"""
+deadline.py
+====================================
+This module contains time budgets of scraped entities and of whole runs, checked cooperatively by the scrapers.
+"""
+
+import math
+import time
+from contextlib import contextmanager
+from threading import Event, local
+from typing import Iterator, Optional
+
+_local = local()
+# blocking waits within a deadline wake up this often to notice a cancelled run
+CANCEL_POLL_INTERVAL = 0.5
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the time budget of the scraped entity or of the run is exceeded, or the run is cancelled.
+    """
+
+
+class Deadline:
+    """Time budget ending at a point in time, or never. A deadline with a parent expires no later than the parent,
+    e.g. the budget of an entity ends with the budget of the run. Cancelling a deadline expires it and all of its
+    children at once.
+
+    :param seconds: Length of the budget in seconds, defaults to None which means no limit
+    :type seconds: float, optional
+    :param parent: Deadline this one is nested in, defaults to None
+    :type parent: Deadline, optional
+    :param name: Name of the budget used in error messages, defaults to 'deadline'
+    :type name: str, optional
+    """
+
+    def __init__(self, seconds: Optional[float] = None, parent: Optional['Deadline'] = None, name: str = 'deadline'):
+        """Constructor method.
+        """
+        self.seconds = seconds
+        self.parent = parent
+        self.name = name
+        self.expires_at = time.monotonic() + seconds if seconds is not None else math.inf
+        self._cancelled = Event()
+
+    def cancel(self) -> None:
+        """Expires the deadline, scrapers checking it stop at their next check.
+        """
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """Specifies whether the deadline or any of its parents was cancelled.
+        """
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def remaining(self) -> float:
+        """Returns the time left.
+
+        :return: Seconds until the deadline or its parent expires, 0 if cancelled, math.inf if there is no limit
+        :rtype: float
+        """
+        if self.cancelled:
+            return 0.0
+        remaining = max(0.0, self.expires_at - time.monotonic())
+        return min(remaining, self.parent.remaining()) if self.parent is not None else remaining
+
+    @property
+    def expired(self) -> bool:
+        """Specifies whether no time is left.
+        """
+        return self.remaining() <= 0
+
+    def check(self) -> None:
+        """Raises DeadlineExceeded if no time is left.
+
+        :raises DeadlineExceeded: If the deadline or any of its parents expired or was cancelled
+        """
+        if self.remaining() > 0:
+            return
+        deadline = self
+        while deadline is not None and not (deadline._cancelled.is_set() or deadline.expires_at <= time.monotonic()):
+            deadline = deadline.parent
+        deadline = deadline or self
+        if deadline._cancelled.is_set():
+            raise DeadlineExceeded(f'{deadline.name} was cancelled')
+        raise DeadlineExceeded(f'{deadline.name} of {deadline.seconds:g} s was exceeded')
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Returns the deadline of the current thread.
+
+    :return: Deadline set by the innermost deadline_scope, None outside of any scope
+    :rtype: Deadline, optional
+    """
+    return getattr(_local, 'deadline', None)
+
+
+def check_deadline() -> None:
+    """Raises DeadlineExceeded if the deadline of the current thread expired, to be called by scrapers between
+    steps of work which may take long. Page loads, HTTP requests and waits for pages check it themselves.
+
+    :raises DeadlineExceeded: If the deadline of the current thread expired or was cancelled
+    """
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.check()
+
+
+def remaining_time(default: float = math.inf) -> float:
+    """Returns the time left until the deadline of the current thread.
+
+    :param default: Value returned outside of any deadline scope, defaults to math.inf
+    :type default: float, optional
+    :return: Remaining seconds
+    :rtype: float
+    """
+    deadline = current_deadline()
+    return deadline.remaining() if deadline is not None else default
+
+
+def wait_timeout() -> Optional[float]:
+    """Returns the timeout of a single blocking wait of the current thread, e.g. for a lock, a semaphore or
+    a condition. Waits are repeated with check_deadline between them, so they end with DeadlineExceeded when
+    the deadline expires or is cancelled instead of blocking forever.
+
+    :return: Seconds to wait at most, None outside of any deadline scope which means no timeout
+    :rtype: float, optional
+    """
+    deadline = current_deadline()
+    return None if deadline is None else min(deadline.remaining(), CANCEL_POLL_INTERVAL)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float] = None, parent: Optional[Deadline] = None,
+                   name: str = 'deadline') -> Iterator[Deadline]:
+    """Context manager setting the deadline of the current thread.
+
+    :param seconds: Length of the budget in seconds, defaults to None which means no limit of its own
+    :type seconds: float, optional
+    :param parent: Deadline the budget is nested in, defaults to None which means the deadline of the enclosing
+        scope
+    :type parent: Deadline, optional
+    :param name: Name of the budget used in error messages, defaults to 'deadline'
+    :type name: str, optional
+    :return: Deadline of the scope
+    :rtype: Deadline
+    """
+    previous = current_deadline()
+    deadline = Deadline(seconds, parent or previous, name)
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = previous
@@ -0,0 +1,126 @@
+"""
+extraction.py
+====================================
+This module contains bulk extraction of texts from the page loaded in a browser, all the fields of a page are read
+with a single script call instead of a WebDriver round trip per element.
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from WebCrawler.network.deadline import check_deadline
+from WebCrawler.network.page_capture import ReplayDriver, live_driver
+
+# Selenium locator, e.g. (By.ID, 'praw_nip')
+Locator = Tuple[str, str]
+
+# finds elements of Selenium locators and returns their rendered texts, hidden elements have no text like in
+# WebElement.text, arguments are the locators of fields and the locators of rows and cells of tables
+EXTRACT_SCRIPT = """
+function find(locator, context) {
+    var by = locator[0], value = locator[1], found = [];
+    if (by === 'id') {
+        var element = document.getElementById(value);
+        return element && (context === document || context.contains(element)) ? [element] : [];
+    }
+    if (by === 'xpath') {
+        var result = document.evaluate(value, context, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+        for (var i = 0; i < result.snapshotLength; i++) {
+            if (result.snapshotItem(i).nodeType === 1) found.push(result.snapshotItem(i));
+        }
+        return found;
+    }
+    if (by === 'name') return Array.prototype.slice.call(document.getElementsByName(value));
+    if (by === 'tag name') return Array.prototype.slice.call(context.getElementsByTagName(value));
+    if (by === 'class name') return Array.prototype.slice.call(context.getElementsByClassName(value));
+    return Array.prototype.slice.call(context.querySelectorAll(value));
+}
+function text(element) {
+    if (!element.getClientRects().length || window.getComputedStyle(element).visibility === 'hidden') return '';
+    return element.innerText;
+}
+var fields = arguments[0].map(function (locator) {
+    var found = find(locator, document);
+    return found.length ? text(found[0]) : null;
+});
+var tables = arguments[1].map(function (table) {
+    return find(table[0], document).map(function (row) {
+        return find(table[1], row).map(text);
+    });
+});
+return [fields, tables];
+"""
+
+
+def _normalize(text: Optional[str]) -> str:
+    """Collapses whitespace of the rendered text the way WebElement.text does.
+    """
+    lines = (' '.join(line.split()) for line in (text or '').split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+def extract(driver: WebDriver, fields: Dict[str, Locator] = None,
+            tables: Dict[str, Tuple[Locator, Locator]] = None) -> Tuple[Dict[str, str], Dict[str, List[List[str]]]]:
+    """Reads texts of all the fields and tables of the loaded page at once. A browser runs a single script, a page
+    replayed from the page store is read from its captured HTML. Scripts run through a recording proxy are not
+    recorded as interactions.
+
+    :param driver: Browser with the loaded page
+    :type driver: WebDriver
+    :param fields: Locators of the fields by their names, the first matching element is read, defaults to None
+    :type fields: Dict[str, Locator], optional
+    :param tables: Locators of rows and of cells within every row by names of the tables, defaults to None
+    :type tables: Dict[str, Tuple[Locator, Locator]], optional
+    :raises NoSuchElementException: If any of the fields is not on the page
+    :return: Texts of the fields and texts of cells of every row of the tables
+    :rtype: Tuple[Dict[str, str], Dict[str, List[List[str]]]]
+    """
+    fields, tables = fields or {}, tables or {}
+    check_deadline()
+    if isinstance(driver, ReplayDriver):
+        # the captured HTML is parsed locally, elements cost no round trips
+        texts = [next((element.text for element in driver.find_elements(*locator)), None)
+                 for locator in fields.values()]
+        rows = [[[cell.text for cell in row.find_elements(*cells)] for row in driver.find_elements(*row_locator)]
+                for row_locator, cells in tables.values()]
+    else:
+        texts, rows = live_driver(driver).execute_script(
+            EXTRACT_SCRIPT, [list(locator) for locator in fields.values()],
+            [[list(row_locator), list(cells)] for row_locator, cells in tables.values()])
+
+    missing = [name for name, text in zip(fields, texts) if text is None]
+    if missing:
+        raise NoSuchElementException(f"Unable to locate fields: {', '.join(missing)}")
+    return ({name: _normalize(text) for name, text in zip(fields, texts)},
+            {name: [[_normalize(cell) for cell in row] for row in table] for name, table in zip(tables, rows)})
+
+
+def extract_fields(driver: WebDriver, fields: Dict[str, Locator]) -> Dict[str, str]:
+    """Reads texts of all the fields of the loaded page at once.
+
+    :param driver: Browser with the loaded page
+    :type driver: WebDriver
+    :param fields: Locators of the fields by their names, the first matching element is read
+    :type fields: Dict[str, Locator]
+    :raises NoSuchElementException: If any of the fields is not on the page
+    :return: Texts of the fields in the order of fields
+    :rtype: Dict[str, str]
+    """
+    return extract(driver, fields)[0]
+
+
+def extract_rows(driver: WebDriver, rows: Locator, cells: Locator) -> List[List[str]]:
+    """Reads texts of all the cells of a table of the loaded page at once.
+
+    :param driver: Browser with the loaded page
+    :type driver: WebDriver
+    :param rows: Locator of the rows
+    :type rows: Locator
+    :param cells: Locator of the cells within a row
+    :type cells: Locator
+    :return: Texts of the cells of every row
+    :rtype: List[List[str]]
+    """
+    return extract(driver, tables={'rows': (rows, cells)})[1]['rows']
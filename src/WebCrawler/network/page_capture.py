@@ -0,0 +1,514 @@
+"""
+page_capture.py
+====================================
+This module contains the record/replay layer of the scrapers. In record mode every page the scrapers load is
+captured to a PageStore, in replay mode pages are served from the store without network access or browsers.
+"""
+
+import os
+import re
+from threading import Lock
+from typing import Any, List, Optional
+from urllib.parse import urljoin
+from uuid import uuid4
+
+import lxml.html
+import requests
+from requests.structures import CaseInsensitiveDict
+from selenium.common.exceptions import InvalidSelectorException, NoSuchElementException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from WebCrawler.custom_logger import get_logger
+from WebCrawler.storage.page_store import BROWSER, HTTP, PageStore
+
+RECORD = 'record'
+REPLAY = 'replay'
+
+# attribute marking elements hidden by CSS in captured pages, the replay needs it to tell visible text
+HIDDEN_ATTRIBUTE = 'data-wcrawler-hidden'
+# copies the document with computed visibility and current values of inputs, so the capture reflects what
+# the scraper saw rather than the original HTML
+SNAPSHOT_SCRIPT = f"""
+    var source = document.documentElement, copy = source.cloneNode(true);
+    var originals = source.getElementsByTagName('*'), copies = copy.getElementsByTagName('*');
+    for (var i = 0; i < originals.length; i++) {{
+        var style = window.getComputedStyle(originals[i]);
+        if (style.display === 'none' || style.visibility === 'hidden') {{
+            copies[i].setAttribute('{HIDDEN_ATTRIBUTE}', '');
+        }}
+        if (originals[i].tagName === 'INPUT') {{
+            copies[i].setAttribute('value', originals[i].value);
+        }}
+    }}
+    return '<!DOCTYPE html>' + copy.outerHTML;
+"""
+_SKIPPED_TAGS = {'script', 'style', 'head', 'noscript', 'template'}
+_BLOCK_TAGS = {'address', 'article', 'br', 'dd', 'div', 'dl', 'dt', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5',
+               'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'tbody', 'thead',
+               'tfoot', 'tr', 'ul'}
+
+
+class PageNotRecorded(Exception):
+    """Raised in replay mode when a page or a state of a page was not captured.
+    """
+
+
+def _locator_path(parent: Optional[str], by: str, value: str, index: Optional[int] = None) -> str:
+    """Returns the path identifying an element by the chain of locators it was found with.
+    """
+    path = f'{by}={value}' if index is None else f'{by}={value}[{index}]'
+    return path if parent is None else f'{parent} > {path}'
+
+
+def _state_key(state: List[str]) -> str:
+    """Returns the key of a page state made of the loaded URL and interactions done since.
+    """
+    return '\n'.join(state)
+
+
+class RecordingDriver:
+    """WebDriver proxy capturing every state of the loaded pages. A state is identified by the loaded URL and
+    the interactions (clicks, typed text, executed scripts) done since, a snapshot of the state is stored just
+    before it changes, so it contains everything rendered while the scraper was reading it.
+
+    :param driver: Browser being recorded
+    :type driver: WebDriver
+    :param capture: Capture the pages are stored by
+    :type capture: PageCapture
+    """
+
+    def __init__(self, driver: WebDriver, capture: 'PageCapture'):
+        """Constructor method.
+        """
+        self._driver = driver
+        self._capture = capture
+        self._state: Optional[List[str]] = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._driver, name)
+
+    @property
+    def wrapped(self) -> WebDriver:
+        return self._driver
+
+    def get(self, url: str) -> None:
+        self.flush()
+        self._state = None
+        self._driver.get(url)
+        self._state = [url]
+
+    def execute_script(self, script: str, *args) -> Any:
+        self.transition(f'script {script}')
+        return self._driver.execute_script(script, *args)
+
+    def find_element(self, by: str = By.ID, value: str = None) -> 'RecordingElement':
+        return RecordingElement(self._driver.find_element(by, value), self, _locator_path(None, by, value))
+
+    def find_elements(self, by: str = By.ID, value: str = None) -> List['RecordingElement']:
+        return [RecordingElement(element, self, _locator_path(None, by, value, i))
+                for i, element in enumerate(self._driver.find_elements(by, value))]
+
+    def quit(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._driver.quit()
+
+    def transition(self, action: str) -> None:
+        """Stores the current state and moves to the state after the action.
+
+        :param action: Description of the interaction
+        :type action: str
+        """
+        self.flush()
+        if self._state is not None:
+            self._state = self._state + [action]
+
+    def flush(self) -> None:
+        """Stores a snapshot of the current state.
+        """
+        if self._state is None:
+            return
+        try:
+            html = self._driver.execute_script(SNAPSHOT_SCRIPT)
+        except Exception:
+            html = self._driver.page_source
+        self._capture.store.put(BROWSER, _state_key(self._state), self._driver.current_url, html.encode('utf-8'))
+
+
+def live_driver(driver: WebDriver) -> WebDriver:
+    """Returns the browser of a recording proxy, scripts run through the proxy would be recorded as interactions.
+
+    :param driver: Browser, possibly wrapped in a recording proxy
+    :type driver: WebDriver
+    :return: The browser itself
+    :rtype: WebDriver
+    """
+    return driver.wrapped if isinstance(driver, RecordingDriver) else driver
+
+
+class RecordingElement:
+    """WebElement proxy reporting interactions to the recording driver.
+
+    :param element: Recorded element
+    :type element: WebElement
+    :param driver: Driver the element belongs to
+    :type driver: RecordingDriver
+    :param path: Chain of locators the element was found with
+    :type path: str
+    """
+
+    def __init__(self, element, driver: RecordingDriver, path: str):
+        """Constructor method.
+        """
+        self._element = element
+        self._driver = driver
+        self._path = path
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._element, name)
+
+    def click(self) -> None:
+        self._driver.transition(f'click {self._path}')
+        self._element.click()
+
+    def send_keys(self, *value) -> None:
+        self._driver.transition(f"type {self._path} {''.join(map(str, value))}")
+        self._element.send_keys(*value)
+
+    def clear(self) -> None:
+        self._driver.transition(f'clear {self._path}')
+        self._element.clear()
+
+    def find_element(self, by: str = By.ID, value: str = None) -> 'RecordingElement':
+        return RecordingElement(self._element.find_element(by, value), self._driver,
+                                _locator_path(self._path, by, value))
+
+    def find_elements(self, by: str = By.ID, value: str = None) -> List['RecordingElement']:
+        return [RecordingElement(element, self._driver, _locator_path(self._path, by, value, i))
+                for i, element in enumerate(self._element.find_elements(by, value))]
+
+
+def _find(node, by: str, value: str) -> list:
+    """Finds elements under the lxml node with a Selenium locator.
+    """
+    if by == By.XPATH:
+        return [found for found in node.xpath(value) if isinstance(found, lxml.html.HtmlElement)]
+    if by == By.ID:
+        return node.xpath('.//*[@id=$value]', value=value)
+    if by == By.NAME:
+        return node.xpath('.//*[@name=$value]', value=value)
+    if by == By.TAG_NAME:
+        return node.xpath(f'.//{value}') if re.fullmatch(r'[\w-]+', value) else []
+    if by == By.CLASS_NAME:
+        return node.xpath(""".//*[contains(concat(' ', normalize-space(@class), ' '), $value)]""",
+                          value=f' {value} ')
+    if by == By.CSS_SELECTOR:
+        return node.cssselect(value)
+    raise InvalidSelectorException(f'Locator {by} is not supported in replay mode')
+
+
+def _is_hidden(node) -> bool:
+    """Checks whether the node or any of its ancestors was hidden when captured.
+    """
+    for current in [node, *node.iterancestors()]:
+        style = current.get('style', '').replace(' ', '').lower()
+        if HIDDEN_ATTRIBUTE in current.attrib or 'display:none' in style or 'hidden' in current.attrib:
+            return True
+    return False
+
+
+def _visible_text(node) -> str:
+    """Returns text of the node the way a browser renders it, without hidden elements and with collapsed
+    whitespace.
+    """
+    if _is_hidden(node):
+        return ''
+    parts = []
+
+    def walk(current) -> None:
+        if not isinstance(current.tag, str) or current.tag in _SKIPPED_TAGS or HIDDEN_ATTRIBUTE in current.attrib:
+            return
+        block = current.tag in _BLOCK_TAGS
+        if block:
+            parts.append('\n')
+        if current.text:
+            parts.append(current.text)
+        for child in current:
+            walk(child)
+            if child.tail:
+                parts.append(child.tail)
+        if block:
+            parts.append('\n')
+
+    walk(node)
+    lines = (' '.join(line.split()) for line in ''.join(parts).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+class ReplayDriver:
+    """Stand-in of WebDriver serving captured page states. Page loads and interactions move between the states
+    the same way they did while recording, elements are looked up in the captured HTML with lxml.
+
+    :param capture: Capture the pages are served from
+    :type capture: PageCapture
+    """
+
+    def __init__(self, capture: 'PageCapture'):
+        """Constructor method.
+        """
+        self._capture = capture
+        self._state: Optional[List[str]] = None
+        self._page: Optional[dict] = None
+        self._root = None
+        self.session_id = uuid4().hex
+
+    def get(self, url: str) -> None:
+        self._load([url])
+
+    @property
+    def page_source(self) -> str:
+        return self._page['content'].decode('utf-8') if self._page else ''
+
+    @property
+    def current_url(self) -> str:
+        return self._page['url'] if self._page else ''
+
+    @property
+    def window_handles(self) -> List[str]:
+        return [self.session_id]
+
+    def find_element(self, by: str = By.ID, value: str = None) -> 'ReplayElement':
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise NoSuchElementException(f'Unable to locate element: {by}={value}')
+        return ReplayElement(elements[0]._node, self, _locator_path(None, by, value))
+
+    def find_elements(self, by: str = By.ID, value: str = None) -> List['ReplayElement']:
+        if self._root is None:
+            return []
+        return [ReplayElement(node, self, _locator_path(None, by, value, i))
+                for i, node in enumerate(_find(self._root, by, value))]
+
+    def execute_script(self, script: str, *args) -> None:
+        self.transition(f'script {script}')
+
+    def transition(self, action: str) -> None:
+        """Moves to the state captured after the action.
+
+        :param action: Description of the interaction
+        :type action: str
+        """
+        if self._state is None:
+            raise PageNotRecorded(f'No page was loaded before: {action}')
+        self._load(self._state + [action])
+
+    def implicitly_wait(self, time_to_wait: float) -> None:
+        pass
+
+    def delete_all_cookies(self) -> None:
+        pass
+
+    def add_cookie(self, cookie: dict) -> None:
+        pass
+
+    def get_cookies(self) -> List[dict]:
+        return []
+
+    def quit(self) -> None:
+        self._state, self._page, self._root = None, None, None
+
+    def _load(self, state: List[str]) -> None:
+        """Loads the captured state.
+        """
+        page = self._capture.store.get(BROWSER, _state_key(state))
+        if page is None:
+            raise PageNotRecorded(f"Page state was not recorded: {' -> '.join(state)}")
+        self._state, self._page = state, page
+        html = page['content'].decode('utf-8')
+        self._root = lxml.html.document_fromstring(html) if html.strip() else None
+
+
+class ReplayElement:
+    """Stand-in of WebElement backed by a node of the captured HTML.
+
+    :param node: Node of the captured page
+    :type node: lxml.html.HtmlElement
+    :param driver: Driver serving the page
+    :type driver: ReplayDriver
+    :param path: Chain of locators the element was found with
+    :type path: str
+    """
+
+    def __init__(self, node, driver: ReplayDriver, path: str):
+        """Constructor method.
+        """
+        self._node = node
+        self._driver = driver
+        self._path = path
+
+    @property
+    def text(self) -> str:
+        return _visible_text(self._node)
+
+    @property
+    def tag_name(self) -> str:
+        return self._node.tag
+
+    def get_attribute(self, name: str) -> Optional[str]:
+        value = self._node.get(name)
+        if value is not None and name in ['href', 'src']:
+            return urljoin(self._driver.current_url, value)
+        return value
+
+    def is_displayed(self) -> bool:
+        return not _is_hidden(self._node)
+
+    def is_enabled(self) -> bool:
+        return 'disabled' not in self._node.attrib
+
+    def click(self) -> None:
+        self._driver.transition(f'click {self._path}')
+
+    def send_keys(self, *value) -> None:
+        self._driver.transition(f"type {self._path} {''.join(map(str, value))}")
+
+    def clear(self) -> None:
+        self._driver.transition(f'clear {self._path}')
+
+    def find_element(self, by: str = By.ID, value: str = None) -> 'ReplayElement':
+        elements = _find(self._node, by, value)
+        if not elements:
+            raise NoSuchElementException(f'Unable to locate element: {by}={value}')
+        return ReplayElement(elements[0], self._driver, _locator_path(self._path, by, value))
+
+    def find_elements(self, by: str = By.ID, value: str = None) -> List['ReplayElement']:
+        return [ReplayElement(node, self._driver, _locator_path(self._path, by, value, i))
+                for i, node in enumerate(_find(self._node, by, value))]
+
+
+class PageCapture:
+    """Record/replay switch of the whole process. Drivers of the driver pool and HTTP requests of the rate limiter
+    go through it: in record mode every loaded page is stored, in replay mode pages come from the store and
+    neither browsers nor the network are used, so changed extraction logic can be rerun at parser speed.
+    """
+
+    def __init__(self):
+        """Constructor method.
+        """
+        self.mode: Optional[str] = None
+        self.store: Optional[PageStore] = None
+        self._lock = Lock()
+        self.logger = get_logger()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == RECORD
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == REPLAY
+
+    def configure(self, mode: Optional[str] = None, path: Optional[str] = None) -> None:
+        """Switches the mode of the capture.
+
+        :param mode: RECORD, REPLAY or None which disables the capture, defaults to None
+        :type mode: str, optional
+        :param path: Path to the page store, required in record and replay mode, defaults to None
+        :type path: str, optional
+        """
+        if mode not in [None, RECORD, REPLAY]:
+            raise ValueError(f"Unknown capture mode: {mode}")
+        if mode is not None and not path:
+            raise ValueError(f"Capture mode {mode} requires a path to the page store")
+        if mode == REPLAY and not os.path.exists(path):
+            raise FileNotFoundError(f"Page store does not exist: {path}")
+
+        with self._lock:
+            if self.store is not None and (mode is None or self.store.db_path != path):
+                self.store.close()
+                self.store = None
+            if mode is not None and self.store is None:
+                self.store = PageStore(path)
+            self.mode = mode
+        if mode is not None:
+            self.logger.info(f'Page capture in {mode} mode, store: {path}')
+
+    def wrap(self, driver: WebDriver) -> WebDriver:
+        """Wraps a started browser in a recording proxy in record mode.
+
+        :param driver: Started browser
+        :type driver: WebDriver
+        :return: Recording proxy or the same driver
+        :rtype: WebDriver
+        """
+        return RecordingDriver(driver, self) if self.recording else driver
+
+    def replay_driver(self) -> ReplayDriver:
+        """Returns a new driver serving captured pages.
+
+        :return: Replay driver
+        :rtype: ReplayDriver
+        """
+        return ReplayDriver(self)
+
+    def accepts(self, driver) -> bool:
+        """Checks whether a pooled driver can be used in the current mode.
+
+        :param driver: Driver of the pool
+        :type driver: WebDriver
+        :return: True if the driver matches the mode
+        :rtype: bool
+        """
+        if self.replaying:
+            return isinstance(driver, ReplayDriver)
+        if self.recording:
+            return isinstance(driver, RecordingDriver)
+        return not isinstance(driver, (ReplayDriver, RecordingDriver))
+
+    def record_response(self, url: str, response: requests.Response) -> None:
+        """Stores a response of an HTTP request in record mode.
+
+        :param url: Requested URL, or a key made of it and the body of a request whose body changes the response
+        :type url: str
+        :param response: Response to the request
+        :type response: requests.Response
+        """
+        if self.recording:
+            self.store.put(HTTP, url, response.url, response.content, response.status_code, dict(response.headers))
+
+    def replay_response(self, url: str) -> requests.Response:
+        """Returns the captured response of an HTTP request.
+
+        :param url: Requested URL, or the key the response was stored with
+        :type url: str
+        :return: Captured response
+        :rtype: requests.Response
+        """
+        page = self.store.get(HTTP, url)
+        if page is None:
+            raise PageNotRecorded(f"Response was not recorded: {url}")
+        response = requests.Response()
+        response.url = page['url']
+        response.status_code = page['status']
+        response.headers = CaseInsensitiveDict(page['headers'])
+        response._content = page['content']
+        return response
+
+
+_page_capture: Optional[PageCapture] = None
+_page_capture_lock = Lock()
+
+
+def get_page_capture() -> PageCapture:
+    """Returns common PageCapture instance for the whole process.
+
+    :return: Instance of PageCapture
+    :rtype: PageCapture
+    """
+    global _page_capture
+    with _page_capture_lock:
+        if _page_capture is None:
+            _page_capture = PageCapture()
+        return _page_capture
@@ -0,0 +1,363 @@
+"""
+rate_limiter.py
+====================================
+This module contains a rate limiter keyed by host, used by all the scrapers to pace requests to scraped sites.
+"""
+
+import math
+import time
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from WebCrawler.metrics import get_metrics
+from WebCrawler.network.deadline import check_deadline, remaining_time, wait_timeout
+from WebCrawler.network.page_capture import ReplayDriver, get_page_capture, live_driver
+from WebCrawler.network.retry import (ERROR_PAGE_PREFIXES, RETRY_STATUSES, CircuitBreaker, CircuitOpen, RetryPolicy,
+                                      TransientError, is_retryable)
+
+# requests per second and maximum number of requests in flight
+HostLimit = Tuple[float, int]
+# size of the loaded document reported by the browser, 0 if it is not known
+TRANSFER_SIZE_SCRIPT = ("var entry = performance.getEntriesByType('navigation')[0]; "
+                        "return entry ? (entry.transferSize || entry.decodedBodySize) : 0;")
+# page load timeout of Selenium restored after loads bounded by a deadline
+DEFAULT_PAGE_LOAD_TIMEOUT = 300
+
+
+def _page_size(driver: WebDriver) -> int:
+    """Returns the number of bytes of the page loaded by the driver.
+    """
+    if isinstance(driver, ReplayDriver):
+        return len(driver.page_source.encode('utf-8'))
+    try:
+        # scripts run through the recording proxy would be recorded as interactions
+        return int(live_driver(driver).execute_script(TRANSFER_SIZE_SCRIPT) or 0)
+    except Exception:
+        return 0
+
+
+class TokenBucket:
+    """Token bucket refilled with rate tokens per second, holding at most burst tokens.
+
+    :param rate: Number of tokens added per second
+    :type rate: float
+    :param burst: Maximum number of tokens, defaults to 1
+    :type burst: int, optional
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        """Constructor method.
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def take(self) -> float:
+        """Takes a token, blocks until one is available or the deadline of the current thread expires.
+
+        :raises DeadlineExceeded: If the deadline of the current thread expires before a token is available
+        :return: Time in seconds spent waiting for the token
+        :rtype: float
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            check_deadline()
+            timeout = wait_timeout()
+            delay = delay if timeout is None else min(delay, timeout)
+            time.sleep(delay)
+            waited += delay
+
+
+class RateLimiter:
+    """Limits requests sent to every host to a number of requests per second and a number of requests in flight.
+    All the page loads and HTTP requests of the scrapers go through the limiter, so every site is scraped up to its
+    safe limit in parallel instead of scrapers sleeping for a fixed time after each request.
+
+    Pages replayed from a page capture are not paced, the network is not used then. Every request is recorded in
+    the run metrics. Requests check the deadline of the current thread and do not last longer than the time left.
+
+    Requests failing with transient errors, e.g. connection errors, timeouts, browser error pages or HTTP 503, are
+    repeated with the retry policy. Every host has a circuit breaker, so while a site is down its requests fail
+    fast with CircuitOpen instead of each of them waiting for a timeout.
+
+    A host matches a limit of its own name or of any parent domain, e.g. wyszukiwarkaregon.stat.gov.pl uses
+    the limit of stat.gov.pl. Hosts without a limit use the limit of '*'.
+
+    :param limits: Requests per second and requests in flight of every host, overrides DEFAULT_LIMITS,
+        defaults to None
+    :type limits: Dict[str, HostLimit], optional
+    :param retry_policy: Policy of repeating failed requests, defaults to None which means RetryPolicy()
+    :type retry_policy: RetryPolicy, optional
+    """
+
+    DEFAULT_LIMITS: Dict[str, HostLimit] = {
+        'stat.gov.pl': (2.0, 2),
+        'ms.gov.pl': (2.0, 2),
+        'bankier.pl': (2.0, 2),
+        'infostrefa.com': (2.0, 2),
+        'aleo.com': (1.0, 1),
+        'gpw.pl': (2.0, 2),
+        'newconnect.pl': (2.0, 2),
+        '*': (1.0, 2)
+    }
+
+    def __init__(self, limits: Dict[str, HostLimit] = None, retry_policy: RetryPolicy = None):
+        """Constructor method.
+        """
+        self._lock = Lock()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self._shared_in_flight: Dict[str, Any] = {}
+        self.configure(limits)
+
+    def configure(self, limits: Dict[str, HostLimit] = None) -> None:
+        """Replaces limits of the hosts and closes their circuits, requests already in flight keep their previous
+        limits.
+
+        :param limits: Requests per second and requests in flight of every host, overrides DEFAULT_LIMITS,
+            defaults to None
+        :type limits: Dict[str, HostLimit], optional
+        """
+        with self._lock:
+            self.limits = {**self.DEFAULT_LIMITS, **(limits or {})}
+            self._buckets: Dict[str, TokenBucket] = {}
+            self._in_flight: Dict[str, BoundedSemaphore] = {}
+            self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def share_in_flight(self, semaphores: Dict[str, Any]) -> None:
+        """Makes requests in flight of the hosts count towards semaphores shared with other processes, e.g. shards of
+        a sharded scrape, so the processes together keep the limits of requests in flight. The semaphores are kept
+        when the limits are configured again.
+
+        :param semaphores: Semaphores created by multiprocessing, with the limit of requests in flight of every host
+            name or '*'
+        :type semaphores: Dict[str, Any]
+        """
+        with self._lock:
+            self._shared_in_flight = dict(semaphores)
+            self._in_flight = {}
+
+    def host_key(self, url: str) -> str:
+        """Returns the name of the limit used for the URL.
+
+        :param url: URL or host name
+        :type url: str
+        :return: Host name or parent domain with a limit, '*' if there is none
+        :rtype: str
+        """
+        host = (urlsplit(url).hostname if '//' in url else url).lower()
+        parts = host.split('.')
+        for i in range(len(parts)):
+            domain = '.'.join(parts[i:])
+            if domain in self.limits:
+                return domain
+        return '*'
+
+    def circuit_breaker(self, url: str) -> CircuitBreaker:
+        """Returns the circuit breaker of the host, creates it on first use.
+
+        :param url: URL of the request
+        :type url: str
+        :return: Circuit breaker of the host and port of the URL
+        :rtype: CircuitBreaker
+        """
+        host = urlsplit(url).netloc or url
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(host)
+            return self._breakers[host]
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[float]:
+        """Context manager holding one of the requests in flight of the host, entered once the rate of the host
+        allows another request.
+
+        :param url: URL of the request
+        :type url: str
+        :raises DeadlineExceeded: If the deadline of the current thread expires or is cancelled before the slot is
+            entered
+        :return: Time in seconds spent waiting for the slot
+        :rtype: float
+        """
+        check_deadline()
+        if get_page_capture().replaying:
+            yield 0.0
+            return
+        start = time.monotonic()
+        bucket, in_flight = self._host_state(self.host_key(url))
+        while not in_flight.acquire(timeout=wait_timeout()):
+            check_deadline()
+        try:
+            bucket.take()
+            check_deadline()
+            yield time.monotonic() - start
+        finally:
+            in_flight.release()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """Sends a GET request within the limit of its host, repeats it while it fails with transient errors.
+
+        :param url: URL of the request
+        :type url: str
+        :raises CircuitOpen: If the circuit of the host is open
+        :return: Response to the request, the last one if every attempt was answered with an error status
+        :rtype: requests.Response
+        """
+        return self.request('GET', url, **kwargs)
+
+    def request(self, method: str, url: str, session: Optional[requests.Session] = None,
+                capture_key: Optional[str] = None, **kwargs) -> requests.Response:
+        """Sends an HTTP request within the limit of its host, repeats it while it fails with transient errors.
+
+        :param method: HTTP method, e.g. 'POST'
+        :type method: str
+        :param url: URL of the request
+        :type url: str
+        :param session: Session keeping the connections to the host open, defaults to None which means a new
+            connection for every request
+        :type session: requests.Session, optional
+        :param capture_key: Key of the response in the page capture, needed by requests whose body changes the
+            response, defaults to None which means the URL
+        :type capture_key: str, optional
+        :raises CircuitOpen: If the circuit of the host is open
+        :return: Response to the request, the last one if every attempt was answered with an error status
+        :rtype: requests.Response
+        """
+        try:
+            return self._send(url, lambda: self._request_once(method, url, session, capture_key or url, **kwargs))
+        except TransientError as e:
+            if e.response is None:
+                raise
+            return e.response
+
+    def load(self, driver: WebDriver, url: str) -> None:
+        """Loads the page in the browser within the limit of its host, repeats it while it fails with transient
+        errors.
+
+        :param driver: Browser loading the page
+        :type driver: WebDriver
+        :param url: URL of the page
+        :type url: str
+        :raises CircuitOpen: If the circuit of the host is open
+        """
+        self._send(url, lambda: self._load_once(driver, url))
+
+    def _send(self, url: str, send: Callable[[], Any]) -> Any:
+        """Sends a request with the retry policy within the circuit breaker of its host. Replayed pages are served
+        from the page capture, so they are neither repeated nor counted by the breaker.
+        """
+        if get_page_capture().replaying:
+            return send()
+        breaker = self.circuit_breaker(url)
+
+        def attempt() -> Any:
+            try:
+                breaker.allow()
+            except CircuitOpen:
+                get_metrics().record_rejected(url)
+                raise
+            try:
+                result = send()
+            except Exception as e:
+                if is_retryable(e):
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+                raise
+            breaker.record_success()
+            return result
+
+        return self.retry_policy.call(attempt, on_retry=lambda error: get_metrics().record_retry(url))
+
+    def _request_once(self, method: str, url: str, session: Optional[requests.Session], capture_key: str,
+                      **kwargs) -> requests.Response:
+        """Sends a single request, an error status worth repeating is raised as TransientError.
+        """
+        page_capture = get_page_capture()
+        with self.slot(url) as waited:
+            start = time.perf_counter()
+            if page_capture.replaying:
+                response = page_capture.replay_response(capture_key)
+            else:
+                remaining = remaining_time()
+                if remaining < math.inf:
+                    kwargs['timeout'] = min(kwargs.get('timeout') or math.inf, remaining)
+                try:
+                    response = (session or requests).request(method, url, **kwargs)
+                except requests.Timeout:
+                    check_deadline()
+                    raise
+            seconds = time.perf_counter() - start
+        get_metrics().record_request(url, seconds, waited, len(response.content))
+        page_capture.record_response(capture_key, response)
+        if response.status_code in RETRY_STATUSES and not page_capture.replaying:
+            raise TransientError(f"{url} answered with HTTP {response.status_code}", response)
+        return response
+
+    def _load_once(self, driver: WebDriver, url: str) -> None:
+        """Loads the page once, an error page of the browser is raised as TransientError.
+        """
+        with self.slot(url) as waited:
+            start = time.perf_counter()
+            remaining = remaining_time()
+            if remaining == math.inf or isinstance(driver, ReplayDriver):
+                driver.get(url)
+            else:
+                # a page which never finishes loading does not outlive the deadline
+                driver.set_page_load_timeout(max(remaining, 0.001))
+                try:
+                    driver.get(url)
+                except TimeoutException:
+                    check_deadline()
+                    raise
+                finally:
+                    driver.set_page_load_timeout(DEFAULT_PAGE_LOAD_TIMEOUT)
+            seconds = time.perf_counter() - start
+        get_metrics().record_request(url, seconds, waited, _page_size(driver))
+        if not isinstance(driver, ReplayDriver) and str(driver.current_url).startswith(ERROR_PAGE_PREFIXES):
+            raise TransientError(f"{url} could not be loaded by the browser")
+
+    def _host_state(self, key: str) -> Tuple[TokenBucket, BoundedSemaphore]:
+        """Returns the token bucket and the in flight semaphore of the host, creates them on first use.
+        """
+        with self._lock:
+            rate, max_in_flight = self.limits[key]
+            if key not in self._buckets:
+                self._buckets[key] = TokenBucket(rate, burst=max(1, max_in_flight))
+            # semaphores are replaced when they are shared, buckets keep their tokens
+            if key not in self._in_flight:
+                self._in_flight[key] = (self._shared_in_flight.get(key)
+                                        or BoundedSemaphore(max(1, max_in_flight)))
+            return self._buckets[key], self._in_flight[key]
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Returns common RateLimiter instance for the whole process.
+
+    :return: Instance of RateLimiter
+    :rtype: RateLimiter
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter()
+        return _rate_limiter
@@ -0,0 +1,204 @@
+"""
+retry.py
+====================================
+This module contains the retry policy of transient errors and the circuit breaker of sites which are down.
+"""
+
+import random
+import time
+from threading import Lock
+from typing import Any, Callable, Optional
+
+import requests
+from selenium.common.exceptions import (InvalidSelectorException, InvalidSessionIdException, NoSuchElementException,
+                                        NoSuchWindowException, TimeoutException, WebDriverException)
+
+from WebCrawler.custom_logger import get_logger
+from WebCrawler.network.deadline import DeadlineExceeded, check_deadline, remaining_time
+from WebCrawler.network.page_capture import PageNotRecorded
+
+# HTTP statuses of overloaded or failing servers, requests answered with them are repeated
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# addresses of error pages shown by browsers when a page could not be loaded
+ERROR_PAGE_PREFIXES = ('chrome-error://', 'about:neterror')
+
+
+class TransientError(Exception):
+    """Raised when a site answers with an error which is likely to pass, e.g. HTTP 503 or a browser error page.
+
+    :param message: Description of the error
+    :type message: str
+    :param response: Response with the error status, defaults to None
+    :type response: requests.Response, optional
+    """
+
+    def __init__(self, message: str, response: Optional[requests.Response] = None):
+        """Constructor method.
+        """
+        super().__init__(message)
+        self.response = response
+
+
+class CircuitOpen(Exception):
+    """Raised instead of sending a request to a site whose circuit breaker is open.
+    """
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Decides whether the operation which raised the error is worth repeating. Network errors, timeouts and
+    browser errors are, missing elements, closed browsers, exceeded time budgets, open circuits and programming
+    errors are not.
+
+    :param error: Raised exception
+    :type error: BaseException
+    :return: True if the error is likely to be transient
+    :rtype: bool
+    """
+    if isinstance(error, (DeadlineExceeded, CircuitOpen, PageNotRecorded, NoSuchElementException,
+                          InvalidSelectorException, InvalidSessionIdException, NoSuchWindowException)):
+        return False
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (TransientError, requests.ConnectionError, requests.Timeout, TimeoutException,
+                              WebDriverException))
+
+
+class RetryPolicy:
+    """Repeats operations failing with retryable errors after exponentially growing delays with full jitter, so
+    scrapers hitting the same site at once do not retry in lockstep. Delays never outlast the deadline of the
+    current thread.
+
+    :param attempts: Maximum number of attempts, including the first one, defaults to 3
+    :type attempts: int, optional
+    :param base_delay: Upper bound in seconds of the delay before the first retry, doubled for every next one,
+        defaults to 1.0
+    :type base_delay: float, optional
+    :param max_delay: Upper bound in seconds of any delay, defaults to 30.0
+    :type max_delay: float, optional
+    """
+
+    def __init__(self, attempts: int = 3, base_delay: float = 1.0, max_delay: float = 30.0):
+        """Constructor method.
+        """
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, retry: int) -> float:
+        """Returns a random delay before the retry.
+
+        :param retry: Number of the retry, starting from 0
+        :type retry: int
+        :return: Delay in seconds
+        :rtype: float
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def call(self, function: Callable[[], Any], on_retry: Callable[[BaseException], None] = None) -> Any:
+        """Calls the function until it succeeds, fails with an error which is not retryable or runs out of attempts.
+
+        :param function: Operation to call
+        :type function: Callable[[], Any]
+        :param on_retry: Function called with the error before every retry, defaults to None
+        :type on_retry: Callable[[BaseException], None], optional
+        :raises DeadlineExceeded: If the deadline of the current thread expires while waiting for a retry
+        :return: Value returned by the function
+        :rtype: Any
+        """
+        for attempt in range(self.attempts):
+            try:
+                return function()
+            except Exception as e:
+                if attempt == self.attempts - 1 or not is_retryable(e):
+                    raise
+                if on_retry is not None:
+                    on_retry(e)
+                time.sleep(min(self.delay(attempt), remaining_time()))
+                check_deadline()
+
+
+class CircuitBreaker:
+    """Circuit breaker of a single site. After failure_threshold consecutive failures the circuit opens and requests
+    fail fast with CircuitOpen instead of waiting for timeouts of a site which is down. After reset_timeout seconds
+    a single probe request is let through, its success closes the circuit and its failure opens it again for twice
+    as long, up to max_reset_timeout.
+
+    :param name: Name of the site used in logs
+    :type name: str
+    :param failure_threshold: Number of consecutive failures opening the circuit, defaults to 5
+    :type failure_threshold: int, optional
+    :param reset_timeout: Seconds the circuit stays open before the first probe, defaults to 30.0
+    :type reset_timeout: float, optional
+    :param max_reset_timeout: Upper bound in seconds of the time the circuit stays open, defaults to 300.0
+    :type max_reset_timeout: float, optional
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 300.0):
+        """Constructor method.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._open_for = reset_timeout
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = Lock()
+        self.logger = get_logger()
+
+    def allow(self) -> None:
+        """Checks whether a request may be sent, lets a single probe through once the circuit was open long enough.
+
+        :raises CircuitOpen: If the circuit is open or a probe is already in flight
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self._open_for:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            retry_in = max(0.0, self._opened_at + self._open_for - time.monotonic())
+        raise CircuitOpen(f"Circuit of {self.name} is open, next probe in {retry_in:.0f} s")
+
+    def record_success(self) -> None:
+        """Closes the circuit after a successful request.
+        """
+        with self._lock:
+            closed = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.failures = 0
+            self._open_for = self.reset_timeout
+            self._probing = False
+        if closed:
+            self.logger.info(f"Circuit of {self.name} closed, the site responds again")
+
+    def record_failure(self) -> None:
+        """Counts a failed request, opens the circuit after too many of them or after a failed probe.
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                self._open_for = min(self._open_for * 2, self.max_reset_timeout)
+            elif self.state == self.OPEN or self.failures < self.failure_threshold:
+                return
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+            open_for = self._open_for
+        self.logger.warning(f"Circuit of {self.name} opened for {open_for:.0f} s after {self.failures} failures")
+
+    def release(self) -> None:
+        """Gives back the probe of a request which neither succeeded nor failed because of the site, e.g. whose
+        time budget was exceeded.
+        """
+        with self._lock:
+            self._probing = False
@@ -0,0 +1,55 @@
+"""
+sites.py
+====================================
+This module contains base URLs of the scraped sites, they can be overridden e.g. to scrape a local fixture site.
+"""
+
+import os
+from typing import Dict
+
+SITES = {
+    'regon': 'https://wyszukiwarkaregon.stat.gov.pl',
+    'krs': 'https://wyszukiwarka-krs.ms.gov.pl',
+    'aleo': 'https://aleo.com',
+    'gpw': 'https://www.gpw.pl',
+    'newconnect': 'https://www.newconnect.pl',
+    'infostrefa': 'https://infostrefa.com',
+    'bankier': 'https://www.bankier.pl'
+}
+
+
+def _variable(site: str) -> str:
+    """Returns the name of the environment variable overriding the base URL of the site.
+    """
+    return f'WCRAWLER_URL_{site.upper()}'
+
+
+def site_url(site: str) -> str:
+    """Returns the base URL of the site without a trailing slash. The URL of every site can be overridden with
+    an environment variable, e.g. WCRAWLER_URL_BANKIER, so processes started by the scraper use it too.
+
+    :param site: Name of the site, one of SITES
+    :type site: str
+    :return: Base URL of the site
+    :rtype: str
+    """
+    return os.environ.get(_variable(site), SITES[site]).rstrip('/')
+
+
+def override_site_urls(urls: Dict[str, str]) -> None:
+    """Overrides base URLs of the sites in the current process and processes started from it.
+
+    :param urls: Base URLs keyed by the name of the site
+    :type urls: Dict[str, str]
+    """
+    for site, url in urls.items():
+        if site not in SITES:
+            raise ValueError(f"Unknown site: {site}")
+        os.environ[_variable(site)] = url
+
+
+def reset_site_urls() -> None:
+    """Removes all the overrides of base URLs.
+    """
+    for site in SITES:
+        os.environ.pop(_variable(site), None)
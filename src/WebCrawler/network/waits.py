@@ -0,0 +1,317 @@
+"""
+waits.py
+====================================
+This module contains explicit waits of Selenium scrapers with timeouts adapted to the latencies observed on every
+site, used instead of fixed sleeps and long implicit waits.
+"""
+
+import time
+from threading import Lock
+from typing import Any, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
+from selenium.webdriver.remote.webdriver import WebDriver
+from selenium.webdriver.support.wait import WebDriverWait
+
+from WebCrawler.metrics import get_metrics
+from WebCrawler.network.deadline import check_deadline, remaining_time
+from WebCrawler.network.page_capture import ReplayDriver, live_driver
+
+Condition = Callable[[WebDriver], Any]
+
+# counts DOM mutations and XHR or fetch requests in flight of the page, installed once per loaded document
+INSTRUMENT_SCRIPT = """
+if (!window.__wcrawlerWaits) {
+    var state = window.__wcrawlerWaits = {mutations: 0, changed: Date.now(), pending: 0, network: Date.now()};
+    var changed = function () { state.mutations++; state.changed = Date.now(); };
+    var started = function () { state.pending++; state.network = Date.now(); };
+    var finished = function () { state.pending--; state.network = Date.now(); };
+    new MutationObserver(changed).observe(document, {childList: true, subtree: true, attributes: true,
+                                                     characterData: true});
+    var send = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        started();
+        this.addEventListener('loadend', finished);
+        return send.apply(this, arguments);
+    };
+    if (window.fetch) {
+        var fetch = window.fetch;
+        window.fetch = function () {
+            started();
+            var result = fetch.apply(this, arguments);
+            result.then(finished, finished);
+            return result;
+        };
+    }
+}
+return window.__wcrawlerWaits.mutations;
+"""
+# ready state, number of mutations, milliseconds since the last mutation, requests in flight and milliseconds since
+# the last request started or finished, only the ready state if the document was not instrumented
+STATE_SCRIPT = ("var state = window.__wcrawlerWaits; if (!state) return [document.readyState]; var now = Date.now(); "
+                "return [document.readyState, state.mutations, now - state.changed, state.pending, "
+                "now - state.network];")
+
+
+def _page_state(driver: WebDriver) -> list:
+    return live_driver(driver).execute_script(STATE_SCRIPT) or ['loading']
+
+
+def dom_settled(mutations: int, quiet: float = 0.1) -> Condition:
+    """Returns a condition met when the DOM changed since the page was instrumented with AdaptiveWaits.instrument
+    and did not change for quiet seconds. A document loaded since, e.g. after a click following a link, is settled
+    once it is loaded.
+
+    :param mutations: Number of mutations returned by AdaptiveWaits.instrument before the interaction
+    :type mutations: int
+    :param quiet: Seconds without mutations, defaults to 0.1
+    :type quiet: float, optional
+    :return: Condition for AdaptiveWaits.until
+    :rtype: Condition
+    """
+    def condition(driver: WebDriver) -> bool:
+        if isinstance(driver, ReplayDriver):
+            # the replayed page is already in the state captured after the interaction
+            return True
+        state = _page_state(driver)
+        if len(state) == 1:
+            return state[0] == 'complete'
+        return state[1] > mutations and state[2] >= quiet * 1000
+
+    return condition
+
+
+def network_idle(quiet: float = 0.1) -> Condition:
+    """Returns a condition met when the document is loaded and no XHR or fetch request was in flight for quiet
+    seconds. Requests are only counted on pages instrumented with AdaptiveWaits.instrument.
+
+    :param quiet: Seconds without requests, defaults to 0.1
+    :type quiet: float, optional
+    :return: Condition for AdaptiveWaits.until
+    :rtype: Condition
+    """
+    def condition(driver: WebDriver) -> bool:
+        if isinstance(driver, ReplayDriver):
+            return True
+        state = _page_state(driver)
+        if len(state) == 1:
+            return state[0] == 'complete'
+        return state[0] == 'complete' and state[3] <= 0 and state[4] >= quiet * 1000
+
+    return condition
+
+
+class WaitTimeout:
+    """Timeout of waits of a single kind on a single site, estimated from observed wait times like the
+    retransmission timeout of TCP: smoothed time plus four deviations, doubled after every timeout.
+
+    :param initial: Timeout in seconds used before anything is observed
+    :type initial: float
+    :param minimum: Lower bound of the timeout in seconds
+    :type minimum: float
+    :param maximum: Upper bound of the timeout in seconds
+    :type maximum: float
+    """
+
+    def __init__(self, initial: float, minimum: float, maximum: float):
+        """Constructor method.
+        """
+        self.minimum = minimum
+        self.maximum = maximum
+        self.seconds = min(max(initial, minimum), maximum)
+        self.smoothed: Optional[float] = None
+        self.deviation = 0.0
+        self.waits = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+
+    def observe(self, seconds: float, timed_out: bool) -> None:
+        """Updates the timeout with the time of a finished wait.
+
+        :param seconds: Time in seconds the wait took
+        :type seconds: float
+        :param timed_out: Specifies whether the condition was not met in time
+        :type timed_out: bool
+        """
+        self.waits += 1
+        self.total_seconds += seconds
+        if timed_out:
+            self.timeouts += 1
+            self.seconds = min(self.seconds * 2, self.maximum)
+            return
+        if self.smoothed is None:
+            self.smoothed, self.deviation = seconds, seconds / 2
+        else:
+            self.deviation = 0.75 * self.deviation + 0.25 * abs(self.smoothed - seconds)
+            self.smoothed = 0.875 * self.smoothed + 0.125 * seconds
+        self.seconds = min(max(self.smoothed + 4 * self.deviation, self.minimum), self.maximum)
+
+    def to_dict(self) -> dict:
+        """Exports the state of the timeout.
+
+        :return: Dictionary with 'timeout', 'smoothed', 'waits', 'timeouts' and 'seconds'
+        :rtype: dict
+        """
+        return {'timeout': round(self.seconds, 3),
+                'smoothed': round(self.smoothed, 6) if self.smoothed is not None else None,
+                'waits': self.waits, 'timeouts': self.timeouts, 'seconds': round(self.total_seconds, 6)}
+
+
+class AdaptiveWaits:
+    """Explicit waits of Selenium scrapers. Every wait polls a condition, e.g. an element being present,
+    dom_settled or network_idle, with a timeout learned from the previous waits of the same kind on the same site,
+    so a missing element costs a few typical latencies of the site instead of a fixed implicit wait. Time spent
+    waiting is recorded in the run metrics. Waits do not last longer than the deadline of the current thread.
+
+    Pages replayed from a page capture are not waited for, the condition is checked once. Pages being recorded are
+    instrumented and polled past the recording proxy, so waits are not recorded as interactions.
+
+    :param initial_timeout: Timeout in seconds of a kind of waits before any of them finished, defaults to 10.0
+    :type initial_timeout: float, optional
+    :param min_timeout: Lower bound of learned timeouts in seconds, defaults to 1.0
+    :type min_timeout: float, optional
+    :param max_timeout: Upper bound of learned timeouts in seconds, defaults to 30.0
+    :type max_timeout: float, optional
+    :param poll_frequency: Seconds between checks of the condition, defaults to 0.05
+    :type poll_frequency: float, optional
+    """
+
+    def __init__(self, initial_timeout: float = 10.0, min_timeout: float = 1.0, max_timeout: float = 30.0,
+                 poll_frequency: float = 0.05):
+        """Constructor method.
+        """
+        self.initial_timeout = initial_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.poll_frequency = poll_frequency
+        self._timeouts: Dict[Tuple[str, str], WaitTimeout] = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def site_key(site: str) -> str:
+        """Returns the host the waits of the site are learned for.
+
+        :param site: URL or host name
+        :type site: str
+        :return: Host name
+        :rtype: str
+        """
+        return (urlsplit(site).hostname if '//' in site else site) or site
+
+    def timeout(self, site: str, name: str) -> float:
+        """Returns the current timeout of the waits.
+
+        :param site: URL of the site
+        :type site: str
+        :param name: Kind of the waits, e.g. 'search'
+        :type name: str
+        :return: Timeout in seconds
+        :rtype: float
+        """
+        return self._timeout(site, name).seconds
+
+    def instrument(self, driver: WebDriver) -> int:
+        """Starts counting DOM mutations and requests of the loaded page, to be called before the interaction
+        which is waited for with dom_settled or network_idle.
+
+        :param driver: Browser with the loaded page
+        :type driver: WebDriver
+        :return: Number of mutations counted so far, to be passed to dom_settled
+        :rtype: int
+        """
+        if isinstance(driver, ReplayDriver):
+            return 0
+        return int(live_driver(driver).execute_script(INSTRUMENT_SCRIPT) or 0)
+
+    def until(self, driver: WebDriver, condition: Condition, site: str, name: str, learn_timeouts: bool = True) -> Any:
+        """Waits until the condition returns a truthy value, like WebDriverWait.until with the learned timeout.
+
+        :param driver: Browser the condition is checked with
+        :type driver: WebDriver
+        :param condition: Function of the driver, e.g. one of selenium expected_conditions
+        :type condition: Condition
+        :param site: URL of the site
+        :type site: str
+        :param name: Kind of the wait, timeouts are learned separately for every kind
+        :type name: str
+        :param learn_timeouts: Specifies whether a timeout lengthens the learned timeout, False for waits which time
+            out when nothing is found rather than when the site is slow, defaults to True
+        :type learn_timeouts: bool, optional
+        :raises TimeoutException: If the condition is not met within the timeout
+        :raises DeadlineExceeded: If the deadline of the current thread expires first
+        :return: Value returned by the condition
+        :rtype: Any
+        """
+        check_deadline()
+        if isinstance(driver, ReplayDriver):
+            try:
+                result = condition(driver)
+            except (NoSuchElementException, StaleElementReferenceException):
+                result = None
+            if not result:
+                raise TimeoutException(f"Wait {name} was not met in the replayed page")
+            return result
+
+        timeout = self._timeout(site, name)
+        seconds = min(timeout.seconds, remaining_time())
+        start = time.perf_counter()
+        try:
+            result = WebDriverWait(driver, seconds, poll_frequency=self.poll_frequency).until(
+                condition, f"Wait {name} was not met within {seconds:.1f} s")
+        except TimeoutException:
+            # a wait cut short by the deadline says nothing about the latency of the site
+            self._observe(timeout, site, time.perf_counter() - start, True,
+                          learn=learn_timeouts and seconds >= timeout.seconds)
+            check_deadline()
+            raise
+        self._observe(timeout, site, time.perf_counter() - start, False)
+        return result
+
+    def stats(self) -> Dict[str, Dict[str, dict]]:
+        """Returns learned timeouts and wait times of every site.
+
+        :return: Dictionary of waits of every kind keyed by the host
+        :rtype: Dict[str, Dict[str, dict]]
+        """
+        with self._lock:
+            stats = {}
+            for (host, name), timeout in self._timeouts.items():
+                stats.setdefault(host, {})[name] = timeout.to_dict()
+            return stats
+
+    def reset(self) -> None:
+        """Forgets all the learned timeouts.
+        """
+        with self._lock:
+            self._timeouts = {}
+
+    def _timeout(self, site: str, name: str) -> WaitTimeout:
+        key = (self.site_key(site), name)
+        with self._lock:
+            if key not in self._timeouts:
+                self._timeouts[key] = WaitTimeout(self.initial_timeout, self.min_timeout, self.max_timeout)
+            return self._timeouts[key]
+
+    def _observe(self, timeout: WaitTimeout, site: str, seconds: float, timed_out: bool, learn: bool = True) -> None:
+        if learn:
+            with self._lock:
+                timeout.observe(seconds, timed_out)
+        get_metrics().record_wait(site, seconds, timed_out)
+
+
+_waits: Optional[AdaptiveWaits] = None
+_waits_lock = Lock()
+
+
+def get_waits() -> AdaptiveWaits:
+    """Returns common AdaptiveWaits instance for the whole process.
+
+    :return: Instance of AdaptiveWaits
+    :rtype: AdaptiveWaits
+    """
+    global _waits
+    with _waits_lock:
+        if _waits is None:
+            _waits = AdaptiveWaits()
+        return _waits
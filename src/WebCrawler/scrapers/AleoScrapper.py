@@ -1,31 +1,42 @@
-import requests
 from bs4 import BeautifulSoup
-import time
+from WebCrawler.metrics import get_metrics
+from WebCrawler.network import get_rate_limiter, site_url
 
+# aleo.com sometimes answers with a page without results, such requests are repeated
+MAX_ATTEMPTS = 10
 
-def get_href_links(tax_identifier, print_info=False):
+
+def _get(url, headers, is_complete, rate_limiter):
+    soup = None
+    for i in range(MAX_ATTEMPTS):
+        if i:
+            get_metrics().record_retry(url)
+        response = rate_limiter.get(url, headers=headers)
+        soup = BeautifulSoup(response.content, "html.parser")
+        if response.ok and is_complete(soup):
+            break
+    return soup
+
+
+def get_href_links(tax_identifier, print_info=False, rate_limiter=None):
+    rate_limiter = rate_limiter or get_rate_limiter()
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
                       'Chrome/58.0.3029.110 Safari/537.3'}
-    url = f"https://aleo.com/int/companies?phrase='{tax_identifier}'"
-    for i in range(10):
-        response = requests.get(url, headers=headers)
-        time.sleep(1)
+    url = f"{site_url('aleo')}/int/companies?phrase='{tax_identifier}'"
+    soup = _get(url, headers, lambda page: page.find("a", {"class": "catalog-row-first-line__company-name"}),
+                rate_limiter)
 
-    soup = BeautifulSoup(response.content, "html.parser")
     href_links = []
     for div in soup.find_all("div", {"class": "catalog-row-first-line"}):
         for a in div.find_all("a", {"class": "catalog-row-first-line__company-name"}):
             href_links.append(a.get("href"))
     if print_info:
         print(href_links[0])
-    url = f"https://aleo.com/int/{href_links[0]}"
+    url = f"{site_url('aleo')}/int/{href_links[0]}"
     if print_info:
         print(url)
-    for i in range(10):
-        response = requests.get(url, headers=headers)
-        time.sleep(1)
-    soup = BeautifulSoup(response.content, "html.parser")
+    soup = _get(url, headers, lambda page: True, rate_limiter)
 
     account_numbers = []
     for account in soup.find_all('div', {'class': 'bank-account__number'}):
@@ -2,5 +2,7 @@ from .AleoScrapper import get_href_links
 from .bankier_scraper import BankierScraper
 from .infostrefa_scraper import InfoStrefaScraper
 from .krs_scraper import KrsScraper
+from .local_unit_crawler import LocalUnit, LocalUnitCrawler
+from .regon_client import RegonClient
 from .regon_scraper import RegonScraper
 from .stock_name_scraper import StockNameScraper
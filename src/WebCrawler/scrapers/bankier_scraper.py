@@ -5,12 +5,19 @@ This module is used to scrape data from bankier.pl website.
 """
 
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+from typing import Callable
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as ec
 from bs4 import BeautifulSoup
 from datetime import datetime
 from WebCrawler.custom_logger import get_logger
+from WebCrawler.drivers import DriverPool, get_driver_pool
+from WebCrawler.network import AdaptiveWaits, RateLimiter, get_rate_limiter, get_waits, site_url
+from WebCrawler.storage import RecordBuilder
+
+# posts of a forum thread are saved in rows of about this many characters instead of one row of the whole
+# discussion, the sentiment model reads no more of a row anyway
+THREAD_CHUNK_CHARS = 4000
 
 
 class BankierScraper:
@@ -21,28 +28,37 @@ class BankierScraper:
             entities: DataFrame containing entities data.
             print_info: Flag indicating whether to print information during the scraping process.
     """
-    def __init__(self, entities: pd.DataFrame, num_pages=1, print_info=False):
+    def __init__(self, entities: pd.DataFrame, num_pages=1, print_info=False, driver_pool: DriverPool = None,
+                 on_news: Callable[[list], None] = None, rate_limiter: RateLimiter = None,
+                 waits: AdaptiveWaits = None):
         """
             Initializes an instance of BankierScraper.
 
             :param entities: DataFrame containing entities data.
             :param print_info: Flag indicating whether to print information during the scraping process.
                 Defaults to False.
+            :param driver_pool: Pool the browser is leased from, defaults to the pool shared by the whole process.
+            :param on_news: Function called with every scraped news row [nip, data, wiadomosc] as soon as it is
+                scraped, defaults to None.
+            :param rate_limiter: Limiter pacing requests to the site, defaults to the limiter shared by the
+                whole process.
+            :param waits: Waits for elements of the pages, defaults to the waits shared by the whole process.
         """
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.implicitly_wait(30)
+        self.site = site_url('bankier')
+        self.driver_pool = driver_pool or get_driver_pool()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.waits = waits or get_waits()
+        self.driver = self.driver_pool.acquire('chrome', self.site)
         self.forum_link = ''
         self.messages_link = ''
         self.news_link = ''
         self.entities = entities
-        self.news = pd.DataFrame(columns=[
+        self.news = RecordBuilder([
             'nip',
             'data',
             'wiadomosc'
         ])
+        self.on_news = on_news
         self.print_info = print_info
         self.logger = get_logger()
         self.num_pages = num_pages
@@ -58,25 +74,44 @@ class BankierScraper:
         for count, entity in enumerate(self.entities.itertuples()):
             counter = str(count+1) + '/' + str(len(self.entities))
             try:
-                self.driver.get(
-                    f"https://www.bankier.pl/inwestowanie/profile/quote.html?symbol={entity.nazwa_gieldowa}")
-                self.forum_link = self.driver.find_element(By.XPATH, "//div[contains(@id, 'boxForum')]/div[contains("
-                                                                     "@class, 'boxFooter')]/a").get_attribute('href')
-                self.messages_link = self.driver.find_element(By.XPATH, "//a[contains(text(), 'Więcej komunikatów')]").\
-                    get_attribute('href')
-                self.news_link = self.driver.find_element(By.XPATH, "//a[contains(text(), 'Więcej wiadomości')]").\
-                    get_attribute('href')
-                self._get_forum(entity.nip)
-                self._get_messages(entity.nip)
-                self._get_news(entity.nip)
+                self.scrap_entity(entity.nip, entity.nazwa_gieldowa)
                 if self.print_info:
                     self.logger.info(f"{counter} BankierScraper scraped: {entity.nip}")
             except:
                 if self.print_info:
                     self.logger.error(f"{counter} BankierScraper could not scrap: {entity.nip}")
 
-        self.driver.quit()
-        return self.news
+        self.close()
+        return self.news.to_dataframe()
+
+    def scrap_entity(self, nip: str, stock_name: str) -> None:
+        """
+            Public method used to scrape forum threads, messages and news of a single entity into the news records.
+
+            :param nip: NIP of the entity.
+            :param stock_name: Stock name of the entity used to find its profile on bankier.pl.
+            :return: None.
+        """
+        self.rate_limiter.load(self.driver, f"{self.site}/inwestowanie/profile/quote.html?symbol={stock_name}")
+        self.forum_link = self.waits.until(self.driver, ec.presence_of_element_located(
+            (By.XPATH, "//div[contains(@id, 'boxForum')]/div[contains(@class, 'boxFooter')]/a")), self.site,
+            'profile').get_attribute('href')
+        self.messages_link = self.driver.find_element(By.XPATH, "//a[contains(text(), 'Więcej komunikatów')]").\
+            get_attribute('href')
+        self.news_link = self.driver.find_element(By.XPATH, "//a[contains(text(), 'Więcej wiadomości')]").\
+            get_attribute('href')
+        self._get_forum(nip)
+        self._get_messages(nip)
+        self._get_news(nip)
+
+    def close(self) -> None:
+        """
+            Public method used to give the browser used by the scraper back to the driver pool.
+
+            :param: None.
+            :return: None.
+        """
+        self.driver_pool.release(self.driver, self.site)
 
     def _get_news(self, entity: str) -> None:
         """
@@ -86,7 +121,7 @@ class BankierScraper:
             :return: None.
         """
         news_links = []
-        self.driver.get(self.news_link)
+        self.rate_limiter.load(self.driver, self.news_link)
         for i in range(self.num_pages):
             html = self.driver.page_source
             soup = BeautifulSoup(html, 'html.parser')
@@ -94,7 +129,7 @@ class BankierScraper:
             for news_element in news_elements:
                 news_links.append(news_element.get('href'))
         for link in news_links:
-            self.driver.get(f"https://bankier.pl{link}")
+            self.rate_limiter.load(self.driver, f"{self.site}{link}")
             html = self.driver.page_source
             soup = BeautifulSoup(html, 'html.parser')
             article_attributes = soup.find('div', {'class': 'm-article-attributes'}).find_all('div')
@@ -108,7 +143,7 @@ class BankierScraper:
             news = ''
             for paragraph in paragraphs:
                 news += paragraph.text
-            self.news.loc[len(self.news)] = [entity, date, news]
+            self._add_news([entity, date, news])
 
     def _get_messages(self, entity: str) -> None:
         """
@@ -118,7 +153,7 @@ class BankierScraper:
             :return: None.
         """
         messages_links = []
-        self.driver.get(self.messages_link)
+        self.rate_limiter.load(self.driver, self.messages_link)
         for i in range(self.num_pages):
             html = self.driver.page_source
             soup = BeautifulSoup(html, 'html.parser')
@@ -131,12 +166,12 @@ class BankierScraper:
                     messages_links.append(href)
             next_page_element = articles_div.find('a', {'class': 'next'})
             if next_page_element:
-                self.driver.get(f"https://bankier.pl{next_page_element.get('href')}")
+                self.rate_limiter.load(self.driver, f"{self.site}{next_page_element.get('href')}")
             else:
                 break
 
         for link in messages_links:
-            self.driver.get(f"https://bankier.pl{link}")
+            self.rate_limiter.load(self.driver, f"{self.site}{link}")
             html = self.driver.page_source
             soup = BeautifulSoup(html, 'html.parser')
             date = soup.find('div', {'class': 'm-article-attributes'}).find_all('div')[0].text
@@ -151,7 +186,7 @@ class BankierScraper:
                 next_tr = tr_element.find_next_sibling('tr')
                 if next_tr:
                     td_content = next_tr.find('td', {'colspan': True}).text
-                    self.news.loc[len(self.news)] = [entity, date, td_content]
+                    self._add_news([entity, date, td_content])
 
     def _get_forum(self, entity: str) -> None:
         """
@@ -161,7 +196,7 @@ class BankierScraper:
             :return: None.
         """
         thread_links = []
-        self.driver.get(self.forum_link)
+        self.rate_limiter.load(self.driver, self.forum_link)
         for i in range(self.num_pages):
             html = self.driver.page_source
             soup = BeautifulSoup(html, 'html.parser')
@@ -170,19 +205,19 @@ class BankierScraper:
                 thread_links.append(tr_element.find('a').get('href'))
             next_btn = soup.find('div', {'class': 'pagination'}).find('a', {'class': 'next'})
             if next_btn:
-                self.driver.get(f"https://bankier.pl{next_btn.get('href')}")
+                self.rate_limiter.load(self.driver, f"{self.site}{next_btn.get('href')}")
             else:
                 break
         for link in thread_links:
-            self.driver.get(f"https://bankier.pl/forum/{link}")
+            self.rate_limiter.load(self.driver, f"{self.site}/forum/{link}")
             html = self.driver.page_source
             soup = BeautifulSoup(html, 'html.parser')
             date = soup.find('div', {'class': 'entry-meta'}).find('time', {'class': 'entry-date'}).text.strip()
             date = datetime.strptime(date, "%Y-%m-%d %H:%M").strftime("%H:%M %d/%m/%Y")
             show_all = soup.find('a', {'id': 'showAllThread'})
-            text = ''
             if show_all:
-                self.driver.get(f"https://bankier.pl/forum/{show_all.get('href')}")
+                posts, size = [], 0
+                self.rate_limiter.load(self.driver, f"{self.site}/forum/{show_all.get('href')}")
                 while True:
                     html = self.driver.page_source
                     soup = BeautifulSoup(html, 'html.parser')
@@ -190,12 +225,30 @@ class BankierScraper:
                     if thread_tree:
                         li_elements = thread_tree.find_all('li')
                         for li_element in li_elements:
-                            text += li_element.find('div', {'class': 'p'}).text
+                            post = li_element.find('div', {'class': 'p'}).text
+                            # a long discussion is saved in parts as it is read
+                            if posts and size + len(post) > THREAD_CHUNK_CHARS:
+                                self._add_news([entity, date, ''.join(posts)])
+                                posts, size = [], 0
+                            posts.append(post)
+                            size += len(post)
                     next_btn = soup.find('div', {'class': 'pagination'}).find('a', {'class': 'next'})
                     if next_btn:
-                        self.driver.get(f"https://bankier.pl{next_btn.get('href')}")
+                        self.rate_limiter.load(self.driver, f"{self.site}{next_btn.get('href')}")
                     else:
                         break
+                text = ''.join(posts)
             else:
                 text = soup.find('div', {'id': 'boxThread'}).find('div', {'class': 'p'}).text
-            self.news.loc[len(self.news)] = [entity, date, text]
+            self._add_news([entity, date, text])
+
+    def _add_news(self, row: list) -> None:
+        """
+            Private method used to save a scraped news row and pass it to the on_news callback.
+
+            :param row: News row [nip, data, wiadomosc].
+            :return: None.
+        """
+        self.news.append(row)
+        if self.on_news is not None:
+            self.on_news(row)
@@ -5,11 +5,14 @@ This module is used to scrape data from infostrefa.pl website.
 """
 
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+from typing import Callable
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as ec
 from bs4 import BeautifulSoup
 from WebCrawler.custom_logger import get_logger
+from WebCrawler.drivers import DriverPool, get_driver_pool
+from WebCrawler.network import AdaptiveWaits, RateLimiter, get_rate_limiter, get_waits, site_url
+from WebCrawler.storage import RecordBuilder
 
 
 class InfoStrefaScraper:
@@ -21,26 +24,37 @@ class InfoStrefaScraper:
             entities (pd.DataFrame): DataFrame containing entities data.
             print_info (bool): Flag indicating whether to print information during the scraping process.
     """
-    def __init__(self, entities: pd.DataFrame, num_pages=1, print_info=False):
+    def __init__(self, entities: pd.DataFrame, num_pages=1, print_info=False, driver_pool: DriverPool = None,
+                 on_news: Callable[[list], None] = None, rate_limiter: RateLimiter = None,
+                 waits: AdaptiveWaits = None):
         """
             Initializes an instance of InfoStrefaScraper.
 
             :param entities: DataFrame containing entities data.
             :param print_info: Flag indicating whether to print information during the scraping process.
                 Defaults to False.
+            :param driver_pool: Pool the browser is leased from, defaults to the pool shared by the whole process.
+            :param on_news: Function called with every scraped news row [nip, data, wiadomosc] as soon as it is
+                scraped, defaults to None.
+            :param rate_limiter: Limiter pacing requests to the site, defaults to the limiter shared by the
+                whole process.
+            :param waits: Waits for elements of the pages, defaults to the waits shared by the whole process.
         """
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.implicitly_wait(30)
+        self.site = site_url('infostrefa')
+        self.driver_pool = driver_pool or get_driver_pool()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.waits = waits or get_waits()
+        self.driver = self.driver_pool.acquire('chrome', self.site)
+        # sessions of the pool which have already accepted the consent popup
+        self.consent_sessions = self.driver_pool.site_state(self.site).setdefault('consent_sessions', set())
         self.news_links = []
         self.entities = entities
-        self.news = pd.DataFrame(columns=[
+        self.news = RecordBuilder([
             'nip',
             'data',
             'wiadomosc'
         ])
+        self.on_news = on_news
         self.print_info = print_info
         self.logger = get_logger()
         self.num_pages = num_pages
@@ -53,7 +67,8 @@ class InfoStrefaScraper:
             :return: None.
         """
         self.news_links = []
-        pages_num = self.driver.find_element(By.XPATH, "//ul[@class='pagination']/li[last()]").text
+        pages_num = self.waits.until(self.driver, ec.presence_of_element_located(
+            (By.XPATH, "//ul[@class='pagination']/li[last()]")), self.site, 'search').text
 
         for i in range(min(int(pages_num), self.num_pages)):
             html = self.driver.page_source
@@ -74,29 +89,61 @@ class InfoStrefaScraper:
             :return: DataFrame containing scraped data.
 
         """
-        self.driver.get('https://infostrefa.com/infostrefa/pl/index/')
-        self.driver.delete_all_cookies()
-        self.driver.execute_script("window.localStorage.clear()")
-        self.driver.find_element(By.ID, 'rodoButtonAccept').click()
         for count, entity in enumerate(self.entities.itertuples()):
             counter = str(count+1) + '/' + str(len(self.entities))
             try:
-                entity_id = self._get_entity_id(entity.nazwa_gieldowa)
-                if entity_id:
-                    self.driver.get(
-                        f"https://infostrefa.com/infostrefa/pl/wiadomosci/szukaj/1?company={entity_id}&category=wszystko")
-                else:
+                if not self.scrap_entity(entity.nip, entity.nazwa_gieldowa):
                     continue
-                self._get_news_links()
-                self._get_news(entity.nip)
                 if self.print_info:
                     self.logger.info(f"{counter} InfostrefaScraper scraped: {entity.nip}")
             except:
                 if self.print_info:
                     self.logger.error(f"{counter} InfostrefaScraper could not scrap: {entity.nip}")
 
-        self.driver.quit()
-        return self.news
+        self.close()
+        return self.news.to_dataframe()
+
+    def scrap_entity(self, nip: str, stock_name: str) -> bool:
+        """
+            Public method used to scrape news of a single entity into the news records.
+
+            :param nip: NIP of the entity.
+            :param stock_name: Stock name of the entity used to find it on infostrefa.pl.
+            :return: True if the entity was found on infostrefa.pl, otherwise False.
+        """
+        if self.driver.session_id not in self.consent_sessions:
+            self._accept_consent()
+        entity_id = self._get_entity_id(stock_name)
+        if not entity_id:
+            return False
+        self.rate_limiter.load(self.driver, f"{self.site}/infostrefa/pl/wiadomosci/szukaj/1?"
+                                            f"company={entity_id}&category=wszystko")
+        self._get_news_links()
+        self._get_news(nip)
+        return True
+
+    def close(self) -> None:
+        """
+            Public method used to give the browser used by the scraper back to the driver pool.
+
+            :param: None.
+            :return: None.
+        """
+        self.driver_pool.release(self.driver, self.site)
+
+    def _accept_consent(self) -> None:
+        """
+            Private method used to open infostrefa.pl with a clean session and accept the consent popup.
+
+            :param: None.
+            :return: None.
+        """
+        self.rate_limiter.load(self.driver, f'{self.site}/infostrefa/pl/index/')
+        self.driver.delete_all_cookies()
+        self.driver.execute_script("window.localStorage.clear()")
+        self.waits.until(self.driver, ec.element_to_be_clickable((By.ID, 'rodoButtonAccept')), self.site,
+                         'consent').click()
+        self.consent_sessions.add(self.driver.session_id)
 
     def _get_entity_id(self, entity: str) -> str:
         """
@@ -105,7 +152,7 @@ class InfoStrefaScraper:
             :param entity: Name of the entity for which the ID is to be retrieved.
             :return: Entity ID if found, otherwise an empty string.
         """
-        self.driver.get("https://infostrefa.com/infostrefa/pl/spolki")
+        self.rate_limiter.load(self.driver, f"{self.site}/infostrefa/pl/spolki")
         html = self.driver.page_source
         soup = BeautifulSoup(html, 'html.parser')
 
@@ -125,7 +172,7 @@ class InfoStrefaScraper:
             :return: None.
         """
         for i in range(len(self.news_links)):
-            self.driver.get(f"https://infostrefa.com{self.news_links[i]}")
+            self.rate_limiter.load(self.driver, f"{self.site}{self.news_links[i]}")
             html = self.driver.page_source
             soup = BeautifulSoup(html, 'html.parser')
             divs = soup.find_all('div', {'class': 'news-full-content'})
@@ -145,4 +192,15 @@ class InfoStrefaScraper:
                             else:
                                 text += '\n'
             date = soup.find('div', {'class': 'text-date'}).text
-            self.news.loc[len(self.news)] = [entity, date, text]
+            self._add_news([entity, date, text])
+
+    def _add_news(self, row: list) -> None:
+        """
+            Private method used to save a scraped news row and pass it to the on_news callback.
+
+            :param row: News row [nip, data, wiadomosc].
+            :return: None.
+        """
+        self.news.append(row)
+        if self.on_news is not None:
+            self.on_news(row)
@@ -1,10 +1,13 @@
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.support import expected_conditions as ec
 import pandas as pd
 from typing import *
+from WebCrawler.drivers import DriverPool, get_driver_pool
+from WebCrawler.network import (AdaptiveWaits, RateLimiter, extract_fields, extract_rows, get_rate_limiter, get_waits,
+                                site_url)
+from WebCrawler.storage import RecordBuilder
 
 xpaths = {
     'KRS': "//ds-input[@label='Numer KRS']/*/input",
@@ -28,6 +31,20 @@ xpaths = {
     'WayOfRepr': '//*[@id="p-panel-24-content"]/div/div/div/div[4]',
     'NextPage': "//*[@class='p-paginator-next p-paginator-element p-link p-ripple']"
 }
+# keys of general info and xpaths of the fields they are read from
+FIELDS = {
+    'nazwa': 'NameInfo',
+    'krs': 'KRSInfo',
+    'nip': 'NIPInfo',
+    'regon': 'RegonInfo',
+    'forma_prawna': 'LegalForm',
+    'data_wpisu_do_rej_przeds': 'DataEntry',
+    'data_wykr_z_rej_przeds': 'DataDeletion',
+    'nazwa_org_repr': 'NameOfRepr',
+    'sposob_repr': 'WayOfRepr',
+    'adr_www': 'WWWSite',
+    'email': 'Email'
+}
 
 
 class KrsScraper:
@@ -39,31 +56,53 @@ class KrsScraper:
     :type id_type: str
     :param headless: Specifies whether the browser should not pop up while scrapping, defaults to True
     :type headless: bool, optional
+    :param driver_pool: Pool the browser is leased from, defaults to the pool shared by the whole process or to
+        a private pool with a visible browser when headless is False
+    :type driver_pool: DriverPool, optional
+    :param rate_limiter: Limiter pacing requests to the site, defaults to the limiter shared by the whole process
+    :type rate_limiter: RateLimiter, optional
+    :param waits: Waits for elements of the pages, defaults to the waits shared by the whole process
+    :type waits: AdaptiveWaits, optional
     """
 
-    def __init__(self, idx: str, id_type: Literal["NIP", "REGON", "KRS"], headless: bool = True) -> None:
+    def __init__(self, idx: str, id_type: Literal["NIP", "REGON", "KRS"], headless: bool = True,
+                 driver_pool: DriverPool = None, rate_limiter: RateLimiter = None, waits: AdaptiveWaits = None) -> None:
         """Constructor method.
         """
-        self.url = 'https://wyszukiwarka-krs.ms.gov.pl/'
+        self.site = site_url('krs')
+        self.url = f"{self.site}/"
         self.id = idx
         self.id_type = id_type
         self.headless = headless
+        self.driver_pool = driver_pool
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.waits = waits or get_waits()
 
     def scrap(self) -> Tuple[dict[str, str], pd.DataFrame]:
-        """Scraps the site.
+        """Scraps the site using a browser leased from the driver pool.
+        """
+        if self.driver_pool is not None:
+            driver_pool = self.driver_pool
+        elif self.headless:
+            driver_pool = get_driver_pool()
+        else:
+            driver_pool = DriverPool(max_size=1, headless=False)
+
+        try:
+            with driver_pool.lease('chrome', self.url) as driver:
+                return self._scrap(driver)
+        finally:
+            if self.driver_pool is None and not self.headless:
+                driver_pool.close()
+
+    def _scrap(self, driver: WebDriver) -> Tuple[dict[str, str], pd.DataFrame]:
+        """Scraps the site with the given browser.
         """
-        chrome_options = Options()
-        if self.headless:
-            chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        driver = webdriver.Chrome(options=chrome_options)
-        driver.fullscreen_window()
-        driver.get(self.url)
+        self.rate_limiter.load(driver, self.url)
 
         # search and input id
-        WebDriverWait(driver, 10).until(ec.presence_of_element_located((By.XPATH, xpaths[self.id_type])))
-        input_element = driver.find_element(By.XPATH, xpaths[self.id_type])
+        input_element = self.waits.until(driver, ec.presence_of_element_located((By.XPATH, xpaths[self.id_type])),
+                                         self.site, 'form')
         input_element.send_keys(self.id)
 
         # mark 'Przedsiębiorcy' checkbox        
@@ -78,62 +117,24 @@ class KrsScraper:
         driver.find_element(By.XPATH, xpaths['Table'])
 
         try:
-            WebDriverWait(driver, 5).until(ec.presence_of_element_located((By.XPATH, xpaths['Link'])))
-        except:
+            # the result list stays empty when nothing is found, which says nothing about the latency of the site
+            self.waits.until(driver, ec.presence_of_element_located((By.XPATH, xpaths['Link'])), self.site, 'search',
+                             learn_timeouts=False)
+        except TimeoutException:
             raise Exception(f"KrsScrapper: Not found {self.id_type}: {self.id} in KRS.")
 
         driver.execute_script("document.getElementsByClassName('link')[0].click()")
 
-        # search Forma prawna
-        WebDriverWait(driver, 5).until(ec.presence_of_element_located((By.XPATH, xpaths['LegalForm'])))
-        legal_form_element = driver.find_element(By.XPATH, xpaths['LegalForm'])
-        legal_form = legal_form_element.text
-
-        # search namme
-        name_info_element = driver.find_element(By.XPATH, xpaths['NameInfo'])
-        name_info = name_info_element.text
-
-        # search KRS
-        krs_info_element = driver.find_element(By.XPATH, xpaths['KRSInfo'])
-        krs_info = krs_info_element.text
-
-        # search NIP
-        nip_info_element = driver.find_element(By.XPATH, xpaths['NIPInfo'])
-        nip_info = nip_info_element.text
-
-        # search REGON
-        regon_info_element = driver.find_element(By.XPATH, xpaths['RegonInfo'])
-        regon_info = regon_info_element.text
-
-        # search Data wpisu do Rejestru Przedsiębiorców
-        date_entry_element = driver.find_element(By.XPATH, xpaths['DataEntry'])
-        date_entry = date_entry_element.text
-
-        # search Data wykreślenia z Rejestru Przedsiębiorców
-        date_removal_element = driver.find_element(By.XPATH, xpaths['DataDeletion'])
-        date_removal = date_removal_element.text
-
-        # search Adres WWW
-        www_address_element = driver.find_element(By.XPATH, xpaths['WWWSite'])
-        www_address = www_address_element.text
-
-        # seach E-mail
-        email_element = driver.find_element(By.XPATH, xpaths['Email'])
-        email = email_element.text
-
-        # search Nazwa organu reprezentacji
-        nameofrepr_element = driver.find_element(By.XPATH, xpaths['NameOfRepr'])
-        nameofrepr = nameofrepr_element.text
-
-        # search Sposób reprezentacji
-        wayofrepr_element = driver.find_element(By.XPATH, xpaths['WayOfRepr'])
-        wayofrepr = wayofrepr_element.text
+        # all the fields of the details are read at once
+        self.waits.until(driver, ec.presence_of_element_located((By.XPATH, xpaths['LegalForm'])), self.site, 'details')
+        general_info = extract_fields(driver, {column: (By.XPATH, xpaths[name]) for column, name in FIELDS.items()})
+        nip_info = general_info['nip']
 
         # search section with representants
-        WebDriverWait(driver, 5).until(ec.presence_of_element_located((By.XPATH, xpaths['ReprSection'])))
-        repr_section = driver.find_element(By.XPATH, xpaths['ReprSection'])
+        self.waits.until(driver, ec.presence_of_element_located((By.XPATH, xpaths['ReprSection'])), self.site,
+                         'representatives')
 
-        representants = pd.DataFrame(columns=[
+        representants = RecordBuilder([
             'nip',
             'imie',
             'imie2',
@@ -144,16 +145,15 @@ class KrsScraper:
 
         # search Członkowie reprezentacji in rows
         while True:
-            WebDriverWait(driver, 5).until(ec.presence_of_element_located((By.XPATH, '//tbody/tr')))
-            rows = repr_section.find_elements(By.XPATH, '//tbody/tr')
-            for row in rows:
-                columns = row.find_elements(By.TAG_NAME, 'td')
-                row_data = [nip_info]
-                for column in columns:
-                    value = column.find_element(By.CLASS_NAME, 'ds-column-value').text
-                    row_data.append(value)
+            self.waits.until(driver, ec.presence_of_element_located((By.XPATH, '//tbody/tr')), self.site, 'rows')
+            # the first value of every cell of every row
+            rows = extract_rows(driver, (By.XPATH, '//tbody/tr'), (By.XPATH, "./td/descendant::*[contains(concat("
+                                                                   "' ', normalize-space(@class), ' '), "
+                                                                   "' ds-column-value ')][1]"))
+            for columns in rows:
+                row_data = [nip_info, *columns]
                 row_data_ordered = [row_data[0], row_data[3], row_data[4], row_data[1], row_data[2], row_data[5]]
-                representants.loc[len(representants)] = row_data_ordered
+                representants.append(row_data_ordered)
 
             try:
                 driver.find_element(By.XPATH, xpaths['NextPage'])
@@ -162,18 +162,4 @@ class KrsScraper:
             except:
                 break
 
-        general_info = {
-            "nazwa": name_info,
-            "krs": krs_info,
-            "nip": nip_info,
-            "regon": regon_info,
-            "forma_prawna": legal_form,
-            "data_wpisu_do_rej_przeds": date_entry,
-            "data_wykr_z_rej_przeds": date_removal,
-            "nazwa_org_repr": nameofrepr,
-            "sposob_repr": wayofrepr,
-            "adr_www": www_address,
-            "email": email,
-        }
-
-        return general_info, representants
+        return general_info, representants.to_dataframe()
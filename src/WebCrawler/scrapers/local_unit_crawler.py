@@ -0,0 +1,159 @@
+"""
+local_unit_crawler.py
+====================================
+This module is used to scrape local units of REGON entities concurrently, e.g. thousands of branches of a bank.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from threading import Lock, local
+from typing import Any, Callable, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+import pandas as pd
+
+from WebCrawler.custom_logger import get_logger, log_fields
+from WebCrawler.metrics import get_metrics
+from WebCrawler.network import (Deadline, DeadlineExceeded, RetryPolicy, check_deadline, current_deadline,
+                                deadline_scope)
+
+
+class LocalUnit(NamedTuple):
+    """Scraped local unit, restored ones were taken from an earlier run instead of being scraped.
+    """
+    regon: str
+    local_entity: pd.DataFrame
+    pkd: pd.DataFrame
+    restored: bool = False
+
+
+class LocalUnitCrawler:
+    """Scrapes local units listed by get_entity_info(..., local_units=False) of RegonScraper or RegonClient. The list
+    is read in pages of page_size units, units of a page are scraped concurrently by a bounded pool of scrapers,
+    each with its own browser or HTTP session, and every page is yielded as soon as it is scraped, so rows of an
+    entity with thousands of units are streamed instead of being collected until the last unit. Units seen by the
+    crawler before, or restored from an earlier run, are not scraped again.
+
+    :param scraper_factory: Function creating a scraper with get_local_entity_info, called once in every pool thread
+    :type scraper_factory: Callable[[], Any]
+    :param workers: Number of units scraped at once, defaults to 2
+    :type workers: int, optional
+    :param page_size: Number of units read from the list and yielded at once, defaults to 50
+    :type page_size: int, optional
+    :param retry_policy: Policy repeating units which failed with transient errors, defaults to 2 attempts
+    :type retry_policy: RetryPolicy, optional
+    :param unit_timeout: Time budget in seconds of a single unit within the budget of the crawl, defaults to 120.0,
+        None means no budget of its own
+    :type unit_timeout: float, optional
+    """
+
+    def __init__(self, scraper_factory: Callable[[], Any], workers: int = 2, page_size: int = 50,
+                 retry_policy: Optional[RetryPolicy] = None, unit_timeout: Optional[float] = 120.0):
+        """Constructor method.
+        """
+        self.scraper_factory = scraper_factory
+        self.workers = max(1, workers)
+        self.page_size = max(1, page_size)
+        self.retry_policy = retry_policy or RetryPolicy(attempts=2, base_delay=2.0)
+        self.unit_timeout = unit_timeout
+        self.seen: Set[str] = set()
+        self.failed: List[str] = []
+        self.metrics = get_metrics()
+        self.logger = get_logger()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._scrapers: List[Any] = []
+        self._scrapers_lock = Lock()
+        self._local = local()
+
+    def crawl(self, units: Iterable[tuple],
+              restore: Optional[Callable[[str], Optional[Tuple[pd.DataFrame, pd.DataFrame]]]] = None
+              ) -> Iterator[List[LocalUnit]]:
+        """Scrapes the units page by page. Requests of the pool threads count towards the metrics scope and stay
+        within the deadline of the calling thread. Units which failed are left in failed and may be tried again.
+
+        :param units: Arguments of get_local_entity_info, the REGON of the unit first, read lazily
+        :type units: Iterable[tuple]
+        :param restore: Function returning the local entity and PKD frames of a unit scraped in an earlier run,
+            None if it has to be scraped, defaults to None
+        :type restore: Callable[[str], Optional[Tuple[pd.DataFrame, pd.DataFrame]]], optional
+        :raises DeadlineExceeded: If the deadline of the calling thread expires, the page in progress is dropped
+        :return: Iterator of pages of scraped and restored units
+        :rtype: Iterator[List[LocalUnit]]
+        """
+        self.failed = []
+        deadline, record = current_deadline(), self.metrics.current()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='RegonLocal')
+
+        listed = (tuple(unit) for unit in units if unit and unit[0] not in self.seen)
+        while True:
+            check_deadline()
+            page = []
+            for unit in islice(listed, self.page_size):
+                self.seen.add(unit[0])
+                frames = restore(unit[0]) if restore is not None else None
+                if frames is not None:
+                    page.append((unit, LocalUnit(unit[0], *frames, restored=True)))
+                else:
+                    page.append((unit, self._executor.submit(self._scrap, unit, deadline, record)))
+            if not page:
+                return
+            yield self._collect(page, deadline)
+
+    def close(self) -> None:
+        """Stops the pool and closes the scrapers of its threads.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._scrapers_lock:
+            scrapers, self._scrapers = self._scrapers, []
+        for scraper in scrapers:
+            try:
+                scraper.close()
+            except:
+                self.logger.warning("Scraper of local units could not be closed")
+
+    def _collect(self, page: List[tuple], deadline: Optional[Deadline]) -> List[LocalUnit]:
+        """Waits for the units of the page, failed units are logged and forgotten, so they may be listed again.
+        A unit exceeding its own budget fails alone, an expired budget of the crawl drops the whole page and forgets
+        all of its units, including the ones scraped already.
+        """
+        scraped = []
+        for number, (unit, result) in enumerate(page):
+            if isinstance(result, LocalUnit):
+                scraped.append(result)
+                continue
+            try:
+                scraped.append(LocalUnit(unit[0], *result.result()))
+            except Exception as e:
+                if isinstance(e, DeadlineExceeded) and deadline is not None and deadline.expired:
+                    for _, pending in page[number + 1:]:
+                        if not isinstance(pending, LocalUnit):
+                            pending.cancel()
+                    # none of the units of the page is yielded
+                    self.seen.difference_update(dropped[0] for dropped, _ in page)
+                    raise
+                self.seen.discard(unit[0])
+                self.failed.append(unit[0])
+                self.logger.warning(f"Local unit {unit[0]} could not be scraped - {e}",
+                                    extra=log_fields('regon_local', unit[0]))
+        return scraped
+
+    def _scrap(self, unit: tuple, deadline: Optional[Deadline],
+               record: Optional[dict]) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Scrapes a single unit in a pool thread.
+        """
+        with deadline_scope(self.unit_timeout, deadline, 'local unit budget'), self.metrics.attach(record):
+            scraper = self._scraper()
+            return self.retry_policy.call(lambda: scraper.get_local_entity_info(*unit),
+                                          lambda e: self.metrics.record_retry())
+
+    def _scraper(self) -> Any:
+        """Returns the scraper of the current pool thread, created on first use.
+        """
+        scraper = getattr(self._local, 'scraper', None)
+        if scraper is None:
+            scraper = self._local.scraper = self.scraper_factory()
+            with self._scrapers_lock:
+                self._scrapers.append(scraper)
+        return scraper
@@ -0,0 +1,324 @@
+"""
+regon_client.py
+====================================
+This module is used to get information from the REGON database through the BIR1.1 service instead of a browser.
+"""
+
+import os
+import re
+import time
+from html import unescape
+from typing import Dict, List, Optional, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from WebCrawler.network import RateLimiter, get_rate_limiter, site_url
+from WebCrawler.scrapers.regon_scraper import ENTITY_COLUMNS, LOCAL_ENTITY_COLUMNS, PKD_COLUMNS
+from WebCrawler.storage import PkdDictionary, RecordBuilder, get_pkd_dictionary
+
+SERVICE_PATH = '/wsBIR/UslugaBIRzewnPubl.svc'
+# environment variable with the user key of BIR, read by processes started by the scraper too
+KEY_VARIABLE = 'WCRAWLER_REGON_KEY'
+PUBLIC_NAMESPACE = 'http://CIS/BIR/PUBL/2014/07'
+BIR_NAMESPACE = 'http://CIS/BIR/2014/07'
+ACTIONS = {
+    'Zaloguj': f'{PUBLIC_NAMESPACE}/IUslugaBIRzewnPubl/Zaloguj',
+    'DaneSzukajPodmioty': f'{PUBLIC_NAMESPACE}/IUslugaBIRzewnPubl/DaneSzukajPodmioty',
+    'DanePobierzPelnyRaport': f'{PUBLIC_NAMESPACE}/IUslugaBIRzewnPubl/DanePobierzPelnyRaport',
+    'GetValue': f'{BIR_NAMESPACE}/IUslugaBIR/GetValue'
+}
+ENVELOPE = ('<soap:Envelope xmlns:soap="http://www.w3.org/2003/05/soap-envelope" xmlns:ns="{namespace}" '
+            'xmlns:dat="http://CIS/BIR/PUBL/2014/07/DataContract">'
+            '<soap:Header xmlns:wsa="http://www.w3.org/2005/08/addressing">'
+            '<wsa:To>{url}</wsa:To><wsa:Action>{action}</wsa:Action></soap:Header>'
+            '<soap:Body><ns:{operation}>{parameters}</ns:{operation}></soap:Body></soap:Envelope>')
+# sessions of BIR expire after an hour without requests
+SESSION_TTL = 50 * 60
+# code of the error returned when no entity matches the search
+NOT_FOUND = '4'
+
+# full reports of every type of unit returned by the search: main report, PKD report and list of local units
+REPORTS = {
+    'P': ('BIR11OsPrawna', 'BIR11OsPrawnaPkd', 'BIR11OsPrawnaListaJednLokalnych'),
+    'F': ('BIR11OsFizycznaDaneOgolne', 'BIR11OsFizycznaPkd', 'BIR11OsFizycznaListaJednLokalnych'),
+    'LP': ('BIR11JednLokalnaOsPrawnej', 'BIR11JednLokalnaOsPrawnejPkd', None),
+    'LF': ('BIR11JednLokalnaOsFizycznej', 'BIR11JednLokalnaOsFizycznejPkd', None)
+}
+# reports of the business activity of a natural person keyed by the register (silos) it is kept in
+ACTIVITY_REPORTS = {
+    '1': 'BIR11OsFizycznaDzialalnoscCeidg',
+    '2': 'BIR11OsFizycznaDzialalnoscRolnicza',
+    '3': 'BIR11OsFizycznaDzialalnoscPozostala',
+    '4': 'BIR11OsFizycznaDzialalnoscSkreslonaDo20141108'
+}
+PREFIXES = {'P': 'praw', 'F': 'fiz', 'LP': 'lokpraw', 'LF': 'lokfiz'}
+FORM_FIELDS = ['podstawowaFormaPrawna', 'szczegolnaFormaPrawna', 'formaWlasnosci']
+ADDRESS_FIELDS = ['adSiedzKraj_Nazwa', 'adSiedzWojewodztwo_Nazwa', 'adSiedzPowiat_Nazwa', 'adSiedzGmina_Nazwa',
+                  'adSiedzMiejscowosc_Nazwa', 'adSiedzUlica_Nazwa', 'adSiedzNumerNieruchomosci', 'adSiedzKodPocztowy']
+
+
+class BirError(Exception):
+    """Raised when the BIR service answers with an error.
+    """
+
+
+def _postal_code(code: str) -> str:
+    return f'{code[:2]}-{code[2:]}' if re.fullmatch(r'\d{5}', code) else code
+
+
+def _pkd_code(code: str) -> str:
+    match = re.fullmatch(r'(\d{2})(\d{2})(\w)', code)
+    return '.'.join(match.groups()) if match else code
+
+
+class RegonClient:
+    """Client of the BIR1.1 service behind https://wyszukiwarkaregon.stat.gov.pl, used instead of RegonScraper.
+    Searches and full reports are SOAP requests sent over one pooled HTTP session through the rate limiter, so an
+    entity takes a few requests instead of a browser clicking through the search page. Returned DataFrames have
+    the same columns and formatting as those of RegonScraper.
+
+    :param api_key: User key of BIR, defaults to None which means the WCRAWLER_REGON_KEY environment variable
+    :type api_key: str, optional
+    :param rate_limiter: Limiter pacing requests to the site, defaults to the limiter shared by the whole process
+    :type rate_limiter: RateLimiter, optional
+    :param session: HTTP session the requests are sent with, defaults to a new session
+    :type session: requests.Session, optional
+    :param timeout: Timeout in seconds of every request, defaults to 30.0
+    :type timeout: float, optional
+    :param pkd_dictionary: Dictionary the names of PKD codes are kept in, defaults to the dictionary shared by the
+        whole process
+    :type pkd_dictionary: PkdDictionary, optional
+    """
+
+    def __init__(self, api_key: Optional[str] = None, rate_limiter: RateLimiter = None,
+                 session: Optional[requests.Session] = None, timeout: float = 30.0,
+                 pkd_dictionary: PkdDictionary = None):
+        """Constructor method.
+        """
+        self.api_key = api_key if api_key is not None else os.environ.get(KEY_VARIABLE, '')
+        self.url = f"{site_url('regon')}{SERVICE_PATH}"
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.timeout = timeout
+        self.pkd_dictionary = pkd_dictionary or get_pkd_dictionary()
+        self.session = session
+        if self.session is None:
+            self.session = requests.Session()
+            self.session.mount(self.url, HTTPAdapter(pool_connections=1, pool_maxsize=4))
+        self._session_id = None
+        self._logged_at = 0.0
+
+        self.entity_data = RecordBuilder(ENTITY_COLUMNS)
+        self.local_entity_data = RecordBuilder(LOCAL_ENTITY_COLUMNS)
+        self.pkd = RecordBuilder(PKD_COLUMNS)
+        # local units left for LocalUnitCrawler, arguments of get_local_entity_info
+        self.local_units = []
+
+    def get_entity_info(self, number: str, num_type: str,
+                        local_units: bool = True) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """Gets entities matching the identifier together with their local units and PKD codes.
+
+        :param number: Identifier of the entity
+        :type number: str
+        :param num_type: Type of the identifier, one of NIP, REGON or KRS
+        :type num_type: str
+        :param local_units: Specifies whether local units of the found entities are fetched, otherwise they are
+            only listed in local_units, e.g. for LocalUnitCrawler, defaults to True
+        :type local_units: bool, optional
+        :raises BirError: If the service answers with an error other than no entity found
+        :return: Entities, local units and PKD codes
+        :rtype: Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
+        """
+        self.reset_dataframes()
+        for unit in self.search(number, num_type):
+            if unit.get('Typ') in ('P', 'F'):
+                self._add_entity(unit, local_units)
+            elif unit.get('Typ') in ('LP', 'LF'):
+                self._add_local_entity(unit['Regon'], unit['Typ'])
+        return self.entity_data.to_dataframe(), self.local_entity_data.to_dataframe(), self.pkd.to_dataframe()
+
+    def get_local_entity_info(self, regon: str, unit_type: Optional[str] = None,
+                              parent: Optional[list] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Gets a single local unit listed in local_units together with its PKD codes.
+
+        :param regon: REGON of the local unit
+        :type regon: str
+        :param unit_type: Type of the unit, LP or LF, defaults to None which means it is searched for
+        :type unit_type: str, optional
+        :param parent: Row of the entity of the unit, defaults to None which means it is fetched
+        :type parent: list, optional
+        :return: Local unit and PKD codes
+        :rtype: Tuple[pd.DataFrame, pd.DataFrame]
+        """
+        self.reset_dataframes()
+        if unit_type is None:
+            unit_type = next(iter(self.search(regon, 'REGON')), {}).get('Typ', 'LP')
+        self._add_local_entity(regon, unit_type, parent)
+        return self.local_entity_data.to_dataframe(), self.pkd.to_dataframe()
+
+    def search(self, number: str, num_type: str) -> List[Dict[str, str]]:
+        """Searches units of the REGON database by the identifier.
+
+        :param number: Identifier of the entity
+        :type number: str
+        :param num_type: Type of the identifier, one of NIP, REGON or KRS
+        :type num_type: str
+        :return: Found units with their 'Regon', 'Nip', 'Nazwa', 'Typ' and 'SilosID'
+        :rtype: List[Dict[str, str]]
+        """
+        parameter = num_type.capitalize()
+        parameters = (f'<ns:pParametryWyszukiwania><dat:{parameter}>{escape(number)}</dat:{parameter}>'
+                      f'</ns:pParametryWyszukiwania>')
+        units = self._data('DaneSzukajPodmioty', parameters, f'{parameter}={number}')
+        if not units and self._value('StatusSesji') != '1':
+            # an expired session answers like a search which found nothing
+            self._session_id = None
+            units = self._data('DaneSzukajPodmioty', parameters, f'{parameter}={number}')
+        return units
+
+    def report(self, regon: str, name: str) -> List[Dict[str, str]]:
+        """Gets a full report of the unit.
+
+        :param regon: REGON of the unit
+        :type regon: str
+        :param name: Name of the report, e.g. BIR11OsPrawna
+        :type name: str
+        :return: Records of the report
+        :rtype: List[Dict[str, str]]
+        """
+        parameters = (f'<ns:pRegon>{escape(regon)}</ns:pRegon>'
+                      f'<ns:pNazwaRaportu>{escape(name)}</ns:pNazwaRaportu>')
+        return self._data('DanePobierzPelnyRaport', parameters, f'{name}={regon}')
+
+    def close(self) -> None:
+        """Closes connections of the HTTP session.
+        """
+        self.session.close()
+        self._session_id = None
+
+    def reset_dataframes(self) -> None:
+        """Clears records of the previous entity.
+        """
+        self.entity_data.clear()
+        self.local_entity_data.clear()
+        self.pkd.clear()
+        self.local_units = []
+
+    def _add_entity(self, unit: Dict[str, str], local_units: bool = True) -> None:
+        """Adds the entity, its PKD codes and its local units, or only lists the local units.
+        """
+        main_report, pkd_report, local_report = REPORTS[unit['Typ']]
+        prefix = PREFIXES[unit['Typ']]
+        data = next(iter(self.report(unit['Regon'], main_report)), {})
+        if unit['Typ'] == 'F' and unit.get('SilosID') in ACTIVITY_REPORTS:
+            # name and address of a natural person are kept in the report of the business activity
+            data = {**data, **next(iter(self.report(unit['Regon'], ACTIVITY_REPORTS[unit['SilosID']])), {})}
+
+        regon = data.get(f'{prefix}_regon9') or unit['Regon']
+        row = [regon, data.get(f'{prefix}_nip') or unit.get('Nip', ''),
+               data.get(f'{prefix}_nazwa') or unit.get('Nazwa', ''),
+               *self._forms(data, prefix), *self._address(data, prefix)]
+        self._add_pkd(regon, unit['Regon'], pkd_report, prefix)
+        self.entity_data.append(row)
+
+        for local_unit in self.report(unit['Regon'], local_report):
+            local_regon = local_unit.get(f'lok{prefix}_regon14')
+            if local_regon and local_units:
+                self._add_local_entity(local_regon, f'L{unit["Typ"]}', row)
+            elif local_regon:
+                self.local_units.append((local_regon, f'L{unit["Typ"]}', row))
+
+    def _add_local_entity(self, regon: str, unit_type: str, parent: Optional[list] = None) -> None:
+        """Adds the local unit and its PKD codes, the legal form and identifiers of its entity are taken from
+        the row of the entity.
+        """
+        main_report, pkd_report, _ = REPORTS[unit_type]
+        prefix = PREFIXES[unit_type]
+        if parent is None:
+            # REGON of a local unit starts with the REGON of its entity
+            parent_unit = next(iter(self.search(regon[:9], 'REGON')), None)
+            parent_data = next(iter(self.report(regon[:9], REPORTS[unit_type[1:]][0])), {}) if parent_unit else {}
+            parent_prefix = PREFIXES[unit_type[1:]]
+            parent = [regon[:9], (parent_unit or {}).get('Nip', ''), '', *self._forms(parent_data, parent_prefix)]
+
+        data = next(iter(self.report(regon, main_report)), {})
+        self.local_entity_data.append([data.get(f'{prefix}_regon14') or regon, parent[0], parent[1],
+                                       data.get(f'{prefix}_nazwa', ''), *parent[3:6], *self._address(data, prefix)])
+        self._add_pkd(regon, regon, pkd_report, prefix)
+
+    def _add_pkd(self, regon: str, report_regon: str, name: str, prefix: str) -> None:
+        for record in self.report(report_regon, name):
+            code = record.get(f'{prefix}_pkdKod', record.get(f'{prefix}_pkd_Kod', ''))
+            description = record.get(f'{prefix}_pkdNazwa', record.get(f'{prefix}_pkd_Nazwa', ''))
+            self.pkd.append([regon, self.pkd_dictionary.add(_pkd_code(code), description)])
+
+    @staticmethod
+    def _forms(data: Dict[str, str], prefix: str) -> List[str]:
+        """Returns legal forms and the form of ownership as the code and the name, like on the search page.
+        """
+        forms = []
+        for field in FORM_FIELDS:
+            symbol, name = data.get(f'{prefix}_{field}_Symbol', ''), data.get(f'{prefix}_{field}_Nazwa', '')
+            forms.append(f'{symbol} - {name}' if symbol and name else symbol or name)
+        return forms
+
+    @staticmethod
+    def _address(data: Dict[str, str], prefix: str) -> List[str]:
+        address = [data.get(f'{prefix}_{field}', '') for field in ADDRESS_FIELDS]
+        address[-1] = _postal_code(address[-1])
+        return address
+
+    def _data(self, operation: str, parameters: str, capture: str) -> List[Dict[str, str]]:
+        """Calls an operation returning records, an empty list means nothing was found.
+        """
+        result = self._call(operation, parameters, capture, PUBLIC_NAMESPACE, self._login())
+        if not result.strip():
+            return []
+        records = [{field.tag: (field.text or '').strip() for field in record}
+                   for record in ElementTree.fromstring(result).findall('dane')]
+        if records and 'ErrorCode' in records[0]:
+            if records[0]['ErrorCode'] == NOT_FOUND:
+                return []
+            raise BirError(f"BIR error {records[0]['ErrorCode']}: {records[0].get('ErrorMessagePl', '')}")
+        return records
+
+    def _value(self, name: str) -> str:
+        """Returns a diagnostic value of the service, e.g. StatusSesji.
+        """
+        return self._call('GetValue', f'<ns:pNazwaParametru>{name}</ns:pNazwaParametru>', name,
+                          BIR_NAMESPACE, self._session_id).strip()
+
+    def _login(self) -> str:
+        """Returns the identifier of the session, opens a new one if there is none or it is about to expire.
+        """
+        if self._session_id is None or time.monotonic() - self._logged_at > SESSION_TTL:
+            session_id = self._call('Zaloguj', f'<ns:pKluczUzytkownika>{escape(self.api_key)}</ns:pKluczUzytkownika>',
+                                    'Zaloguj', PUBLIC_NAMESPACE).strip()
+            if not session_id:
+                raise BirError(f"BIR session could not be opened, check the user key in {KEY_VARIABLE}")
+            self._session_id, self._logged_at = session_id, time.monotonic()
+        return self._session_id
+
+    def _call(self, operation: str, parameters: str, capture: str, namespace: str,
+              session_id: Optional[str] = None) -> str:
+        """Sends a SOAP request and returns the unescaped result of the operation.
+        """
+        envelope = ENVELOPE.format(namespace=namespace, url=self.url, action=ACTIONS[operation],
+                                   operation=operation, parameters=parameters)
+        headers = {'Content-Type': 'application/soap+xml; charset=utf-8'}
+        if session_id is not None:
+            headers['sid'] = session_id
+        # the service answers every operation on the same URL, so captured responses are keyed by the operation
+        response = self.rate_limiter.request('POST', self.url, session=self.session,
+                                             capture_key=f'{self.url}#{operation}:{capture}',
+                                             data=envelope.encode('utf-8'), headers=headers, timeout=self.timeout)
+        response.raise_for_status()
+        # responses are MTOM messages, the envelope is found by the element of the result
+        match = re.search(rf'<(?:\w+:)?{operation}Result(?:\s[^>]*)?(?:/>|>(.*?)</(?:\w+:)?{operation}Result>)',
+                          response.content.decode('utf-8', errors='replace'), re.S)
+        if match is None:
+            raise BirError(f"BIR returned no result of {operation}")
+        return unescape(match.group(1) or '')
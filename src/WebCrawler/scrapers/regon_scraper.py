@@ -4,14 +4,31 @@ regon_scraper.py
 This module is used to scrape information from the REGON database.
 """
 
-import time
 import pandas as pd
-from selenium.webdriver.support.wait import WebDriverWait
-from typing import Union, Tuple
+from typing import List, Tuple, Union
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as ec
+from WebCrawler.drivers import DriverPool, get_driver_pool
+from WebCrawler.network import (AdaptiveWaits, RateLimiter, dom_settled, extract_fields, extract_rows, get_rate_limiter,
+                                get_waits, network_idle, site_url)
+from WebCrawler.storage import PkdDictionary, RecordBuilder, get_pkd_dictionary
+
+# columns of the DataFrames returned by get_entity_info
+ENTITY_COLUMNS = ['regon', 'nip', 'nazwa', 'forma_prawna', 'sz_forma_prawna', 'forma_wlasnosci', 'kraj', 'wojewodztwo',
+                  'powiat', 'gmina', 'miejscowosc', 'ulica', 'nr', 'kod_pocztowy']
+LOCAL_ENTITY_COLUMNS = ['regon', 'regon j.nadrzędnej', 'nip j.nadrzędnej', 'nazwa', 'forma_prawna', 'sz_forma_prawna',
+                        'forma_wlasnosci', 'kraj', 'wojewodztwo', 'powiat', 'gmina', 'miejscowosc', 'ulica', 'nr',
+                        'kod_pocztowy']
+# names of PKD codes are kept in the PKD dictionary
+PKD_COLUMNS = ['regon', 'kod']
+# suffixes of ids of the report fields read into the columns of entities, prefixed with the entity type
+ENTITY_FIELDS = ['regon9', 'nip', 'nazwa', 'nazwaPodstawowejFormyPrawnej', 'nazwaSzczegolnejFormyPrawnej',
+                 'nazwaFormyWlasnosci']
+# message shown instead of the result list when no entity matches the searched identifier
+NOT_FOUND_ID = 'divInfoKomunikat'
+ADDRESS_FIELDS = ['adSiedzNazwaKraju', 'adSiedzNazwaWojewodztwa', 'adSiedzNazwaPowiatu', 'adSiedzNazwaGminy',
+                  'adSiedzNazwaMiejscowosci', 'adSiedzNazwaUlicy', 'adSiedzNumerNieruchomosci', 'adSiedzKodPocztowy']
 
 
 class RegonScraper:
@@ -20,10 +37,11 @@ class RegonScraper:
         It is initialised with the following parameters.
 
         Attributes:
-            entity_data (pandas.DataFrame): The DataFrame where the scraped data about entities will be stored.
-            local_entity_data (pandas.DataFrame): The DataFrame where the scraped data about local entities will
-                                                  be stored.
-            pkd (pandas.DataFrame): The DataFrame where the scraped data about pkd will be stored.
+            entity_data (RecordBuilder): The builder where the scraped data about entities will be stored.
+            local_entity_data (RecordBuilder): The builder where the scraped data about local entities will
+                                               be stored.
+            pkd (RecordBuilder): The builder where the scraped codes of pkd will be stored.
+            pkd_dictionary (PkdDictionary): The dictionary where names of the pkd codes will be stored.
             key_type (dict): The dictionary containing the keys and their corresponding identifiers used for crawling.
             entity_type (dict): The dictionary containing the entity types and their corresponding identifiers used
                                 for scarping.
@@ -31,59 +49,37 @@ class RegonScraper:
                                       identifiers used for scarping.
             local_entity_form (dict): The dictionary containing the local entity forms types and their corresponding
                                       identifiers used for scraping.
+            local_units (list): REGON numbers of local entities left for LocalUnitCrawler by get_entity_info.
     """
 
-    def __init__(self):
+    def __init__(self, driver_pool: DriverPool = None, rate_limiter: RateLimiter = None, waits: AdaptiveWaits = None,
+                 pkd_dictionary: PkdDictionary = None):
         """
             Initializes the RegonScraper class.
+
+            :param driver_pool: Pool the browser is leased from, defaults to the pool shared by the whole process.
+            :param rate_limiter: Limiter pacing requests to the site, defaults to the limiter shared by the
+                whole process.
+            :param waits: Waits for the pages to change after clicks, defaults to the waits shared by the whole
+                process.
+            :param pkd_dictionary: Dictionary of names of the pkd codes, defaults to the dictionary shared by
+                the whole process.
         """
         # Technical variables
         self.local_regons = []
-        self.rows = 0
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_experimental_option('excludeSwitches', ['enable-logging'])
-        self.driver = webdriver.Chrome(options=chrome_options)
-        self.driver.implicitly_wait(30)
-
-        self.entity_data = pd.DataFrame(columns=[
-            'regon',
-            'nip',
-            'nazwa',
-            'forma_prawna',
-            'sz_forma_prawna',
-            'forma_wlasnosci',
-            'kraj',
-            'wojewodztwo',
-            'powiat',
-            'gmina',
-            'miejscowosc',
-            'ulica',
-            'nr',
-            'kod_pocztowy'
-        ])
-        self.local_entity_data = pd.DataFrame(columns=[
-            'regon',
-            'regon j.nadrzędnej',
-            'nip j.nadrzędnej',
-            'nazwa',
-            'forma_prawna',
-            'sz_forma_prawna',
-            'forma_wlasnosci',
-            'kraj',
-            'wojewodztwo',
-            'powiat',
-            'gmina',
-            'miejscowosc',
-            'ulica',
-            'nr',
-            'kod_pocztowy'
-        ])
-        self.pkd = pd.DataFrame(columns=[
-            'regon',
-            'kod',
-            'nazwa'
-        ])
+        self.local_units = []
+        self._form_shown = False
+        self.site = site_url('regon')
+        self.driver_pool = driver_pool or get_driver_pool()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.waits = waits or get_waits()
+        self.pkd_dictionary = pkd_dictionary or get_pkd_dictionary()
+        # missing elements are not waited for, changes of the page are waited for explicitly
+        self.driver = self.driver_pool.acquire('chrome', self.site)
+
+        self.entity_data = RecordBuilder(ENTITY_COLUMNS)
+        self.local_entity_data = RecordBuilder(LOCAL_ENTITY_COLUMNS)
+        self.pkd = RecordBuilder(PKD_COLUMNS)
         self.key_type = {
             'NIP': 'txtNip',
             'REGON': 'txtRegon',
@@ -132,40 +128,66 @@ class RegonScraper:
                               'table' in driver.find_element(By.ID, l_entity_id).get_attribute('style')), None)
         return l_entity_type
 
-    def _get_data(self, key_value: str, idx: int, data_type: str) -> None:
+    def _search(self, key_value: str, data_type: str, reload: bool = True) -> List[str]:
         """
-            Private method used to scrape the data from the database.
+            Private method used to search for entities in the database.
 
             :param key_value: The key value used to search for the entity in the database.
-            :param idx: Value specifying the number of the line to be analysed.
-            :return: None.
+            :param data_type: The type of the key value, one of the keys of key_type.
+            :param reload: Whether to load a new search page, otherwise the form of the shown page is used again.
+            :return: REGON numbers of the found entities in the order of the result list.
         """
-        # Initialize driver
-        self.driver.get("https://wyszukiwarkaregon.stat.gov.pl/appBIR/index.aspx")
-        self.driver.delete_all_cookies()
-        self.driver.execute_script("window.localStorage.clear()")
-
-        input_data = WebDriverWait(self.driver, 30).until(ec.element_to_be_clickable((By.ID, self.key_type[data_type])))
-        time.sleep(0.5)
+        if reload:
+            self.rate_limiter.load(self.driver, f"{self.site}/appBIR/index.aspx")
+            self.driver.delete_all_cookies()
+            self.driver.execute_script("window.localStorage.clear()")
+        else:
+            for input_id in self.key_type.values():
+                self.driver.find_element(By.ID, input_id).clear()
+
+        input_data = self.waits.until(self.driver, ec.element_to_be_clickable((By.ID, self.key_type[data_type])),
+                                      self.site, 'form')
         input_data.send_keys(str(key_value))
 
+        mutations = self.waits.instrument(self.driver)
         submit_button = self.driver.find_element(By.ID, "btnSzukaj")
-        submit_button.click()
-        time.sleep(0.5)
-
-        table_body = self.driver.find_element(By.CLASS_NAME, 'tabelaZbiorczaListaJednostek').find_element(By.TAG_NAME,
-                                                                                                          'tbody')
-        rows = table_body.find_elements(By.TAG_NAME, 'tr')
-        self.rows = len(rows)
+        with self.rate_limiter.slot(self.site):
+            submit_button.click()
+        if not reload:
+            # the shown report may still contain a result list of the previous search
+            self.waits.until(self.driver, ec.all_of(dom_settled(mutations), network_idle()), self.site, 'search')
+
+        # an identifier which is not in the registry is reported at once instead of timing out like a slow site
+        found = self.waits.until(self.driver, ec.any_of(
+            ec.presence_of_element_located((By.CLASS_NAME, 'tabelaZbiorczaListaJednostek')),
+            ec.visibility_of_element_located((By.ID, NOT_FOUND_ID))), self.site, 'search')
+        if found.get_attribute('id') == NOT_FOUND_ID:
+            raise Exception(f"RegonScraper: Not found {data_type}: {key_value} in REGON.")
+        rows = extract_rows(self.driver, (By.XPATH, "//*[contains(concat(' ', normalize-space(@class), ' '), "
+                                                    "' tabelaZbiorczaListaJednostek ')]//tbody/tr"),
+                            (By.TAG_NAME, 'a'))
+        return [row[0] for row in rows if row]
+
+    def _get_data(self, idx: int) -> List[str]:
+        """
+            Private method used to scrape the report of an entity from the shown result list.
 
+            :param idx: Value specifying the number of the line to be analysed.
+            :return: REGON numbers of the local entities of the entity.
+        """
+        table = self.driver.find_element(By.CLASS_NAME, 'tabelaZbiorczaListaJednostek')
+        rows = table.find_element(By.TAG_NAME, 'tbody').find_elements(By.TAG_NAME, 'tr')
+        mutations = self.waits.instrument(self.driver)
         regon_link = rows[idx].find_element(By.TAG_NAME, 'a')
-        regon_link.click()
-        time.sleep(0.5)
+        with self.rate_limiter.slot(self.site):
+            regon_link.click()
+        self.waits.until(self.driver, ec.all_of(dom_settled(mutations), network_idle()), self.site, 'report')
 
-        entity_type = self._identify_entity_type(self.driver)
+        entity_type = self.waits.until(self.driver, self._identify_entity_type, self.site, 'report')
 
         self._get_entity_details(self.driver, entity_type)
         self._check_if_local_entities_exist(self.driver, entity_type)
+        return [regon.strip() for regon in self.local_regons]
 
     def _get_entity_details(self, driver: webdriver, entity_type) -> None:
         """
@@ -175,39 +197,14 @@ class RegonScraper:
             :param entity_type: The local entity type identifier as a string.
             :return: None.
         """
-        row_data = []
         if entity_type in ['fiz', 'praw']:
-            # REGON
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_regon9').text)
-            # NIP
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_nip').text)
-            # NAZWA
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_nazwa').text)
-            # kod i nazwa podstawowej formy prawnej
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_nazwaPodstawowejFormyPrawnej').text)
-            # kod i nazwa szczególnej formy prawnej
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_nazwaSzczegolnejFormyPrawnej').text)
-            # kod i nazwa formy własności
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_nazwaFormyWlasnosci').text)
-            # kraj
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaKraju').text)
-            # województwo
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaWojewodztwa').text)
-            # powiat
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaPowiatu').text)
-            # gmina
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaGminy').text)
-            # miejscowość
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaMiejscowosci').text)
-            # ulica
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaUlicy').text)
-            # nr nieruchomości
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_adSiedzNumerNieruchomosci').text)
-            # kod pocztowy
-            row_data.append(driver.find_element(By.ID, f'{entity_type}_adSiedzKodPocztowy').text)
+            # all the fields of the report are read at once
+            fields = extract_fields(driver, {column: (By.ID, f'{entity_type}_{field}') for column, field in
+                                             zip(ENTITY_COLUMNS, ENTITY_FIELDS + ADDRESS_FIELDS)})
+            row_data = list(fields.values())
 
             self._get_pkd(self.driver, entity_type, row_data[0])
-            self.entity_data.loc[len(self.entity_data)] = row_data
+            self.entity_data.append(row_data)
         elif entity_type in ['lokpraw', 'lokfiz']:
             self._get_local_entity_details(driver, entity_type)
 
@@ -219,27 +216,16 @@ class RegonScraper:
             :param entity_type: The local entity type identifier as a string.
             :return: None.
         """
-        row_data = [driver.find_element(By.ID, f'{entity_type}_regon14').text,
-                    driver.find_element(By.ID, f'{entity_type}_{self.local_entity_type[entity_type]}_regon').text,
-                    driver.find_element(By.ID, f'{entity_type}_{self.local_entity_type[entity_type]}_nip').text,
-                    driver.find_element(By.ID, f'{entity_type}_nazwa').text,
-                    driver.find_element(By.ID, f'{entity_type}_{self.local_entity_type[entity_type]}'
-                                               f'_{self.local_entity_form[entity_type+"_p"]}').text,
-                    driver.find_element(By.ID, f'{entity_type}_{self.local_entity_type[entity_type]}'
-                                               f'_{self.local_entity_form[entity_type+"_sz"]}').text,
-                    driver.find_element(By.ID, f'{entity_type}_{self.local_entity_type[entity_type]}'
-                                               f'_{self.local_entity_form[entity_type+"_wl"]}').text,
-                    driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaKraju').text,
-                    driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaWojewodztwa').text,
-                    driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaPowiatu').text,
-                    driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaGminy').text,
-                    driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaMiejscowosci').text,
-                    driver.find_element(By.ID, f'{entity_type}_adSiedzNazwaUlicy').text,
-                    driver.find_element(By.ID, f'{entity_type}_adSiedzNumerNieruchomosci').text,
-                    driver.find_element(By.ID, f'{entity_type}_adSiedzKodPocztowy').text]
+        parent = f'{entity_type}_{self.local_entity_type[entity_type]}'
+        ids = [f'{entity_type}_regon14', f'{parent}_regon', f'{parent}_nip', f'{entity_type}_nazwa',
+               *(f'{parent}_{self.local_entity_form[f"{entity_type}_{form}"]}' for form in ['p', 'sz', 'wl']),
+               *(f'{entity_type}_{field}' for field in ADDRESS_FIELDS)]
+        fields = extract_fields(driver, {column: (By.ID, element_id)
+                                         for column, element_id in zip(LOCAL_ENTITY_COLUMNS, ids)})
+        row_data = list(fields.values())
 
         self._get_pkd(self.driver, entity_type, row_data[0])
-        self.local_entity_data.loc[len(self.local_entity_data)] = row_data
+        self.local_entity_data.append(row_data)
 
     def _check_if_local_entities_exist(self, driver: webdriver, entity_type) -> None:
         """
@@ -253,13 +239,13 @@ class RegonScraper:
         if entity_type in ['fiz', 'praw']:
             if 'table' in driver.find_element(By.ID, f'{entity_type}_lokTable').get_attribute('style'):
                 list_button = driver.find_element(By.ID, f'{entity_type}_butLinkLok')
-                list_button.click()
-                time.sleep(0.5)
-                td = driver.find_element(By.ID, f'{entity_type}_lok')
-                body = td.find_element(By.TAG_NAME, 'tbody')
-                rows = body.find_elements(By.TAG_NAME, 'tr')
-                for row in rows:
-                    self.local_regons.append(row.find_element(By.TAG_NAME, 'a').text)
+                mutations = self.waits.instrument(driver)
+                with self.rate_limiter.slot(self.site):
+                    list_button.click()
+                self.waits.until(driver, ec.all_of(dom_settled(mutations), network_idle()), self.site, 'local_entities')
+                rows = extract_rows(driver, (By.XPATH, f"//*[@id='{entity_type}_lok']//tbody/tr"),
+                                    (By.TAG_NAME, 'a'))
+                self.local_regons += [row[0] for row in rows if row]
 
     def _get_pkd(self, driver: webdriver, entity_type, regon) -> None:
         """
@@ -270,43 +256,81 @@ class RegonScraper:
             :param regon: REGON of the entity for which we are extracting pkd
             :return: None.
         """
-        driver.find_element(By.ID, f'{entity_type}_butLinkDzial').click()
-        time.sleep(0.5)
-        td = driver.find_element(By.ID, f'{entity_type}_dzial')
-        tables = td.find_elements(By.TAG_NAME, 'table')
-        for table in tables:
-            body = table.find_element(By.TAG_NAME, 'tbody')
-            self.driver.implicitly_wait(.1)
-            rows = body.find_elements(By.TAG_NAME, 'tr')
-            self.driver.implicitly_wait(30)
-            for row in rows:
-                data = row.find_elements(By.TAG_NAME, 'td')
-                self.pkd.loc[len(self.pkd)] = [regon, data[0].text, data[1].text]
-
-    def get_entity_info(self, number: str, num_type: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        mutations = self.waits.instrument(driver)
+        with self.rate_limiter.slot(self.site):
+            driver.find_element(By.ID, f'{entity_type}_butLinkDzial').click()
+        self.waits.until(driver, ec.all_of(dom_settled(mutations), network_idle()), self.site, 'pkd')
+        rows = extract_rows(driver, (By.XPATH, f"//*[@id='{entity_type}_dzial']//table/tbody/tr"),
+                            (By.TAG_NAME, 'td'))
+        for data in rows:
+            self.pkd.append([regon, self.pkd_dictionary.add(data[0], data[1])])
+
+    def get_entity_info(self, number: str, num_type: str,
+                        local_units: bool = True) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
         """
             Public method used to scrape the data from the database and return it as a pandas DataFrame.
 
-            :param: None.
+            :param number: The key value used to search for the entity in the database.
+            :param num_type: The type of the key value, one of the keys of key_type.
+            :param local_units: Whether local entities of the found entities are scraped, otherwise their REGON
+                numbers are only listed in local_units, e.g. for LocalUnitCrawler.
             :return: The scraped data as a pandas DataFrame.
         """
         self.reset_dataframes()
-        self._get_data(number, 0, num_type)
-        for regon in self.local_regons:
-            self._get_data(regon.strip(), 0, 'REGON')
-        for idx in range(1, self.rows):
-            self._get_data(number, idx, num_type)
-            for regon in self.local_regons:
-                self._get_data(regon.strip(), 0, 'REGON')
-        return self.entity_data, self.local_entity_data, self.pkd
+        # the result list is read once, the report replaces it, so every next result and every local entity is
+        # opened by searching its own REGON in the form of the shown page instead of repeating the whole search
+        pending = self._search(number, num_type)
+        scraped = set()
+        first = True
+        while pending:
+            regon = pending.pop(0)
+            if regon in scraped:
+                continue
+            if not first:
+                self._search(regon, 'REGON', reload=False)
+            first = False
+            scraped.add(regon)
+            local_regons = self._get_data(0)
+            if local_units:
+                # local entities of a result are scraped right after it, before the next result
+                pending[:0] = local_regons
+            else:
+                self.local_units += [(local_regon,) for local_regon in local_regons if local_regon not in scraped]
+        self._form_shown = True
+        return self.entity_data.to_dataframe(), self.local_entity_data.to_dataframe(), self.pkd.to_dataframe()
+
+    def get_local_entity_info(self, regon: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+            Public method used to scrape a single local entity listed in local_units.
+
+            :param regon: REGON of the local entity.
+            :return: The local entity and its pkd as pandas DataFrames.
+        """
+        self.reset_dataframes()
+        # the form of the shown page is used again unless the previous search failed half way
+        reload, self._form_shown = not self._form_shown, False
+        self._search(regon, 'REGON', reload=reload)
+        self._get_data(0)
+        self._form_shown = True
+        return self.local_entity_data.to_dataframe(), self.pkd.to_dataframe()
+
+    def close(self) -> None:
+        """
+            Public method used to give the browser used by the scraper back to the driver pool.
+
+            :param: None.
+            :return: None.
+        """
+        self.driver_pool.release(self.driver, self.site)
 
     def reset_dataframes(self) -> None:
         """
-            Public method used to clear pandas DataFrame during iteration.
+            Public method used to clear scraped records during iteration.
 
             :param: None.
             :return: None.
         """
-        self.entity_data.drop(self.entity_data.index, inplace=True)
-        self.local_entity_data.drop(self.local_entity_data.index, inplace=True)
-        self.pkd.drop(self.pkd.index, inplace=True)
+        self.entity_data.clear()
+        self.local_entity_data.clear()
+        self.pkd.clear()
+        self.local_units = []
@@ -3,18 +3,16 @@ stock_name_scraper.py
 ====================================
 This module is used to scrape entities stock name.
 """
-import os
-import time
 import pandas as pd
-from selenium.webdriver.support.wait import WebDriverWait
-from selenium import webdriver
-from selenium.webdriver.firefox.options import Options as firefoxOptions
-from selenium.webdriver.firefox.service import Service
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as ec
 from bs4 import BeautifulSoup
 from typing import List
 from WebCrawler.custom_logger import get_logger
+from WebCrawler.drivers import DriverPool, get_driver_pool
+from WebCrawler.network import (AdaptiveWaits, RateLimiter, dom_settled, get_rate_limiter, get_waits, network_idle,
+                                site_url)
 
 
 class StockNameScraper:
@@ -27,20 +25,24 @@ class StockNameScraper:
 
     """
 
-    def __init__(self, entities: pd.DataFrame, print_info=False):
+    def __init__(self, entities: pd.DataFrame, print_info=False, driver_pool: DriverPool = None,
+                 rate_limiter: RateLimiter = None, waits: AdaptiveWaits = None):
         """
             Initializes an instance of StockNameScraper.
 
             :param entities: DataFrame containing entities data.
             :param print_info: Flag indicating whether to print information during the scraping process.
                 Defaults to False.
+            :param driver_pool: Pool the browser is leased from, defaults to the pool shared by the whole process.
+            :param rate_limiter: Limiter pacing requests to the sites, defaults to the limiter shared by the
+                whole process.
+            :param waits: Waits for the search results, defaults to the waits shared by the whole process.
             :return: None.
         """
-        firefox_options = firefoxOptions()
-        firefox_options.add_argument("--headless")
-        service = Service(log_path=os.devnull)
-        self.driver = webdriver.Firefox(options=firefox_options, service=service)
-        self.driver.implicitly_wait(2)
+        self.driver_pool = driver_pool or get_driver_pool()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.waits = waits or get_waits()
+        self.driver = self.driver_pool.acquire('firefox')
         self.entities = entities
         self.print_info = print_info
         self.logger = get_logger()
@@ -56,13 +58,9 @@ class StockNameScraper:
             :return: List of stock names for entities.
         """
         for count, entity in enumerate(self.entities.itertuples()):
-            self.driver.delete_all_cookies()
             counter = str(count+1) + '/' + str(len(self.entities))
             try:
-                entity_isin = self._get_entity_isin(entity.nazwa, 'newconnect')
-                if not entity_isin:
-                    entity_isin = self._get_entity_isin(entity.nazwa, 'gpw')
-                entity_stock_name = self._get_entity_stock_name(entity_isin)
+                entity_stock_name = self.get_stock_name(entity.nazwa)
                 self.stock_names.append(entity_stock_name)
                 if self.print_info:
                     self.logger.info(f"{counter} StockNameScraper scraped: {entity.nip}")
@@ -71,9 +69,31 @@ class StockNameScraper:
                     self.logger.error(f"{counter} StockNameScraper could not scrap: {entity.nip}")
                 self.stock_names.append('')
 
-        self.driver.quit()
+        self.close()
         return self.stock_names
 
+    def get_stock_name(self, entity_name: str) -> str:
+        """
+            Public method used to retrieve the stock name of a single entity, first from NewConnect and then from GPW.
+
+            :param entity_name: Name of the entity for which the stock name is to be retrieved.
+            :return: Stock name of the entity if found, otherwise an empty string.
+        """
+        self.driver.delete_all_cookies()
+        entity_isin = self._get_entity_isin(entity_name, 'newconnect')
+        if not entity_isin:
+            entity_isin = self._get_entity_isin(entity_name, 'gpw')
+        return self._get_entity_stock_name(entity_isin)
+
+    def close(self) -> None:
+        """
+            Public method used to give the browser used by the scraper back to the driver pool.
+
+            :param: None.
+            :return: None.
+        """
+        self.driver_pool.release(self.driver)
+
     def _get_entity_isin(self, entity_name: str, stock_type: str) -> str:
         """
             Private method used to retrieve the ISIN (International Securities Identification Number) of an entity
@@ -85,12 +105,20 @@ class StockNameScraper:
             :return: ISIN of the entity if found, otherwise an empty string.
         """
         entity_name = entity_name.replace('"', '')
-        self.driver.get(f"https://www.{stock_type}.pl/spolki")
-        search_input = self.driver.find_element(By.NAME, 'searchText')
-        time.sleep(0.3)
-        search_input.send_keys(entity_name)
-        WebDriverWait(self.driver, 30).until(ec.invisibility_of_element_located((By.ID, 'preview-area')))
-        time.sleep(0.8)
+        site = site_url(stock_type)
+        self.rate_limiter.load(self.driver, f"{site}/spolki")
+        search_input = self.waits.until(self.driver, ec.presence_of_element_located((By.NAME, 'searchText')), site,
+                                        'form')
+        mutations = self.waits.instrument(self.driver)
+        # typing sends a search request
+        with self.rate_limiter.slot(self.driver.current_url):
+            search_input.send_keys(entity_name)
+        try:
+            self.waits.until(self.driver, ec.all_of(ec.invisibility_of_element_located((By.ID, 'preview-area')),
+                                                    dom_settled(mutations), network_idle()), site, 'search')
+        except TimeoutException:
+            # the search did not change the page, there are no results
+            pass
         try:
             entity_link_element = self.driver.find_element(By.XPATH, "//tbody[contains(@id, 'search-result')]/tr/td/a")
         except:
@@ -107,7 +135,7 @@ class StockNameScraper:
             :param entity_isin: ISIN of the entity for which the stock name is to be retrieved.
             :return: Stock name of the entity if found, otherwise an empty string.
         """
-        self.driver.get('https://infostrefa.com/infostrefa/pl/spolki')
+        self.rate_limiter.load(self.driver, f"{site_url('infostrefa')}/infostrefa/pl/spolki")
         html = self.driver.page_source
         soup = BeautifulSoup(html, 'html.parser')
 
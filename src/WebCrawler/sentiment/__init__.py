@@ -1 +1,2 @@
 from .sentiment import SentimentAnalyzer
+from .sentiment_worker import SentimentWorker
\ No newline at end of file
@@ -3,6 +3,7 @@ import warnings
 import nltk
 import pandas as pd
 import torch
+from typing import List
 from nltk.stem import WordNetLemmatizer
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 
@@ -18,6 +19,8 @@ class SentimentAnalyzer:
 
     Attributes
     ----------
+    batch_size : int
+        The number of texts analyzed by a single pass of the model.
     sentiment_dict : dict
         A dictionary containing lists of words associated with different sentiment categories.
     lemmatizer : WordNetLemmatizer
@@ -31,13 +34,16 @@ class SentimentAnalyzer:
     -------
     analyze_text(text)
         Analyzes the sentiment of the given text and returns the sentiment category.
+    analyze_texts(texts)
+        Analyzes the sentiment of a batch of texts and returns their sentiment categories.
     generate_time_table(df)
         Generates a time's table from the given DataFrame.
     get_sentiment_analysis(df)
         Analyzes the sentiment of the text data in the given DataFrame and returns a DataFrame with sentiment analysis
         results.
     """
-    def __init__(self):
+    def __init__(self, batch_size: int = 16):
+        self.batch_size = batch_size
         self.sentiment_dict = {
             "pozytywny": ["sukces", "wzrost", "postęp", "dobry", "wynik", "zwiększenie", "dobra", "tendencja",
                           "doskonałe", "wynik", "wygrana", "przychód", "zysk", "dobrze", "prosperujący", "sukces",
@@ -80,16 +86,29 @@ class SentimentAnalyzer:
         str
             The sentiment category of the text (either "negatwny", "neutralny", or "pozytywny").
         """
-        inputs = self.tokenizer(text, return_tensors="pt", truncation=True, padding=True)
-        outputs = self.model(**inputs)
-        sentiment = torch.argmax(outputs.logits, dim=1).item()
+        return self.analyze_texts([text])[0]
 
-        if sentiment == 0:
-            return "negatywny"
-        elif sentiment == 1:
-            return "neutralny"
-        else:
-            return "pozytywny"
+    def analyze_texts(self, texts: List[str]) -> List[str]:
+        """
+        Analyzes the sentiment of a batch of texts with a single pass of the model.
+
+        Parameters
+        ----------
+        texts : List[str]
+            The texts to be analyzed.
+
+        Returns
+        -------
+        List[str]
+            The sentiment categories of the texts, in the same order.
+        """
+        inputs = self.tokenizer(texts, return_tensors="pt", truncation=True, padding=True)
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+        sentiments = torch.argmax(outputs.logits, dim=1).tolist()
+
+        return ["negatywny" if sentiment == 0 else "neutralny" if sentiment == 1 else "pozytywny"
+                for sentiment in sentiments]
 
     @staticmethod
     def generate_time_table(df: pd.DataFrame) -> pd.DataFrame:
@@ -137,7 +156,9 @@ class SentimentAnalyzer:
         timestamp = pd.to_datetime(df['data'], format='%H:%M %d/%m/%Y')
 
         sentiment_analysis['timestamp'] = timestamp.astype(str)
-        sentiment_analysis['typ_oceny'] = sentiment_analysis['wiadomosc'].apply(lambda x: self.analyze_text(x))
+        texts = sentiment_analysis['wiadomosc'].tolist()
+        sentiment_analysis['typ_oceny'] = [sentiment for i in range(0, len(texts), self.batch_size)
+                                           for sentiment in self.analyze_texts(texts[i:i + self.batch_size])]
         sentiment_analysis = sentiment_analysis.rename(columns={'spolka': 'nip'})
         sentiment_analysis = sentiment_analysis[['nip', 'typ_oceny', 'timestamp']]
 
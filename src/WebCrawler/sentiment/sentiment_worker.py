@@ -0,0 +1,191 @@
+import pandas as pd
+from queue import Empty, Queue
+from threading import Thread
+from typing import Callable, Dict, List, Optional, Tuple
+
+from WebCrawler.custom_logger import get_logger
+from WebCrawler.storage import RecordBuilder
+from .sentiment import SentimentAnalyzer
+
+SENTIMENT_COLUMNS = ['nip', 'typ_oceny', 'timestamp']
+TIME_COLUMNS = ['godzina', 'dzien', 'miesiac', 'rok']
+
+_SENTINEL = object()
+
+
+class SentimentWorker:
+    """
+    A background consumer scoring news rows as soon as scrapers find them, so sentiment analysis overlaps with
+    scraping instead of running after it.
+
+    ...
+
+    Attributes
+    ----------
+    batch_size : int
+        The maximum number of rows scored by a single pass of the model.
+    on_entity : Callable
+        Called with (source, key, sentiment_df, time_df, news_hash) when all the rows of a completely scraped
+        entity are scored.
+
+    Methods
+    -------
+    start()
+        Starts the worker thread.
+    submit(source, key, row)
+        Queues a news row [nip, data, wiadomosc] of the entity for scoring.
+    finish_entity(source, key, complete, news_hash)
+        Marks that all the rows of the entity were submitted.
+    close()
+        Marks that no more rows will be submitted.
+    join()
+        Waits until all the submitted rows are scored.
+    get_results()
+        Returns sentiment and time DataFrames of every source.
+    """
+    def __init__(self, batch_size: int = 16, maxsize: int = 256, on_entity: Optional[Callable] = None):
+        self.batch_size = batch_size
+        self.on_entity = on_entity
+        self.queue = Queue(maxsize=maxsize)
+        self.logger = get_logger()
+        self._analyzer = None
+        self._sentiment: Dict[str, RecordBuilder] = {}
+        self._time: Dict[str, RecordBuilder] = {}
+        self._entities: Dict[Tuple[str, str], Tuple[RecordBuilder, RecordBuilder]] = {}
+        self._thread = Thread(target=self._run, name='SentimentWorker', daemon=True)
+
+    def start(self) -> None:
+        """
+        Starts the worker thread.
+        """
+        self._thread.start()
+
+    def submit(self, source: str, key: str, row: List[str]) -> None:
+        """
+        Queues a news row for scoring, blocks while the queue is full.
+
+        Parameters
+        ----------
+        source : str
+            The name of the scraped source, e.g. "bankier".
+        key : str
+            The identifier of the entity within the source.
+        row : List[str]
+            The news row [nip, data, wiadomosc].
+        """
+        self.queue.put(('row', source, key, row))
+
+    def finish_entity(self, source: str, key: str, complete: bool, news_hash: str) -> None:
+        """
+        Marks that all the rows of the entity were submitted.
+
+        Parameters
+        ----------
+        source : str
+            The name of the scraped source.
+        key : str
+            The identifier of the entity within the source.
+        complete : bool
+            Whether the entity was scraped without errors, only then on_entity is called.
+        news_hash : str
+            The content hash of all the news of the entity passed to on_entity.
+        """
+        self.queue.put(('end', source, key, complete, news_hash))
+
+    def close(self) -> None:
+        """
+        Marks that no more rows will be submitted.
+        """
+        self.queue.put(_SENTINEL)
+
+    def join(self) -> None:
+        """
+        Waits until all the submitted rows are scored.
+        """
+        self._thread.join()
+
+    def get_results(self) -> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
+        """
+        Returns the results of all the scored rows.
+
+        Returns
+        -------
+        Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]
+            Sentiment DataFrames and time DataFrames keyed by the source.
+        """
+        return ({source: records.to_dataframe() for source, records in self._sentiment.items()},
+                {source: records.to_dataframe() for source, records in self._time.items()})
+
+    def _run(self) -> None:
+        """
+        Worker loop, scores all the rows waiting in the queue (up to batch_size) with a single pass of the model.
+        """
+        finished = False
+        while not finished:
+            items = [self.queue.get()]
+            rows = 0
+            while rows < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except Empty:
+                    break
+                items.append(item)
+                rows += item is not _SENTINEL and item[0] == 'row'
+
+            if _SENTINEL in items:
+                finished = True
+                items = [item for item in items if item is not _SENTINEL]
+
+            try:
+                self._handle(items)
+            except Exception as e:
+                self.logger.error(f"SentimentWorker could not analyze {len(items)} items - {e}")
+
+    def _handle(self, items: list) -> None:
+        """
+        Scores the rows of the batch and closes entities whose end markers are in the batch.
+        """
+        rows = [item for item in items if item[0] == 'row']
+        sentiments = []
+        if rows:
+            if self._analyzer is None:
+                self._analyzer = SentimentAnalyzer(batch_size=self.batch_size)
+            sentiments = self._analyzer.analyze_texts([row[3][2] for row in rows])
+
+        sentiments = iter(sentiments)
+        for item in items:
+            if item[0] == 'row':
+                _, source, key, row = item
+                self._add_row(source, key, row, next(sentiments))
+            else:
+                _, source, key, complete, news_hash = item
+                self._finish(source, key, complete, news_hash)
+
+    def _add_row(self, source: str, key: str, row: List[str], sentiment: str) -> None:
+        """
+        Saves the sentiment of a single row and its time.
+        """
+        try:
+            timestamp = pd.to_datetime(row[1], format='%H:%M %d/%m/%Y')
+        except (TypeError, ValueError):
+            self.logger.error(f"SentimentWorker skipped a news row with incorrect date: {row[1]}")
+            return
+
+        sentiment_row = [row[0], sentiment, str(timestamp)]
+        time_row = [timestamp.hour, timestamp.day, timestamp.month, timestamp.year]
+        self._sentiment.setdefault(source, RecordBuilder(SENTIMENT_COLUMNS)).append(sentiment_row)
+        self._time.setdefault(source, RecordBuilder(TIME_COLUMNS)).append(time_row)
+
+        entity_sentiment, entity_time = self._entities.setdefault(
+            (source, key), (RecordBuilder(SENTIMENT_COLUMNS), RecordBuilder(TIME_COLUMNS)))
+        entity_sentiment.append(sentiment_row)
+        entity_time.append(time_row)
+
+    def _finish(self, source: str, key: str, complete: bool, news_hash: str) -> None:
+        """
+        Passes the results of a finished entity to on_entity.
+        """
+        entity_sentiment, entity_time = self._entities.pop(
+            (source, key), (RecordBuilder(SENTIMENT_COLUMNS), RecordBuilder(TIME_COLUMNS)))
+        if complete and self.on_entity is not None:
+            self.on_entity(source, key, entity_sentiment.to_dataframe(), entity_time.to_dataframe(), news_hash)
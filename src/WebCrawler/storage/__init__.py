@@ -0,0 +1,9 @@
+from .freshness_store import FreshnessStore
+from .identity_index import IdentityIndex, normalize_identifier
+from .page_store import PageStore
+from .pkd_dictionary import DICTIONARY_COLUMNS, PkdDictionary, get_pkd_dictionary
+from .parquet_output import read_parquet, write_parquet
+from .record_builder import RecordBuilder
+from .result_store import ResultHandle, ResultStore
+from .scrap_journal import ScrapJournal
+from .serialization import content_hash
@@ -0,0 +1,123 @@
+"""
+freshness_store.py
+====================================
+This module contains a store of previously scraped results used for incremental scrapes.
+"""
+
+import os
+import sqlite3
+import time
+from threading import Lock
+from typing import Dict, Optional
+
+import pandas as pd
+
+from WebCrawler.custom_logger import get_logger
+from WebCrawler.storage.serialization import content_hash, dump_entry, load_entry
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+class FreshnessStore:
+    """SQLite store keeping the last scraped result of every (source, entity) pair together with the time of
+    the scrape and a hash of its content. Results younger than the time to live of their source are reused
+    instead of being scraped again, so registry data changing rarely is not fetched on every run.
+
+    :param db_path: Path to the database file
+    :type db_path: str
+    :param ttls: Time to live in seconds for every source, overrides DEFAULT_TTLS, defaults to None
+    :type ttls: Dict[str, float], optional
+    """
+
+    DEFAULT_TTLS = {
+        'regon': 30 * DAY,
+        'regon_local': 30 * DAY,
+        'krs': 30 * DAY,
+        'aleo': 30 * DAY,
+        'stock_name': 30 * DAY,
+        'bankier': HOUR,
+        'infostrefa': HOUR,
+        # sentiment is reused only while the analyzed news have the same content hash
+        'sentiment_bankier': 30 * DAY,
+        'sentiment_infostrefa': 30 * DAY
+    }
+
+    def __init__(self, db_path: str, ttls: Dict[str, float] = None):
+        """Constructor method.
+        """
+        self.db_path = db_path
+        self.ttls = {**self.DEFAULT_TTLS, **(ttls or {})}
+        self._lock = Lock()
+        self.logger = get_logger()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # shards of a sharded scrape use the same file from separate processes
+        self._conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS swiezosc(
+                zrodlo TEXT,
+                klucz TEXT,
+                data_scrapowania REAL,
+                hash TEXT,
+                wynik TEXT,
+                PRIMARY KEY(zrodlo, klucz)
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, source: str, key: str) -> Optional[dict]:
+        """Returns the stored result of the pair if it is younger than the time to live of the source.
+
+        :param source: Name of the scraped source
+        :type source: str
+        :param key: Identifier of the entity within the source
+        :type key: str
+        :return: Dictionary with 'frames', 'value', 'scraped_at' and 'hash', None if there is no fresh result
+        :rtype: dict, optional
+        """
+        ttl = self.ttls.get(source, 0)
+        if not ttl:
+            return None
+
+        with self._lock:
+            row = self._conn.execute("SELECT data_scrapowania, hash, wynik FROM swiezosc WHERE zrodlo=? AND klucz=?",
+                                     (source, key)).fetchone()
+        if row is None or time.time() - row[0] > ttl:
+            return None
+
+        entry = load_entry(row[2])
+        entry['scraped_at'] = row[0]
+        entry['hash'] = row[1]
+        return entry
+
+    def put(self, source: str, key: str, frames: Dict[str, pd.DataFrame] = None, value=None) -> bool:
+        """Stores the result of a scraped pair.
+
+        :param source: Name of the scraped source
+        :type source: str
+        :param key: Identifier of the entity within the source
+        :type key: str
+        :param frames: DataFrames scraped for the entity, defaults to None
+        :type frames: Dict[str, pd.DataFrame], optional
+        :param value: Any other JSON serializable result, defaults to None
+        :type value: Any, optional
+        :return: True if the content differs from the previously stored one
+        :rtype: bool
+        """
+        new_hash = content_hash(frames, value)
+        with self._lock:
+            row = self._conn.execute("SELECT hash FROM swiezosc WHERE zrodlo=? AND klucz=?", (source, key)).fetchone()
+            self._conn.execute("INSERT OR REPLACE INTO swiezosc VALUES (?, ?, ?, ?, ?)",
+                               (source, key, time.time(), new_hash, dump_entry(frames, value)))
+            self._conn.commit()
+        return row is None or row[0] != new_hash
+
+    def close(self) -> None:
+        """Closes the connection to the database.
+        """
+        with self._lock:
+            self._conn.close()
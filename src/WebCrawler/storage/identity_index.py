@@ -0,0 +1,208 @@
+"""
+identity_index.py
+====================================
+This module contains an index resolving NIP, REGON and KRS numbers of the same company to one entity.
+"""
+
+import os
+import sqlite3
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+Identifier = Tuple[str, str]
+
+# identifier types in order of preference of the one naming a merged entity
+IDENTIFIER_TYPES = ['NIP', 'REGON', 'KRS']
+
+
+def normalize_identifier(value: str, id_type: str) -> Identifier:
+    """Returns the identifier in the form it is indexed with, e.g. NIP without dashes and country prefix, REGON of a
+    whole entity written with 14 digits shortened to 9 and KRS padded with zeros.
+
+    :param value: Identifier as written in the input or scraped from a site
+    :type value: str
+    :param id_type: Type of the identifier, one of IDENTIFIER_TYPES
+    :type id_type: str
+    :return: Type and normalized value
+    :rtype: Identifier
+    """
+    id_type = id_type.strip().upper()
+    value = ''.join(str(value).split()).replace('-', '')
+    if id_type == 'NIP' and value.upper().startswith('PL'):
+        value = value[2:]
+    if id_type == 'REGON' and len(value) == 14 and value.endswith('00000'):
+        value = value[:9]
+    if id_type == 'KRS' and value.isdigit():
+        value = value.zfill(10)
+    return id_type, value
+
+
+def _entity_name(identifier: Identifier) -> str:
+    return f'{identifier[0]}:{identifier[1]}'
+
+
+def _preference(identifier: Identifier) -> tuple:
+    id_type, value = identifier
+    return IDENTIFIER_TYPES.index(id_type) if id_type in IDENTIFIER_TYPES else len(IDENTIFIER_TYPES), value
+
+
+class IdentityIndex:
+    """Index of identifiers known to belong to the same company. Every identifier resolves to a canonical entity,
+    identifiers found together in REGON or KRS results are linked into one entity, so input rows naming the same
+    company by NIP, REGON and KRS are scraped once. Links are kept in a SQLite table and reused by the next runs,
+    without a path they only live as long as the index.
+
+    Sources claim entities before scraping them, a second claim of the same entity by the same source is refused
+    until the first one is released.
+
+    :param db_path: Path to the database file, defaults to None which means links are not persisted
+    :type db_path: str, optional
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """Constructor method.
+        """
+        self.db_path = db_path
+        self._entities: Dict[Identifier, str] = {}
+        self._members: Dict[str, Set[Identifier]] = {}
+        self._claims: Dict[str, Set[str]] = {}
+        self._lock = Lock()
+        self._conn = None
+
+        if db_path is None:
+            return
+        directory = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # shards of a sharded scrape use the same file from separate processes
+        self._conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS tozsamosc(
+                typ TEXT,
+                identyfikator TEXT,
+                podmiot TEXT,
+                PRIMARY KEY(typ, identyfikator)
+            )
+        """)
+        self._conn.commit()
+        for id_type, value, entity in self._conn.execute("SELECT typ, identyfikator, podmiot FROM tozsamosc"):
+            self._entities[(id_type, value)] = entity
+            self._members.setdefault(entity, set()).add((id_type, value))
+
+    def resolve(self, value: str, id_type: str) -> str:
+        """Returns the canonical entity of the identifier.
+
+        :param value: Identifier
+        :type value: str
+        :param id_type: Type of the identifier
+        :type id_type: str
+        :return: Name of the entity, e.g. 'NIP:5250001009', the identifier itself if it was never linked
+        :rtype: str
+        """
+        identifier = normalize_identifier(value, id_type)
+        with self._lock:
+            return self._entities.get(identifier, _entity_name(identifier))
+
+    def link(self, identifiers: Iterable[Identifier]) -> Optional[str]:
+        """Records that the identifiers belong to the same company, merging the entities they resolved to so far.
+
+        :param identifiers: Pairs of value and type, values which are not numbers, e.g. '-' shown instead of a
+            missing NIP, are ignored
+        :type identifiers: Iterable[Identifier]
+        :return: Name of the entity of the identifiers, None if none of them was a number
+        :rtype: str, optional
+        """
+        identifiers = {identifier for identifier in (normalize_identifier(value, id_type)
+                                                     for value, id_type in identifiers if value is not None)
+                       if identifier[1].isdigit()}
+        if not identifiers:
+            return None
+
+        with self._lock:
+            entities = {self._entities.get(identifier, _entity_name(identifier)) for identifier in identifiers}
+            members = set(identifiers)
+            for entity in entities:
+                members |= self._members.pop(entity, set())
+            entity = _entity_name(min(members, key=_preference))
+            changed = [identifier for identifier in members if self._entities.get(identifier) != entity]
+            for identifier in members:
+                self._entities[identifier] = entity
+            self._members[entity] = members
+            claims = set()
+            for merged in entities:
+                claims |= self._claims.pop(merged, set())
+            if claims:
+                self._claims.setdefault(entity, set()).update(claims)
+
+            if changed and self._conn is not None:
+                self._conn.executemany("INSERT OR REPLACE INTO tozsamosc VALUES (?, ?, ?)",
+                                       [(id_type, value, entity) for id_type, value in changed])
+                self._conn.commit()
+        return entity
+
+    def claim(self, source: str, value: str, id_type: str) -> bool:
+        """Claims the entity of the identifier for scraping from the source.
+
+        :param source: Name of the source
+        :type source: str
+        :param value: Identifier
+        :type value: str
+        :param id_type: Type of the identifier
+        :type id_type: str
+        :return: False if the entity was already claimed for the source, True otherwise
+        :rtype: bool
+        """
+        identifier = normalize_identifier(value, id_type)
+        with self._lock:
+            sources = self._claims.setdefault(self._entities.get(identifier, _entity_name(identifier)), set())
+            if source in sources:
+                return False
+            sources.add(source)
+            return True
+
+    def release(self, source: str, value: str, id_type: str) -> None:
+        """Gives back the claim of an entity which could not be scraped, so another identifier of it may be tried.
+
+        :param source: Name of the source
+        :type source: str
+        :param value: Identifier
+        :type value: str
+        :param id_type: Type of the identifier
+        :type id_type: str
+        """
+        identifier = normalize_identifier(value, id_type)
+        with self._lock:
+            self._claims.get(self._entities.get(identifier, _entity_name(identifier)), set()).discard(source)
+
+    def clear_claims(self) -> None:
+        """Forgets all claims, links are kept.
+        """
+        with self._lock:
+            self._claims = {}
+
+    def dedupe(self, rows: Iterable[tuple]) -> Tuple[List[tuple], List[Tuple[tuple, tuple]]]:
+        """Removes input rows naming an entity named by an earlier row.
+
+        :param rows: Rows of an identifier and its type
+        :type rows: Iterable[tuple]
+        :return: Unique rows in the input order and pairs of every removed row and the row kept instead of it
+        :rtype: Tuple[List[tuple], List[Tuple[tuple, tuple]]]
+        """
+        unique, duplicates, kept = [], [], {}
+        for row in rows:
+            entity = self.resolve(row[0], row[1])
+            if entity in kept:
+                duplicates.append((row, kept[entity]))
+            else:
+                kept[entity] = row
+                unique.append(row)
+        return unique, duplicates
+
+    def close(self) -> None:
+        """Closes the connection to the database.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
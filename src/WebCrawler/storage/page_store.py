@@ -0,0 +1,110 @@
+"""
+page_store.py
+====================================
+This module contains a compressed store of captured pages used to replay scrapes without network access.
+"""
+
+import json
+import os
+import sqlite3
+import time
+import zlib
+from threading import Lock
+from typing import Dict, Optional
+
+# kinds of captured pages
+BROWSER = 'browser'
+HTTP = 'http'
+
+
+class PageStore:
+    """SQLite store of pages loaded by the scrapers. Every page is kept under its kind (a browser state or an HTTP
+    response) and a key together with its final URL, the time of the capture, HTTP status and headers. Content is
+    compressed with zlib. A page captured again replaces the previous capture.
+
+    :param db_path: Path to the database file
+    :type db_path: str
+    """
+
+    def __init__(self, db_path: str):
+        """Constructor method.
+        """
+        self.db_path = db_path
+        self._lock = Lock()
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        # shards of a sharded scrape use the same file from separate processes
+        self._conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS strony(
+                rodzaj TEXT,
+                klucz TEXT,
+                url TEXT,
+                data_pobrania REAL,
+                status INTEGER,
+                naglowki TEXT,
+                tresc BLOB,
+                PRIMARY KEY(rodzaj, klucz)
+            )
+        """)
+        self._conn.commit()
+
+    def put(self, kind: str, key: str, url: str, content: bytes, status: int = 200,
+            headers: Dict[str, str] = None) -> None:
+        """Stores a captured page.
+
+        :param kind: Kind of the page, BROWSER or HTTP
+        :type kind: str
+        :param key: Key the page is replayed by
+        :type key: str
+        :param url: Final URL of the page
+        :type url: str
+        :param content: Content of the page
+        :type content: bytes
+        :param status: HTTP status of the page, defaults to 200
+        :type status: int, optional
+        :param headers: HTTP headers of the response, defaults to None
+        :type headers: Dict[str, str], optional
+        """
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO strony VALUES (?, ?, ?, ?, ?, ?, ?)",
+                               (kind, key, url, time.time(), status, json.dumps(headers or {}),
+                                zlib.compress(content)))
+            self._conn.commit()
+
+    def get(self, kind: str, key: str) -> Optional[dict]:
+        """Returns a captured page.
+
+        :param kind: Kind of the page, BROWSER or HTTP
+        :type kind: str
+        :param key: Key the page was stored under
+        :type key: str
+        :return: Dictionary with 'url', 'captured_at', 'status', 'headers' and 'content', None if the page was not
+            captured
+        :rtype: dict, optional
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT url, data_pobrania, status, naglowki, tresc FROM strony "
+                                     "WHERE rodzaj=? AND klucz=?", (kind, key)).fetchone()
+        if row is None:
+            return None
+        return {
+            'url': row[0],
+            'captured_at': row[1],
+            'status': row[2],
+            'headers': json.loads(row[3]),
+            'content': zlib.decompress(row[4])
+        }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM strony").fetchone()[0]
+
+    def close(self) -> None:
+        """Closes the connection to the database.
+        """
+        with self._lock:
+            self._conn.close()
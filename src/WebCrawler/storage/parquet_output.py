@@ -0,0 +1,170 @@
+"""
+parquet_output.py
+====================================
+This module contains the Parquet output of scraping results, partitioned by source and scrape date.
+"""
+
+import datetime
+import glob
+import os
+from typing import List
+
+import pandas as pd
+
+from WebCrawler.storage.result_store import ResultHandle
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    # Parquet output is optional, csv files are written without pyarrow
+    pa = None
+    pq = None
+
+COMPRESSION = 'zstd'
+_ENTITY_COLUMNS = ['forma_prawna', 'sz_forma_prawna', 'forma_wlasnosci', 'kraj', 'wojewodztwo', 'powiat', 'gmina',
+                   'miejscowosc', 'ulica', 'nr', 'kod_pocztowy']
+
+# source of every result, used as the first level of partitions
+RESULT_SOURCES = {
+    'regon_entity_df': 'regon',
+    'regon_local_entity_df': 'regon',
+    'regon_pkd_df': 'regon',
+    'regon_pkd_dictionary_df': 'regon',
+    'krs_representatives_df': 'krs',
+    'krs_general_info_df': 'krs',
+    'aleo_account_numbers_df': 'aleo',
+    'aleo_shareholders_df': 'aleo',
+    'infostrefa_news_df': 'infostrefa',
+    'bankier_news_df': 'bankier',
+    'sentiment_info_df': 'infostrefa',
+    'sentiment_bankier_df': 'bankier',
+    'time_df': 'sentiment'
+}
+
+# columns and their Arrow types of every result, identifiers like NIP, REGON and KRS are kept as strings
+RESULT_SCHEMAS = {
+    'regon_entity_df': [(column, 'string') for column in ['regon', 'nip', 'nazwa', *_ENTITY_COLUMNS,
+                                                          'nazwa_gieldowa']],
+    'regon_local_entity_df': [(column, 'string') for column in ['regon', 'regon j.nadrzędnej', 'nip j.nadrzędnej',
+                                                                'nazwa', *_ENTITY_COLUMNS]],
+    'regon_pkd_df': [('regon', 'string'), ('kod', 'string')],
+    'regon_pkd_dictionary_df': [('kod', 'string'), ('nazwa', 'string'), ('wersja', 'int64')],
+    'krs_representatives_df': [(column, 'string')
+                               for column in ['nip', 'imie', 'imie2', 'nazwisko', 'nazwisko2', 'funkcja']],
+    'krs_general_info_df': [(column, 'string')
+                            for column in ['nazwa', 'krs', 'nip', 'regon', 'forma_prawna', 'data_wpisu_do_rej_przeds',
+                                           'data_wykr_z_rej_przeds', 'nazwa_org_repr', 'sposob_repr', 'adr_www',
+                                           'email']],
+    'aleo_account_numbers_df': [('nip', 'string'), ('account_number', 'string')],
+    'aleo_shareholders_df': [('nip', 'string'), ('shareholder', 'string')],
+    'infostrefa_news_df': [('nip', 'string'), ('data', 'string'), ('wiadomosc', 'string')],
+    'bankier_news_df': [('nip', 'string'), ('data', 'string'), ('wiadomosc', 'string')],
+    'sentiment_info_df': [('nip', 'string'), ('typ_oceny', 'string'), ('timestamp', 'string')],
+    'sentiment_bankier_df': [('nip', 'string'), ('typ_oceny', 'string'), ('timestamp', 'string')],
+    'time_df': [('godzina', 'int8'), ('dzien', 'int8'), ('miesiac', 'int8'), ('rok', 'int16')]
+}
+
+
+def _require_pyarrow() -> None:
+    if pq is None:
+        raise ImportError("Parquet output needs pyarrow, install it with: pip install pyarrow")
+
+
+def _schema(name: str, columns: List[str]) -> 'pa.Schema':
+    """Returns the schema of the result, columns which are not in RESULT_SCHEMAS are stored as strings.
+    """
+    types = dict(RESULT_SCHEMAS.get(name, []))
+    columns = [column for column in types if column in columns] + [column for column in columns
+                                                                    if column not in types]
+    return pa.schema([(column, pa.type_for_alias(types.get(column, 'string'))) for column in columns])
+
+
+def _to_table(df: pd.DataFrame, schema: 'pa.Schema') -> 'pa.Table':
+    """Converts a chunk of the result to a table with the schema, missing values are stored as nulls.
+    """
+    arrays = []
+    for field in schema:
+        values = df[field.name] if field.name in df.columns else pd.Series([None] * len(df), dtype=object)
+        if pa.types.is_string(field.type):
+            values = values.map(lambda value: None if pd.isna(value) else str(value))
+        else:
+            values = pd.to_numeric(values, errors='coerce')
+        arrays.append(pa.array(values, type=field.type, from_pandas=True))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def partition_path(root: str, name: str, scrape_date: str) -> str:
+    """Returns the path of the result in the partition of its source and the scrape date.
+
+    :param root: Directory of the partitioned output
+    :type root: str
+    :param name: Name of the result, e.g. regon_entity_df
+    :type name: str
+    :param scrape_date: Date of the scrape in ISO format
+    :type scrape_date: str
+    :return: Path like root/source=regon/scrape_date=2024-01-31/regon_entity_df.parquet
+    :rtype: str
+    """
+    return os.path.join(root, f'source={RESULT_SOURCES.get(name, "other")}', f'scrape_date={scrape_date}',
+                        f'{name}.parquet')
+
+
+def write_parquet(handle: ResultHandle, root: str, scrape_date: datetime.date = None) -> str:
+    """Writes the result to a zstd compressed Parquet file chunk by chunk, without loading it whole. The result
+    scraped earlier the same day is replaced.
+
+    :param handle: Handle of the result
+    :type handle: ResultHandle
+    :param root: Directory of the partitioned output
+    :type root: str
+    :param scrape_date: Date of the scrape, defaults to None which means today
+    :type scrape_date: datetime.date, optional
+    :return: Path of the written file
+    :rtype: str
+    """
+    _require_pyarrow()
+    path = partition_path(root, handle.name, (scrape_date or datetime.date.today()).isoformat())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    schema = _schema(handle.name, handle.columns)
+    with pq.ParquetWriter(path, schema, compression=COMPRESSION) as writer:
+        for chunk in handle.chunks():
+            writer.write_table(_to_table(chunk, schema))
+    return path
+
+
+def scrape_dates(root: str, name: str) -> List[str]:
+    """Returns sorted dates of scrapes saved for the result.
+
+    :param root: Directory of the partitioned output
+    :type root: str
+    :param name: Name of the result
+    :type name: str
+    :return: Dates in ISO format
+    :rtype: List[str]
+    """
+    paths = glob.glob(partition_path(root, name, '*'))
+    return sorted(os.path.basename(os.path.dirname(path)).split('=', 1)[1] for path in paths)
+
+
+def read_parquet(root: str, name: str, scrape_date: str = None) -> pd.DataFrame:
+    """Reads the result saved by write_parquet, strings stay strings without any dtype arguments.
+
+    :param root: Directory of the partitioned output
+    :type root: str
+    :param name: Name of the result
+    :type name: str
+    :param scrape_date: Date of the scrape in ISO format, defaults to None which means the latest scrape
+    :type scrape_date: str, optional
+    :raises FileNotFoundError: If the result was not saved
+    :return: DataFrame with the result
+    :rtype: pd.DataFrame
+    """
+    _require_pyarrow()
+    if scrape_date is None:
+        dates = scrape_dates(root, name)
+        if not dates:
+            raise FileNotFoundError(f"No Parquet output of {name} in {root}")
+        scrape_date = dates[-1]
+    return pq.read_table(partition_path(root, name, scrape_date)).to_pandas()
+
@@ -0,0 +1,192 @@
+"""
+pkd_dictionary.py
+====================================
+This module contains the dictionary of PKD codes, scraped rows only carry codes and names are kept here once.
+"""
+
+import os
+import sqlite3
+from threading import Lock
+from typing import Dict, Iterable, Optional
+
+import pandas as pd
+
+DICTIONARY_COLUMNS = ['kod', 'nazwa', 'wersja']
+
+
+class PkdDictionary:
+    """Dictionary of PKD codes and their names. Entries are loaded once from a SQLite table, cached in memory and
+    added as scrapers find codes, so rows of entities and local units keep only codes instead of repeating the same
+    long names. The dictionary is versioned, its version grows whenever a code is added or renamed, e.g. by
+    a revision of the classification, and every entry keeps the version it was last changed in.
+
+    :param db_path: Path to the database file, defaults to None which means entries are not persisted
+    :type db_path: str, optional
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        """Constructor method.
+        """
+        self.db_path = None
+        self._names: Dict[str, str] = {}
+        self._versions: Dict[str, int] = {}
+        self._version = 0
+        self._lock = Lock()
+        self._conn = None
+        self.configure(db_path)
+
+    @property
+    def version(self) -> int:
+        """Version of the dictionary, 0 while it is empty.
+        """
+        return self._version
+
+    def configure(self, db_path: Optional[str] = None) -> None:
+        """Loads entries persisted in the database file, entries known so far are kept and saved there.
+
+        :param db_path: Path to the database file, None keeps the current one, defaults to None
+        :type db_path: str, optional
+        """
+        if db_path is None or db_path == self.db_path:
+            return
+        directory = os.path.dirname(os.path.abspath(db_path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+            # shards of a sharded scrape use the same file from separate processes
+            self._conn = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+            self.db_path = db_path
+            with self._conn:
+                self._conn.execute("""
+                    CREATE TABLE IF NOT EXISTS pkd_slownik(
+                        kod TEXT PRIMARY KEY,
+                        nazwa TEXT,
+                        wersja INTEGER
+                    )
+                """)
+                persisted = self._conn.execute("SELECT kod, nazwa, wersja FROM pkd_slownik").fetchall()
+            known = {code for code, _, _ in persisted}
+            for code, name, version in persisted:
+                self._names[code] = name
+                self._versions[code] = version
+                self._version = max(self._version, version)
+            for code in [code for code in self._names if code not in known]:
+                self._save(code)
+
+    def add(self, code: str, name: str) -> str:
+        """Records the name of the code, a new name of a known code replaces the old one.
+
+        :param code: PKD code, e.g. '62.01.Z'
+        :type code: str
+        :param name: Name of the code, an empty name does not replace a known one
+        :type name: str
+        :return: The code, stored in scraped rows instead of the name
+        :rtype: str
+        """
+        # most codes are known, they are looked up without the lock
+        if not code or self._names.get(code) == name or (not name and code in self._names):
+            return code
+        with self._lock:
+            if self._names.get(code) != name:
+                self._names[code] = name
+                self._save(code)
+        return code
+
+    def name(self, code: str) -> Optional[str]:
+        """Returns the name of the code.
+
+        :param code: PKD code
+        :type code: str
+        :return: Name of the code, None if it is not in the dictionary
+        :rtype: str, optional
+        """
+        return self._names.get(code)
+
+    def update(self, df: Optional[pd.DataFrame]) -> None:
+        """Adds entries of a frame returned by to_dataframe, e.g. saved in the journal by another process.
+
+        :param df: Entries with columns kod and nazwa, defaults to None
+        :type df: pd.DataFrame, optional
+        """
+        if df is not None and not df.empty:
+            for code, name in df[['kod', 'nazwa']].itertuples(index=False, name=None):
+                self.add(code, name)
+
+    def encode(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Moves names of codes of scraped rows to the dictionary, e.g. rows saved by older runs with their names.
+
+        :param df: Rows with columns kod and nazwa
+        :type df: pd.DataFrame
+        :return: Rows without the nazwa column
+        :rtype: pd.DataFrame
+        """
+        if 'nazwa' not in df:
+            return df
+        self.update(df)
+        return df.drop(columns=['nazwa'])
+
+    def decode(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Adds names of codes to scraped rows.
+
+        :param df: Rows with the kod column
+        :type df: pd.DataFrame
+        :return: Rows with the nazwa column
+        :rtype: pd.DataFrame
+        """
+        return df.assign(nazwa=df['kod'].map(self._names))
+
+    def to_dataframe(self, codes: Iterable[str] = None) -> pd.DataFrame:
+        """Returns entries of the dictionary.
+
+        :param codes: Codes of the entries, unknown ones are skipped, defaults to None which means all the entries
+        :type codes: Iterable[str], optional
+        :return: Entries sorted by code with columns kod, nazwa and wersja
+        :rtype: pd.DataFrame
+        """
+        with self._lock:
+            codes = sorted(self._names if codes is None else {code for code in codes if code in self._names})
+            return pd.DataFrame([[code, self._names[code], self._versions[code]] for code in codes],
+                                columns=DICTIONARY_COLUMNS)
+
+    def close(self) -> None:
+        """Closes the connection to the database.
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+                self.db_path = None
+
+    def _save(self, code: str) -> None:
+        """Assigns the next version to a changed entry and saves it, called with the lock held.
+        """
+        version = self._version + 1
+        if self._conn is not None:
+            with self._conn:
+                # other processes may have changed the dictionary since it was loaded
+                version = max(version, self._conn.execute(
+                    "SELECT COALESCE(MAX(wersja), 0) + 1 FROM pkd_slownik").fetchone()[0])
+                self._conn.execute("INSERT OR REPLACE INTO pkd_slownik VALUES (?, ?, ?)",
+                                   (code, self._names[code], version))
+        self._versions[code] = version
+        self._version = version
+
+
+_pkd_dictionary: Optional[PkdDictionary] = None
+_pkd_dictionary_lock = Lock()
+
+
+def get_pkd_dictionary() -> PkdDictionary:
+    """Returns common PkdDictionary instance for the whole process.
+
+    :return: Instance of PkdDictionary
+    :rtype: PkdDictionary
+    """
+    global _pkd_dictionary
+    with _pkd_dictionary_lock:
+        if _pkd_dictionary is None:
+            _pkd_dictionary = PkdDictionary()
+        return _pkd_dictionary
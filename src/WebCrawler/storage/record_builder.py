@@ -0,0 +1,69 @@
+"""
+record_builder.py
+====================================
+This module contains a column oriented accumulator of scraped rows.
+"""
+
+from typing import Dict, Iterable, List, Sequence
+
+import pandas as pd
+
+
+class RecordBuilder:
+    """Accumulates scraped rows in one list per column and materialises them to a DataFrame once, instead of
+    growing a DataFrame row by row with df.loc[len(df)] = row, which copies data on every append.
+
+    :param columns: Names of the columns
+    :type columns: List[str]
+    :param dtypes: Types of the columns applied when the DataFrame is built, defaults to None
+    :type dtypes: Dict[str, str], optional
+    """
+
+    def __init__(self, columns: List[str], dtypes: Dict[str, str] = None):
+        """Constructor method.
+        """
+        self.columns = list(columns)
+        self.dtypes = dtypes or {}
+        self._data: List[list] = [[] for _ in self.columns]
+
+    def append(self, row: Sequence) -> None:
+        """Appends a single row.
+
+        :param row: Values of the row in the order of the columns
+        :type row: Sequence
+        """
+        if len(row) != len(self.columns):
+            raise ValueError(f"Row has {len(row)} values, expected {len(self.columns)}")
+        for values, value in zip(self._data, row):
+            values.append(value)
+
+    def extend(self, rows: Iterable[Sequence]) -> None:
+        """Appends many rows.
+
+        :param rows: Rows with values in the order of the columns
+        :type rows: Iterable[Sequence]
+        """
+        for row in rows:
+            self.append(row)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Builds a DataFrame with all the appended rows.
+
+        :return: DataFrame with the columns of the builder
+        :rtype: pd.DataFrame
+        """
+        df = pd.DataFrame(dict(zip(self.columns, self._data)), columns=self.columns)
+        if self.dtypes:
+            df = df.astype(self.dtypes)
+        return df
+
+    def clear(self) -> None:
+        """Removes all the appended rows.
+        """
+        for values in self._data:
+            values.clear()
+
+    def __len__(self) -> int:
+        """Returns the number of appended rows.
+        """
+        return len(self._data[0]) if self._data else 0
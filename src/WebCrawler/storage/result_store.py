@@ -0,0 +1,301 @@
+"""
+result_store.py
+====================================
+This module contains the on-disk store of scraping results, written incrementally while entities are scraped.
+"""
+
+import os
+import shutil
+import tempfile
+import weakref
+from threading import Lock
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, TextIO
+
+import pandas as pd
+
+from WebCrawler.storage.serialization import dump_entry, load_entry
+
+PARTITION_EXTENSION = '.jsonl'
+# file listing names of the partitions and subdirectories created by the store, one per line, nothing else in its
+# directory is removed by the store
+MANIFEST = '.result_store'
+
+
+def _union(columns: List[str], other: Sequence[str]) -> List[str]:
+    """Returns columns followed by the columns of other which are not among them, like pd.concat does.
+    """
+    return columns + [column for column in other if column not in columns]
+
+
+class ResultHandle:
+    """Lazy handle of a result saved in partitions on disk. Rows are read only when they are asked for, one chunk
+    of rows per scraped entity at a time.
+
+    :param name: Name of the result, e.g. regon_entity_df
+    :type name: str
+    :param paths: Paths of the partitions with chunks of the result
+    :type paths: List[str]
+    :param rows: Number of rows in all the partitions, defaults to 0
+    :type rows: int, optional
+    :param columns: Columns of the result, chunks without some of them are filled with NaN, defaults to None
+    :type columns: List[str], optional
+    """
+
+    def __init__(self, name: str, paths: List[str], rows: int = 0, columns: List[str] = None):
+        """Constructor method.
+        """
+        self.name = name
+        self.paths = list(paths)
+        self.rows = rows
+        self.columns = list(columns or [])
+
+    @classmethod
+    def concat(cls, handles: List['ResultHandle']) -> 'ResultHandle':
+        """Joins handles of the same result, e.g. written by shards of a sharded scrape, without reading them.
+
+        :param handles: Handles to join
+        :type handles: List[ResultHandle]
+        :return: Handle of the rows of all the handles
+        :rtype: ResultHandle
+        """
+        columns = []
+        for handle in handles:
+            columns = _union(columns, handle.columns)
+        return cls(handles[0].name if handles else '', [path for handle in handles for path in handle.paths],
+                   sum(handle.rows for handle in handles), columns)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    @property
+    def empty(self) -> bool:
+        """Specifies whether the result has no rows.
+        """
+        return self.rows == 0
+
+    def chunks(self) -> Iterator[pd.DataFrame]:
+        """Reads chunks of the result one by one.
+
+        :return: Iterator of DataFrames with the columns of the result
+        :rtype: Iterator[pd.DataFrame]
+        """
+        for path in self.paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding='utf-8') as file:
+                for line in file:
+                    yield load_entry(line)['frames']['rows'].reindex(columns=self.columns)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Loads the whole result.
+
+        :return: DataFrame with all the rows of the result
+        :rtype: pd.DataFrame
+        """
+        frames = list(self.chunks())
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(frames, axis=0, ignore_index=True)
+
+    def to_csv(self, path: str) -> None:
+        """Saves the result to a csv file chunk by chunk, without loading it whole.
+
+        :param path: Path of the csv file
+        :type path: str
+        """
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            header = True
+            for chunk in self.chunks():
+                chunk.to_csv(file, index=False, header=header)
+                header = False
+            if header:
+                pd.DataFrame(columns=self.columns).to_csv(file, index=False)
+
+
+class ResultStore:
+    """Writes results to partitions on disk as soon as they are scraped, so they are not held in memory for the
+    whole run. Every result is a file with a JSON line per appended chunk. Partitions and subdirectories left in
+    the directory by the previous run are removed, other files of the directory are kept, so it may be shared with
+    other outputs. If on_append is set, it is called with the name and rows of every appended
+    chunk, e.g. to insert them into the database while scraping goes on.
+
+    :param directory: Directory of the partitions, defaults to None which means a temporary directory removed
+        together with the store
+    :type directory: str, optional
+    """
+
+    def __init__(self, directory: str = None):
+        """Constructor method.
+        """
+        if directory is None:
+            directory = tempfile.mkdtemp(prefix='wcrawler-results-')
+            self._cleanup = weakref.finalize(self, shutil.rmtree, directory, True)
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self._cleanup = None
+        self.directory = directory
+        self._files: Dict[str, TextIO] = {}
+        self._rows: Dict[str, int] = {}
+        self._columns: Dict[str, List[str]] = {}
+        self._adopted: Dict[str, List[ResultHandle]] = {}
+        self._owned: Set[str] = set()
+        self._lock = Lock()
+        self.on_append: Optional[Callable[[str, pd.DataFrame], None]] = None
+        self.clear()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name + PARTITION_EXTENSION)
+
+    def _file(self, name: str) -> TextIO:
+        """Returns the partition of the result opened for appending, called with the lock held.
+        """
+        if name not in self._files:
+            self._own(name + PARTITION_EXTENSION)
+            self._files[name] = open(self._path(name), 'a', encoding='utf-8')
+        return self._files[name]
+
+    def _own(self, name: str) -> None:
+        """Records a file or a subdirectory of the directory in the manifest before it is created, called with
+        the lock held.
+        """
+        if name not in self._owned:
+            with open(os.path.join(self.directory, MANIFEST), 'a', encoding='utf-8') as manifest:
+                manifest.write(name + '\n')
+            self._owned.add(name)
+
+    def subdirectory(self, name: str) -> str:
+        """Returns a subdirectory of the store, e.g. for results of a shard, removed together with the results.
+
+        :param name: Name of the subdirectory
+        :type name: str
+        :return: Path of the subdirectory
+        :rtype: str
+        """
+        with self._lock:
+            self._own(name)
+        return os.path.join(self.directory, name)
+
+    def declare(self, name: str, columns: Sequence[str]) -> None:
+        """Sets columns of a result which are kept even if no rows are appended.
+
+        :param name: Name of the result
+        :type name: str
+        :param columns: Names of the columns
+        :type columns: Sequence[str]
+        """
+        with self._lock:
+            self._columns[name] = _union(self._columns.get(name, []), columns)
+
+    def append(self, name: str, df: pd.DataFrame) -> None:
+        """Appends rows of a single entity to the result.
+
+        :param name: Name of the result
+        :type name: str
+        :param df: Rows to append
+        :type df: pd.DataFrame
+        """
+        line = dump_entry({'rows': df}) + '\n' if not df.empty else None
+        with self._lock:
+            self._columns[name] = _union(self._columns.get(name, []), df.columns)
+            if line is not None:
+                self._file(name).write(line)
+                self._rows[name] = self._rows.get(name, 0) + len(df)
+        if line is not None and self.on_append is not None:
+            self.on_append(name, df)
+
+    def append_rows(self, name: str, rows: List[Sequence], columns: List[str]) -> None:
+        """Appends rows given as lists of values.
+
+        :param name: Name of the result
+        :type name: str
+        :param rows: Values of the rows in the order of the columns
+        :type rows: List[Sequence]
+        :param columns: Names of the columns
+        :type columns: List[str]
+        """
+        self.append(name, pd.DataFrame(rows, columns=columns))
+
+    def transform(self, name: str, function: Callable[[pd.DataFrame], pd.DataFrame]) -> None:
+        """Rewrites the result chunk by chunk, e.g. to add a column known only after all the stages finished.
+
+        :param name: Name of the result
+        :type name: str
+        :param function: Function returning the transformed chunk, also called with an empty DataFrame to find
+            the columns of the result
+        :type function: Callable[[pd.DataFrame], pd.DataFrame]
+        """
+        with self._lock:
+            if name in self._files:
+                self._files.pop(name).close()
+            handle = ResultHandle(name, [self._path(name)], self._rows.get(name, 0), self._columns.get(name, []))
+            columns = list(function(pd.DataFrame(columns=handle.columns)).columns)
+            rows = 0
+            temporary_path = self._path(name) + '.tmp'
+            self._own(os.path.basename(temporary_path))
+            with open(temporary_path, 'w', encoding='utf-8') as file:
+                for chunk in handle.chunks():
+                    chunk = function(chunk)
+                    columns = _union(columns, chunk.columns)
+                    rows += len(chunk)
+                    file.write(dump_entry({'rows': chunk}) + '\n')
+            os.replace(temporary_path, self._path(name))
+            self._rows[name] = rows
+            self._columns[name] = columns
+
+    def adopt(self, handle: ResultHandle) -> None:
+        """Adds rows of a handle written elsewhere, e.g. by a shard, to the result without copying them.
+
+        :param handle: Handle of the rows
+        :type handle: ResultHandle
+        """
+        with self._lock:
+            self._adopted.setdefault(handle.name, []).append(handle)
+
+    def handle(self, name: str) -> ResultHandle:
+        """Returns a lazy handle of all the rows appended to the result so far.
+
+        :param name: Name of the result
+        :type name: str
+        :return: Handle of the result
+        :rtype: ResultHandle
+        """
+        with self._lock:
+            if name in self._files:
+                self._files[name].flush()
+            own = ResultHandle(name, [self._path(name)], self._rows.get(name, 0), self._columns.get(name, []))
+            return ResultHandle.concat([own, *self._adopted.get(name, [])])
+
+    def clear(self) -> None:
+        """Removes all the results, including results of stores in subdirectories, e.g. of shards. Only files and
+        subdirectories listed in the manifest are removed.
+        """
+        with self._lock:
+            for file in self._files.values():
+                file.close()
+            self._files = {}
+            self._rows = {}
+            self._columns = {}
+            self._adopted = {}
+            manifest_path = os.path.join(self.directory, MANIFEST)
+            if os.path.exists(manifest_path):
+                with open(manifest_path, 'r', encoding='utf-8') as manifest:
+                    names = {line.strip() for line in manifest}
+                for name in names:
+                    # only names of entries of the directory itself are written there
+                    if not name or os.path.basename(name) != name or name in (os.curdir, os.pardir):
+                        continue
+                    path = os.path.join(self.directory, name)
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    elif os.path.exists(path):
+                        os.remove(path)
+                os.remove(manifest_path)
+            self._owned = set()
+
+    def close(self) -> None:
+        """Closes partitions opened for appending.
+        """
+        with self._lock:
+            for file in self._files.values():
+                file.close()
+            self._files = {}
@@ -0,0 +1,130 @@
+"""
+scrap_journal.py
+====================================
+This module contains an append-only journal of scraping results used to resume interrupted scrapes.
+"""
+
+import glob
+import json
+import os
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from WebCrawler.custom_logger import get_logger
+from WebCrawler.storage.serialization import dump_entry, load_entry
+
+
+class ScrapJournal:
+    """Append-only journal with one JSON line per completed (source, entity) pair. Every line is flushed to disk
+    as soon as the entity is scraped, so after a crash the scrape can be resumed and its results rebuilt. Only
+    positions of the lines are kept in memory, frames of an entry are read from the file when it is restored.
+
+    Shards of a sharded scrape write their own files next to the main one, all of them are read when resuming.
+
+    :param path: Path to the journal file
+    :type path: str
+    :param resume: Specifies whether entries of the previous run are loaded, otherwise they are removed,
+        defaults to False
+    :type resume: bool, optional
+    :param shard: Number of the shard writing to the journal, defaults to None
+    :type shard: int, optional
+    """
+
+    def __init__(self, path: str, resume: bool = False, shard: Optional[int] = None):
+        """Constructor method.
+        """
+        self.path = path
+        self.write_path = path if shard is None else f'{path}.shard{shard}'
+        # file and byte offset of the line of every completed pair
+        self._entries: Dict[tuple, Tuple[str, int]] = {}
+        self._lock = Lock()
+        self.logger = get_logger()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        if resume:
+            self._load()
+        else:
+            for journal_path in self._paths():
+                os.remove(journal_path)
+
+    def get(self, source: str, key: str) -> Optional[dict]:
+        """Returns the entry of an already completed pair.
+
+        :param source: Name of the scraped source
+        :type source: str
+        :param key: Identifier of the entity within the source
+        :type key: str
+        :return: Dictionary with 'frames' (dict of DataFrames) and 'value', None if the pair was not completed
+        :rtype: dict, optional
+        """
+        position = self._entries.get((source, key))
+        if position is None:
+            return None
+        journal_path, offset = position
+        with open(journal_path, 'rb') as f:
+            f.seek(offset)
+            entry = load_entry(f.readline().decode('utf-8'))
+        return {'frames': entry['frames'], 'value': entry['value']}
+
+    def record(self, source: str, key: str, frames: Dict[str, pd.DataFrame] = None, value=None) -> None:
+        """Appends a completed pair to the journal and syncs it to disk.
+
+        :param source: Name of the scraped source
+        :type source: str
+        :param key: Identifier of the entity within the source
+        :type key: str
+        :param frames: DataFrames scraped for the entity, defaults to None
+        :type frames: Dict[str, pd.DataFrame], optional
+        :param value: Any other JSON serializable result, defaults to None
+        :type value: Any, optional
+        """
+        line = (dump_entry(frames or {}, value, source=source, key=key) + '\n').encode('utf-8')
+
+        with self._lock:
+            with open(self.write_path, 'a+b') as f:
+                offset = f.seek(0, os.SEEK_END)
+                if offset:
+                    f.seek(offset - 1)
+                    # a line truncated by a crash is ended, so it does not swallow the new one
+                    if f.read(1) != b'\n':
+                        line, offset = b'\n' + line, offset + 1
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._entries[(source, key)] = (self.write_path, offset)
+
+    def __len__(self) -> int:
+        """Returns the number of completed pairs.
+        """
+        return len(self._entries)
+
+    def _paths(self) -> List[str]:
+        """Returns paths of the main journal file and journals of all the shards.
+        """
+        paths = sorted(glob.glob(f'{glob.escape(self.path)}.shard*'))
+        if os.path.exists(self.path):
+            paths.insert(0, self.path)
+        return paths
+
+    def _load(self) -> None:
+        """Indexes entries of all the journal files, skips lines truncated by a crash. Frames are not kept, they are
+        read again by get.
+        """
+        for journal_path in self._paths():
+            with open(journal_path, 'rb') as f:
+                offset = 0
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        self.logger.error(f"ScrapJournal skipped a damaged line of {journal_path}")
+                    else:
+                        self._entries[(entry['source'], entry['key'])] = (journal_path, offset)
+                    offset += len(line)
+
+        self.logger.info(f"ScrapJournal loaded {len(self._entries)} completed entries")
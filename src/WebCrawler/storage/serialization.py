@@ -0,0 +1,62 @@
+"""
+serialization.py
+====================================
+This module contains helpers used to store scraped DataFrames as JSON.
+"""
+
+import hashlib
+import json
+from typing import Dict
+
+import pandas as pd
+
+
+def _to_json(value):
+    """Converts numpy scalars and other values unknown to json module.
+    """
+    return value.item() if hasattr(value, 'item') else str(value)
+
+
+def dump_entry(frames: Dict[str, pd.DataFrame] = None, value=None, **fields) -> str:
+    """Serializes scraped DataFrames and an additional value to a single line of JSON.
+
+    :param frames: DataFrames to serialize, defaults to None
+    :type frames: Dict[str, pd.DataFrame], optional
+    :param value: Any other JSON serializable result, defaults to None
+    :type value: Any, optional
+    :return: JSON document without new lines
+    :rtype: str
+    """
+    frames = frames or {}
+    return json.dumps({
+        **fields,
+        'frames': {name: {'columns': list(df.columns), 'data': df.values.tolist()} for name, df in frames.items()},
+        'value': value
+    }, ensure_ascii=False, default=_to_json)
+
+
+def load_entry(line: str) -> dict:
+    """Deserializes a JSON document created by dump_entry.
+
+    :param line: JSON document
+    :type line: str
+    :return: Dictionary with 'frames' (dict of DataFrames), 'value' and all the additional fields
+    :rtype: dict
+    """
+    entry = json.loads(line)
+    entry['frames'] = {name: pd.DataFrame(frame['data'], columns=frame['columns'])
+                       for name, frame in entry['frames'].items()}
+    return entry
+
+
+def content_hash(frames: Dict[str, pd.DataFrame] = None, value=None) -> str:
+    """Computes a hash of scraped content, used to tell whether it changed since the previous scrape.
+
+    :param frames: Scraped DataFrames, defaults to None
+    :type frames: Dict[str, pd.DataFrame], optional
+    :param value: Any other JSON serializable result, defaults to None
+    :type value: Any, optional
+    :return: Hex digest of SHA-256
+    :rtype: str
+    """
+    return hashlib.sha256(dump_entry(frames, value).encode('utf-8')).hexdigest()
@@ -0,0 +1,160 @@
+import time
+from threading import Lock
+
+import pandas as pd
+import pytest
+
+from WebCrawler.drivers import DriverPool, driver_pool
+from WebCrawler.managers import scraper_manager
+from WebCrawler.scrapers.regon_scraper import ENTITY_COLUMNS, LOCAL_ENTITY_COLUMNS, PKD_COLUMNS
+from WebCrawler.storage import RecordBuilder
+
+
+class FakeDriver:
+    """Driver of a browser which is never started, leased from FakeDriverPool."""
+
+    window_handles = ['main']
+
+    def implicitly_wait(self, seconds):
+        pass
+
+    def get_cookies(self):
+        return []
+
+    def quit(self):
+        pass
+
+
+class FakeDriverPool(DriverPool):
+    """DriverPool starting FakeDriver instead of browsers, counts browsers leased at the same time."""
+
+    def __init__(self, max_size=5):
+        super().__init__(max_size=max_size)
+        self.leased = 0
+        self.peak = 0
+        self._count_lock = Lock()
+
+    def acquire(self, browser='chrome', site=None, implicit_wait=0):
+        driver = super().acquire(browser, site, implicit_wait)
+        with self._count_lock:
+            self.leased += 1
+            self.peak = max(self.peak, self.leased)
+        return driver
+
+    def release(self, driver, site=None):
+        with self._count_lock:
+            self.leased -= 1
+        super().release(driver, site)
+
+    def _create(self, browser):
+        driver = FakeDriver()
+        with self._condition:
+            self._browsers[driver] = browser
+        return driver
+
+
+def nip(number):
+    return str(1000000000 + number)
+
+
+def regon(number):
+    return str(100000000 + number)
+
+
+def entity_number(identifier):
+    return int(identifier[-4:])
+
+
+class FakeRegonScraper:
+    """RegonScraper holding a browser from the shared pool until it is closed, every entity has local units."""
+
+    local_units_per_entity = 3
+    delay = 0.002
+
+    def __init__(self):
+        self.driver_pool = driver_pool.get_driver_pool()
+        self.driver = self.driver_pool.acquire('chrome', 'regon')
+        self.local_units = []
+
+    def get_entity_info(self, number, num_type, local_units=True):
+        time.sleep(self.delay)
+        i = entity_number(number)
+        entity = [regon(i), nip(i), f'Firma {i}'] + [''] * (len(ENTITY_COLUMNS) - 3)
+        self.local_units = [(f'{regon(i)}{unit:05d}',) for unit in range(1, self.local_units_per_entity + 1)]
+        return (pd.DataFrame([entity], columns=ENTITY_COLUMNS), pd.DataFrame(columns=LOCAL_ENTITY_COLUMNS),
+                pd.DataFrame([[regon(i), '62.01.Z']], columns=PKD_COLUMNS))
+
+    def get_local_entity_info(self, local_regon):
+        time.sleep(self.delay)
+        row = [local_regon, local_regon[:9], '', f'Oddział {local_regon}'] + [''] * (len(LOCAL_ENTITY_COLUMNS) - 4)
+        return (pd.DataFrame([row], columns=LOCAL_ENTITY_COLUMNS),
+                pd.DataFrame([[local_regon, '62.01.Z']], columns=PKD_COLUMNS))
+
+    def close(self):
+        self.driver_pool.release(self.driver, 'regon')
+
+
+class FakeKrsScraper:
+    """KrsScraper leasing a browser for every entity."""
+
+    def __init__(self, idx, id_type):
+        self.idx = idx
+
+    def scrap(self):
+        with driver_pool.get_driver_pool().lease('chrome', 'krs'):
+            time.sleep(FakeRegonScraper.delay)
+        i = entity_number(self.idx)
+        general_info = dict.fromkeys(scraper_manager.KRS_GENERAL_INFO_COLUMNS, '')
+        general_info.update(nazwa=f'Firma {i}', nip=nip(i), regon=regon(i), krs=str(i).zfill(10))
+        return general_info, pd.DataFrame(columns=['nip', 'imie', 'imie2', 'nazwisko', 'nazwisko2', 'funkcja'])
+
+
+class FakeStockNameScraper:
+    """StockNameScraper holding a browser until it is closed, every entity is listed."""
+
+    def __init__(self, entities, print_info=False):
+        self.driver_pool = driver_pool.get_driver_pool()
+        self.driver = self.driver_pool.acquire('firefox')
+
+    def get_stock_name(self, name):
+        return name.upper().replace(' ', '')
+
+    def close(self):
+        self.driver_pool.release(self.driver)
+
+
+class FakeNewsScraper:
+    """News scraper holding a browser until it is closed, every entity has a single news."""
+
+    def __init__(self, entities, print_info=False, on_news=None):
+        self.driver_pool = driver_pool.get_driver_pool()
+        self.driver = self.driver_pool.acquire('chrome', 'news')
+        self.news = RecordBuilder(scraper_manager.NEWS_COLUMNS)
+
+    def scrap_entity(self, nip, stock_name):
+        time.sleep(FakeRegonScraper.delay)
+        self.news.append([nip, '12:00 01/01/2024', f'Wiadomość {stock_name}'])
+        return True
+
+    def close(self):
+        self.driver_pool.release(self.driver, 'news')
+
+
+@pytest.fixture
+def fake_pool(monkeypatch):
+    """Shared driver pool of fake browsers, capped at 5 like the default pool."""
+    pool = FakeDriverPool()
+    monkeypatch.setattr(driver_pool, '_driver_pool', pool)
+    return pool
+
+
+@pytest.fixture
+def fake_scrapers(monkeypatch, fake_pool):
+    """Replaces the scrapers used by ScraperManager with fakes using browsers of fake_pool."""
+    monkeypatch.setitem(scraper_manager.ScraperManager.REGON_BACKENDS, 'selenium', FakeRegonScraper)
+    monkeypatch.setattr(scraper_manager, 'KrsScraper', FakeKrsScraper)
+    monkeypatch.setattr(scraper_manager, 'StockNameScraper', FakeStockNameScraper)
+    monkeypatch.setattr(scraper_manager, 'BankierScraper', FakeNewsScraper)
+    monkeypatch.setattr(scraper_manager, 'InfoStrefaScraper', FakeNewsScraper)
+    monkeypatch.setattr(scraper_manager, 'get_href_links', lambda nip: ([], []))
+    return fake_pool
@@ -0,0 +1,52 @@
+from WebCrawler.network import site_url
+from WebCrawler.scrapers.bankier_scraper import THREAD_CHUNK_CHARS, BankierScraper
+
+from conftest import FakeDriver
+
+POST = 'Kurs rośnie od tygodnia. ' * 60
+
+
+def thread_page(posts, next_page=None):
+    items = ''.join(f'<li><div class="p">{post}</div></li>' for post in posts)
+    pagination = f'<a class="next" href="{next_page}">&gt;</a>' if next_page else ''
+    return f'<ul class="threadTree">{items}</ul><div class="pagination">{pagination}</div>'
+
+
+class ForumSite(FakeDriver):
+    """Forum of bankier.pl with a single thread of seven posts shown on two pages."""
+
+    def __init__(self):
+        site = site_url('bankier')
+        self.pages = {
+            f'{site}/forum/forum_o_firmie,1.html':
+                '<table class="threadsList"><tr><td><a href="watek,1.html">Wątek</a></td></tr></table>'
+                '<div class="pagination"></div>',
+            f'{site}/forum/watek,1.html':
+                '<div class="entry-meta"><time class="entry-date">2024-01-31 12:00</time></div>'
+                '<a id="showAllThread" href="watek,1,calosc.html">Pokaż cały wątek</a>',
+            f'{site}/forum/watek,1,calosc.html': thread_page([POST] * 5, '/forum/watek,1,calosc,2.html'),
+            f'{site}/forum/watek,1,calosc,2.html': thread_page([POST] * 2)
+        }
+        self.current_url = ''
+        self.page_source = ''
+
+    def get(self, url):
+        self.current_url, self.page_source = url, self.pages[url]
+
+    def execute_script(self, script, *args):
+        return 0
+
+
+def test_long_forum_thread_is_saved_in_parts(fake_pool):
+    rows = []
+    scraper = BankierScraper(None, driver_pool=fake_pool, on_news=rows.append)
+    scraper.close()
+    scraper.driver = ForumSite()
+    scraper.forum_link = f'{scraper.site}/forum/forum_o_firmie,1.html'
+    scraper._get_forum('1000000001')
+
+    assert len(POST) * 2 <= THREAD_CHUNK_CHARS < len(POST) * 3
+    assert [len(text) // len(POST) for _, _, text in rows] == [2, 2, 2, 1]
+    assert all(nip == '1000000001' and date == '12:00 31/01/2024' for nip, date, _ in rows)
+    assert ''.join(text for _, _, text in rows) == POST * 7
+    assert len(scraper.news.to_dataframe()) == 4
@@ -0,0 +1,28 @@
+import io
+import os
+import subprocess
+import sys
+
+from WebCrawler.custom_logger import configure_logging
+from WebCrawler.custom_logger.custom_logger import BURST_VARIABLE, FORMAT_VARIABLE, RATE_VARIABLE
+
+FILTERS_SCRIPT = ("from WebCrawler.custom_logger import get_logger; "
+                  "print([(f.rate, f.burst) for h in get_logger().handlers for f in h.filters])")
+
+
+def filters_of_worker_process():
+    return subprocess.run([sys.executable, '-c', FILTERS_SCRIPT], env=os.environ, capture_output=True, text=True,
+                          check=True).stdout.strip()
+
+
+def test_worker_processes_inherit_log_rate(monkeypatch):
+    for variable in [FORMAT_VARIABLE, RATE_VARIABLE, BURST_VARIABLE]:
+        monkeypatch.setenv(variable, '')
+        monkeypatch.delenv(variable)
+    try:
+        configure_logging(stream=io.StringIO(), rate=0)
+        assert filters_of_worker_process() == '[]'
+        configure_logging(stream=io.StringIO(), rate=5, burst=10)
+        assert filters_of_worker_process() == '[(5.0, 10)]'
+    finally:
+        configure_logging()
@@ -0,0 +1,27 @@
+import sqlite3
+
+import pandas as pd
+
+from WebCrawler.managers import DataBaseManager, DataBaseWriter
+
+
+def test_failed_batch_keeps_results_which_can_be_inserted(tmp_path):
+    db_path = str(tmp_path / 'db.sqlite')
+    DataBaseManager(db_path).create_tables()
+    writer = DataBaseWriter(db_path, flush_interval=10)
+    # news scraped before the entity wait for it, the next result fails the whole batch
+    writer.submit('bankier_news_df', pd.DataFrame([['1000000001', '2024-01-31', 'news']],
+                                                  columns=['nip', 'data', 'wiadomosc']))
+    writer.submit('regon_entity_df', pd.DataFrame([['100000001', '1000000001', 'Firma']],
+                                                  columns=['regon', 'nip', 'nazwa']))
+    writer.submit('infostrefa_news_df', pd.DataFrame([['1000000001', 'news', 'unknown']],
+                                                     columns=['nip', 'wiadomosc', 'kolumna']))
+    writer.close()
+    writer.start()
+    writer.join()
+
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("SELECT nip FROM podmiot").fetchall() == [('1000000001',)]
+        assert conn.execute("SELECT wiadomosc, id_podmiotu FROM bankier").fetchall() == [('news', 1)]
+    assert writer.inserted == {'podmiot': 1, 'bankier': 1}
+    assert writer.dropped == {'infostrefa_news_df': 1}
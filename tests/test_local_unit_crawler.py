@@ -0,0 +1,115 @@
+import time
+
+import pandas as pd
+import pytest
+
+from WebCrawler.network import DeadlineExceeded, check_deadline, deadline_scope
+from WebCrawler.scrapers.local_unit_crawler import LocalUnitCrawler
+from WebCrawler.scrapers.regon_scraper import LOCAL_ENTITY_COLUMNS, PKD_COLUMNS
+
+from conftest import FakeRegonScraper, regon
+
+
+def local_units(count, entity=1):
+    return [(f'{regon(entity)}{unit:05d}',) for unit in range(1, count + 1)]
+
+
+class SlowRegonScraper(FakeRegonScraper):
+    """RegonScraper whose units listed in slow never finish, until their time budget expires."""
+
+    slow = set()
+
+    def get_local_entity_info(self, local_regon):
+        while local_regon in self.slow:
+            check_deadline()
+            time.sleep(0.01)
+        return super().get_local_entity_info(local_regon)
+
+
+class FailingRegonScraper(FakeRegonScraper):
+    """RegonScraper failing to scrape units listed in failing."""
+
+    failing = set()
+
+    def get_local_entity_info(self, local_regon):
+        if local_regon in self.failing:
+            raise ValueError(f'Report of {local_regon} is empty')
+        return super().get_local_entity_info(local_regon)
+
+
+class CountingRegonScraper(FakeRegonScraper):
+    """RegonScraper listing the units it scraped in scraped."""
+
+    scraped = []
+
+    def get_local_entity_info(self, local_regon):
+        self.scraped.append(local_regon)
+        return super().get_local_entity_info(local_regon)
+
+
+def test_units_are_scraped_in_pages_by_bounded_pool(fake_pool):
+    units = local_units(7)
+    crawler = LocalUnitCrawler(FakeRegonScraper, workers=2, page_size=3)
+    pages = list(crawler.crawl(iter(units)))
+
+    assert [len(page) for page in pages] == [3, 3, 1]
+    assert [unit.regon for page in pages for unit in page] == [unit[0] for unit in units]
+    assert all(len(unit.local_entity) == 1 and len(unit.pkd) == 1 for page in pages for unit in page)
+    assert len(crawler._scrapers) <= 2
+    crawler.close()
+    assert fake_pool.leased == 0
+
+
+def test_seen_and_restored_units_are_not_scraped_again(fake_pool):
+    CountingRegonScraper.scraped = scraped = []
+    units = local_units(4)
+    restored = {units[1][0]: (pd.DataFrame(columns=LOCAL_ENTITY_COLUMNS), pd.DataFrame(columns=PKD_COLUMNS))}
+    crawler = LocalUnitCrawler(CountingRegonScraper, page_size=10)
+
+    pages = list(crawler.crawl(units + units[:2], restore=restored.get))
+    assert [(unit.regon, unit.restored) for unit in pages[0]] == [(unit[0], unit == units[1]) for unit in units]
+    assert sorted(scraped) == sorted(unit[0] for unit in units if unit != units[1])
+    # units of another listing of the same entity were seen already
+    assert list(crawler.crawl(units)) == []
+    crawler.close()
+
+
+def test_failed_units_are_left_for_another_attempt(fake_pool):
+    units = local_units(3)
+    FailingRegonScraper.failing = {units[1][0]}
+    crawler = LocalUnitCrawler(FailingRegonScraper)
+
+    assert [unit.regon for page in crawler.crawl(units) for unit in page] == [units[0][0], units[2][0]]
+    assert crawler.failed == [units[1][0]]
+
+    FailingRegonScraper.failing = set()
+    assert [unit.regon for page in crawler.crawl(units) for unit in page] == [units[1][0]]
+    assert crawler.failed == []
+    crawler.close()
+
+
+def test_unit_exceeding_its_budget_fails_alone(fake_pool):
+    units = local_units(3)
+    SlowRegonScraper.slow = {units[0][0]}
+    crawler = LocalUnitCrawler(SlowRegonScraper, unit_timeout=0.2)
+
+    assert [unit.regon for page in crawler.crawl(units) for unit in page] == [units[1][0], units[2][0]]
+    assert crawler.failed == [units[0][0]]
+    crawler.close()
+
+
+def test_expired_budget_of_the_crawl_drops_the_page(fake_pool):
+    units = local_units(6)
+    SlowRegonScraper.slow = {unit[0] for unit in units}
+    crawler = LocalUnitCrawler(SlowRegonScraper, workers=2, page_size=3, unit_timeout=None)
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded), deadline_scope(0.2):
+        list(crawler.crawl(units))
+    assert time.monotonic() - start < 2
+
+    # units of the dropped page are listed again by the next crawl
+    SlowRegonScraper.slow = set()
+    assert [unit.regon for page in crawler.crawl(units) for unit in page] == [unit[0] for unit in units]
+    crawler.close()
+    assert fake_pool.leased == 0
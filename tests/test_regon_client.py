@@ -0,0 +1,68 @@
+import pytest
+
+from WebCrawler.benchmark import FixtureSite
+from WebCrawler.network import RateLimiter, override_site_urls, reset_site_urls
+from WebCrawler.scrapers.regon_client import RegonClient
+from WebCrawler.storage import PkdDictionary
+
+
+@pytest.fixture
+def site():
+    """Fixture site serving the BIR service, every fifth entity has a local unit."""
+    with FixtureSite(entities=6) as site:
+        override_site_urls(site.urls())
+        try:
+            yield site
+        finally:
+            reset_site_urls()
+
+
+@pytest.fixture
+def client(site):
+    client = RegonClient(api_key='klucz', rate_limiter=RateLimiter({'127.0.0.1': (1000.0, 4)}),
+                         pkd_dictionary=PkdDictionary())
+    yield client
+    client.close()
+
+
+def test_entity_with_pkd_and_local_units(site, client):
+    entity = site.entities[0]
+    entities, local_entities, pkd = client.get_entity_info(entity['nip'], 'NIP')
+
+    assert entities.values.tolist() == [[
+        entity['regon'], entity['nip'], entity['name'], '1 - OSOBA PRAWNA', '16 - SPÓŁKI AKCYJNE',
+        '215 - WŁASNOŚĆ KRAJOWYCH OSÓB FIZYCZNYCH', 'POLSKA', 'MAZOWIECKIE', 'Warszawa', 'Śródmieście', 'Warszawa',
+        'ul. Testowa', '1', '00-001']]
+    local_regon = entity['local_units'][0]
+    assert local_entities[['regon', 'regon j.nadrzędnej', 'nip j.nadrzędnej', 'nazwa']].values.tolist() == [
+        [local_regon, entity['regon'], entity['nip'], f"{entity['name']} ODDZIAŁ"]]
+    codes = [code for code, _ in entity['pkd']]
+    assert pkd.values.tolist() == [[entity['regon'], code] for code in codes] + [[local_regon, code] for code in codes]
+    assert [client.pkd_dictionary.name(code) for code in codes] == [name for _, name in entity['pkd']]
+
+
+def test_local_units_are_listed_for_the_crawler(site, client):
+    entity = site.entities[0]
+    entities, local_entities, _ = client.get_entity_info(entity['regon'], 'REGON', local_units=False)
+    assert len(entities) == 1 and local_entities.empty
+    assert [unit[:2] for unit in client.local_units] == [(entity['local_units'][0], 'LP')]
+
+    local_entities, pkd = client.get_local_entity_info(*client.local_units[0])
+    assert local_entities[['regon', 'nip j.nadrzędnej']].values.tolist() == [[entity['local_units'][0], entity['nip']]]
+    assert len(pkd) == len(entity['pkd'])
+
+
+def test_identifier_missing_from_the_registry_finds_nothing(client):
+    assert client.search('0000000000', 'NIP') == []
+    assert all(df.empty for df in client.get_entity_info('0000000000', 'NIP'))
+
+
+def test_expired_session_is_opened_again(site, client):
+    entity = site.entities[1]
+    assert [unit['Regon'] for unit in client.search(entity['krs'], 'KRS')] == [entity['regon']]
+    expired = client._session_id
+    # the service forgets the session, its searches are answered like searches which found nothing
+    site._bir_sessions.clear()
+
+    assert [unit['Regon'] for unit in client.search(entity['krs'], 'KRS')] == [entity['regon']]
+    assert client._session_id not in (None, expired)
@@ -0,0 +1,83 @@
+import pytest
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.common.by import By
+
+from WebCrawler.network import AdaptiveWaits, RetryPolicy, is_retryable
+from WebCrawler.scrapers.regon_scraper import NOT_FOUND_ID, RegonScraper
+
+from conftest import FakeDriver
+
+
+class FakeElement:
+    """Displayed and enabled element of a fake page."""
+
+    def __init__(self, element_id):
+        self.element_id = element_id
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def get_attribute(self, name):
+        return self.element_id if name == 'id' else None
+
+    def send_keys(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def click(self):
+        pass
+
+
+class NotFoundPage(FakeDriver):
+    """Search page of REGON showing the message of no entity found after every search."""
+
+    current_url = 'https://wyszukiwarkaregon.stat.gov.pl/appBIR/index.aspx'
+    elements = ['txtNip', 'txtRegon', 'txtKrs', 'btnSzukaj', NOT_FOUND_ID]
+
+    def get(self, url):
+        pass
+
+    def delete_all_cookies(self):
+        pass
+
+    def execute_script(self, script, *args):
+        return 0
+
+    def find_element(self, by=By.ID, value=None):
+        if by == By.ID and value in self.elements:
+            return FakeElement(value)
+        raise NoSuchElementException(value)
+
+
+def test_identifier_missing_from_the_registry_is_not_retried(fake_pool):
+    waits = AdaptiveWaits()
+    scraper = RegonScraper(driver_pool=fake_pool, waits=waits)
+    scraper.driver_pool.release(scraper.driver, scraper.site)
+    scraper.driver = NotFoundPage()
+    attempts = []
+
+    def attempt():
+        attempts.append(1)
+        return scraper.get_entity_info('1000000001', 'NIP')
+
+    with pytest.raises(Exception, match='Not found NIP: 1000000001') as error:
+        RetryPolicy(attempts=3, base_delay=0).call(attempt)
+    assert not is_retryable(error.value)
+    assert len(attempts) == 1
+    # the message is found at once, so the learned timeout of searches does not grow
+    search = waits.stats()['wyszukiwarkaregon.stat.gov.pl']['search']
+    assert search['timeouts'] == 0 and search['timeout'] <= waits.initial_timeout
+
+
+def test_timeouts_of_not_found_waits_are_not_learned():
+    waits = AdaptiveWaits(initial_timeout=0.1, min_timeout=0.1)
+    site = 'https://krs.example.com'
+    for learn_timeouts, timeout in [(False, 0.1), (True, 0.2)]:
+        with pytest.raises(TimeoutException):
+            waits.until(FakeDriver(), lambda driver: False, site, 'search', learn_timeouts=learn_timeouts)
+        assert waits.stats()['krs.example.com']['search']['timeout'] == timeout
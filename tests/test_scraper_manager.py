@@ -0,0 +1,48 @@
+from multiprocessing import get_context
+
+import pytest
+
+from WebCrawler.managers import ScraperManager
+from WebCrawler.managers.scraper_manager import PIPELINE_BROWSERS, _shared_in_flight, _split_rate_limits
+from WebCrawler.network import DeadlineExceeded, RateLimiter, deadline_scope
+
+from conftest import FakeRegonScraper, nip
+
+
+def test_pipeline_with_local_units_does_not_run_out_of_browsers(fake_scrapers):
+    # far more entities than the stage queues hold, so every stage keeps its browser while others wait for theirs
+    entities = 40
+    manager = ScraperManager(data=[(nip(i), 'NIP') for i in range(entities)], queue_size=2, analyze_sentiment=False,
+                             local_unit_workers=2, run_timeout=60,
+                             entity_timeouts={'krs': 10, 'bankier': 10, 'infostrefa': 10, 'stock_name': 10})
+    manager.scrap()
+
+    assert len(manager.regon_entity_df) == entities
+    assert len(manager.regon_local_entity_df) == entities * FakeRegonScraper.local_units_per_entity
+    assert len(manager.krs_general_info_df) == entities
+    assert len(manager.bankier_news_df) == entities
+    assert len(manager.infostrefa_news_df) == entities
+    assert not any(record.get('timed_out') for record in manager.metrics.snapshot()['entities'])
+    assert fake_scrapers.peak <= fake_scrapers.max_size == PIPELINE_BROWSERS + 2
+    assert fake_scrapers.leased == 0
+
+
+def test_workers_share_requests_in_flight_of_a_host():
+    limits = {'aleo.com': (100.0, 1)}
+    workers = 3
+    in_flight = _shared_in_flight(limits, get_context('spawn'))
+    # every worker process has its own rate limiter
+    limiters = [RateLimiter(_split_rate_limits(limits, workers)) for _ in range(workers)]
+    # a request sent before the semaphores are shared does not keep the limiter from using them
+    with limiters[0].slot('https://aleo.com/pl/firma/0'):
+        pass
+    for limiter in limiters:
+        limiter.share_in_flight(in_flight)
+
+    with limiters[0].slot('https://aleo.com/pl/firma/1'):
+        for limiter in limiters[1:]:
+            with pytest.raises(DeadlineExceeded), deadline_scope(0.2):
+                with limiter.slot('https://aleo.com/pl/firma/2'):
+                    pass
+    with limiters[1].slot('https://aleo.com/pl/firma/2') as waited:
+        assert waited < 0.2
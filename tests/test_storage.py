@@ -0,0 +1,46 @@
+import os
+
+import pandas as pd
+
+from WebCrawler.storage import ResultStore, ScrapJournal
+
+
+def test_result_store_clear_keeps_files_it_did_not_create(tmp_path):
+    (tmp_path / 'journal').mkdir()
+    (tmp_path / 'journal' / 'scrap_journal.jsonl').write_text('{}\n')
+    (tmp_path / 'notes.jsonl').write_text('{}\n')
+    store = ResultStore(str(tmp_path))
+    store.append('regon_entity_df', pd.DataFrame([['1', '2']], columns=['regon', 'nip']))
+    shard = ResultStore(store.subdirectory('shard-0'))
+    shard.append('regon_entity_df', pd.DataFrame([['3', '4']], columns=['regon', 'nip']))
+    store.adopt(shard.handle('regon_entity_df'))
+    shard.close()
+    assert len(store.handle('regon_entity_df').to_dataframe()) == 2
+
+    # a store of the next run removes partitions of the previous one
+    store.close()
+    ResultStore(str(tmp_path))
+
+    assert sorted(os.listdir(tmp_path)) == ['journal', 'notes.jsonl']
+    assert (tmp_path / 'journal' / 'scrap_journal.jsonl').exists()
+
+
+def test_scrap_journal_reads_frames_of_resumed_entries_from_disk(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = ScrapJournal(path)
+    frames = {'news': pd.DataFrame([['1', 'Wiadomość']], columns=['nip', 'wiadomosc'])}
+    journal.record('bankier', 'a', frames)
+    journal.record('krs', 'b', value=['x', 1])
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"source": "krs", "key": "trunc')
+
+    resumed = ScrapJournal(path, resume=True)
+    assert len(resumed) == 2
+    assert all(isinstance(position, tuple) for position in resumed._entries.values())
+    pd.testing.assert_frame_equal(resumed.get('bankier', 'a')['frames']['news'], frames['news'])
+    assert resumed.get('krs', 'b') == {'frames': {}, 'value': ['x', 1]}
+    assert resumed.get('krs', 'c') is None
+
+    # lines appended after a truncated one are still found
+    resumed.record('aleo', 'c', value='y')
+    assert ScrapJournal(path, resume=True).get('aleo', 'c')['value'] == 'y'
@@ -0,0 +1,67 @@
+import time
+
+from WebCrawler.distributed import TaskQueue
+from WebCrawler.distributed.task_queue import DEAD, DONE, LEASED, PENDING
+
+
+def queues(tmp_path, visibility_timeout=60, max_attempts=3):
+    """Queue of the coordinator, configured with the settings, and a queue of a worker reading them."""
+    db_path = str(tmp_path / 'queue.db')
+    coordinator = TaskQueue(db_path)
+    coordinator.configure(visibility_timeout, max_attempts)
+    coordinator.put([('regon', '1000000001', ('1000000001', 'NIP'))])
+    return coordinator, TaskQueue(db_path)
+
+
+def test_workers_use_settings_of_the_coordinator(tmp_path):
+    coordinator, worker = queues(tmp_path, visibility_timeout=30, max_attempts=5)
+    assert (worker.visibility_timeout, worker.max_attempts) == (30, 5)
+    # an override of the worker is not saved in the queue
+    assert TaskQueue(str(tmp_path / 'queue.db'), visibility_timeout=10).visibility_timeout == 10
+    assert coordinator.visibility_timeout == 30
+
+
+def test_expired_lease_is_handed_out_again(tmp_path):
+    coordinator, worker = queues(tmp_path, visibility_timeout=0.2)
+    task = worker.lease('worker-1')
+    assert (task.key, task.item, task.attempts) == ('1000000001', ('1000000001', 'NIP'), 1)
+    assert worker.lease('worker-2') is None
+    assert coordinator.counts()[LEASED] == 1
+
+    time.sleep(0.3)
+    task = worker.lease('worker-2')
+    assert task.attempts == 2
+    worker.complete(task, [], [('krs', '1000000001', ('1000000001', 'NIP'))])
+    assert coordinator.counts() == {PENDING: 1, LEASED: 0, DONE: 1, DEAD: 0}
+
+
+def test_extended_lease_stays_hidden(tmp_path):
+    _, worker = queues(tmp_path, visibility_timeout=0.3)
+    task = worker.lease('worker-1')
+    for _ in range(3):
+        time.sleep(0.15)
+        worker.extend(task, 'worker-1')
+        assert worker.lease('worker-2') is None
+    # a lease lost to another worker is not extended by the old one
+    time.sleep(0.4)
+    assert worker.lease('worker-2') is not None
+    worker.extend(task, 'worker-1')
+    assert worker.lease('worker-1') is None
+
+
+def test_failed_task_is_abandoned_after_max_attempts(tmp_path):
+    coordinator, worker = queues(tmp_path, max_attempts=2)
+    worker.fail(worker.lease('worker-1'))
+    assert coordinator.counts()[PENDING] == 1
+    worker.fail(worker.lease('worker-1'))
+    assert coordinator.counts()[DEAD] == 1
+    assert worker.lease('worker-1') is None
+    assert worker.is_finished()
+
+
+def test_expired_lease_of_the_last_attempt_is_abandoned(tmp_path):
+    coordinator, worker = queues(tmp_path, visibility_timeout=0.1, max_attempts=1)
+    worker.lease('worker-1')
+    time.sleep(0.2)
+    assert worker.lease('worker-2') is None
+    assert coordinator.counts()[DEAD] == 1